@@ -9,6 +9,8 @@ class Module(MixedModule):
         'isenabled': 'interp_gc.isenabled',
         'enable_finalizers': 'interp_gc.enable_finalizers',
         'disable_finalizers': 'interp_gc.disable_finalizers',
+        'get_stats': 'interp_gc.get_stats',
+        'set_hook': 'interp_gc.set_hook',
         'garbage': 'space.newlist([])',
         #'dump_heap_stats': 'interp_gc.dump_heap_stats',
     }
@@ -34,3 +36,7 @@ class Module(MixedModule):
                 'GcRef': 'referents.W_GcRef',
                 })
         MixedModule.__init__(self, space, w_name)
+        # the hook installed by set_hook() is called by a periodic action
+        from pypy.module.gc.interp_gc import GcHookAction
+        space.actionflag.register_periodic_action(
+            space.fromcache(GcHookAction), use_bytecode_counter=True)
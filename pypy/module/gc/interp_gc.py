@@ -1,5 +1,6 @@
 from pypy.interpreter.gateway import unwrap_spec
 from pypy.interpreter.error import OperationError
+from pypy.interpreter.executioncontext import PeriodicAsyncAction
 from rpython.rlib import rgc
 
 
@@ -48,6 +49,25 @@ def enable_finalizers(space):
 def disable_finalizers(space):
     space.user_del_action.finalizers_lock_count += 1
 
+def get_stats(space):
+    """Return a dict with the statistics that the GC provides:
+    'released_memory' and 'total_released_memory', the number of bytes of
+    free memory currently and so far given back to the OS, and
+    'freed_arenas'; the number of 'minor_collections' and 'major_steps'
+    so far, with the total, min, max and 99th percentile of their
+    durations ('minor_pause_total', etc.) in ticks of the CPU's timestamp
+    counter; 'total_promoted', the number of bytes moved out of the
+    nursery, and 'total_freed', the number of bytes freed by the major
+    collections; 'gc_state', the phase of the major collection (0 to 3
+    for scanning, marking, sweeping, finalizing) and 'pinned_objects'.
+    The dict is empty if the GC does not give any."""
+    w_result = space.newdict()
+    for i in range(len(rgc.STAT_NAMES)):
+        value = rgc.get_stats(i)
+        if value >= 0:
+            space.setitem_str(w_result, rgc.STAT_NAMES[i], space.wrap(value))
+    return w_result
+
 # ____________________________________________________________
 
 @unwrap_spec(filename='str0')
@@ -61,3 +81,91 @@ def dump_heap_stats(space, filename):
         f.write("%d %d " % (tb[i].count, tb[i].size))
         f.write(",".join([str(tb[i].links[j]) for j in range(len(tb))]) + "\n")
     f.close()
+
+# ____________________________________________________________
+
+class GcHookAction(PeriodicAsyncAction):
+    """Calls the hook installed with set_hook() every sys.checkinterval
+    bytecodes, if there were collections since the last call.  The hook
+    cannot be called from the GC itself, which runs at places where
+    app-level code cannot."""
+
+    def __init__(self, space):
+        PeriodicAsyncAction.__init__(self, space)
+        self.w_hook = None
+        self.running = False
+        self.reset()
+
+    def reset(self):
+        self.minor_collections = rgc.get_stats(rgc.STAT_MINOR_COLLECTIONS)
+        self.minor_pause_total = rgc.get_stats(rgc.STAT_MINOR_PAUSE_TOTAL)
+        self.total_promoted = rgc.get_stats(rgc.STAT_TOTAL_PROMOTED)
+        self.major_steps = rgc.get_stats(rgc.STAT_MAJOR_STEPS)
+        self.major_pause_total = rgc.get_stats(rgc.STAT_MAJOR_PAUSE_TOTAL)
+        self.total_freed = rgc.get_stats(rgc.STAT_TOTAL_FREED)
+
+    def perform(self, executioncontext, frame):
+        if self.w_hook is None or self.running:
+            return
+        minor_collections = rgc.get_stats(rgc.STAT_MINOR_COLLECTIONS)
+        major_steps = rgc.get_stats(rgc.STAT_MAJOR_STEPS)
+        if (minor_collections == self.minor_collections and
+                major_steps == self.major_steps):
+            return
+        space = self.space
+        minor_pause_total = rgc.get_stats(rgc.STAT_MINOR_PAUSE_TOTAL)
+        total_promoted = rgc.get_stats(rgc.STAT_TOTAL_PROMOTED)
+        major_pause_total = rgc.get_stats(rgc.STAT_MAJOR_PAUSE_TOTAL)
+        total_freed = rgc.get_stats(rgc.STAT_TOTAL_FREED)
+        w_info = space.newdict()
+        space.setitem_str(w_info, 'minor_collections',
+                          space.wrap(minor_collections -
+                                     self.minor_collections))
+        space.setitem_str(w_info, 'minor_duration',
+                          space.wrap(minor_pause_total -
+                                     self.minor_pause_total))
+        space.setitem_str(w_info, 'promoted',
+                          space.wrap(total_promoted - self.total_promoted))
+        space.setitem_str(w_info, 'major_steps',
+                          space.wrap(major_steps - self.major_steps))
+        space.setitem_str(w_info, 'major_duration',
+                          space.wrap(major_pause_total -
+                                     self.major_pause_total))
+        space.setitem_str(w_info, 'freed',
+                          space.wrap(total_freed - self.total_freed))
+        space.setitem_str(w_info, 'gc_state',
+                          space.wrap(rgc.get_stats(rgc.STAT_GC_STATE)))
+        space.setitem_str(w_info, 'pinned_objects',
+                          space.wrap(rgc.get_stats(rgc.STAT_PINNED_OBJECTS)))
+        self.minor_collections = minor_collections
+        self.minor_pause_total = minor_pause_total
+        self.total_promoted = total_promoted
+        self.major_steps = major_steps
+        self.major_pause_total = major_pause_total
+        self.total_freed = total_freed
+        w_hook = self.w_hook
+        self.running = True
+        try:
+            space.call_function(w_hook, w_info)
+        except OperationError, e:
+            e.write_unraisable(space, "gc hook ", w_hook)
+        finally:
+            self.running = False
+
+def set_hook(space, w_callback):
+    """set_hook(callback)
+
+    Call 'callback' with a dict describing the collections that occurred
+    since the previous call: the number of 'minor_collections' and their
+    total 'minor_duration' (in the same ticks as get_stats()), the bytes
+    'promoted' out of the nursery, the number of 'major_steps', their
+    'major_duration' and the bytes 'freed', and the current 'gc_state'
+    and 'pinned_objects'.  It is called between two bytecodes, every
+    sys.checkinterval bytecodes if there was at least one collection.
+    set_hook(None) removes the hook."""
+    action = space.fromcache(GcHookAction)
+    if space.is_none(w_callback):
+        action.w_hook = None
+    else:
+        action.reset()
+        action.w_hook = w_callback
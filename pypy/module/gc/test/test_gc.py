@@ -1,4 +1,5 @@
 import py
+from pypy.interpreter.gateway import interp2app, unwrap_spec
 
 
 class AppTestGC(object):
@@ -7,6 +8,21 @@ class AppTestGC(object):
         gc.collect() # mostly a "does not crash" kind of test
         gc.collect(0) # mostly a "does not crash" kind of test
 
+    def test_get_stats(self):
+        import gc
+        stats = gc.get_stats()
+        assert isinstance(stats, dict)
+        for key, value in stats.items():
+            assert key in ('released_memory', 'total_released_memory',
+                           'freed_arenas', 'minor_collections',
+                           'minor_pause_total', 'minor_pause_min',
+                           'minor_pause_max', 'minor_pause_p99',
+                           'total_promoted', 'major_steps',
+                           'major_pause_total', 'major_pause_min',
+                           'major_pause_max', 'major_pause_p99',
+                           'total_freed', 'gc_state', 'pinned_objects')
+            assert value >= 0
+
     def test_disable_finalizers(self):
         import gc
 
@@ -71,6 +87,76 @@ class AppTestGC(object):
         assert gc.isenabled()
 
 
+class AppTestGcHook(object):
+
+    def setup_class(cls):
+        from rpython.rlib import rgc
+        stats = {}
+        def fake_get_stats(stats_no):
+            return stats.get(stats_no, -1)
+        @unwrap_spec(minor=int, major=int)
+        def collections(space, minor, major):
+            stats[rgc.STAT_MINOR_COLLECTIONS] = (
+                stats.get(rgc.STAT_MINOR_COLLECTIONS, 0) + minor)
+            stats[rgc.STAT_MINOR_PAUSE_TOTAL] = (
+                stats.get(rgc.STAT_MINOR_PAUSE_TOTAL, 0) + 10)
+            stats[rgc.STAT_TOTAL_PROMOTED] = (
+                stats.get(rgc.STAT_TOTAL_PROMOTED, 0) + 100)
+            stats[rgc.STAT_MAJOR_STEPS] = (
+                stats.get(rgc.STAT_MAJOR_STEPS, 0) + major)
+            stats[rgc.STAT_MAJOR_PAUSE_TOTAL] = 0
+            stats[rgc.STAT_TOTAL_FREED] = 0
+            stats[rgc.STAT_GC_STATE] = 1
+            stats[rgc.STAT_PINNED_OBJECTS] = 2
+        cls._get_stats = staticmethod(rgc.get_stats)
+        rgc.get_stats = fake_get_stats
+        cls.w_collections = cls.space.wrap(interp2app(collections))
+
+    def teardown_class(cls):
+        from rpython.rlib import rgc
+        rgc.get_stats = cls._get_stats
+
+    def test_hook(self):
+        import gc, sys
+        infos = []
+        old_interval = sys.getcheckinterval()
+        sys.setcheckinterval(1)
+        try:
+            self.collections(1, 0)
+            gc.set_hook(infos.append)
+            for i in range(10):
+                pass
+            assert infos == []      # nothing since set_hook()
+            self.collections(3, 1)
+            for i in range(10):
+                pass
+            gc.set_hook(None)
+            self.collections(1, 0)
+            for i in range(10):
+                pass
+        finally:
+            sys.setcheckinterval(old_interval)
+        assert infos == [{'minor_collections': 3, 'minor_duration': 10,
+                          'promoted': 100, 'major_steps': 1,
+                          'major_duration': 0, 'freed': 0,
+                          'gc_state': 1, 'pinned_objects': 2}]
+
+    def test_hook_error(self):
+        import gc, sys
+        def hook(info):
+            raise ValueError
+        old_interval = sys.getcheckinterval()
+        sys.setcheckinterval(1)
+        try:
+            gc.set_hook(hook)
+            self.collections(1, 0)
+            for i in range(10):     # the error is printed, not raised
+                pass
+            gc.set_hook(None)
+        finally:
+            sys.setcheckinterval(old_interval)
+
+
 class AppTestGcDumpHeap(object):
     pytestmark = py.test.mark.xfail(run=False)
 
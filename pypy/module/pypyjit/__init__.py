@@ -12,6 +12,10 @@ class Module(MixedModule):
         'set_optimize_hook': 'interp_resop.set_optimize_hook',
         'set_abort_hook': 'interp_resop.set_abort_hook',
         'get_stats_snapshot': 'interp_resop.get_stats_snapshot',
+        'get_guard_report': 'interp_resop.get_guard_report',
+        'compile_pending': 'interp_resop.compile_pending',
+        'get_hotness_profile': 'interp_resop.get_hotness_profile',
+        'load_hotness_profile': 'interp_resop.load_hotness_profile',
         'enable_debug': 'interp_resop.enable_debug',
         'disable_debug': 'interp_resop.disable_debug',
         'ResOperation': 'interp_resop.WrappedOp',
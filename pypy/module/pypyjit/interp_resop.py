@@ -6,9 +6,10 @@ from pypy.interpreter.gateway import unwrap_spec, interp2app
 from pypy.interpreter.pycode import PyCode
 from pypy.interpreter.error import OperationError
 from rpython.rtyper.lltypesystem import lltype
-from rpython.rtyper.annlowlevel import cast_base_ptr_to_instance, hlstr
+from rpython.rtyper.annlowlevel import cast_base_ptr_to_instance, hlstr, llstr
 from rpython.rtyper.rclass import OBJECT
 from rpython.jit.metainterp.resoperation import rop
+from rpython.jit.metainterp import jitprof
 from rpython.rlib.nonconst import NonConstant
 from rpython.rlib import jit_hooks
 from rpython.rlib.jit import Counters
@@ -363,21 +364,46 @@ W_JitLoopInfo.acceptable_as_base_class = False
 
 
 class W_JitInfoSnapshot(W_Root):
-    def __init__(self, space, w_times, w_counters, w_counter_times):
+    def __init__(self, space, w_times, w_counters, w_counter_times,
+                 w_memory, w_compile_queue, w_guard_failures, w_locations,
+                 w_retrace_limit_hits):
         self.w_loop_run_times = w_times
+        self.w_guard_failures = w_guard_failures
+        self.w_retrace_limit_hits = w_retrace_limit_hits
+        self.w_locations = w_locations
         self.w_counters = w_counters
         self.w_counter_times = w_counter_times
+        self.w_memory = w_memory
+        self.w_compile_queue = w_compile_queue
 
 W_JitInfoSnapshot.typedef = TypeDef(
     "JitInfoSnapshot",
     loop_run_times = interp_attrproperty_w("w_loop_run_times",
                                              cls=W_JitInfoSnapshot),
+    guard_failures = interp_attrproperty_w("w_guard_failures",
+                                           cls=W_JitInfoSnapshot,
+                                           doc="number of failures of each "
+                                               "guard, by guard number"),
+    retrace_limit_hits = interp_attrproperty_w("w_retrace_limit_hits",
+                                               cls=W_JitInfoSnapshot,
+                                               doc="number of times each "
+                                                   "loop hit retrace_limit"),
+    locations = interp_attrproperty_w("w_locations", cls=W_JitInfoSnapshot,
+                                      doc="where the loops, bridges and "
+                                          "guards come from"),
     counters = interp_attrproperty_w("w_counters",
                                        cls=W_JitInfoSnapshot,
                                        doc="various JIT counters"),
     counter_times = interp_attrproperty_w("w_counter_times",
                                             cls=W_JitInfoSnapshot,
-                                            doc="various JIT timers")
+                                            doc="various JIT timers"),
+    memory = interp_attrproperty_w("w_memory", cls=W_JitInfoSnapshot,
+                                   doc="memory used by the compiled loops, "
+                                       "see the loop_memory_limit parameter"),
+    compile_queue = interp_attrproperty_w("w_compile_queue",
+                                          cls=W_JitInfoSnapshot,
+                                          doc="loops waiting to be compiled, "
+                                              "see compile_pending()")
 )
 W_JitInfoSnapshot.acceptable_as_base_class = False
 
@@ -386,6 +412,7 @@ def get_stats_snapshot(space):
     is eager - the attribute access is not lazy, if you need new stats
     you need to call this function again.
     """
+    w_locations = space.newdict()
     ll_times = jit_hooks.stats_get_loop_run_times(None)
     w_times = space.newdict()
     for i in range(len(ll_times)):
@@ -393,6 +420,24 @@ def get_stats_snapshot(space):
                                 space.wrap(ll_times[i].number)])
         space.setitem(w_times, w_key,
                       space.wrap(ll_times[i].counter))
+        _set_location(space, w_locations, w_key, ll_times[i].type,
+                      ll_times[i].number)
+    ll_failures = jit_hooks.stats_get_guard_failures(None)
+    w_guard_failures = space.newdict()
+    for i in range(len(ll_failures)):
+        w_number = space.wrap(ll_failures[i].number)
+        space.setitem(w_guard_failures, w_number,
+                      space.wrap(ll_failures[i].counter))
+        w_key = space.newtuple([space.wrap('g'), w_number])
+        _set_location(space, w_locations, w_key, 'g', ll_failures[i].number)
+    ll_retraces = jit_hooks.stats_get_retrace_limit_hits(None)
+    w_retrace_limit_hits = space.newdict()
+    for i in range(len(ll_retraces)):
+        w_number = space.wrap(ll_retraces[i].number)
+        space.setitem(w_retrace_limit_hits, w_number,
+                      space.wrap(ll_retraces[i].counter))
+        w_key = space.newtuple([space.wrap('e'), w_number])
+        _set_location(space, w_locations, w_key, 'e', ll_retraces[i].number)
     w_counters = space.newdict()
     for i, counter_name in enumerate(Counters.counter_names):
         v = jit_hooks.stats_get_counter_value(None, i)
@@ -402,8 +447,90 @@ def get_stats_snapshot(space):
     space.setitem_str(w_counter_times, 'TRACING', space.wrap(tr_time))
     b_time = jit_hooks.stats_get_times_value(None, Counters.BACKEND)
     space.setitem_str(w_counter_times, 'BACKEND', space.wrap(b_time))
+    w_memory = space.newdict()
+    space.setitem_str(w_memory, 'total_size',
+                      space.wrap(jit_hooks.stats_memmgr_get_total_size(None)))
+    space.setitem_str(w_memory, 'max_size',
+                      space.wrap(jit_hooks.stats_memmgr_get_max_size(None)))
+    space.setitem_str(w_memory, 'limit_hits',
+                      space.wrap(jit_hooks.stats_memmgr_get_limit_hits(None)))
+    space.setitem_str(w_memory, 'evicted_loops',
+                      space.wrap(jit_hooks.stats_memmgr_get_evicted_loops(None)))
+    w_compile_queue = space.newdict()
+    space.setitem_str(w_compile_queue, 'pending',
+                space.wrap(jit_hooks.stats_compile_queue_get_pending(None)))
+    space.setitem_str(w_compile_queue, 'deferred',
+                space.wrap(jit_hooks.stats_compile_queue_get_deferred(None)))
+    space.setitem_str(w_compile_queue, 'failed',
+                space.wrap(jit_hooks.stats_compile_queue_get_failed(None)))
     return space.wrap(W_JitInfoSnapshot(space, w_times, w_counters,
-                                        w_counter_times))
+                                        w_counter_times, w_memory,
+                                        w_compile_queue, w_guard_failures,
+                                        w_locations, w_retrace_limit_hits))
+
+def _set_location(space, w_locations, w_key, tp, number):
+    location = hlstr(jit_hooks.stats_get_location(None, tp, number))
+    if location:
+        space.setitem(w_locations, w_key, space.wrap(location))
+
+GUARD_REASONS = [(jitprof.GUARD_COUNTING, 'counting'),
+                 (jitprof.GUARD_BUSY, 'busy'),
+                 (jitprof.GUARD_FORCED, 'forced'),
+                 (jitprof.GUARD_TRACING, 'tracing')]
+
+@unwrap_spec(limit=int)
+def get_guard_report(space, limit=10):
+    """ Return the 'limit' guards that failed the most often since
+    enable_debug() was called, as a list of tuples (guard number, number
+    of failures, location, reasons).  'reasons' is a dict counting what
+    happened after the failures: 'counting' towards the trace_eagerness
+    threshold and 'busy' (already tracing from this guard) go back to the
+    interpreter, 'forced' is a GUARD_NOT_FORCED, which never gets a bridge,
+    and 'tracing' started tracing a bridge.
+    """
+    ll_reasons = jit_hooks.stats_get_guard_reasons(None)
+    reasons = {}
+    for i in range(len(ll_reasons)):
+        key = (ll_reasons[i].number, ll_reasons[i].type)
+        reasons[key] = ll_reasons[i].counter
+    ll_top = jit_hooks.stats_get_top_failing_guards(None, limit)
+    result_w = []
+    for i in range(len(ll_top)):
+        number = ll_top[i].number
+        w_reasons = space.newdict()
+        for reason, name in GUARD_REASONS:
+            count = reasons.get((number, reason), 0)
+            if count:
+                space.setitem_str(w_reasons, name, space.wrap(count))
+        location = hlstr(jit_hooks.stats_get_location(None, 'g', number))
+        result_w.append(space.newtuple([space.wrap(number),
+                                        space.wrap(ll_top[i].counter),
+                                        space.wrap(location), w_reasons]))
+    return space.newlist(result_w)
+
+def compile_pending(space):
+    """ Optimize and assemble the loops that were traced but not compiled
+    yet, because the compile_queue parameter is set.  Call it when the
+    program is idle.  Returns the number of loops compiled.
+    """
+    return space.wrap(jit_hooks.stats_compile_pending(None))
+
+def get_hotness_profile(space):
+    """ Return a profile of the loops that are hot or already compiled,
+    as a string with one line per loop.  Give it to load_hotness_profile()
+    in a new process running the same program, to make it trace these
+    loops without waiting for the usual threshold.
+    """
+    return space.wrap(hlstr(jit_hooks.stats_dump_hotness_profile(None)))
+
+@unwrap_spec(profile=str)
+def load_hotness_profile(space, profile):
+    """ Load a profile returned by get_hotness_profile() in a previous
+    process.  The loops are recognized by their code object, line and
+    bytecode position.  Returns the number of loops loaded.
+    """
+    return space.wrap(jit_hooks.stats_load_hotness_profile(None,
+                                                           llstr(profile)))
 
 def enable_debug(space):
     """ Set the jit debugging - completely necessary for some stats to work,
@@ -0,0 +1,345 @@
+#! /usr/bin/env python
+"""
+Analyses the dumpfiles produced by gc.dump_rpy_heap().
+
+Syntax:  heapdiff.py  summary   <dumpfile>
+         heapdiff.py  diff      <old dumpfile>  <new dumpfile>
+         heapdiff.py  retained  <dumpfile>  [<number of objects>]
+
+'summary' prints the number and total size of the objects of each type.
+'diff' prints how they changed between two dumps of the same process,
+the types that grew the most last: run it on two dumps taken some time
+apart to find what leaks.  'retained' prints the objects that keep the
+most memory alive, i.e. the size of all the objects that would be freed
+if they were, computed from the dominator tree of the heap.
+
+The type names are loaded from the typeids.txt in the same dir as the
+(first) dumpfile, or else from gc.get_typeids_z() if we are running on
+the PyPy that made the dump.  The dump only contains the RPython types:
+the instances of app-level classes show up with the name of the
+interp-level class that implements them, like W_ObjectObjectUserDict...
+
+The files are read with mmap, a part at a time, so 'summary' and 'diff'
+need little memory even for dumps bigger than the RAM.  'retained'
+needs about a dozen words per object and two per reference between
+objects, but not the dump itself.
+"""
+import sys, os, array, mmap, struct, heapq, bisect
+
+from pypy.tool.gcdump import Stat
+
+WORD = struct.calcsize('l')
+CHUNK = 1024 * 1024     # words
+
+
+class HeapDumpError(Exception):
+    pass
+
+
+class HeapDump(object):
+    """A dumpfile, mapped in memory."""
+
+    def __init__(self, filename):
+        self.file = open(filename, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        if size % WORD != 0 or size < 4 * WORD:
+            raise HeapDumpError("invalid or truncated dump file "
+                                "(or 32/64-bit mix)")
+        self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.length = size // WORD
+        if self.read(self.length - 1, 1)[0] != -1:
+            raise HeapDumpError("invalid or truncated dump file "
+                                "(or 32/64-bit mix)")
+
+    def close(self):
+        self.mmap.close()
+        self.file.close()
+
+    def read(self, start, count):
+        """Return an array with the 'count' words starting at 'start'."""
+        a = array.array('l')
+        a.fromstring(self.mmap[start * WORD:(start + count) * WORD])
+        return a
+
+    def records(self):
+        """Yield (pos, addr, typenum, size, links) for each object, where
+        'pos' is the position of the object in the file, in words.  The
+        marker written after the roots has 'addr' and 'typenum' 0."""
+        base = 0
+        a = self.read(0, CHUNK)
+        i = 0
+        while base + i < self.length:
+            j = i + 3
+            while j >= len(a) or a[j] != -1:
+                if j >= len(a):
+                    # the object continues after this part: read again
+                    # from the start of the object, at least twice more
+                    if base + len(a) >= self.length:
+                        raise HeapDumpError("truncated dump file")
+                    base += i
+                    j -= i
+                    a = self.read(base, max(CHUNK, 2 * (len(a) - i)))
+                    i = 0
+                else:
+                    j += 1
+            yield (base + i, a[i], a[i+1], a[i+2], a[i+3:j])
+            i = j + 1
+
+    def links(self, pos, count):
+        """The addresses of the objects referenced by the object at 'pos',
+        which has 'count' of them."""
+        return self.read(pos + 3, count)
+
+
+def summarize(dump):
+    """Return a dict {typenum: [count, totalsize]}."""
+    summary = {}
+    for pos, addr, typenum, size, links in dump.records():
+        if addr == 0:
+            continue    # the marker after the roots
+        try:
+            stat = summary[typenum]
+        except KeyError:
+            stat = summary[typenum] = [0, 0]
+        stat[0] += 1
+        stat[1] += size
+    return summary
+
+def diff_summaries(old, new):
+    """Return a list of (typenum, count difference, size difference,
+    new count, new size), sorted by size difference."""
+    result = []
+    for typenum in set(old) | set(new):
+        oldcount, oldsize = old.get(typenum, (0, 0))
+        newcount, newsize = new.get(typenum, (0, 0))
+        if (oldcount, oldsize) != (newcount, newsize):
+            result.append((typenum, newcount - oldcount, newsize - oldsize,
+                           newcount, newsize))
+    result.sort(key=lambda item: (item[2], item[1]))
+    return result
+
+
+class DominatorTree(object):
+    """The dominator tree of the heap: the immediate dominator of an
+    object is the last object through which all the paths from the
+    roots to it go.  The objects are numbered from 1 in the order of the
+    dumpfile; 0 is a fake root pointing to all the roots.  Computed with
+    the iterative algorithm of Cooper, Harvey and Kennedy, 'A Simple,
+    Fast Dominance Algorithm'."""
+
+    def __init__(self, dump):
+        self.dump = dump
+        self.load_objects()
+        self.compute_postorder()
+        self.compute_predecessors()
+        self.compute_idoms()
+        self.compute_retained()
+
+    def load_objects(self):
+        self.addrs = array.array('l', [0])
+        self.typenums = array.array('l', [0])
+        self.sizes = array.array('l', [0])
+        self.numroots = -1
+        for pos, addr, typenum, size, links in self.dump.records():
+            if addr == 0:
+                self.numroots = len(self.addrs) - 1
+                continue
+            self.addrs.append(addr)
+            self.typenums.append(typenum)
+            self.sizes.append(size)
+        if self.numroots < 0:
+            raise HeapDumpError("no marker after the roots")
+        self.build_index()
+        self.load_successors()
+
+    def build_index(self):
+        # 'sorted_addrs' are the addresses in increasing order, and the
+        # object with the address sorted_addrs[i] is number perm[i]; the
+        # dumps are usually not in address order
+        addrs = self.addrs
+        perm = sorted(xrange(1, len(addrs)), key=addrs.__getitem__)
+        self.perm = array.array('l', perm)
+        del perm
+        self.sorted_addrs = array.array('l', [addrs[n] for n in self.perm])
+
+    def lookup(self, addr):
+        """The number of the object at 'addr', or -1."""
+        i = bisect.bisect_left(self.sorted_addrs, addr)
+        if i < len(self.sorted_addrs) and self.sorted_addrs[i] == addr:
+            return self.perm[i]
+        return -1
+
+    def load_successors(self):
+        # in the style of a sparse matrix: the successors of 'n' are
+        # succs[succstart[n]:succstart[n+1]]
+        self.succstart = array.array('l', [0, 0])
+        self.succs = array.array('l')
+        for pos, addr, typenum, size, links in self.dump.records():
+            if addr == 0:
+                continue
+            for link in links:
+                m = self.lookup(link)
+                if m >= 0:
+                    self.succs.append(m)
+            self.succstart.append(len(self.succs))
+
+    def successors(self, n):
+        if n == 0:
+            return xrange(1, self.numroots + 1)
+        return self.succs[self.succstart[n]:self.succstart[n + 1]]
+
+    def compute_postorder(self):
+        # 'postorder' lists the reachable objects, each one after all the
+        # objects that it dominates; 'postnum' is the reverse mapping, or
+        # -1 for the objects not reached yet
+        self.postorder = array.array('l')
+        self.postnum = array.array('l', [-1]) * len(self.addrs)
+        visited = array.array('b', [0]) * len(self.addrs)
+        visited[0] = 1
+        stack = [(0, iter(self.successors(0)))]
+        while stack:
+            n, successors = stack[-1]
+            for m in successors:
+                if not visited[m]:
+                    visited[m] = 1
+                    stack.append((m, iter(self.successors(m))))
+                    break
+            else:
+                stack.pop()
+                self.postnum[n] = len(self.postorder)
+                self.postorder.append(n)
+
+    def compute_predecessors(self):
+        # in the style of a sparse matrix: the predecessors of 'n' are
+        # preds[predstart[n]:predstart[n+1]]
+        count = array.array('l', [0]) * (len(self.addrs) + 1)
+        for n in self.postorder:
+            for m in self.successors(n):
+                count[m + 1] += 1
+        for n in range(len(self.addrs)):
+            count[n + 1] += count[n]
+        self.predstart = count
+        self.preds = array.array('l', [0]) * count[-1]
+        fill = array.array('l', count)
+        for n in self.postorder:
+            for m in self.successors(n):
+                self.preds[fill[m]] = n
+                fill[m] += 1
+
+    def intersect(self, a, b):
+        idom = self.idom
+        postnum = self.postnum
+        while a != b:
+            while postnum[a] < postnum[b]:
+                a = idom[a]
+            while postnum[b] < postnum[a]:
+                b = idom[b]
+        return a
+
+    def compute_idoms(self):
+        self.idom = idom = array.array('l', [-1]) * len(self.addrs)
+        idom[0] = 0
+        changed = True
+        while changed:
+            changed = False
+            # in reverse postorder, skipping the fake root, which is last
+            for k in range(len(self.postorder) - 2, -1, -1):
+                n = self.postorder[k]
+                new_idom = -1
+                for i in range(self.predstart[n], self.predstart[n + 1]):
+                    p = self.preds[i]
+                    if idom[p] == -1:
+                        continue
+                    if new_idom == -1:
+                        new_idom = p
+                    else:
+                        new_idom = self.intersect(p, new_idom)
+                if idom[n] != new_idom:
+                    idom[n] = new_idom
+                    changed = True
+
+    def compute_retained(self):
+        # an object is after all the objects that it dominates in the
+        # postorder, so we can add up the sizes in one pass
+        self.retained = array.array('l', self.sizes)
+        for k in range(len(self.postorder) - 1):
+            n = self.postorder[k]
+            self.retained[self.idom[n]] += self.retained[n]
+
+    def largest(self, count):
+        """Return the numbers of the 'count' objects that retain the
+        most memory, the largest first."""
+        retained = self.retained
+        return heapq.nlargest(count, self.postorder[:-1],
+                              key=lambda n: retained[n])
+
+
+def load_typeids(filename):
+    stat = Stat()
+    typeid_name = os.path.join(os.path.dirname(filename), 'typeids.txt')
+    if os.path.isfile(typeid_name):
+        stat.load_typeids(typeid_name)
+    else:
+        try:
+            import zlib, gc
+            data = gc.get_typeids_z()
+        except (ImportError, AttributeError):
+            pass
+        else:
+            stat.load_typeids(zlib.decompress(data).split("\n"))
+    return stat
+
+
+def print_summary(stat, summary):
+    items = summary.items()
+    items.sort(key=lambda (typenum, s): s[1])    # sort by totalsize
+    totalsize = 0
+    for typenum, (count, size) in items:
+        totalsize += size
+        print '%8d %8.2fM  %s' % (count, size / (1024.0*1024.0),
+                                  stat.get_type_name(typenum))
+    print 'total %.1fM' % (totalsize / (1024.0*1024.0),)
+
+def print_diff(stat, diff):
+    print '   count     size  new count  new size'
+    for typenum, dcount, dsize, count, size in diff:
+        print '%+8d %+8.2fM  %9d %8.2fM  %s' % (
+            dcount, dsize / (1024.0*1024.0), count, size / (1024.0*1024.0),
+            stat.get_type_name(typenum))
+
+def print_retained(stat, tree, count):
+    print 'retained      self  type'
+    for n in tree.largest(count):
+        print '%7.2fM  %8d  %s at 0x%x' % (
+            tree.retained[n] / (1024.0*1024.0), tree.sizes[n],
+            stat.get_type_name(tree.typenums[n]), tree.addrs[n])
+    print 'total %.1fM' % (tree.retained[0] / (1024.0*1024.0),)
+
+
+def main(argv):
+    if len(argv) < 3 or argv[1] not in ('summary', 'diff', 'retained'):
+        print >> sys.stderr, __doc__
+        sys.exit(2)
+    command = argv[1]
+    stat = load_typeids(argv[2])
+    dump = HeapDump(argv[2])
+    if command == 'summary':
+        print_summary(stat, summarize(dump))
+    elif command == 'diff':
+        if len(argv) < 4:
+            print >> sys.stderr, __doc__
+            sys.exit(2)
+        dump2 = HeapDump(argv[3])
+        print_diff(stat, diff_summaries(summarize(dump), summarize(dump2)))
+        dump2.close()
+    else:
+        if len(argv) > 3:
+            count = int(argv[3])
+        else:
+            count = 30
+        print_retained(stat, DominatorTree(dump), count)
+    dump.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv)
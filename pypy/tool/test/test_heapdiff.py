@@ -0,0 +1,136 @@
+import py
+import array
+from pypy.tool import heapdiff
+from pypy.tool.heapdiff import HeapDump, DominatorTree, summarize
+from pypy.tool.heapdiff import diff_summaries
+
+
+def write_dump(tmpdir, name, roots, objects):
+    # 'roots' and 'objects' are lists of (addr, typenum, size, links)
+    a = array.array('l')
+    for objs in [roots, [(0, 0, 0, [])], objects]:
+        for addr, typenum, size, links in objs:
+            a.extend([addr, typenum, size])
+            a.extend(links)
+            a.append(-1)
+    filename = str(tmpdir.join(name))
+    f = open(filename, 'wb')
+    a.tofile(f)
+    f.close()
+    return filename
+
+# A is the only root, A -> B, A -> C, B -> D, C -> D, D -> E, E -> D
+ROOTS = [(0x100, 1, 10, [0x200, 0x300])]
+OBJECTS = [(0x200, 2, 20, [0x400]),
+           (0x300, 2, 30, [0x400]),
+           (0x400, 3, 40, [0x500]),
+           (0x500, 4, 50, [0x400])]
+
+
+def test_records(tmpdir):
+    dump = HeapDump(write_dump(tmpdir, 'dump', ROOTS, OBJECTS))
+    records = [(addr, typenum, size, list(links))
+               for pos, addr, typenum, size, links in dump.records()]
+    assert records == ROOTS + [(0, 0, 0, [])] + OBJECTS
+    dump.close()
+
+def test_records_in_small_parts(tmpdir, monkeypatch):
+    monkeypatch.setattr(heapdiff, 'CHUNK', 5)
+    dump = HeapDump(write_dump(tmpdir, 'dump', ROOTS, OBJECTS))
+    records = [(addr, typenum, size, list(links))
+               for pos, addr, typenum, size, links in dump.records()]
+    assert records == ROOTS + [(0, 0, 0, [])] + OBJECTS
+    for pos, addr, typenum, size, links in dump.records():
+        assert dump.links(pos, len(links)) == links
+    dump.close()
+
+def test_truncated(tmpdir):
+    filename = write_dump(tmpdir, 'dump', ROOTS, OBJECTS)
+    data = open(filename, 'rb').read()
+    open(filename, 'wb').write(data[:-heapdiff.WORD])
+    py.test.raises(heapdiff.HeapDumpError, HeapDump, filename)
+
+def test_summarize_and_diff(tmpdir):
+    dump = HeapDump(write_dump(tmpdir, 'dump1', ROOTS, OBJECTS))
+    old = summarize(dump)
+    dump.close()
+    assert old == {1: [1, 10], 2: [2, 50], 3: [1, 40], 4: [1, 50]}
+    dump = HeapDump(write_dump(tmpdir, 'dump2', ROOTS, OBJECTS[:2] +
+                               [(0x600, 2, 60, []), (0x700, 5, 70, [])]))
+    new = summarize(dump)
+    dump.close()
+    assert diff_summaries(old, new) == [(4, -1, -50, 0, 0),
+                                        (3, -1, -40, 0, 0),
+                                        (2, 1, 60, 3, 110),
+                                        (5, 1, 70, 1, 70)]
+
+def test_dominator_tree(tmpdir):
+    dump = HeapDump(write_dump(tmpdir, 'dump', ROOTS, OBJECTS))
+    tree = DominatorTree(dump)
+    idoms = dict([(tree.addrs[n], tree.addrs[tree.idom[n]])
+                  for n in range(1, len(tree.addrs))])
+    assert idoms == {0x100: 0, 0x200: 0x100, 0x300: 0x100,
+                     0x400: 0x100, 0x500: 0x400}
+    retained = dict([(tree.addrs[n], tree.retained[n])
+                     for n in range(1, len(tree.addrs))])
+    assert retained == {0x100: 150, 0x200: 20, 0x300: 30,
+                        0x400: 90, 0x500: 50}
+    assert [tree.addrs[n] for n in tree.largest(2)] == [0x100, 0x400]
+    dump.close()
+
+def test_dominator_tree_not_in_address_order(tmpdir):
+    dump = HeapDump(write_dump(tmpdir, 'dump', [(0x900, 1, 10, [0x300])],
+                               [(0x300, 2, 20, [0x100, 0x700]),
+                                (0x700, 3, 30, [0x100, 0x555]),
+                                (0x100, 4, 40, [])]))
+    tree = DominatorTree(dump)
+    assert list(tree.addrs) == [0, 0x900, 0x300, 0x700, 0x100]
+    assert [tree.lookup(addr) for addr in [0x100, 0x300, 0x555, 0x700,
+                                           0x900, 0x1000]] == [
+        4, 2, -1, 3, 1, -1]
+    # the reference to 0x555, which is not in the dump, is ignored
+    assert list(tree.successors(3)) == [4]
+    assert list(tree.retained) == [100, 100, 90, 30, 40]
+    dump.close()
+
+def test_main(tmpdir, capsys):
+    filename = write_dump(tmpdir, 'dump', ROOTS, OBJECTS)
+    tmpdir.join('typeids.txt').write('member0    ?\n'
+                                     'member1    GcStruct A\n'
+                                     'member2    GcStruct B\n'
+                                     'member3    GcStruct D\n'
+                                     'member4    GcStruct E\n')
+    heapdiff.main(['heapdiff.py', 'retained', filename, '1'])
+    out, err = capsys.readouterr()
+    assert out.splitlines()[1].split() == ['0.00M', '10', 'A', 'at', '0x100']
+
+def test_random_dominator_tree(tmpdir):
+    import random
+    r = random.Random(42)
+    addrs = [0x1000 + 16 * i for i in range(60)]
+    objs = []
+    for addr in addrs:
+        links = [r.choice(addrs) for i in range(r.randrange(4))]
+        objs.append((addr, 1, r.randrange(1, 100), links))
+    roots, objects = objs[:3], objs[3:]
+    tree = DominatorTree(HeapDump(write_dump(tmpdir, 'dump', roots, objects)))
+    edges = dict([(addr, links) for addr, _, _, links in objs])
+    sizes = dict([(addr, size) for addr, _, size, _ in objs])
+    def reachable(without):
+        seen = set()
+        pending = [addr for addr, _, _, _ in roots if addr != without]
+        while pending:
+            addr = pending.pop()
+            if addr not in seen:
+                seen.add(addr)
+                pending.extend([a for a in edges[addr] if a != without])
+        return seen
+    alive = reachable(None)
+    for n in range(1, len(tree.addrs)):
+        addr = tree.addrs[n]
+        if addr not in alive:
+            continue
+        # the retained size is the size of the objects that are only
+        # reachable through this one
+        freed = alive - reachable(addr)
+        assert tree.retained[n] == sum([sizes[a] for a in freed])
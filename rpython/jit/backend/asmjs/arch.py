@@ -7,3 +7,26 @@ FRAME_FIXED_SIZE = 0
 JITFRAME_FIXED_SIZE = 0
 
 SANITYCHECK = True
+
+# Bridges are compiled into separate "satellite" functions until there are
+# this many of them pending, at which point they are folded back into their
+# parent function.  Set to zero to always re-assemble the whole function.
+MAX_PENDING_SATELLITES = 16
+
+# Re-assembled functions are queued for compilation rather than compiled
+# immediately, and the previous code keeps running until they're ready.
+# The queue is processed on entry to the JIT, spending at most this many
+# milliseconds per entry; a negative budget empties the queue every time.
+DEFERRED_COMPILATION = True
+PENDING_COMPILE_BUDGET_MS = 2
+
+# The generated source for each new loop or bridge is saved in a persistent
+# cache of at most this many bytes and entries, so that later runs can
+# compile it ahead of time.  When there is no other compilation pending,
+# this many cached traces are precompiled on entry to the JIT, and at most
+# MAX_PRECOMPILED of them are kept waiting to be used.  Set the size to
+# zero to disable.
+TRACE_CACHE_SIZE = 8 * 1024 * 1024
+TRACE_CACHE_MAX_ENTRIES = 512
+TRACE_CACHE_PRECOMPILE = 1
+TRACE_CACHE_MAX_PRECOMPILED = 32
@@ -25,13 +25,28 @@ from rpython.jit.metainterp.history import (AbstractFailDescr, ConstInt,
 
 from rpython.jit.backend.asmjs import support
 from rpython.jit.backend.asmjs import jsvalue as js
-from rpython.jit.backend.asmjs.arch import WORD, SANITYCHECK
+from rpython.jit.backend.asmjs.arch import (WORD, SANITYCHECK,
+                                            MAX_PENDING_SATELLITES,
+                                            DEFERRED_COMPILATION)
 from rpython.jit.backend.asmjs.jsbuilder import ASMJSBuilder
 
 
 GILFUNCPTR = lltype.Ptr(lltype.FuncType([], lltype.Void))
 
 
+def install_jssource(funcid, jssrc):
+    """Make the given asmjs source the code for the given function id.
+
+    With DEFERRED_COMPILATION this only queues the source for compilation.
+    Any code previously compiled for the id keeps running until the queue
+    is processed on a subsequent entry into the JIT.
+    """
+    if DEFERRED_COMPILATION:
+        support.jitSchedule(funcid, jssrc)
+    else:
+        support.jitRecompile(funcid, jssrc)
+
+
 @rgc.no_collect
 def release_gil_shadowstack():
     before = rffi.aroundstate.before
@@ -46,9 +61,9 @@ def reacquire_gil_shadowstack():
         after()
 
 
-# A one-word slot in memory that can be written into to invalidate jitted code.
-# The code checks this flag in GUARD_NOT_INVALIDATED, in leiu of the ability
-# to patch the existing code.
+# A one-word counter in memory that is bumped whenever a function's loops are
+# invalidated.  Since we can't patch the code in place, this lets code that's
+# already running notice that it's out of date; see genop_guard_not_invalidated.
 INVALIDATION = lltype.Struct(
     "INVALIDATION",
     ("counter", lltype.Signed)
@@ -56,11 +71,40 @@ INVALIDATION = lltype.Struct(
 INVALIDATION_PTR = lltype.Ptr(INVALIDATION)
 
 
+# A one-word slot in memory through which a satellite function can ask its
+# parent function to resume execution at a particular block.  It holds zero
+# when there is no pending request.
+REENTRY = lltype.Struct(
+    "REENTRY",
+    ("label", lltype.Signed)
+)
+REENTRY_PTR = lltype.Ptr(REENTRY)
+
+# Label values at or above this are requests to re-enter the function at
+# block number (label - REENTRY_LABEL_BASE), rather than at a loop entry.
+REENTRY_LABEL_BASE = 1 << 24
+
+
+# An array of one-word slots, one for each guard in a block, holding the
+# funcid of the satellite function compiled for that guard's bridge.  The
+# guard failure path checks this slot before bailing out to the interpreter.
+SATELLITE_SLOTS = rffi.CArray(lltype.Signed)
+SATELLITE_SLOTS_PTR = lltype.Ptr(SATELLITE_SLOTS)
+
+
+# A table describing how to spill the failargs of a guard, which is passed
+# to the shared guard failure helper.  The first entry is the gcmap, and the
+# rest are the frame locations of each non-hole failarg.
+FAILTABLE = rffi.CArray(lltype.Signed)
+FAILTABLE_PTR = lltype.Ptr(FAILTABLE)
+
+
 class AssemblerASMJS(object):
     """Class for assembling a Trace into a compiled ASMJS function."""
 
     def __init__(self, cpu):
         self.cpu = cpu
+        self.new_jssources = {}
 
     def set_debug(self, v):
         return False
@@ -101,6 +145,7 @@ class AssemblerASMJS(object):
     def assemble_loop(self, loopname, inputargs, operations, looptoken, log):
         """Assemble and compile a new loop function from the given trace."""
         #os.write(2, "ASSEMBLE LOOP START %f\n" % (time.time(),))
+        self.new_jssources.clear()
         # Build a new func holding this new loop.
         func = CompiledFuncASMJS(self)
         clt = CompiledLoopTokenASMJS(self, func, looptoken.number)
@@ -122,6 +167,10 @@ class AssemblerASMJS(object):
                 func.reassemble()
             else:
                 target_block.clt.func.merge_with(func)
+        # Save the code of the function now holding the loop in the
+        # persistent trace cache.
+        self._store_in_trace_cache(loopname, operations,
+                                   clt.func.compiled_funcid)
         #os.write(2, "ASSEMBLE LOOP END %f\n" % (time.time(),))
 
     def assemble_bridge(self, faildescr, inputargs, operations,
@@ -129,26 +178,49 @@ class AssemblerASMJS(object):
         """Assemble, compile and link a new bridge from the given trace."""
         #os.write(2, "ASSEMBLE BRIDGE START %f\n" % (time.time(),))
         assert isinstance(faildescr, AbstractFailDescr)
+        self.new_jssources.clear()
         # Merge the new operations into the existing loop.
         self.setup(original_loop_token)
         clt = original_loop_token.compiled_loop_token
-        clt.add_code_to_loop(operations, inputargs, faildescr)
+        new_blocks = clt.add_code_to_loop(operations, inputargs, faildescr)
         self.teardown()
         # If it jumps to a loop in a different func, merge with that func.
-        # If not, recompile just the modified func.
+        # If not, try to link it in as a satellite of the modified func,
+        # falling back to recompiling the whole thing.
         final_op = operations[-1]
-        if final_op.getopnum() != rop.JUMP:
-            clt.func.reassemble()
-        else:
+        if final_op.getopnum() == rop.JUMP:
             descr = final_op.getdescr()
             assert isinstance(descr, TargetToken)
             target_block = descr._asmjs_block
-            if target_block.clt.func is clt.func:
-                clt.func.reassemble()
-            else:
+            if target_block.clt.func is not clt.func:
                 target_block.clt.func.merge_with(clt.func)
+                self._store_in_trace_cache("bridge", operations,
+                                           clt.func.compiled_funcid)
+                return
+        if clt.func.attach_satellite(faildescr, new_blocks):
+            funcid = clt.func.satellites[-1].compiled_funcid
+        else:
+            clt.func.reassemble()
+            funcid = clt.func.compiled_funcid
+        self._store_in_trace_cache("bridge", operations, funcid)
         #os.write(2, "ASSEMBLE BRIDGE END %f\n" % (time.time(),))
 
+    def note_jssource(self, funcid, jssrc):
+        """Record the source just installed for the given function id."""
+        if self.cpu.trace_cache is not None:
+            self.new_jssources[funcid] = jssrc
+
+    def _store_in_trace_cache(self, name, operations, funcid):
+        # Several functions may have been re-assembled along the way, e.g.
+        # the dispatch stub of a merged function; only the given one has
+        # the code for the new operations.
+        trace_cache = self.cpu.trace_cache
+        if trace_cache is not None:
+            jssrc = self.new_jssources.get(funcid, None)
+            if jssrc is not None:
+                trace_cache.store(name, operations, jssrc)
+        self.new_jssources.clear()
+
     def redirect_call_assembler(self, oldlooptoken, newlooptoken):
         #os.write(2, "ASSEMBLE REDIRECT START %f\n" % (time.time(),))
         oldclt = oldlooptoken.compiled_loop_token
@@ -189,12 +261,26 @@ class CompiledFuncASMJS(object):
         self.num_removed_loops = 0
         self.merged_from = None
         self.merged_into = None
+        self.satellites = []
+        self.num_satellite_blocks = 0
+        self.reentry_blockids = {}
+        self.reloop_scope = None
+        self.has_invalidated_blocks = False
         frame_info = lltype.malloc(jitframe.JITFRAMEINFO, flavor="raw")
         self.frame_info = rffi.cast(jitframe.JITFRAMEINFOPTR, frame_info)
         self.frame_info.clear()
         self.ensure_frame_depth(0)
+        reentry = lltype.malloc(REENTRY, flavor="raw")
+        self.reentry = rffi.cast(REENTRY_PTR, reentry)
+        self.reentry.label = 0
+        invalidation = lltype.malloc(INVALIDATION, flavor="raw")
+        self.invalidation = rffi.cast(INVALIDATION_PTR, invalidation)
+        self.invalidation.counter = 0
 
     def free(self):
+        self.fold_satellites()
+        lltype.free(self.invalidation, flavor="raw")
+        lltype.free(self.reentry, flavor="raw")
         lltype.free(self.frame_info, flavor="raw")
         support.jitFree(self.compiled_funcid)
 
@@ -220,6 +306,8 @@ class CompiledFuncASMJS(object):
             src_func = other
         if res_func.merged_from is None:
             res_func.merged_from = []
+        # Any pending satellites will be inlined by the reassembly below.
+        src_func.fold_satellites()
         # Merge all the loops into the selected result function.
         res_func.merged_from.append(src_func)
         res_func.ensure_frame_depth(src_func.frame_info.jfi_frame_depth * WORD)
@@ -232,9 +320,11 @@ class CompiledFuncASMJS(object):
             block.compiled_blockid = len(res_func.compiled_blocks)
             res_func.compiled_blocks.append(block)
         res_func.reassemble()
-        # Mark the source function as being merged.
+        # Mark the source function as being merged.  Any of its code that's
+        # still running won't hear about later invalidation of the loops it
+        # contains, so we treat it as invalidated straight away.
         src_func.merged_into = res_func
-        src_func.reassemble()
+        src_func.invalidate()
         return res_func
 
     def remove_loop(self, clt):
@@ -242,6 +332,8 @@ class CompiledFuncASMJS(object):
             assert self.compiled_loops[clt.compiled_loopid] is clt
             for block in clt.compiled_blocks:
                 assert self.compiled_blocks[block.compiled_blockid] is block
+        # Satellites may reference slots in the blocks we're about to free.
+        self.fold_satellites()
         self.compiled_loops[clt.compiled_loopid] = None
         clt.func = None
         for block in clt.compiled_blocks:
@@ -250,10 +342,28 @@ class CompiledFuncASMJS(object):
         self.num_removed_loops += 1
         if self.num_removed_loops < len(self.compiled_loops):
             self.reassemble()
+            # The old code references memory from the freed blocks,
+            # so we can't let it keep running while the new code waits.
+            support.jitFlush(self.compiled_funcid)
         else:
             # Nothing is left referencing this function.
             self.free()
 
+    def invalidate(self):
+        """Invalidate the currently-running code for this function.
+
+        Any code that is already running will fail its next check in a
+        GUARD_NOT_INVALIDATED.  We immediately swap in re-assembled code in
+        which those guards know whether they're still valid, so that new
+        entries into the function don't have to check.
+        """
+        self.invalidation.counter += 1
+        self.reassemble()
+        support.jitFlush(self.compiled_funcid)
+
+    def get_invalidation_addr(self):
+        return rffi.cast(lltype.Signed, self.invalidation)
+
     def ensure_frame_depth(self, required_offset):
         if SANITYCHECK:
             assert required_offset >= 0
@@ -267,13 +377,17 @@ class CompiledFuncASMJS(object):
 
         The generated code consists of a short header to load input arguments
         and sanity-check a few things, followed by the relooped code for
-        all the contained blocks.
+        all the contained blocks.  The whole thing is wrapped in a loop so
+        that satellite functions can ask us to resume at any label.
         """
+        # Everything will be compiled inline, so we no longer need satellites.
+        self.fold_satellites()
         bldr = ASMJSBuilder(self.cpu)
         if self.merged_into is not None:
             # This function has been merged into some other function.
             # Dispatch each loop to its new location via a simple switch.
             bldr.emit_comment("DISPATCH TO MERGED FUNCTION")
+            self.reentry_blockids = {}
             if len(self.compiled_loops) == 1:
                 clt = self.compiled_loops[0]
                 assert clt is not None
@@ -296,60 +410,49 @@ class CompiledFuncASMJS(object):
                                 bldr.emit_assignment(js.frame, call)
                                 bldr.emit_exit()
         else:
-            # We check the depth of the frame at entry to the function.
-            # If it's too small then we rellocate it via a helper.
-            req_depth = js.ConstInt(self.frame_info.jfi_frame_depth)
-            cur_depth = js.HeapData(js.Int32, js.FrameSizeAddr())
-            frame_too_small = js.LessThan(cur_depth, req_depth)
-            bldr.emit_comment("CHECK FRAME DEPTH")
-            with bldr.emit_if_block(frame_too_small):
-                # We must store a gcmap to prevent input args from being gc'd.
-                # The layout of input args depends on the target loop.
-                with bldr.emit_switch_block(js.label):
-                    for clt in self.compiled_loops:
-                        loopid = js.ConstInt(clt.compiled_loopid)
-                        with bldr.emit_case_block(loopid):
-                            clt.emit_store_initial_gcmap(bldr)
-                # Now we can call the helper function.
-                # There might be an exception active, which must be preserved.
-                reallocfn = js.ConstInt(self.cpu.realloc_frame)
-                args = [js.frame, req_depth]
-                with ctx_preserve_exception(self, bldr):
-                    newframe = js.DynCallFunc("iii", reallocfn, args)
-                    bldr.emit_assignment(js.frame, newframe)
-            # Load input args for the loop being entered,
-            # and convert from loopid to blockid
-            bldr.emit_comment("LOAD INPUT ARGS")
-            if len(self.compiled_loops) == 1:
-                clt = self.compiled_loops[0]
-                assert clt is not None
-                clt.emit_load_arguments(bldr)
-                clt.emit_set_initial_blockid(bldr)
-            else:
-                with bldr.emit_switch_block(js.label):
-                    for clt in self.compiled_loops:
-                        if clt is not None:
-                            loopid = js.ConstInt(clt.compiled_loopid)
-                            with bldr.emit_case_block(loopid):
-                                clt.emit_load_arguments(bldr)
-                                clt.emit_set_initial_blockid(bldr)
-            # Generate the relooped body from all loop blocks.
-            # XXX TODO: find a way to avoid re-doing all this work
-            # each time we add a new block.
-            #os.write(2, "ASSEMBLER RELOOP START %f\n" % (time.time(),))
+            # Find the blocks to be relooped, and the entry points into them.
+            # Every label is a potential entry point, since satellites may
+            # jump back into it from outside the function.
             blocks = {}
             entries = []
+            self.has_invalidated_blocks = False
             for clt in self.compiled_loops:
                 if clt is not None and clt.redirected_to is None:
                     entries.append(clt.compiled_blocks[0].compiled_blockid)
                     for block in clt.compiled_blocks:
                         blocks[block.compiled_blockid] = block
-            self.reloop_state = []
-            self.emit_relooped_blocks(bldr, entries, blocks)
-            self.reloop_state = None
-            #os.write(2, "ASSEMBLER RELOOP END %f\n" % (time.time(),))
-            # Always exit by returning the frame.
-            bldr.emit_exit()
+                        if block.is_invalidated():
+                            self.has_invalidated_blocks = True
+            self.reentry_blockids = {}
+            for blockid, block in blocks.iteritems():
+                if isinstance(block.intoken, TargetToken):
+                    self.reentry_blockids[blockid] = True
+                    if blockid not in entries:
+                        entries.append(blockid)
+            with bldr.emit_while_block(js.true, "R"):
+                if not self.reentry_blockids:
+                    self._emit_header(bldr)
+                else:
+                    is_reentry = js.GreaterThanEq(
+                        js.label, js.ConstInt(REENTRY_LABEL_BASE))
+                    with bldr.emit_if_block(is_reentry):
+                        # Load input args from where the satellite left them.
+                        # The frame must be big enough, since the satellite
+                        # checked it against the current required depth.
+                        bldr.emit_comment("RE-ENTER FROM SATELLITE")
+                        self._emit_reentry_header(bldr, blocks)
+                    with bldr.emit_else_block():
+                        self._emit_header(bldr)
+                # Generate the relooped body from all loop blocks.
+                # XXX TODO: find a way to avoid re-doing all this work
+                # each time we add a new block.
+                #os.write(2, "ASSEMBLER RELOOP START %f\n" % (time.time(),))
+                self.reloop_state = []
+                self.emit_relooped_blocks(bldr, entries, blocks)
+                self.reloop_state = None
+                #os.write(2, "ASSEMBLER RELOOP END %f\n" % (time.time(),))
+                # Always exit by returning the frame.
+                bldr.emit_exit()
 
         # Compile the replacement source code for our function.
         jssrc = bldr.finish()
@@ -357,9 +460,205 @@ class CompiledFuncASMJS(object):
         #os.write(2, jssrc)
         #os.write(2, "\n=-=-=-=-=-=-=-=-\n")
         #os.write(2, "ASSEMBLER COMPILE START %f\n" % (time.time(),))
-        support.jitRecompile(self.compiled_funcid, jssrc)
+        install_jssource(self.compiled_funcid, jssrc)
+        self.assembler.note_jssource(self.compiled_funcid, jssrc)
         #os.write(2, "ASSEMBLER COMPILE END %f\n" % (time.time(),))
 
+    def _emit_header(self, bldr):
+        # We check the depth of the frame at entry to the function.
+        # If it's too small then we rellocate it via a helper.
+        req_depth = js.ConstInt(self.frame_info.jfi_frame_depth)
+        cur_depth = js.HeapData(js.Int32, js.FrameSizeAddr())
+        frame_too_small = js.LessThan(cur_depth, req_depth)
+        bldr.emit_comment("CHECK FRAME DEPTH")
+        with bldr.emit_if_block(frame_too_small):
+            # We must store a gcmap to prevent input args from being gc'd.
+            # The layout of input args depends on the target loop.
+            with bldr.emit_switch_block(js.label):
+                for clt in self.compiled_loops:
+                    if clt is not None:
+                        loopid = js.ConstInt(clt.compiled_loopid)
+                        with bldr.emit_case_block(loopid):
+                            clt.emit_store_initial_gcmap(bldr)
+            self._emit_realloc_frame(bldr, req_depth)
+        # Load input args for the loop being entered,
+        # and convert from loopid to blockid
+        bldr.emit_comment("LOAD INPUT ARGS")
+        if len(self.compiled_loops) == 1:
+            clt = self.compiled_loops[0]
+            assert clt is not None
+            clt.emit_load_arguments(bldr)
+            clt.emit_set_initial_blockid(bldr)
+        else:
+            with bldr.emit_switch_block(js.label):
+                for clt in self.compiled_loops:
+                    if clt is not None:
+                        loopid = js.ConstInt(clt.compiled_loopid)
+                        with bldr.emit_case_block(loopid):
+                            clt.emit_load_arguments(bldr)
+                            clt.emit_set_initial_blockid(bldr)
+
+    def _emit_reentry_header(self, bldr, blocks):
+        with bldr.emit_switch_block(js.label):
+            for blockid in self.reentry_blockids:
+                block = blocks[blockid]
+                label = js.ConstInt(REENTRY_LABEL_BASE + blockid)
+                with bldr.emit_case_block(label):
+                    block.emit_load_arguments(bldr)
+                    bldr.emit_assignment(js.label, js.ConstInt(blockid))
+
+    def _emit_realloc_frame(self, bldr, req_depth):
+        # Call the helper function to enlarge the frame.
+        # There might be an exception active, which must be preserved.
+        reallocfn = js.ConstInt(self.cpu.realloc_frame)
+        args = [js.frame, req_depth]
+        with ctx_preserve_exception(self, bldr):
+            newframe = js.DynCallFunc("iii", reallocfn, args)
+            bldr.emit_assignment(js.frame, newframe)
+
+    def get_reentry_addr(self):
+        return rffi.cast(lltype.Signed, self.reentry)
+
+    def is_local_block(self, block):
+        """Check whether the given block is being compiled into the code
+        currently being assembled, as opposed to living in some other
+        function that can only be reached by exiting from this one."""
+        if self.reloop_scope is None:
+            return True
+        return block.compiled_blockid in self.reloop_scope
+
+    def attach_satellite(self, faildescr, blocks):
+        """Link in a newly-added bridge without re-assembling this function.
+
+        Rather than re-generating code for every block in the function, the
+        bridge is compiled into a small stand-alone "satellite" function.
+        The failure path of the bridged guard checks a slot in memory and,
+        once we write the satellite's funcid there, calls into it instead of
+        exiting.  This makes the cost of attaching a bridge proportional to
+        the size of the bridge rather than of the whole function.
+
+        Satellites are folded back in when the function is next reassembled,
+        which we force once they make up a large share of its blocks.
+
+        Returns False if the bridge can't be compiled as a satellite, in
+        which case the caller must reassemble the function as usual.
+        """
+        if len(self.satellites) >= MAX_PENDING_SATELLITES:
+            return False
+        if self.merged_into is not None:
+            return False
+        # The guard must have a slot for us to link the satellite through.
+        # Guards that might have a pending exception don't get one, since
+        # the exception has been moved out of the way by the time we'd call.
+        if faildescr._asmjs_satellite_owner is None:
+            return False
+        # We only handle a single bridge block with no internal labels,
+        # which exits or jumps back to a label that accepts re-entry.
+        if len(blocks) != 1:
+            return False
+        block = blocks[0]
+        # It must expect its input args where the failure path spills them.
+        faillocs = faildescr._asmjs_faillocs
+        j = 0
+        for i in xrange(len(faillocs)):
+            if faildescr._asmjs_failkinds[i] == HOLE:
+                continue
+            if j >= len(block.inputlocs) or block.inputlocs[j] != faillocs[i]:
+                return False
+            j += 1
+        if j != len(block.inputlocs):
+            return False
+        if block.outtoken is not None:
+            outtoken = block.outtoken
+            assert isinstance(outtoken, TargetToken)
+            target_block = outtoken._asmjs_block
+            if target_block.clt.func is not self:
+                return False
+            if target_block.compiled_blockid not in self.reentry_blockids:
+                return False
+        # Fold everything back in once satellites would make up more than
+        # half of the function, so the total cost of reassembly stays linear
+        # in the amount of code added.
+        num_folded = len(self.compiled_blocks) - self.num_satellite_blocks
+        num_folded -= len(blocks)
+        if self.num_satellite_blocks + len(blocks) > num_folded:
+            return False
+        # The satellite will re-enter us at blocks chosen by the most recent
+        # reassembly, so that code must be live before we link it in.
+        support.jitFlush(self.compiled_funcid)
+        satellite = CompiledSatelliteASMJS(self, faildescr, blocks)
+        self.satellites.append(satellite)
+        self.num_satellite_blocks += len(blocks)
+        self.assemble_satellite(satellite)
+        owner = faildescr._asmjs_satellite_owner
+        index = faildescr._asmjs_satellite_index
+        owner.set_satellite_funcid(index, satellite.compiled_funcid)
+        return True
+
+    def fold_satellites(self):
+        """Unlink all pending satellites from their guards.
+
+        This must be followed by a reassembly, which will inline the
+        corresponding bridges, or by freeing the function entirely.
+        """
+        for satellite in self.satellites:
+            satellite.free()
+        self.satellites = []
+        self.num_satellite_blocks = 0
+
+    def assemble_satellite(self, satellite):
+        """Compile the stand-alone function for a satellite.
+
+        It loads its input args from where the guard failure path spilled
+        them, and its relooping is limited to its own blocks.  Any jumps to
+        other blocks go back into this function via the reentry slot.
+        """
+        bldr = ASMJSBuilder(self.cpu)
+        entry_block = satellite.blocks[0]
+        # The frame may need to be enlarged for the new code.
+        req_depth = js.ConstInt(self.frame_info.jfi_frame_depth)
+        cur_depth = js.HeapData(js.Int32, js.FrameSizeAddr())
+        frame_too_small = js.LessThan(cur_depth, req_depth)
+        bldr.emit_comment("CHECK FRAME DEPTH")
+        with bldr.emit_if_block(frame_too_small):
+            gcmap = entry_block.initial_gcmap
+            gcmapref = js.Relocation(self.cpu.cast_ptr_to_int(gcmap))
+            bldr.emit_store(gcmapref, js.FrameGCMapAddr(), js.Int32)
+            self._emit_realloc_frame(bldr, req_depth)
+        # The guard failure is being handled, so clear its descr.
+        bldr.emit_store(js.zero, js.FrameDescrAddr(), js.Int32)
+        entry_block.emit_load_arguments(bldr)
+        blocks = {}
+        self.reloop_scope = {}
+        for block in satellite.blocks:
+            blocks[block.compiled_blockid] = block
+            self.reloop_scope[block.compiled_blockid] = True
+        self.reloop_state = []
+        self.emit_relooped_blocks(bldr, [entry_block.compiled_blockid], blocks)
+        self.reloop_state = None
+        self.reloop_scope = None
+        bldr.emit_exit()
+        jssrc = bldr.finish()
+        install_jssource(satellite.compiled_funcid, jssrc)
+        self.assembler.note_jssource(satellite.compiled_funcid, jssrc)
+
+    def _emit_reentry_jump(self, bldr, blockid):
+        # Spill the jump args to where the target block will load them from,
+        # and ask our caller to resume execution at that block.
+        block = self.compiled_blocks[blockid]
+        bldr.emit_comment("JUMP BACK INTO PARENT FUNCTION")
+        inputvars = block._get_inputvars_from_kinds(block.inputkinds, bldr)
+        for i in xrange(len(block.inputkinds)):
+            kind = block.inputkinds[i]
+            if kind != HOLE:
+                typ = js.HeapType.from_kind(kind)
+                addr = js.FrameSlotAddr(block.inputlocs[i])
+                bldr.emit_store(inputvars[i], addr, typ)
+        block.emit_store_gcmap(bldr, block.initial_gcmap)
+        label = js.ConstInt(REENTRY_LABEL_BASE + blockid)
+        bldr.emit_store(label, js.Relocation(self.get_reentry_addr()), js.Int32)
+        bldr.emit_exit()
+
     def emit_relooped_blocks(self, bldr, entries, blocks):
         if not entries:
             return
@@ -484,7 +783,10 @@ class CompiledFuncASMJS(object):
                 break
             i -= 1
         else:
-            assert False, "should never reach here"
+            # It's not in the code we're assembling, which can only happen
+            # for a satellite jumping back into its parent function.
+            assert self.reloop_scope is not None
+            self._emit_reentry_jump(bldr, blockid)
 
     def _block_needs_path(self, src_blockid, dst_blockid):
         # XXX TODO: it is tremendously inefficient to recalculate
@@ -503,6 +805,9 @@ class CompiledFuncASMJS(object):
             seen[blockid] = True
             if self._block_has_path(blockid):
                 continue
+            if self.reloop_scope is not None:
+                if blockid not in self.reloop_scope:
+                    continue
             if blockid == dst_blockid:
                 return True
             for succ in self._block_successors(block):
@@ -531,6 +836,30 @@ class CompiledFuncASMJS(object):
                 yield guardtoken._asmjs_block
 
 
+class CompiledSatelliteASMJS(object):
+    """A bridge compiled into its own function, pending folding.
+
+    See CompiledFuncASMJS.attach_satellite() for how these are used.
+    """
+
+    def __init__(self, func, faildescr, blocks):
+        self.func = func
+        self.faildescr = faildescr
+        self.blocks = blocks
+        self.compiled_funcid = support.jitReserve()
+        for block in blocks:
+            block.satellite = self
+
+    def free(self):
+        # Clear the slot before freeing, so that any stale code still on
+        # the stack will take the normal guard-failure exit.
+        owner = self.faildescr._asmjs_satellite_owner
+        owner.set_satellite_funcid(self.faildescr._asmjs_satellite_index, 0)
+        for block in self.blocks:
+            block.satellite = None
+        support.jitFree(self.compiled_funcid)
+
+
 class CompiledLoopTokenASMJS(CompiledLoopToken):
     """CompiledLoopToken with extra fields for asmjs backend."""
 
@@ -545,13 +874,7 @@ class CompiledLoopTokenASMJS(CompiledLoopToken):
         self.redirected_to = None
         self.compiled_blocks = []
         self.inlined_gcrefs = []
-        invalidationptr = lltype.malloc(INVALIDATION, flavor="raw")
-        self.invalidation = rffi.cast(INVALIDATION_PTR, invalidationptr)
-        self.invalidation.counter = 0
-
-    def __del__(self):
-        CompiledLoopToken.__del__(self)
-        lltype.free(self.invalidation, flavor="raw")
+        self.invalidation_counter = 0
 
     def add_code_to_loop(self, operations, inputargs, intoken=None):
         # Re-write to use lower-level GC operations,
@@ -571,6 +894,8 @@ class CompiledLoopTokenASMJS(CompiledLoopToken):
                 faildescr = op.getdescr()
                 assert isinstance(faildescr, AbstractFailDescr)
                 faildescr._asmjs_block = None
+                faildescr._asmjs_satellite_owner = None
+                faildescr._asmjs_satellite_index = -1
                 guardtokens.append(faildescr)
             # Label descrs start a new block.
             elif op.getopnum() == rop.LABEL:
@@ -608,9 +933,12 @@ class CompiledLoopTokenASMJS(CompiledLoopToken):
         # Generate the new code.
         for i in xrange(first_new_block, len(self.compiled_blocks)):
             self.compiled_blocks[i].generate_code()
+        return self.compiled_blocks[first_new_block:]
 
     def invalidate_loop(self):
-        self.invalidation.counter += 1
+        self.invalidation_counter += 1
+        if self.func is not None:
+            self.func.invalidate()
 
     def redirect_loop(self, newclt):
         self.redirected_to = newclt
@@ -620,7 +948,7 @@ class CompiledLoopTokenASMJS(CompiledLoopToken):
 
     def emit_store_initial_gcmap(self, bldr):
         gcmap = self.compiled_blocks[0].initial_gcmap
-        gcmapref = js.ConstInt(self.cpu.cast_ptr_to_int(gcmap))
+        gcmapref = js.Relocation(self.cpu.cast_ptr_to_int(gcmap))
         gcmapaddr = js.FrameGCMapAddr()
         bldr.emit_store(gcmapref, gcmapaddr, js.Int32)
 
@@ -647,6 +975,8 @@ class CompiledBlockASMJS(object):
         self.intoken = intoken
         self.guardtokens = guardtokens
         self.outtoken = outtoken
+        self.satellite = None
+        self.satellite_slots = lltype.nullptr(SATELLITE_SLOTS)
 
         # Tell the input token about its owning block.
         # XXX TODO: avoid circular references by using weakrefs?
@@ -658,7 +988,7 @@ class CompiledBlockASMJS(object):
 
         # Remember value of invalidation counter when this block was created.
         # If it goes above this value, then GUARD_NOT_INVALIDATED fails.
-        self.initial_invalidation_counter = clt.invalidation.counter
+        self.initial_invalidation_counter = clt.invalidation_counter
 
         # Calculate the locations at which our input args will appear
         # on the frame.  In the process, count how many variables of
@@ -687,6 +1017,7 @@ class CompiledBlockASMJS(object):
         # Calculate a gcmap corresponding to the initial layout of the frame.
         # This will be needed if we ever need to enlarge the frame.
         self.allocated_gcmaps = []
+        self.allocated_failtables = []
         if len(reflocs) == 0:
             self.initial_gcmap = jitframe.NULLGCMAP
         else:
@@ -728,10 +1059,25 @@ class CompiledBlockASMJS(object):
         self.box_expressions = {}
         self.box_expression_graveyard = {}
         self.box_variable_refcounts = {}
+        self.box_variable_hints = {}
 
     def free(self):
         for gcmap in self.allocated_gcmaps:
             lltype.free(gcmap, flavor="raw")
+        for failtable in self.allocated_failtables:
+            lltype.free(failtable, flavor="raw")
+        if self.satellite_slots:
+            lltype.free(self.satellite_slots, flavor="raw")
+
+    def is_invalidated(self):
+        counter = self.clt.invalidation_counter
+        return counter != self.initial_invalidation_counter
+
+    def set_satellite_funcid(self, index, funcid):
+        self.satellite_slots[index] = funcid
+
+    def get_satellite_slot_addr(self, index):
+        return rffi.cast(lltype.Signed, self.satellite_slots) + index * WORD
 
     def allocate_gcmap(self, offset):
         length = offset // WORD
@@ -744,6 +1090,22 @@ class CompiledBlockASMJS(object):
             gcmap[i] = r_uint(0)
         return gcmap
 
+    def allocate_failtable(self, gcmap, kinds, framelocs):
+        assert len(kinds) == len(framelocs)
+        size = 1
+        for i in xrange(len(kinds)):
+            if kinds[i] != HOLE:
+                size += 1
+        failtable = lltype.malloc(FAILTABLE, size, flavor="raw")
+        self.allocated_failtables.append(failtable)
+        failtable[0] = self.cpu.cast_ptr_to_int(gcmap)
+        j = 1
+        for i in xrange(len(kinds)):
+            if kinds[i] != HOLE:
+                failtable[j] = framelocs[i]
+                j += 1
+        return failtable
+
     def allocate_gcmap_from_kinds(self, kinds, framelocs):
         assert len(kinds) == len(framelocs)
         # Check whether a gcmap is actually needed.
@@ -799,6 +1161,32 @@ class CompiledBlockASMJS(object):
         self.clt.func.emit_jump(bldr, descr._asmjs_block.compiled_blockid)
 
     def emit_guard_body(self, bldr, faildescr):
+        if not faildescr._asmjs_checkinv:
+            self._emit_guard_failure(bldr, faildescr)
+        elif self.is_invalidated():
+            # We're already known to be invalid, so fail unconditionally.
+            bldr.emit_comment("GUARD IS INVALIDATED")
+            self._emit_guard_failure(bldr, faildescr)
+        else:
+            # We were valid when assembled, so check whether anything has
+            # been invalidated since then.  If not, nothing needs checking
+            # again until the next call that might invalidate.  That doesn't
+            # hold if some other guard in the function must always fail,
+            # since we might jump to it without making any calls.
+            func = self.clt.func
+            offset, size = symbolic.get_field_token(
+                INVALIDATION, "counter", self.cpu.translate_support_code)
+            assert size == js.Int32.size
+            addr = js.Plus(js.Relocation(func.get_invalidation_addr()),
+                           js.ConstInt(offset))
+            counter = js.HeapData(js.Int32, addr)
+            expected = js.ConstInt(func.invalidation.counter)
+            with bldr.emit_if_block(js.NotEqual(counter, expected)):
+                self._emit_guard_failure(bldr, faildescr)
+            if not func.has_invalidated_blocks:
+                bldr.emit_assignment(js.invalidation_check, js.zero)
+
+    def _emit_guard_failure(self, bldr, faildescr):
         faillocs = faildescr._asmjs_faillocs
         failkinds = faildescr._asmjs_failkinds
         failvars = [None] * len(faildescr._asmjs_failvars)
@@ -819,7 +1207,8 @@ class CompiledBlockASMJS(object):
         # If the guard has been compiled into a bridge, emit a local
         # jump to the appropriate label.  Otherwise, spill to frame.
         target_block = faildescr._asmjs_block
-        if target_block is not None:
+        if target_block is not None and \
+                self.clt.func.is_local_block(target_block):
             # XXX TODO: we know that the guard code will just be inserted
             # inline here.  There's no need for a jump, and we can have it
             # read directly from the failvars rather than inputvars.
@@ -840,17 +1229,17 @@ class CompiledBlockASMJS(object):
                     bldr.emit_store(js.zero, pos_exctyp, js.Int32)
                     bldr.emit_store(js.zero, pos_excval, js.Int32)
             # Call guard failure helper, creating code for it if necessary.
-            # The code is uniquely identified by failkinds.
-            # XXX TODO: this whole "helper func" thing needs a good refactor.
+            # The code is uniquely identified by failkinds, and is shared
+            # by all guards with the same kinds of failargs.  Everything
+            # else it needs is read from the guard's failtable.
             # XXX TODO: currently, helper funcs will never be freed.
+            failtable = faildescr._asmjs_failtable
             helper_argtypes = ["i", "i"]
             helper_args = [
                 js.ConstPtr(cast_instance_to_gcref(faildescr)),
-                js.ConstInt(self.cpu.cast_ptr_to_int(faildescr._asmjs_gcmap))
+                js.Relocation(rffi.cast(lltype.Signed, failtable))
             ]
             for i in xrange(len(failkinds)):
-                # XXX TODO: are we sure that faillocs[i] is a deterministic
-                # function of the failkinds list?
                 kind = failkinds[i]
                 if kind == HOLE:
                     continue
@@ -862,32 +1251,67 @@ class CompiledBlockASMJS(object):
             helper_name = "guard_failure_" + "".join(helper_argtypes)
             if not bldr.has_helper_func(helper_name):
                 with bldr.make_helper_func(helper_name, helper_argtypes) as hb:
-                    # Store the failargs into the frame.
+                    # Store the failargs into the frame, at the locations
+                    # listed in the failtable from second input arg.
                     hb.emit_comment("SPILL %d FAILARGS" % (len(faillocs),))
+                    tablevar = hb.allocate_intvar(1)
+                    num = 0
                     for i in xrange(len(failkinds)):
                         kind = failkinds[i]
                         if kind == HOLE:
                             continue
+                        num += 1
                         typ = js.HeapType.from_kind(kind)
                         myvar = inputvars[i]
                         assert isinstance(myvar, js.Variable)
                         if kind == FLOAT:
                             var = myvar
                         else:
-                            # +2 for descr and gcmap input args
+                            # +2 for descr and failtable input args
                             var = hb.allocate_intvar(int(myvar.varname[1:])+2)
-                        pos = faillocs[i]
-                        hb.emit_store(var, js.FrameSlotAddr(pos), typ)
-                    # Write the gcmap from second input arg.
-                    self.emit_store_gcmapref(hb, hb.allocate_intvar(1))
+                        entry = js.Plus(tablevar, js.ConstInt(num * WORD))
+                        pos = js.HeapData(js.Int32, entry)
+                        addr = js.Plus(js.FrameSlotAddr(0), pos)
+                        hb.emit_store(var, addr, typ)
+                    # Write the gcmap from the start of the failtable.
+                    gcmap = js.HeapData(js.Int32, tablevar)
+                    self.emit_store_gcmapref(hb, gcmap)
                     # Write the faildescr from first input arg.
                     hb.emit_comment("STORE FAILDESCR")
                     descr_var = hb.allocate_intvar(0)
                     hb.emit_store(descr_var, js.FrameDescrAddr(), js.Int32)
             bldr.emit_call_helper_func(helper_name, helper_args)
+            # If a bridge has been attached as a satellite, call into it.
+            self._emit_satellite_dispatch(bldr, faildescr)
             # Bail back to the interpreter to deal with the failure.
             bldr.emit_exit()
 
+    def _emit_satellite_dispatch(self, bldr, faildescr):
+        if faildescr._asmjs_satellite_owner is None:
+            return
+        owner = faildescr._asmjs_satellite_owner
+        index = faildescr._asmjs_satellite_index
+        slotaddr = js.Relocation(owner.get_satellite_slot_addr(index))
+        funcid = js.HeapData(js.Int32, slotaddr)
+        bldr.emit_comment("DISPATCH TO SATELLITE")
+        with ctx_temp_intvar(bldr, funcid) as funcidvar:
+            with bldr.emit_if_block(funcidvar):
+                callargs = [funcidvar, js.frame, js.tladdr, js.zero]
+                call = js.CallFunc("jitInvoke", callargs)
+                bldr.emit_assignment(js.frame, call)
+                # The satellite might have invalidated us.
+                bldr.emit_assignment(js.invalidation_check, js.one)
+                # If it wants to jump back into this function, oblige it.
+                # Nested satellites just pass the request up to the parent.
+                func = self.clt.func
+                if func.reloop_scope is None:
+                    reentry = js.Relocation(func.get_reentry_addr())
+                    label = js.HeapData(js.Int32, reentry)
+                    bldr.emit_assignment(js.label, label)
+                    with bldr.emit_if_block(js.label):
+                        bldr.emit_store(js.zero, reentry, js.Int32)
+                        bldr.emit_continue("R")
+
     def emit_store_gcmap(self, bldr, gcmap, writebarrier=True):
         # Store the appropriate gcmap on the frame.
         comment = "STORE GCMAP"
@@ -898,7 +1322,7 @@ class CompiledBlockASMJS(object):
                 for i in xrange(len(gcmap)):
                     comment = comment + " %d" % (gcmap[i],)
         bldr.emit_comment(comment)
-        gcmapref = js.ConstInt(self.cpu.cast_ptr_to_int(gcmap))
+        gcmapref = js.Relocation(self.cpu.cast_ptr_to_int(gcmap))
         writebarrier = writebarrier and gcmap != jitframe.NULLGCMAP
         self.emit_store_gcmapref(bldr, gcmapref, writebarrier)
 
@@ -1047,6 +1471,7 @@ class CompiledBlockASMJS(object):
             if box:
                 self.box_variables[box] = inputvars[i]
                 self.box_variable_refcounts[inputvars[i]] = 1
+        self.box_variable_hints = self._get_jump_variable_hints()
         # Walk the list of operations, emitting code for each.
         # We expend some modest effort to generate "nice" javascript code,
         # by e.g. folding constant expressions and eliminating temp variables.
@@ -1096,6 +1521,10 @@ class CompiledBlockASMJS(object):
                      self._suspend_box_expression(op.result, expr)
                      self.bldr.emit_comment("SUSPENDED JIT EXPR OP")
                 else:
+                    # Release any args that die here, so that their vars
+                    # can be re-used to hold the result.
+                    for j in range(op.numargs()):
+                        self._maybe_free_boxvar(op.getarg(j), self.pos)
                     boxvar = self._allocate_box_variable(op.result)
                     self.bldr.emit_assignment(boxvar, expr)
             # Free vars for boxes that are no longer needed.
@@ -1104,12 +1533,33 @@ class CompiledBlockASMJS(object):
                 op = self.operations[i]
                 for j in range(op.numargs()):
                     self._maybe_free_boxvar(op.getarg(j))
+                if op.is_guard():
+                    for box in op.getfailargs():
+                        self._maybe_free_boxvar(box)
                 self._maybe_free_boxvar(op.result)
 
         # Capture the final fragment.
         fragment = self.bldr.capture_fragment()
         self.compiled_fragments.append(fragment)
 
+        # Allocate a satellite slot for each guard that could be bridged.
+        num_slots = 0
+        for descr in self.compiled_descrs:
+            if isinstance(descr, AbstractFailDescr):
+                if not descr._asmjs_hasexc:
+                    num_slots += 1
+        if num_slots > 0:
+            self.satellite_slots = lltype.malloc(SATELLITE_SLOTS, num_slots,
+                                                 flavor="raw")
+            num_slots = 0
+            for descr in self.compiled_descrs:
+                if isinstance(descr, AbstractFailDescr):
+                    if not descr._asmjs_hasexc:
+                        descr._asmjs_satellite_owner = self
+                        descr._asmjs_satellite_index = num_slots
+                        self.satellite_slots[num_slots] = 0
+                        num_slots += 1
+
         # Clear code-generation info so that we don't hold refs to it.
         self.bldr = None
         self.inputargs = None
@@ -1123,6 +1573,48 @@ class CompiledBlockASMJS(object):
         self.box_expressions = None
         self.box_expression_graveyard = None
         self.box_variable_refcounts = None
+        self.box_variable_hints = None
+
+    def _get_jump_variable_hints(self):
+        """Find preferred variables for boxes that flow into the final jump.
+
+        The target block expects its input args in variables numbered by
+        position, so boxes that are computed here and live only until the
+        jump can be computed directly into those variables.  That lets the
+        jump skip the final shuffle of values, and lets a variable carry a
+        loop-carried value across iterations without being copied.
+        """
+        hints = {}
+        jumpop = self.operations[-1]
+        if jumpop.getopnum() != rop.JUMP:
+            return hints
+        jumppos = len(self.operations) - 1
+        num_int_args = 0
+        num_double_args = 0
+        for i in xrange(jumpop.numargs()):
+            box = jumpop.getarg(i)
+            if not box:
+                continue
+            if box.type == FLOAT:
+                num = num_double_args
+                num_double_args += 1
+            else:
+                num = num_int_args
+                num_int_args += 1
+            if not isinstance(box, Box):
+                continue
+            if box in hints:
+                # It's passed in more than one position; no clear winner.
+                hints[box] = -1
+                continue
+            # Input args already have their vars, so skip those.
+            if box in self.box_variables:
+                continue
+            longevity = self.longevity.get(box, None)
+            if longevity is None or longevity[1] != jumppos:
+                continue
+            hints[box] = num
+        return hints
 
     #
     # Methods for dealing with boxes and their values.
@@ -1189,10 +1681,18 @@ class CompiledBlockASMJS(object):
         if boxvar is not None:
             self.box_variable_refcounts[boxvar] += 1
         else:
+            # Use the var it will be jumping into, if that's available.
+            hint = self.box_variable_hints.get(box, -1)
             if box.type == FLOAT:
-                boxvar = self.bldr.allocate_doublevar()
+                if hint >= 0 and self.bldr.is_doublevar_free(hint):
+                    boxvar = self.bldr.allocate_doublevar(hint)
+                else:
+                    boxvar = self.bldr.allocate_doublevar()
             else:
-                boxvar = self.bldr.allocate_intvar()
+                if hint >= 0 and self.bldr.is_intvar_free(hint):
+                    boxvar = self.bldr.allocate_intvar(hint)
+                else:
+                    boxvar = self.bldr.allocate_intvar()
             self.box_variable_refcounts[boxvar] = 1
         self.box_variables[box] = boxvar
         return boxvar
@@ -1220,10 +1720,12 @@ class CompiledBlockASMJS(object):
             return True
         return self.longevity[box][1] <= i
 
-    def _maybe_free_boxvar(self, box):
+    def _maybe_free_boxvar(self, box, pos=-1):
         if not isinstance(box, Box):
             return
-        if not self._is_final_use(box, self.pos - 1):
+        if pos < 0:
+            pos = self.pos - 1
+        if not self._is_final_use(box, pos):
             return
         # The box can be freed.  Clean up any suspended expressions,
         # which may in turn free additional variables.
@@ -2023,7 +2525,12 @@ class CompiledBlockASMJS(object):
         while i < len(args):
             callsig += sigmap[descr.arg_classes[i]]
             i += 1
-        with ctx_allow_gc(self, exclude=[op.result]):
+        effectinfo = descr.get_extra_info()
+        if effectinfo is None:
+            invalidates = True
+        else:
+            invalidates = effectinfo.check_can_invalidate()
+        with ctx_allow_gc(self, exclude=[op.result], invalidates=invalidates):
             call = js.DynCallFunc(callsig, fnaddr, args)
             if op.result is None:
                 self.bldr.emit_expr(call)
@@ -2313,25 +2820,24 @@ class CompiledBlockASMJS(object):
         self._genop_guard_failure(test, op)
 
     def genop_guard_not_invalidated(self, op):
-        translate_support_code = self.cpu.translate_support_code
-        offset, size = symbolic.get_field_token(INVALIDATION,
-                                                "counter",
-                                                translate_support_code)
-        assert size == js.Int32.size
-        invalidation = rffi.cast(lltype.Signed, self.clt.invalidation)
-        cur_val = js.HeapData(js.Int32, js.Plus(js.ConstInt(invalidation),
-                                                js.ConstInt(offset)))
-        orig_val = js.ConstInt(self.initial_invalidation_counter)
-        test = js.NotEqual(cur_val, orig_val)
-        self._genop_guard_failure(test, op)
+        # Code can only be invalidated by calls out of the jitted code, so
+        # there's no need to check anything unless we've made such a call
+        # since the function was entered, or since we last checked.  The
+        # real check is generated at each reassembly; see emit_guard_body.
+        self._genop_guard_failure(js.invalidation_check, op)
+        descr = op.getdescr()
+        assert isinstance(descr, AbstractFailDescr)
+        descr._asmjs_checkinv = True
 
     def _genop_guard_failure(self, test, op, faillocs=None):
         descr = self._prepare_guard_op(op, faillocs)
         failargs = op.getfailargs()
         failkinds = descr._asmjs_failkinds
-        for i in range(len(failargs)):
-            if isinstance(failargs[i], Box):
-                self._genop_flush_box(failargs[i])
+        # Failargs that are still suspended expressions are only needed
+        # if the guard fails, so they are not flushed into variables here.
+        # They get evaluated into temp vars inside the failure branch, which
+        # keeps e.g. float arithmetic that only feeds the resume data off
+        # the fast path.
         with self.bldr.emit_if_block(test):
             # Place the failargs into a suite of known vars, so that the
             # dynamically-generated code for the guard can find them.
@@ -2362,11 +2868,13 @@ class CompiledBlockASMJS(object):
             spill_offset = self.forced_spill_frame_offset
             faillocs = self._get_framelocs_from_kinds(failkinds, spill_offset)
         gcmap = self.allocate_gcmap_from_kinds(failkinds, faillocs)
+        failtable = self.allocate_failtable(gcmap, failkinds, faillocs)
         descr._asmjs_failkinds = failkinds
         descr._asmjs_faillocs = faillocs
         descr._asmjs_failvars = [None] * len(faillocs)
+        descr._asmjs_failtable = failtable
         descr._asmjs_hasexc = self._guard_might_have_exception(op)
-        descr._asmjs_gcmap = gcmap
+        descr._asmjs_checkinv = False
         return descr
 
     def _guard_might_have_exception(self, op):
@@ -2450,7 +2958,8 @@ class CompiledBlockASMJS(object):
             else:
                 callsig = "ii"
                 args = [sizevar]
-            with ctx_allow_gc(self, exclude=[op.result]):
+            with ctx_allow_gc(self, exclude=[op.result],
+                              invalidates=False):
                 call = js.DynCallFunc(callsig, js.ConstInt(mallocfn), args)
                 self.bldr.emit_assignment(resvar, call)
             self._genop_check_and_propagate_exception()
@@ -2517,7 +3026,8 @@ class CompiledBlockASMJS(object):
                     assert kind == rewrite.FLAG_UNICODE
                     mallocfn = self.clt.assembler.gc_malloc_unicode_addr
             mallocfn = js.ConstInt(rffi.cast(lltype.Signed, mallocfn))
-            with ctx_allow_gc(self, exclude=[op.result]):
+            with ctx_allow_gc(self, exclude=[op.result],
+                              invalidates=False):
                 call = js.DynCallFunc(callsig, mallocfn, args)
                 self.bldr.emit_assignment(resvar, call)
             self._genop_check_and_propagate_exception()
@@ -2694,9 +3204,10 @@ class ctx_guard_not_forced(ctx_spill_to_frame):
 
 class ctx_allow_gc(ctx_spill_to_frame):
 
-    def __init__(self, block, exclude=None):
+    def __init__(self, block, exclude=None, invalidates=True):
         ctx_spill_to_frame.__init__(self, block)
         self.exclude = exclude
+        self.invalidates = invalidates
 
     def __enter__(self):
         ctx_spill_to_frame.__enter__(self)
@@ -2750,8 +3261,14 @@ class ctx_allow_gc(ctx_spill_to_frame):
                 continue
             if self.exclude is not None and box in self.exclude:
                 continue
+            # No need to reload anything that's dead after this op.
+            if self.block._is_final_use(box, self.block.pos):
+                continue
             addr = js.FrameSlotAddr(pos)
             bldr.emit_load(self._get_jsval(box), addr, js.Int32)
+        # The call may have invalidated the running code.
+        if self.invalidates:
+            bldr.emit_assignment(js.invalidation_check, js.one)
         # It's now safe to pop from the frame as usual.
         ctx_spill_to_frame.__exit__(self, exc_typ, exc_val, exc_tb)
 
@@ -7,6 +7,49 @@ from rpython.jit.backend.asmjs import jsvalue as jsval
 from rpython.jit.backend.asmjs.arch import SANITYCHECK
 
 
+def _number_relocations(code, relocations):
+    """Replace the relocation placeholders in the given code.
+
+    Each distinct value gets the next R<n> name, and is appended to the
+    given list of relocations.
+    """
+    numbers = {}
+    chunks = []
+    start = 0
+    while True:
+        i = code.find("$", start)
+        if i < 0:
+            break
+        j = code.find("$", i + 1)
+        assert j > i
+        value = int(code[i + 1:j])
+        num = numbers.get(value, -1)
+        if num < 0:
+            num = len(relocations)
+            relocations.append(value)
+            numbers[value] = num
+        chunks.append(code[start:i])
+        chunks.append("R%d" % (num,))
+        start = j + 1
+    chunks.append(code[start:])
+    return "".join(chunks)
+
+
+def split_relocations(jssource):
+    """Split the output of ASMJSBuilder.finish() into module code and
+    the list of relocation values.  Mirrors $jitSplitSource in
+    library_jit.js."""
+    if not jssource.startswith("//R"):
+        return jssource, []
+    end = jssource.find("\n")
+    assert end >= 3
+    relocations = []
+    for value in jssource[3:end].split(" "):
+        if value:
+            relocations.append(int(value))
+    return jssource[end + 1:], relocations
+
+
 class ASMJSFragment(object):
 
     def __init__(self, source, all_intvars, all_doublevars, functions):
@@ -30,11 +73,29 @@ class ASMJSBuilder(object):
         self.helper_functions = {}
 
     def finish(self):
-        return "".join(self._build_prelude() +
+        """Return the generated source, as expected by install_jssource().
+
+        Relocations are emitted as placeholders, because the code may go
+        through fragments and helper functions before getting here.  They
+        are numbered in order of appearance and imported from the foreign
+        object as R0, R1, etc, so the module code does not depend on the
+        addresses.  Their values are listed on a first line of the form
+        "//R <value> <value>...", which split_relocations() takes off.
+        """
+        code = "".join(self._build_functions() +
                        self.source_chunks +
                        self._build_epilog())
-
-    def _build_prelude(self):
+        relocations = []
+        code = _number_relocations(code, relocations)
+        chunks = ["//R"]
+        for value in relocations:
+            chunks.append(" %d" % (value,))
+        chunks.append("\n")
+        chunks.extend(self._build_prelude(len(relocations)))
+        chunks.append(code)
+        return "".join(chunks)
+
+    def _build_prelude(self, num_relocations):
         chunks = []
         # Standard asmjs prelude stuff.
         chunks.append('function M(stdlib, foreign, heap){\n')
@@ -54,6 +115,12 @@ class ASMJSBuilder(object):
         chunks.append('var jitInvoke = foreign._jitInvoke;\n')
         for funcname in self.imported_functions:
             chunks.append('var %s = foreign.%s;\n' % (funcname, funcname))
+        for i in xrange(num_relocations):
+            chunks.append('var R%d = foreign.R%d|0;\n' % (i, i))
+        return chunks
+
+    def _build_functions(self):
+        chunks = []
         # Definitions for any helper functions.
         for helper_chunks in self.helper_functions.itervalues():
             chunks.extend(helper_chunks)
@@ -62,6 +129,7 @@ class ASMJSBuilder(object):
         chunks.append('frame=frame|0;\n')
         chunks.append('tladdr=tladdr|0;\n')
         chunks.append('label=label|0;\n')
+        chunks.append('var %s=1;\n' % (jsval.invalidation_check.varname,))
         for var in self.all_intvars.itervalues():
             chunks.append("var %s=0;\n" % (var.varname,))
         for var in self.all_doublevars.itervalues():
@@ -134,6 +202,16 @@ class ASMJSBuilder(object):
                 self.all_doublevars[num] = var
         return var
 
+    def is_intvar_free(self, num):
+        """Check whether the int variable with given number is not in use."""
+        var = self.all_intvars.get(num, None)
+        return var is None or var in self.free_intvars
+
+    def is_doublevar_free(self, num):
+        """Check whether the double variable with given number is not in use."""
+        var = self.all_doublevars.get(num, None)
+        return var is None or var in self.free_doublevars
+
     def free_intvar(self, var):
         """Free up the given int variable for future re-use."""
         assert isinstance(var, jsval.IntVar)
@@ -170,7 +248,7 @@ class ASMJSBuilder(object):
             self.emit(str(intval))
         elif isinstance(val, jsval.ConstPtr):
             refval = (rffi.cast(lltype.Signed, val.getref_base()))
-            self.emit(str(refval))
+            self.emit_relocation(refval)
         elif isinstance(val, jsval.ConstFloat):
             # RPython doesn't have %r format for float repr.
             # XXX TODO: how to do this with no loss of precsion?
@@ -182,6 +260,13 @@ class ASMJSBuilder(object):
             os.write(2, "Unknown js value type: %s" % (val,))
             raise RuntimeError("Unknown js value type: %s" % (val,))
 
+    def emit_relocation(self, value):
+        """Emit a reference to a process-specific address."""
+        if value == 0:
+            self.emit("0")
+        else:
+            self.emit("$%d$" % (value,))
+
     def emit_expr(self, val):
         self.emit_value(val)
         self.emit(";\n")
@@ -39,6 +39,9 @@ def gettype(value):
         if value.type == INT:
             return Fixnum
         if value.type == REF:
+            # Non-null pointers are emitted as relocations, see below.
+            if isinstance(value, ConstPtr) and value.nonnull():
+                return Int
             return Fixnum
     os.write(2, "Unknown ASMJS value: %s" % (value,))
     raise RuntimeError("Unknown ASMJS value: %s" % (value,))
@@ -241,6 +244,25 @@ class TempDoublePtr(IntVar):
 tempDoublePtr = TempDoublePtr()
 
 
+class Relocation(ASMJSValue):
+    """ASMJSValue representing an address that is specific to this process.
+
+    Things like gcmaps, failtables and descrs live at different addresses
+    each time the program runs.  Rather than writing them into the source
+    as literals, they are imported from the foreign object when the module
+    is linked, so that the same source can be reused by another process.
+    See ASMJSBuilder.finish() for the details.
+    """
+
+    jstype = Int
+
+    def __init__(self, value):
+        self.value = value
+
+    def emit_value(self, js):
+        js.emit_relocation(self.value)
+
+
 zero = false = ConstInt(0)
 one = true = ConstInt(1)
 word = ConstInt(WORD)
@@ -709,6 +731,11 @@ frame = IntVar("frame")
 tladdr = IntVar("tladdr")
 label = IntVar("label")
 
+# Flag that is set at function entry, and after anything that might have
+# invalidated the running code, to indicate that GUARD_NOT_INVALIDATED
+# needs to go and check whether it actually has been invalidated.
+invalidation_check = IntVar("invchk")
+
 
 class _FrameFieldAddr(ASMJSValue):
     """ASMJSValue representing the address of a field within the frame."""
@@ -817,9 +844,9 @@ for nm in globals().keys():
     globals()[binopnm] = binop
     wrapper_defn = textwrap.dedent("""
         def %s(lhs, rhs):
-            if isinstance(lhs, ConstInt) or isinstance(lhs, ConstPtr):
-                if isinstance(rhs, ConstInt) or isinstance(rhs, ConstPtr):
-                    return ConstInt(intmask(_getint(lhs) %s _getint(rhs)))
+            # Pointers are not folded, since they must stay relocations.
+            if isinstance(lhs, ConstInt) and isinstance(rhs, ConstInt):
+                return ConstInt(intmask(_getint(lhs) %s _getint(rhs)))
             return %s(lhs, rhs)
     """) % (nm, binop.operator, binopnm)
     exec wrapper_defn in globals()
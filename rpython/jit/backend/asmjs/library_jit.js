@@ -53,6 +53,9 @@ var LibraryJIT = {
     if (Module._jitCompiledFunctions[id]) {
       return 1;
     }
+    if (Module._jitPendingSources && Module._jitPendingSources[id]) {
+      return 1;
+    }
     return 0;
   },
 
@@ -65,19 +68,165 @@ var LibraryJIT = {
   //  An opaque integer "function id" will be returned, which can be passed
   //  to jitInvoke to invoke the newly-compiled function.
   //  
+  jitRecompile__deps: ['$jitReadSource', '$jitLinkSources',
+                       '$jitDropPending'],
   jitRecompile: function(id, addr) {
     id = id|0;
     addr = addr|0;
-    // Read js source from the heap, as a C-style string.
+    jitDropPending(id);
+    jitLinkSources([id], [jitReadSource(addr)]);
+    return id
+  },
+
+  //  Schedule a JIT-compiled function to be re-compiled with new source code.
+  //
+  //  This takes the same arguments as jitRecompile(), but rather than
+  //  compiling the code straight away it copies the source into a queue
+  //  of pending compilations.  Any previously-compiled code for the id
+  //  stays in place and will continue to be used by jitInvoke() until
+  //  the queue is processed by jitFlush() or jitProcessPending().
+  //
+  //  Scheduling an id that is already pending replaces its queued source,
+  //  so a burst of changes to a single function costs only one compile.
+  //
+  jitSchedule__deps: ['$jitReadSource'],
+  jitSchedule: function(id, addr) {
+    id = id|0;
+    addr = addr|0;
+    if (!Module._jitPendingSources) {
+      Module._jitPendingSources = {};
+      Module._jitPendingIds = [];
+    }
+    if (Module._jitPendingIds.indexOf(id) < 0) {
+      Module._jitPendingIds.push(id);
+    }
+    Module._jitPendingSources[id] = jitReadSource(addr);
+  },
+
+  //  Forget the source pending for the given id, if any, together with
+  //  its place in the queue, so that the two always agree.
+  //
+  //  Returns the source, or null if there was none.
+  //
+  $jitDropPending: function(id) {
+    if (!Module._jitPendingSources) {
+      return null;
+    }
+    var source = Module._jitPendingSources[id] || null;
+    delete Module._jitPendingSources[id];
+    var i = Module._jitPendingIds.indexOf(id);
+    if (i >= 0) {
+      Module._jitPendingIds.splice(i, 1);
+    }
+    return source;
+  },
+
+  //  Immediately compile any pending source code for the given id.
+  //
+  //  Returns 1 if code was compiled, 0 if there was nothing pending.
+  //
+  jitFlush__deps: ['$jitLinkSources', '$jitDropPending'],
+  jitFlush: function(id) {
+    id = id|0;
+    var source = jitDropPending(id);
+    if (!source) {
+      return 0;
+    }
+    jitLinkSources([id], [source]);
+    return 1;
+  },
+
+  //  Compile pending source code, spending at most "budget" milliseconds.
+  //
+  //  Pending functions are compiled in the order they were scheduled, and
+  //  several of them are batched into a single call to the javascript
+  //  compiler to amortize its fixed overheads.  The budget is checked
+  //  between batches, so it may be overrun by at most a single batch.
+  //  A negative budget means to empty the queue regardless of time taken.
+  //
+  //  Returns the number of functions still waiting to be compiled.
+  //
+  jitProcessPending__deps: ['$jitLinkSources'],
+  jitProcessPending: function(budget) {
+    budget = budget|0;
+    if (!Module._jitPendingIds) {
+      return 0;
+    }
+    var queue = Module._jitPendingIds;
+    var pending = Module._jitPendingSources;
+    var start = Date.now();
+    while (queue.length > 0) {
+      if (budget >= 0 && Date.now() - start >= budget) {
+        break;
+      }
+      var ids = [];
+      var sources = [];
+      while (queue.length > 0 && ids.length < 8) {
+        var id = queue.shift();
+        // Entries may have been flushed or freed since being queued.
+        if (pending[id]) {
+          ids.push(id);
+          sources.push(pending[id]);
+          delete pending[id];
+        }
+      }
+      if (ids.length > 0) {
+        jitLinkSources(ids, sources);
+      }
+    }
+    return queue.length;
+  },
+
+  //  Read a C-style string from the heap.
+  //
+  $jitReadSource: function(addr) {
     var sourceChars = [];
     var i = addr;
     while (HEAP8[i] != 0) {
       sourceChars.push(String.fromCharCode(HEAP8[i]));
       i++;
     }
-    var source = sourceChars.join("");
-    // Compile it into an asmjs linkable function, and link it.
-    var mkfunc = new Function("return (" + source + ")");
+    return sourceChars.join("");
+  },
+
+  //  Compile a list of asmjs sources, and link them with the main Module
+  //  as the functions for the corresponding list of ids.
+  //
+  //  All the sources are compiled with a single call to the javascript
+  //  compiler, which returns an array of asmjs linkable functions.
+  //
+  //  Each source may start with a line listing its relocations, which
+  //  are passed to the module as foreign.R0, foreign.R1, etc; see
+  //  ASMJSBuilder.finish().  Module code that was handed to jitPrecompile()
+  //  is not compiled again; its existing module function is linked directly.
+  //
+  $jitLinkSources__deps: ['$jitSplitSource'],
+  $jitLinkSources: function(ids, sources) {
+    var precompiled = Module._jitPrecompiled || {};
+    var modules = [];
+    var foreigns = [];
+    var uncompiled = [];
+    for (var i = 0; i < sources.length; i++) {
+      var split = jitSplitSource(sources[i]);
+      if (split.relocations.length === 0) {
+        foreigns[i] = Module;
+      } else {
+        foreigns[i] = Object.create(Module);
+        for (var j = 0; j < split.relocations.length; j++) {
+          foreigns[i]["R" + j] = split.relocations[j];
+        }
+      }
+      if (precompiled.hasOwnProperty(split.code)) {
+        modules[i] = precompiled[split.code];
+        delete precompiled[split.code];
+        var order = Module._jitPrecompiledOrder;
+        order.splice(order.indexOf(split.code), 1);
+        Module._jitPrecompiledHits = (Module._jitPrecompiledHits|0) + 1;
+      } else {
+        modules[i] = null;
+        uncompiled.push(split.code);
+      }
+    }
     var stdlib = {
       "Math": Math,
       "Int8Array": Int8Array,
@@ -95,15 +244,181 @@ var LibraryJIT = {
       }
       Module.tempDoublePtr = tempDoublePtr;
     }
-    Module._jitCompiledFunctions[id] = mkfunc()(stdlib, Module, buffer);
-    return id
+    if (uncompiled.length > 0) {
+      var mkfuncs = new Function("return [(" + uncompiled.join("),\n(") + ")]");
+      var funcs = mkfuncs();
+      for (var i = 0, j = 0; i < modules.length; i++) {
+        if (modules[i] === null) {
+          modules[i] = funcs[j++];
+        }
+      }
+    }
+    for (var i = 0; i < ids.length; i++) {
+      var F = modules[i](stdlib, foreigns[i], buffer);
+      Module._jitCompiledFunctions[ids[i]] = F;
+    }
+  },
+
+  //  Split a source into its module code and the list of relocations
+  //  from its first line, which looks like "//R 1234 5678".
+  //
+  $jitSplitSource: function(source) {
+    var relocations = [];
+    if (source.lastIndexOf("//R", 0) !== 0) {
+      return {code: source, relocations: relocations};
+    }
+    var end = source.indexOf("\n");
+    var values = source.substring(3, end).split(" ");
+    for (var i = 0; i < values.length; i++) {
+      if (values[i]) {
+        relocations.push(values[i]|0);
+      }
+    }
+    return {code: source.substring(end + 1), relocations: relocations};
+  },
+
+  //  Compile asmjs source code without linking it to any function id.
+  //
+  //  The resulting module function is kept until some later call to
+  //  jitRecompile() or jitSchedule() provides exactly the same module code,
+  //  which will then skip straight to linking it.  This is used to warm
+  //  up the compiler with code from the persistent trace cache.  At most
+  //  'limit' module functions are kept, dropping the oldest first.
+  //
+  jitPrecompile__deps: ['$jitReadSource'],
+  jitPrecompile: function(addr, limit) {
+    addr = addr|0;
+    limit = limit|0;
+    var source = jitReadSource(addr);
+    if (!Module._jitPrecompiled) {
+      Module._jitPrecompiled = {};
+      Module._jitPrecompiledOrder = [];
+    }
+    var precompiled = Module._jitPrecompiled;
+    var order = Module._jitPrecompiledOrder;
+    if (precompiled.hasOwnProperty(source)) {
+      return;
+    }
+    precompiled[source] = (new Function("return " + source))();
+    order.push(source);
+    while (order.length > limit) {
+      delete precompiled[order.shift()];
+    }
+  },
+
+  //  Get the backing store for the persistent trace cache.
+  //
+  //  Under node this is a directory of files, named by Module.jitCacheDir
+  //  or the PYPY_ASMJS_CACHE_DIR environment variable.  In a browser it
+  //  is localStorage.  If neither is available then nothing is persisted.
+  //
+  $jitCacheStore: function() {
+    if (Module._jitCacheStore) {
+      return Module._jitCacheStore;
+    }
+    var store = {
+      read: function(name) { return null; },
+      write: function(name, data) { },
+      remove: function(name) { }
+    };
+    if (ENVIRONMENT_IS_NODE) {
+      var fs = require("fs");
+      var path = require("path");
+      var dir = Module.jitCacheDir || process.env.PYPY_ASMJS_CACHE_DIR;
+      if (dir) {
+        try {
+          fs.mkdirSync(dir);
+        } catch (e) {
+          // Most likely it exists already; any real problem will
+          // show up as failure to read or write the entries.
+        }
+        store.read = function(name) {
+          try {
+            return fs.readFileSync(path.join(dir, name), "binary");
+          } catch (e) {
+            return null;
+          }
+        };
+        store.write = function(name, data) {
+          try {
+            fs.writeFileSync(path.join(dir, name), data, "binary");
+          } catch (e) {
+          }
+        };
+        store.remove = function(name) {
+          try {
+            fs.unlinkSync(path.join(dir, name));
+          } catch (e) {
+          }
+        };
+      }
+    } else if (typeof localStorage !== "undefined") {
+      var prefix = "pypy-asmjs-cache:";
+      store.read = function(name) {
+        return localStorage.getItem(prefix + name);
+      };
+      store.write = function(name, data) {
+        try {
+          localStorage.setItem(prefix + name, data);
+        } catch (e) {
+          // Quota exceeded; the entry is simply not cached.
+        }
+      };
+      store.remove = function(name) {
+        localStorage.removeItem(prefix + name);
+      };
+    }
+    Module._jitCacheStore = store;
+    return store;
+  },
+
+  //  Read an entry from the trace cache store.
+  //
+  //  Returns the heap address of a newly-malloced copy of the entry, which
+  //  the caller must free, or zero if there is no such entry.
+  //
+  jitCacheRead__deps: ['$jitReadSource', '$jitCacheStore', 'malloc'],
+  jitCacheRead: function(nameaddr) {
+    nameaddr = nameaddr|0;
+    var data = jitCacheStore().read(jitReadSource(nameaddr));
+    if (data === null) {
+      return 0;
+    }
+    var addr = _malloc(data.length + 1);
+    for (var i = 0; i < data.length; i++) {
+      HEAP8[addr + i] = data.charCodeAt(i);
+    }
+    HEAP8[addr + data.length] = 0;
+    return addr;
+  },
+
+  //  Write an entry to the trace cache store, replacing any existing one.
+  //
+  jitCacheWrite__deps: ['$jitReadSource', '$jitCacheStore'],
+  jitCacheWrite: function(nameaddr, dataaddr) {
+    nameaddr = nameaddr|0;
+    dataaddr = dataaddr|0;
+    jitCacheStore().write(jitReadSource(nameaddr), jitReadSource(dataaddr));
+  },
+
+  //  Remove an entry from the trace cache store.
+  //
+  jitCacheDelete__deps: ['$jitReadSource', '$jitCacheStore'],
+  jitCacheDelete: function(nameaddr) {
+    nameaddr = nameaddr|0;
+    jitCacheStore().remove(jitReadSource(nameaddr));
   },
 
   // Copy a JIT-compiled function to another id.
   //
+  // Any source pending for the source id is compiled first, so that the
+  // copy reflects its most recent code.
+  //
+  jitCopy__deps: ['jitFlush'],
   jitCopy: function(srcId, dstId) {
     srcId = srcId|0;
     dstId = dstId|0;
+    _jitFlush(srcId);
     Module._jitCompiledFunctions[dstId] = Module._jitCompiledFunctions[srcId];
   },
 
@@ -114,14 +429,20 @@ var LibraryJIT = {
   // around data, but that's up to you.
   //
   // If you pass an id that does not have compiled code associated with it,
-  // it will produce a return value of zero.
+  // it will produce a return value of zero.  An id that has never been
+  // compiled but has source pending in the queue is compiled on demand;
+  // an id with existing code will run that code until the queue catches up.
   //
+  jitInvoke__deps: ['jitFlush'],
   jitInvoke: function(id, frame, tladdr, label) {
     id = id|0;
     label = label|0;
     frame = frame|0;
     tladdr = tladdr|0;
     var func = Module._jitCompiledFunctions[id];
+    if (!func && _jitFlush(id)) {
+        func = Module._jitCompiledFunctions[id];
+    }
     if (func) {
         return func(frame, tladdr, label)|0;
     } else {
@@ -131,9 +452,11 @@ var LibraryJIT = {
 
   // Free a JIT-compiled function.
   //
+  jitFree__deps: ['$jitDropPending'],
   jitFree: function(id) {
     id = id|0;
     Module._jitCompiledFunctions[id] = null;
+    jitDropPending(id);
   }
 }
 
@@ -11,7 +11,12 @@ from rpython.jit.backend.asmjs.assembler import (AssemblerASMJS,
                                                  CompiledLoopTokenASMJS)
 from rpython.jit.backend.asmjs.arch import (WORD,
                                             SANITYCHECK,
-                                            JITFRAME_FIXED_SIZE)
+                                            JITFRAME_FIXED_SIZE,
+                                            PENDING_COMPILE_BUDGET_MS,
+                                            TRACE_CACHE_SIZE,
+                                            TRACE_CACHE_MAX_ENTRIES,
+                                            TRACE_CACHE_PRECOMPILE)
+from rpython.jit.backend.asmjs.tracecache import TraceCache
 
 
 class CPU_ASMJS(AbstractLLCPU):
@@ -36,6 +41,10 @@ class CPU_ASMJS(AbstractLLCPU):
                  gcdescr=None):
         AbstractLLCPU.__init__(self, rtyper, stats, opts,
                                translate_support_code, gcdescr)
+        self.trace_cache = None
+        if translate_support_code and TRACE_CACHE_SIZE > 0:
+            self.trace_cache = TraceCache(TRACE_CACHE_SIZE,
+                                          TRACE_CACHE_MAX_ENTRIES)
 
     def set_debug(self, flag):
         return self.assembler.set_debug(flag)
@@ -53,6 +62,8 @@ class CPU_ASMJS(AbstractLLCPU):
         self.assembler.setup_once()
 
     def finish_once(self):
+        if self.trace_cache is not None:
+            self.trace_cache.flush()
         self.assembler.finish_once()
 
     def make_execute_token(self, *ARGS):
@@ -70,6 +81,19 @@ class CPU_ASMJS(AbstractLLCPU):
         def execute_token(executable_token, *args):
             clt = executable_token.compiled_loop_token
             assert isinstance(clt, CompiledLoopTokenASMJS)
+            # Let some of any deferred compilation work catch up.  When
+            # untranslated we always empty the queue, so that tests see
+            # the effect of each new bridge straight away.
+            # Once that's done, spend any idle time saving the index of the
+            # persistent trace cache and warming up the compiler with the
+            # traces it holds.
+            if self.translate_support_code:
+                pending = support.jitProcessPending(PENDING_COMPILE_BUDGET_MS)
+                if pending == 0 and self.trace_cache is not None:
+                    self.trace_cache.flush()
+                    self.trace_cache.precompile(TRACE_CACHE_PRECOMPILE)
+            else:
+                support.jitProcessPending(-1)
             funcid = clt.func.compiled_funcid
             loopid = clt.compiled_loopid
             frame_info = clt.func.frame_info
@@ -13,18 +13,23 @@ can be tested.  It is very slow and depends on the generated asmjs code being
 
 """
 
+import os
 import sys
 import math
+import time
 import ctypes
 import struct
 import subprocess
 import contextlib
+import collections
 
 from rpython.rlib.parsing.tree import RPythonVisitor
 from rpython.rlib.parsing.ebnfparse import parse_ebnf, make_parse_function
 from rpython.rtyper.lltypesystem import lltype, rffi, ll2ctypes
 from rpython.translator.tool.cbuild import ExternalCompilationInfo
 
+from rpython.jit.backend.asmjs.jsbuilder import split_relocations
+
 # First, we have the definitions of the javascript JIT helper functions.
 # These have a native javascript implementation when translated; when
 # untranslated they are implemented atop a rather nasty asmjs-to-python
@@ -50,6 +55,10 @@ def jsexternal(args, result, **kwds):
 
 _jitCompiledFunctions = { 0: None }
 _jitNextFuncId = 1
+_jitPendingSources = {}
+_jitPendingIds = []
+_jitPrecompiled = collections.OrderedDict()
+_jitPrecompiledHits = 0
 
 
 @jsexternal([rffi.CCHARP], rffi.INT)
@@ -72,17 +81,58 @@ def jitReserve():
 def jitExists(funcid):
     if _jitCompiledFunctions.get(funcid, None) is not None:
         return 1
+    if funcid in _jitPendingSources:
+        return 1
     return 0
 
 
+def _jitDropPending(funcid):
+    # Forget the source pending for funcid, if any, and its place in
+    # the queue.  Both are always removed together.
+    if funcid in _jitPendingIds:
+        _jitPendingIds.remove(funcid)
+    return _jitPendingSources.pop(funcid, None)
+
+
 @jsexternal([rffi.INT, rffi.CCHARP], lltype.Void)
 def jitRecompile(funcid, jssource):
     jssource_str = "".join(jssource)[:-1]
+    _jitDropPending(funcid)
+    _jitCompiledFunctions[funcid] = load_asmjs(jssource_str)
+
+
+@jsexternal([rffi.INT, rffi.CCHARP], lltype.Void)
+def jitSchedule(funcid, jssource):
+    jssource_str = "".join(jssource)[:-1]
+    if funcid not in _jitPendingIds:
+        _jitPendingIds.append(funcid)
+    _jitPendingSources[funcid] = jssource_str
+
+
+@jsexternal([rffi.INT], rffi.INT)
+def jitFlush(funcid):
+    jssource_str = _jitDropPending(funcid)
+    if jssource_str is None:
+        return 0
     _jitCompiledFunctions[funcid] = load_asmjs(jssource_str)
+    return 1
+
+
+@jsexternal([rffi.INT], rffi.INT)
+def jitProcessPending(budget):
+    # There's no batching here, since each source is compiled separately
+    # by the python transpiler anyway.
+    start = time.time()
+    while _jitPendingIds:
+        if budget >= 0 and (time.time() - start) * 1000 >= budget:
+            break
+        jitFlush(_jitPendingIds[0])
+    return len(_jitPendingIds)
 
 
 @jsexternal([rffi.INT, rffi.INT], lltype.Void)
 def jitCopy(srcId, dstId):
+    jitFlush(srcId)
     _jitCompiledFunctions[dstId] = _jitCompiledFunctions[srcId]
 
 
@@ -90,6 +140,8 @@ def jitCopy(srcId, dstId):
             _nowrapper=True, random_effects_on_gcobjs=True)
 def jitInvoke(funcid, frame, tladdr, label):
     func = _jitCompiledFunctions.get(funcid, None)
+    if func is None and jitFlush(funcid):
+        func = _jitCompiledFunctions[funcid]
     if func is None:
         res = 0
     else:
@@ -100,6 +152,62 @@ def jitInvoke(funcid, frame, tladdr, label):
 @jsexternal([rffi.INT], lltype.Void)
 def jitFree(funcid):
     _jitCompiledFunctions.pop(funcid, None)
+    _jitDropPending(funcid)
+
+
+@jsexternal([rffi.CCHARP, rffi.INT], lltype.Void)
+def jitPrecompile(jssource, limit):
+    jssource_str = "".join(jssource)[:-1]
+    if jssource_str not in _jitPrecompiled:
+        _jitPrecompiled[jssource_str] = compile_asmjs(jssource_str)
+        while len(_jitPrecompiled) > limit:
+            _jitPrecompiled.popitem(last=False)
+
+
+# The trace cache store is kept in a dict, or in files under _jitCacheDir
+# if that is set, mirroring the node implementation.
+
+_jitCacheDir = None
+_jitCacheData = {}
+
+
+@jsexternal([rffi.CCHARP], rffi.CCHARP)
+def jitCacheRead(name):
+    name_str = "".join(name)[:-1]
+    if _jitCacheDir is None:
+        data = _jitCacheData.get(name_str, None)
+    else:
+        try:
+            with open(os.path.join(_jitCacheDir, name_str), "rb") as f:
+                data = f.read()
+        except IOError:
+            data = None
+    if data is None:
+        return lltype.nullptr(rffi.CCHARP.TO)
+    return rffi.str2charp(data)
+
+
+@jsexternal([rffi.CCHARP, rffi.CCHARP], lltype.Void)
+def jitCacheWrite(name, data):
+    name_str = "".join(name)[:-1]
+    data_str = "".join(data)[:-1]
+    if _jitCacheDir is None:
+        _jitCacheData[name_str] = data_str
+    else:
+        with open(os.path.join(_jitCacheDir, name_str), "wb") as f:
+            f.write(data_str)
+
+
+@jsexternal([rffi.CCHARP], lltype.Void)
+def jitCacheDelete(name):
+    name_str = "".join(name)[:-1]
+    if _jitCacheDir is None:
+        _jitCacheData.pop(name_str, None)
+    else:
+        try:
+            os.unlink(os.path.join(_jitCacheDir, name_str))
+        except OSError:
+            pass
 
 
 # Here we have a simple and slow asmjs-to-python converter.
@@ -108,12 +216,18 @@ def jitFree(funcid):
 
 def load_asmjs(jssource, stdlib=None, foreign=None, heap=None):
     """Load asmjs source code as an equivalent python function."""
-    #validate_asmjs(jssource)
-    func = compile_asmjs(jssource)
+    global _jitPrecompiledHits
+    code, relocations = split_relocations(jssource)
+    #validate_asmjs(code)
+    func = _jitPrecompiled.pop(code, None)
+    if func is None:
+        func = compile_asmjs(code)
+    else:
+        _jitPrecompiledHits += 1
     if heap is None:
         heap = NativeHeap()
     if foreign is None:
-        foreign = FOREIGN(heap)
+        foreign = FOREIGN(heap, relocations)
     if stdlib is None:
         stdlib = STDLIB(heap)
     return func(stdlib, foreign, heap)
@@ -796,8 +910,10 @@ class FOREIGN(object):
 
     tempDoublePtr = tempDoublePtr
 
-    def __init__(self, heap):
+    def __init__(self, heap, relocations=()):
         self._heap = heap
+        for i, value in enumerate(relocations):
+            setattr(self, "R%d" % (i,), value)
 
     def _memcpy(self, dst, src, size):
         return self._heap.memmove(dst, src, size)
@@ -9,6 +9,8 @@ from rpython.jit.metainterp.history import (BoxInt, BoxPtr, ConstInt,
                                             ConstPtr, Box,
                                             BasicFailDescr, BasicFinalDescr)
 from rpython.jit.backend.detect_cpu import getcpuclass
+from rpython.jit.backend.asmjs import support
+from rpython.jit.backend.asmjs.tracecache import TraceCache
 from rpython.jit.backend.x86.arch import WORD
 from rpython.jit.backend.x86.rx86 import fits_in_32bits
 from rpython.jit.backend.llsupport import symbolic
@@ -16,6 +18,7 @@ from rpython.jit.metainterp.resoperation import rop
 from rpython.jit.metainterp.executor import execute
 from rpython.jit.backend.test.runner_test import LLtypeBackendTest
 from rpython.jit.tool.oparser import parse
+from rpython.jit.codewriter import longlong
 import ctypes
 
 CPU = getcpuclass("asmjs")
@@ -56,6 +59,194 @@ class TestASMJSRunner(LLtypeBackendTest):
     def test_compile_bridge_while_running_guard_no_exc(self):
         py.test.xfail("XXX TODO can't bridge from running code yet")
 
+    def test_compile_bridge_as_satellite(self):
+        looptoken = self.test_compile_bridge()
+        func = looptoken.compiled_loop_token.func
+        # The bridge was linked in without reassembling the loop.
+        assert len(func.satellites) == 1
+        # A bridge on a guard in that bridge also gets its own satellite.
+        faildescr2 = func.satellites[0].blocks[0].guardtokens[0]
+        i1c = BoxInt()
+        i4 = BoxInt()
+        bridge = [
+            ResOperation(rop.INT_ADD, [i1c, ConstInt(100)], i4),
+            ResOperation(rop.FINISH, [i4], None, descr=BasicFinalDescr(3)),
+        ]
+        self.cpu.compile_bridge(faildescr2, [i1c], bridge, looptoken)
+        assert len(func.satellites) == 2
+        deadframe = self.cpu.execute_token(looptoken, 2)
+        fail = self.cpu.get_latest_descr(deadframe)
+        assert fail.identifier == 3
+        assert self.cpu.get_int_value(deadframe, 0) == 120
+        # Reassembling folds them back into the main function.
+        func.reassemble()
+        assert len(func.satellites) == 0
+        deadframe = self.cpu.execute_token(looptoken, 2)
+        fail = self.cpu.get_latest_descr(deadframe)
+        assert fail.identifier == 3
+        assert self.cpu.get_int_value(deadframe, 0) == 120
+
+    def test_reassembly_is_deferred(self):
+        looptoken = self.test_compile_bridge()
+        func = looptoken.compiled_loop_token.func
+        funcid = func.compiled_funcid
+        func.reassemble()
+        # The new code is queued, and the old code stays in place.
+        assert funcid in support._jitPendingSources
+        assert support._jitCompiledFunctions[funcid] is not None
+        # Queueing it again replaces the pending source.
+        func.reassemble()
+        assert support._jitPendingIds.count(funcid) == 1
+        # Entering the loop empties the queue.
+        deadframe = self.cpu.execute_token(looptoken, 2)
+        assert funcid not in support._jitPendingSources
+        assert support._jitPendingIds == []
+        fail = self.cpu.get_latest_descr(deadframe)
+        assert fail.identifier == 2
+        assert self.cpu.get_int_value(deadframe, 0) == 20
+
+    def test_flush_forgets_the_queued_id(self):
+        looptoken = self.test_compile_bridge()
+        func = looptoken.compiled_loop_token.func
+        funcid = func.compiled_funcid
+        func.reassemble()
+        assert support.jitFlush(funcid) == 1
+        assert support._jitPendingIds == []
+        # Scheduling it again queues it only once.
+        func.reassemble()
+        assert support._jitPendingIds == [funcid]
+        support.jitFree(funcid)
+        assert support._jitPendingIds == []
+        assert funcid not in support._jitPendingSources
+
+    def _compile_counting_loop(self):
+        i0 = BoxInt()
+        i1 = BoxInt()
+        i2 = BoxInt()
+        looptoken = JitCellToken()
+        targettoken = TargetToken()
+        operations = [
+            ResOperation(rop.LABEL, [i0], None, descr=targettoken),
+            ResOperation(rop.INT_ADD, [i0, ConstInt(1)], i1),
+            ResOperation(rop.INT_LE, [i1, ConstInt(9)], i2),
+            ResOperation(rop.GUARD_TRUE, [i2], None, descr=BasicFailDescr(2)),
+            ResOperation(rop.JUMP, [i1], None, descr=targettoken),
+        ]
+        operations[3].setfailargs([i1])
+        self.cpu.compile_loop([i0], operations, looptoken, name="counter")
+        return looptoken
+
+    def test_trace_cache_stores_loops_and_bridges(self):
+        orig_data = support._jitCacheData
+        support._jitCacheData = {}
+        self.cpu.trace_cache = TraceCache(100000, 100)
+        try:
+            self.test_compile_bridge()
+            assert self.cpu.trace_cache.num_stored == 2
+            assert len(self.cpu.trace_cache.keys) == 2
+            # Nothing needs to be kept once they're stored.
+            assert self.cpu.assembler.new_jssources == {}
+        finally:
+            self.cpu.trace_cache = None
+            support._jitCacheData = orig_data
+
+    def test_trace_cache_hit_in_new_assembler(self):
+        orig_data = support._jitCacheData
+        support._jitCacheData = {}
+        self.cpu.trace_cache = TraceCache(100000, 100)
+        try:
+            self._compile_counting_loop()
+            self.cpu.trace_cache.flush()
+            # A fresh assembler and cache stand in for a later run.  The
+            # gcmaps, descrs and other structures of the loop are allocated
+            # again at different addresses, so the code only matches once
+            # they are relocations.
+            self.cpu.setup()
+            self.cpu.setup_once()
+            self.cpu.trace_cache = TraceCache(100000, 100)
+            assert self.cpu.trace_cache.precompile(5) == 0
+            assert len(support._jitPrecompiled) == 1
+            hits = support._jitPrecompiledHits
+            looptoken = self._compile_counting_loop()
+            deadframe = self.cpu.execute_token(looptoken, 0)
+            assert support._jitPrecompiledHits == hits + 1
+            assert len(support._jitPrecompiled) == 0
+            fail = self.cpu.get_latest_descr(deadframe)
+            assert fail.identifier == 2
+            assert self.cpu.get_int_value(deadframe, 0) == 10
+        finally:
+            self.cpu.trace_cache = None
+            support._jitCacheData = orig_data
+            support._jitPrecompiled.clear()
+
+    def test_loop_carried_values_in_jump_vars(self):
+        # Values computed into the vars of the following loop iteration
+        # must not clobber ones that are still needed to compute others.
+        faildescr = BasicFailDescr(1)
+        targettoken = TargetToken()
+        looptoken = JitCellToken()
+        ops = """
+        [i0, i1, f0]
+        label(i0, i1, f0, descr=targettoken)
+        i2 = int_add(i1, 1)
+        i3 = int_add(i0, i2)
+        f1 = float_add(f0, 1.5)
+        i4 = int_lt(i3, 100)
+        guard_true(i4, descr=faildescr) [i2, i3, f1]
+        jump(i2, i3, f1, descr=targettoken)
+        """
+        loop = parse(ops, self.cpu, namespace=locals())
+        self.cpu.compile_loop(loop.inputargs, loop.operations, looptoken)
+        deadframe = self.cpu.execute_token(looptoken, 0, 1,
+                                           longlong.getfloatstorage(0.0))
+        fail = self.cpu.get_latest_descr(deadframe)
+        assert fail.identifier == 1
+        i0, i1, f0 = 0, 1, 0.0
+        while True:
+            i0, i1, f0 = i1 + 1, i0 + i1 + 1, f0 + 1.5
+            if i1 >= 100:
+                break
+        assert self.cpu.get_int_value(deadframe, 0) == i0
+        assert self.cpu.get_int_value(deadframe, 1) == i1
+        f = self.cpu.get_float_value(deadframe, 2)
+        assert longlong.getrealfloat(f) == f0
+
+    def test_failargs_evaluated_only_on_failure(self):
+        # A value that is only needed by the guard's failargs is computed
+        # inside the failure branch, and must still come out right.
+        faildescr = BasicFailDescr(1)
+        finaldescr = BasicFinalDescr(2)
+        looptoken = JitCellToken()
+        ops = """
+        [i0, f0]
+        i1 = int_lt(i0, 10)
+        f1 = float_mul(f0, 2.5)
+        guard_true(i1, descr=faildescr) [i0, f1]
+        i2 = int_add(i0, 1)
+        f2 = float_add(f0, 1.0)
+        i3 = int_lt(i2, 5)
+        guard_false(i3, descr=faildescr) [f2, i2]
+        finish(i2, descr=finaldescr)
+        """
+        loop = parse(ops, self.cpu, namespace=locals())
+        self.cpu.compile_loop(loop.inputargs, loop.operations, looptoken)
+        deadframe = self.cpu.execute_token(looptoken, 12,
+                                           longlong.getfloatstorage(3.0))
+        assert self.cpu.get_latest_descr(deadframe) is faildescr
+        assert self.cpu.get_int_value(deadframe, 0) == 12
+        f = self.cpu.get_float_value(deadframe, 1)
+        assert longlong.getrealfloat(f) == 7.5
+        deadframe = self.cpu.execute_token(looptoken, 2,
+                                           longlong.getfloatstorage(3.0))
+        assert self.cpu.get_latest_descr(deadframe) is faildescr
+        f = self.cpu.get_float_value(deadframe, 0)
+        assert longlong.getrealfloat(f) == 4.0
+        assert self.cpu.get_int_value(deadframe, 1) == 3
+        deadframe = self.cpu.execute_token(looptoken, 7,
+                                           longlong.getfloatstorage(3.0))
+        assert self.cpu.get_latest_descr(deadframe) is finaldescr
+        assert self.cpu.get_int_value(deadframe, 0) == 8
+
     def test_execute_ptr_operation(self):
         cpu = self.cpu
         u = lltype.malloc(U)
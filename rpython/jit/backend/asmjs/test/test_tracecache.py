@@ -0,0 +1,157 @@
+
+import py
+from rpython.jit.tool.oparser import parse
+from rpython.jit.metainterp.history import BasicFailDescr
+from rpython.jit.backend.asmjs import support, tracecache
+from rpython.jit.backend.asmjs.tracecache import (TraceCache, make_cache_key,
+                                                  encode_entry, decode_entry)
+
+
+def make_ops(src):
+    return parse(src).operations
+
+
+OPS1 = make_ops("""
+[i0]
+i1 = int_add(i0, 1)
+jump(i1)
+""")
+
+OPS2 = make_ops("""
+[i0]
+i1 = int_sub(i0, 1)
+jump(i1)
+""")
+
+GUARD_OPS = """
+[i0]
+i1 = int_add(i0, 1)
+guard_true(i1, descr=faildescr) [i1]
+jump(i1)
+"""
+
+# The sources handed to the cache start with their relocations,
+# as produced by ASMJSBuilder.finish().
+SOURCE1 = "//R 1234 5678\nSOURCE1"
+SOURCE2 = "//R 4321\nSOURCE2"
+
+
+class TestTraceCache(object):
+
+    def setup_method(self, meth):
+        self.orig_dir = support._jitCacheDir
+        self.orig_data = support._jitCacheData
+        support._jitCacheDir = None
+        support._jitCacheData = {}
+
+    def teardown_method(self, meth):
+        support._jitCacheDir = self.orig_dir
+        support._jitCacheData = self.orig_data
+        support._jitPrecompiled.clear()
+
+    def test_cache_key(self):
+        key = make_cache_key("loop1", OPS1)
+        assert key == make_cache_key("loop1", OPS1)
+        assert key != make_cache_key("loop2", OPS1)
+        assert key != make_cache_key("loop1", OPS2)
+        # Fail descrs are numbered differently in each run.
+        ops1 = parse(GUARD_OPS, namespace={"faildescr": BasicFailDescr(1)})
+        ops2 = parse(GUARD_OPS, namespace={"faildescr": BasicFailDescr(2)})
+        assert (make_cache_key("loop1", ops1.operations) ==
+                make_cache_key("loop1", ops2.operations))
+
+    def test_entry_roundtrip(self):
+        key = make_cache_key("loop1", OPS1)
+        data = encode_entry(key, "loop1", "function M(){}\n")
+        assert decode_entry(key, data) == "function M(){}\n"
+        assert decode_entry(key, data[:-1]) is None
+        assert decode_entry("0" * 32, data) is None
+        bad_build = data.replace(tracecache.BUILD_HASH, "0" * 32)
+        assert decode_entry(key, bad_build) is None
+
+    def test_store_and_reload(self):
+        cache = TraceCache(100000, 100)
+        cache.store("loop1", OPS1, SOURCE1)
+        cache.store("loop2", OPS2, SOURCE2)
+        assert cache.num_stored == 2
+        # The index is only written out on flush.
+        assert "index" not in support._jitCacheData
+        cache.flush()
+        assert len(support._jitCacheData["index"].split("\n")) == 2
+        # A fresh cache in a later run sees both entries, and precompiles
+        # the most recently used one first, without its relocations.
+        precompiled = []
+        orig_precompile = support.jitPrecompile
+        support.jitPrecompile = lambda src, limit: precompiled.append(src)
+        try:
+            cache = TraceCache(100000, 100)
+            assert cache.precompile(1) == 1
+            assert precompiled == ["SOURCE2"]
+            assert cache.precompile(5) == 0
+            assert precompiled == ["SOURCE2", "SOURCE1"]
+            assert cache.precompile(5) == 0
+            assert len(precompiled) == 2
+        finally:
+            support.jitPrecompile = orig_precompile
+
+    def test_lru_eviction(self):
+        key1 = make_cache_key("loop1", OPS1)
+        key2 = make_cache_key("loop2", OPS1)
+        key3 = make_cache_key("loop3", OPS1)
+        size = len(encode_entry(key1, "loop1", "X" * 100))
+        cache = TraceCache(size * 2, 100)
+        cache.store("loop1", OPS1, "X" * 100)
+        cache.store("loop2", OPS1, "X" * 100)
+        # Storing loop1 again makes it the most recently used entry.
+        cache.store("loop1", OPS1, "X" * 100)
+        cache.store("loop3", OPS1, "X" * 100)
+        assert cache.keys == [key1, key3]
+        assert cache.total_size == size * 2
+        assert cache.num_evicted == 1
+        assert "trace-" + key2 not in support._jitCacheData
+        # Entries too big for the cache are not stored at all.
+        cache.store("loop4", OPS1, "X" * (size * 2))
+        assert cache.keys == [key1, key3]
+
+    def test_entry_count_limit(self):
+        cache = TraceCache(100000, 2)
+        for i in range(5):
+            cache.store("loop%d" % (i,), OPS1, SOURCE1)
+        assert cache.keys == [make_cache_key("loop3", OPS1),
+                              make_cache_key("loop4", OPS1)]
+        assert cache.num_evicted == 3
+        cache.flush()
+        assert len(support._jitCacheData["index"].split("\n")) == 2
+
+    def test_invalid_entries_are_evicted(self):
+        cache = TraceCache(100000, 100)
+        cache.store("loop1", OPS1, SOURCE1)
+        cache.flush()
+        key = make_cache_key("loop1", OPS1)
+        support._jitCacheData["trace-" + key] = "garbage"
+        orig_precompile = support.jitPrecompile
+        support.jitPrecompile = lambda src, limit: py.test.fail("compiled")
+        try:
+            cache = TraceCache(100000, 100)
+            assert cache.precompile(5) == 0
+            assert cache.keys == []
+            assert cache.num_evicted == 1
+        finally:
+            support.jitPrecompile = orig_precompile
+        cache.flush()
+        assert support._jitCacheData["index"] == ""
+
+    def test_file_store(self, tmpdir):
+        support._jitCacheDir = str(tmpdir)
+        cache = TraceCache(100000, 100)
+        cache.store("loop1", OPS1, SOURCE1)
+        cache.flush()
+        key = make_cache_key("loop1", OPS1)
+        assert tmpdir.join("trace-" + key).check()
+        assert tmpdir.join("index").read() == "%s %d" % (key,
+                                                         cache.sizes[key])
+        cache = TraceCache(100000, 100)
+        cache.load_index()
+        assert cache.keys == [key]
+        cache.evict(key)
+        assert not tmpdir.join("trace-" + key).check()
@@ -0,0 +1,257 @@
+"""
+
+Persistent cache of compiled asmjs traces.
+
+Most of the cost of compiling a loop with this backend is in the javascript
+engine, which has to parse, validate and compile the generated asmjs source
+before it can be linked.  This module keeps the generated source of each
+compiled loop in a persistent store, so that on later runs of the same
+interpreter build it can be handed to the javascript engine ahead of time.
+
+The addresses of descrs, gcmaps and other structures that differ from one
+run to the next are not part of the module code: ASMJSBuilder emits them as
+relocations, which are imported from the foreign object when the module is
+linked.  Only the module code is cached, and jitLinkSources() uses a
+precompiled module whenever it is handed the same code again, binding it
+to the relocations of the current run.  The key of an entry only needs to
+find that code again, so it leaves out anything run-specific; two traces
+that happen to share a key just replace each other's entry.
+
+Both loops and bridges are cached.  For a bridge the cached code is that
+of its satellite function, or of the whole function it was folded into.
+
+The store is a flat namespace of small string values, which the javascript
+runtime keeps in a directory on disk under node or in localStorage in a
+browser; see jitCacheRead() and friends in library_jit.js.  It holds one
+value per cached trace plus an index recording their sizes in LRU order,
+which is used to keep the total size of the cache within a fixed limit.
+
+"""
+
+from rpython.rlib.rmd5 import RMD5
+from rpython.rtyper.lltypesystem import rffi
+from rpython.jit.metainterp.history import ConstInt
+from rpython.jit.backend.llsupport.descr import (SizeDescr, ArrayOrFieldDescr,
+                                                 InteriorFieldDescr, CallDescr)
+
+from rpython.jit.backend.asmjs import support
+from rpython.jit.backend.asmjs.arch import TRACE_CACHE_MAX_PRECOMPILED
+from rpython.jit.backend.asmjs.jsbuilder import split_relocations
+
+
+def _compute_build_hash():
+    # The generated code depends only on the backend and the layout of the
+    # interpreter's data structures.  We fold the backend source into the
+    # hash here, and the layout is covered by the descr names in each key.
+    import os
+    m = RMD5()
+    dirname = os.path.dirname(os.path.abspath(__file__))
+    for fn in ("arch.py", "assembler.py", "jsbuilder.py", "jsvalue.py",
+               "library_jit.js"):
+        f = open(os.path.join(dirname, fn), "rb")
+        try:
+            m.update(f.read())
+        finally:
+            f.close()
+    return m.hexdigest()
+
+
+BUILD_HASH = _compute_build_hash()
+
+INDEX_NAME = "index"
+ENTRY_PREFIX = "trace-"
+ENTRY_MAGIC = "ASMJSTRACE1"
+
+
+def make_cache_key(loopname, operations):
+    """Derive the cache key for a loop with the given name and operations.
+
+    The key covers the build hash, the loop name (which describes its
+    greenkey) and the shape of the trace, but nothing that is numbered or
+    allocated differently in each run.  Of the descrs, only those that
+    describe the layout of the data being accessed are included; the
+    others (fail descrs, target tokens and loop tokens) are just marked.
+    """
+    m = RMD5()
+    m.update(BUILD_HASH)
+    m.update("\n")
+    m.update(loopname)
+    for op in operations:
+        m.update("\n")
+        m.update(op.getopname())
+        for i in range(op.numargs()):
+            arg = op.getarg(i)
+            if isinstance(arg, ConstInt):
+                m.update(" %d" % (arg.getint(),))
+            else:
+                m.update(" _")
+        descr = op.getdescr()
+        if descr is not None:
+            if (isinstance(descr, SizeDescr) or
+                    isinstance(descr, ArrayOrFieldDescr) or
+                    isinstance(descr, InteriorFieldDescr) or
+                    isinstance(descr, CallDescr)):
+                m.update(" ")
+                m.update(descr.repr_of_descr())
+            else:
+                m.update(" *")
+    return m.hexdigest()
+
+
+def encode_entry(key, loopname, jssource):
+    return "%s\n%s\n%s\n%s\n%d\n%s" % (ENTRY_MAGIC, BUILD_HASH, key,
+                                       loopname, len(jssource), jssource)
+
+
+def decode_entry(key, data):
+    """Extract the asmjs source from a cache entry, or None if invalid."""
+    lines = data.split("\n", 5)
+    if len(lines) != 6:
+        return None
+    if lines[0] != ENTRY_MAGIC or lines[1] != BUILD_HASH or lines[2] != key:
+        return None
+    jssource = lines[5]
+    try:
+        size = int(lines[4])
+    except ValueError:
+        return None
+    if size != len(jssource):
+        return None
+    return jssource
+
+
+class TraceCache(object):
+    """LRU cache of compiled asmjs traces in a persistent store.
+
+    Changes to the index are only written out by flush(), which the CPU
+    calls when it is otherwise idle and when it shuts down.
+    """
+
+    def __init__(self, max_size, max_entries):
+        self.max_size = max_size
+        self.max_entries = max_entries
+        self.keys = None
+        self.dirty = False
+        self.sizes = {}
+        self.total_size = 0
+        self.warm_position = 0
+        self.num_stored = 0
+        self.num_evicted = 0
+        self.num_precompiled = 0
+
+    def _read(self, name):
+        addr = support.jitCacheRead(name)
+        if not addr:
+            return None
+        try:
+            return rffi.charp2str(addr)
+        finally:
+            rffi.free_charp(addr)
+
+    def _write(self, name, data):
+        support.jitCacheWrite(name, data)
+
+    def _delete(self, name):
+        support.jitCacheDelete(name)
+
+    def load_index(self):
+        """Load the index of cached traces, if not done already.
+
+        The index lists one key and entry size per line, least recently
+        used first.  Anything malformed is ignored and will be overwritten.
+        """
+        if self.keys is not None:
+            return
+        self.keys = []
+        data = self._read(INDEX_NAME)
+        if data is None:
+            return
+        for line in data.split("\n"):
+            parts = line.split(" ")
+            if len(parts) != 2 or parts[0] in self.sizes:
+                continue
+            try:
+                size = int(parts[1])
+            except ValueError:
+                continue
+            self.keys.append(parts[0])
+            self.sizes[parts[0]] = size
+            self.total_size += size
+        # Most recently used entries are most likely to be needed again.
+        self.warm_position = len(self.keys)
+
+    def save_index(self):
+        lines = []
+        for key in self.keys:
+            lines.append("%s %d" % (key, self.sizes[key]))
+        self._write(INDEX_NAME, "\n".join(lines))
+
+    def flush(self):
+        """Write out the index, if it changed since the last flush."""
+        if self.dirty:
+            self.save_index()
+            self.dirty = False
+
+    def store(self, loopname, operations, jssource):
+        """Store the asmjs source compiled for the given loop.
+
+        The source is as produced by ASMJSBuilder.finish(); its relocations
+        are specific to this run and are not stored.  The entry becomes the
+        most recently used one, and older entries are evicted as necessary
+        to keep within the limits on size and number of entries.
+        """
+        self.load_index()
+        key = make_cache_key(loopname, operations)
+        code, _ = split_relocations(jssource)
+        data = encode_entry(key, loopname, code)
+        size = len(data)
+        if size > self.max_size:
+            return
+        if key in self.sizes:
+            self.keys.remove(key)
+            self.total_size -= self.sizes[key]
+        self._write(ENTRY_PREFIX + key, data)
+        self.keys.append(key)
+        self.sizes[key] = size
+        self.total_size += size
+        self.num_stored += 1
+        while (self.total_size > self.max_size or
+               len(self.keys) > self.max_entries):
+            self.evict(self.keys[0])
+        self.dirty = True
+
+    def evict(self, key):
+        """Remove the entry for the given key from the cache."""
+        idx = self.keys.index(key)
+        del self.keys[idx]
+        if idx < self.warm_position:
+            self.warm_position -= 1
+        self.total_size -= self.sizes[key]
+        del self.sizes[key]
+        self._delete(ENTRY_PREFIX + key)
+        self.num_evicted += 1
+        self.dirty = True
+
+    def precompile(self, count):
+        """Hand up to 'count' cached traces to the javascript engine.
+
+        Entries are visited from most to least recently used, and each is
+        only compiled once per run.  The javascript side keeps at most
+        TRACE_CACHE_MAX_PRECOMPILED of them waiting to be linked, dropping
+        the oldest first.  Returns the number still to visit.
+        """
+        self.load_index()
+        while count > 0 and self.warm_position > 0:
+            self.warm_position -= 1
+            key = self.keys[self.warm_position]
+            data = self._read(ENTRY_PREFIX + key)
+            jssource = None
+            if data is not None:
+                jssource = decode_entry(key, data)
+            if jssource is None:
+                self.evict(key)
+                continue
+            support.jitPrecompile(jssource, TRACE_CACHE_MAX_PRECOMPILED)
+            self.num_precompiled += 1
+            count -= 1
+        return self.warm_position
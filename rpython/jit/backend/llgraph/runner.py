@@ -4,7 +4,7 @@ from rpython.jit.backend.llgraph import support
 from rpython.jit.backend.llsupport import symbolic
 from rpython.jit.metainterp.history import AbstractDescr
 from rpython.jit.metainterp.history import Const, getkind
-from rpython.jit.metainterp.history import INT, REF, FLOAT, VOID
+from rpython.jit.metainterp.history import INT, REF, FLOAT, VOID, VECTOR
 from rpython.jit.metainterp.resoperation import rop
 from rpython.jit.metainterp.optimizeopt import intbounds
 from rpython.jit.codewriter import longlong, heaptracker
@@ -232,6 +232,8 @@ class LLGraphCPU(model.AbstractCPU):
     supports_floats = True
     supports_longlong = r_uint is not r_ulonglong
     supports_singlefloats = True
+    vector_extension = True
+    guard_class_switch_cases = 4
     translate_support_code = False
     is_llgraph = True
 
@@ -263,6 +265,18 @@ class LLGraphCPU(model.AbstractCPU):
         clt._llgraph_alltraces.append(lltrace)
         self._record_labels(lltrace)
 
+    def compile_bridge_for_class(self, faildescr, classbox, inputargs,
+                                 operations, original_loop_token, log=True,
+                                 logger=None):
+        clt = original_loop_token.compiled_loop_token
+        clt.compiling_a_bridge()
+        lltrace = LLTrace(inputargs, operations)
+        if not hasattr(faildescr, '_llgraph_class_cases'):
+            faildescr._llgraph_class_cases = []
+        faildescr._llgraph_class_cases.append((classbox.getint(), lltrace))
+        clt._llgraph_alltraces.append(lltrace)
+        self._record_labels(lltrace)
+
     def _record_labels(self, lltrace):
         for i, op in enumerate(lltrace.operations):
             if op.getopnum() == rop.LABEL:
@@ -715,6 +729,10 @@ class LLFrame(object):
             assert lltype.typeOf(arg) == llmemory.GCREF
         elif box.type == FLOAT:
             assert lltype.typeOf(arg) == longlong.FLOATSTORAGE
+        elif box.type == VECTOR:
+            assert len(arg) == box.count
+            for item in arg:
+                assert lltype.typeOf(item) == longlong.FLOATSTORAGE
         else:
             raise AssertionError(box)
         #
@@ -764,7 +782,7 @@ class LLFrame(object):
 
     # -----------------------------------------------------
 
-    def fail_guard(self, descr, saved_data=None):
+    def fail_guard(self, descr, saved_data=None, bridge=None):
         values = []
         for box in self.current_op.getfailargs():
             if box is not None:
@@ -772,8 +790,10 @@ class LLFrame(object):
             else:
                 value = None
             values.append(value)
-        if hasattr(descr, '_llgraph_bridge'):
-            target = (descr._llgraph_bridge, -1)
+        if bridge is None and hasattr(descr, '_llgraph_bridge'):
+            bridge = descr._llgraph_bridge
+        if bridge is not None:
+            target = (bridge, -1)
             values = [value for value in values if value is not None]
             raise Jump(target, values)
         else:
@@ -817,6 +837,11 @@ class LLFrame(object):
             llmemory.cast_int_to_adr(klass),
             rclass.CLASSTYPE)
         if value.typeptr != expected_class:
+            for klass, bridge in getattr(descr, '_llgraph_class_cases', []):
+                case_class = llmemory.cast_adr_to_ptr(
+                    llmemory.cast_int_to_adr(klass), rclass.CLASSTYPE)
+                if value.typeptr == case_class:
+                    self.fail_guard(descr, bridge=bridge)
             self.fail_guard(descr)
 
     def execute_guard_nonnull_class(self, descr, arg, klass):
@@ -1041,6 +1066,43 @@ class LLFrame(object):
     def execute_keepalive(self, descr, x):
         pass
 
+    def _vec_count(self):
+        return self.current_op.result.count
+
+    def execute_vec_raw_load(self, descr, addr, offset):
+        return tuple([self.cpu.bh_raw_load_f(addr, offset + i * 8, descr)
+                      for i in range(self._vec_count())])
+
+    def execute_vec_raw_store(self, descr, addr, offset, vector):
+        for i in range(len(vector)):
+            self.cpu.bh_raw_store_f(addr, offset + i * 8, vector[i], descr)
+
+    def execute_vec_getarrayitem_raw(self, descr, array, index):
+        return tuple([self.cpu.bh_getarrayitem_raw_f(array, index + i, descr)
+                      for i in range(self._vec_count())])
+
+    def execute_vec_setarrayitem_raw(self, descr, array, index, vector):
+        for i in range(len(vector)):
+            self.cpu.bh_setarrayitem_raw_f(array, index + i, vector[i], descr)
+
+    def execute_vec_float_splat(self, descr, x):
+        return (x,) * self._vec_count()
+
+    def _vec_binaryop(name):
+        from rpython.jit.metainterp.blackhole import BlackholeInterpreter
+        func = BlackholeInterpreter.__dict__['bhimpl_' + name]
+        def execute(self, descr, x, y):
+            assert len(x) == len(y)
+            return tuple([func(x[i], y[i]) for i in range(len(x))])
+        execute.func_name = 'execute_vec_' + name
+        return execute
+
+    execute_vec_float_add = _vec_binaryop('float_add')
+    execute_vec_float_sub = _vec_binaryop('float_sub')
+    execute_vec_float_mul = _vec_binaryop('float_mul')
+    execute_vec_float_truediv = _vec_binaryop('float_truediv')
+    del _vec_binaryop
+
 
 def _getdescr(op):
     d = op.getdescr()
@@ -19,6 +19,11 @@ class AbstractCPU(object):
     # longlongs are supported by the JIT, but stored as doubles.
     # Boxes and Consts are BoxFloats and ConstFloats.
     supports_singlefloats = False
+    # True if the backend implements the VEC_xxx operations
+    vector_extension = False
+    # how many bridges compile_bridge_for_class() can attach to the same
+    # guard_class, or 0 if it is not implemented
+    guard_class_switch_cases = 0
 
     propagate_exception_descr = None
 
@@ -69,6 +74,19 @@ class AbstractCPU(object):
         """
         raise NotImplementedError
 
+    def compile_bridge_for_class(self, faildescr, classbox, inputargs,
+                                 operations, original_loop_token, log=True,
+                                 logger=None):
+        """Assemble a bridge for the failure of the GUARD_CLASS
+        'faildescr' when the object is of class 'classbox' only.  The
+        guard dispatches on the class of the object to the bridges of
+        the classes seen so far; the other classes still fail, or go to
+        the bridge attached with compile_bridge() if there is one.
+        Only called if guard_class_switch_cases is not zero.
+        Returns either None or an instance of rpython.rlib.jit.AsmInfo.
+        """
+        raise NotImplementedError
+
     def dump_loop_token(self, looptoken):
         """Print a disassembled version of looptoken to stdout"""
         raise NotImplementedError
@@ -809,6 +809,54 @@ class BaseBackendTest(Runner):
             assert self.execute_operation(opname, args, 'void') == None
             assert self.guard_failed
 
+    def test_compile_bridge_for_class(self):
+        if self.cpu.guard_class_switch_cases == 0:
+            py.test.skip("compile_bridge_for_class() not supported")
+        t_box, T_box = self.alloc_instance(self.T)
+        u_box, U_box = self.alloc_instance(self.U)
+        t2_box, T2_box = self.alloc_instance(self.T)    # another vtable
+        p0 = BoxPtr()
+        i0 = BoxInt()
+        faildescr1 = BasicFailDescr(1)
+        looptoken = JitCellToken()
+        operations = [
+            ResOperation(rop.GUARD_CLASS, [p0, T_box], None,
+                         descr=faildescr1),
+            ResOperation(rop.FINISH, [i0], None, descr=BasicFinalDescr(2)),
+            ]
+        operations[0].setfailargs([p0, i0])
+        self.cpu.compile_loop([p0, i0], operations, looptoken)
+        #
+        def bridge(n, identifier):
+            p0b = BoxPtr()
+            i0b = BoxInt()
+            i1 = BoxInt()
+            operations = [
+                ResOperation(rop.INT_ADD, [i0b, ConstInt(n)], i1),
+                ResOperation(rop.FINISH, [i1], None,
+                             descr=BasicFinalDescr(identifier)),
+                ]
+            return [p0b, i0b], operations
+        def run(box):
+            deadframe = self.cpu.execute_token(looptoken, box.getref_base(), 5)
+            fail = self.cpu.get_latest_descr(deadframe)
+            if fail is faildescr1:
+                return fail.identifier, self.cpu.get_int_value(deadframe, 1)
+            return fail.identifier, self.cpu.get_int_value(deadframe, 0)
+        #
+        inputargs, bridge_ops = bridge(10, 3)
+        self.cpu.compile_bridge_for_class(faildescr1, U_box, inputargs,
+                                          bridge_ops, looptoken)
+        assert run(t_box) == (2, 5)
+        assert run(u_box) == (3, 15)
+        assert run(t2_box) == (1, 5)
+        #
+        inputargs, bridge_ops = bridge(100, 4)
+        self.cpu.compile_bridge(faildescr1, inputargs, bridge_ops, looptoken)
+        assert run(t_box) == (2, 5)
+        assert run(u_box) == (3, 15)
+        assert run(t2_box) == (4, 105)
+
     def test_ooops(self):
         u1_box, U_box = self.alloc_instance(self.U)
         u2_box, U_box = self.alloc_instance(self.U)
@@ -8,6 +8,7 @@ from rpython.jit.backend.llsupport.asmmemmgr import MachineDataBlockWrapper
 from rpython.jit.backend.llsupport.gcmap import allocate_gcmap
 from rpython.jit.metainterp.history import Const, Box, VOID
 from rpython.jit.metainterp.history import AbstractFailDescr, INT, REF, FLOAT
+from rpython.jit.metainterp.history import VECTOR
 from rpython.rtyper.lltypesystem import lltype, rffi, rstr, llmemory
 from rpython.rtyper.lltypesystem.lloperation import llop
 from rpython.rtyper.annlowlevel import llhelper, cast_instance_to_gcref
@@ -37,12 +38,37 @@ from rpython.rlib.rarithmetic import intmask, r_uint
 from rpython.rlib.objectmodel import compute_unique_id
 
 
+class ClassSwitch(object):
+    """ The code that a failing GUARD_CLASS jumps to once bridges for
+    some classes were attached to it (see compile_bridge_for_class()).  It
+    compares the class of the object, which is still in the register
+    'reg', with the classes of the bridges and jumps to the matching
+    bridge, or else to 'adr_default': the recovery stub of the guard, or
+    the bridge attached with compile_bridge().  The code is rewritten in
+    place at 'adr_code' each time a bridge is added.
+    """
+    def __init__(self, reg, adr_code, size, adr_default):
+        self.reg = reg
+        self.adr_code = adr_code
+        self.size = size
+        self.adr_default = adr_default
+        self.classes = []
+        self.targets = []
+
+
 class Assembler386(BaseAssembler):
     _regalloc = None
     _output_loop_log = None
     _second_tmp_reg = ecx
 
     DEBUG_FRAME_DEPTH = False
+    # upper bounds on the size of the code of a ClassSwitch
+    CLASS_SWITCH_CASE_SIZE = 40
+    CLASS_SWITCH_DEFAULT_SIZE = 16
+    # if True, the recovery stub of a guard only pushes the position of
+    # the guard in a table and jumps to code shared by all the guards;
+    # see write_compact_failure_recoveries()
+    compact_failure_recovery = True
 
     def __init__(self, cpu, translate_support_code=False):
         BaseAssembler.__init__(self, cpu, translate_support_code)
@@ -508,7 +534,7 @@ class Assembler386(BaseAssembler):
 
     @rgc.no_release_gil
     def assemble_bridge(self, faildescr, inputargs, operations,
-                        original_loop_token, log, logger):
+                        original_loop_token, log, logger, classbox=None):
         if not we_are_translated():
             # Arguments should be unique
             assert len(set(inputargs)) == len(inputargs)
@@ -538,7 +564,11 @@ class Assembler386(BaseAssembler):
         debug_bridge(descr_number, rawstart, codeendpos)
         self.patch_pending_failure_recoveries(rawstart)
         # patch the jump from original guard
-        self.patch_jump_for_descr(faildescr, rawstart)
+        if classbox is not None or faildescr._x86_class_switch is not None:
+            self.patch_class_switch(faildescr, classbox, rawstart,
+                                    original_loop_token)
+        else:
+            self.patch_jump_for_descr(faildescr, rawstart)
         ops_offset = self.mc.ops_offset
         frame_depth = max(self.current_clt.frame_info.jfi_frame_depth,
                           frame_depth_no_fixed_size + JITFRAME_FIXED_SIZE)
@@ -558,8 +588,11 @@ class Assembler386(BaseAssembler):
     def write_pending_failure_recoveries(self):
         # for each pending guard, generate the code of the recovery stub
         # at the end of self.mc.
-        for tok in self.pending_guard_tokens:
-            tok.pos_recovery_stub = self.generate_quick_failure(tok)
+        if self.compact_failure_recovery:
+            self.write_compact_failure_recoveries()
+        else:
+            for tok in self.pending_guard_tokens:
+                tok.pos_recovery_stub = self.generate_quick_failure(tok)
         if WORD == 8 and len(self.pending_memoryerror_trampoline_from) > 0:
             self.error_trampoline_64 = self.generate_propagate_error_64()
 
@@ -689,6 +722,11 @@ class Assembler386(BaseAssembler):
         if rx86.fits_in_32bits(offset):
             mc.writeimm32(offset)
             mc.copy_to_raw_memory(adr_jump_offset)
+        elif faildescr._x86_recovery_entry != 0:
+            # the compact recovery stub is too small to be clobbered, but
+            # it ends up jumping to the address in its entry of the table
+            entry = rffi.cast(rffi.SIGNEDP, faildescr._x86_recovery_entry)
+            entry[2] = adr_new_target
         else:
             # "mov r11, addr; jmp r11" is up to 13 bytes, which fits in there
             # because we always write "mov r11, imm-as-8-bytes; call *r11" in
@@ -700,6 +738,68 @@ class Assembler386(BaseAssembler):
             mc.copy_to_raw_memory(adr_target)
         faildescr.adr_jump_offset = 0    # means "patched"
 
+    def patch_class_switch(self, faildescr, classbox, adr_new_target,
+                           looptoken):
+        # attach the bridge at 'adr_new_target' to the GUARD_CLASS
+        # 'faildescr', for objects of class 'classbox' only if it is not None
+        switch = faildescr._x86_class_switch
+        if switch is None:
+            if classbox is None or faildescr._x86_class_reg < 0:
+                self.patch_jump_for_descr(faildescr, adr_new_target)
+                return
+            # first bridge for a class: allocate room for the code of
+            # all the classes, and make the guard jump there
+            size = (self.cpu.guard_class_switch_cases *
+                    self.CLASS_SWITCH_CASE_SIZE +
+                    self.CLASS_SWITCH_DEFAULT_SIZE)
+            mc = codebuf.MachineCodeBlockWrapper()
+            for i in range(size):
+                mc.INT3()
+            adr_code = mc.materialize(self.cpu.asmmemmgr,
+                                      self.get_asmmemmgr_blocks(looptoken))
+            adr_jump_offset = faildescr.adr_jump_offset
+            assert adr_jump_offset != 0
+            offset = adr_code - (adr_jump_offset + 4)
+            if not rx86.fits_in_32bits(offset):
+                # rare case, the guard can only have a single bridge
+                self.patch_jump_for_descr(faildescr, adr_new_target)
+                return
+            p = rffi.cast(rffi.INTP, adr_jump_offset)
+            adr_stub = adr_jump_offset + 4 + rffi.cast(lltype.Signed, p[0])
+            switch = ClassSwitch(faildescr._x86_class_reg, adr_code, size,
+                                 adr_stub)
+            switch.classes.append(classbox.getint())
+            switch.targets.append(adr_new_target)
+            self._write_class_switch(switch)
+            mc = codebuf.MachineCodeBlockWrapper()
+            mc.writeimm32(offset)
+            mc.copy_to_raw_memory(adr_jump_offset)
+            faildescr.adr_jump_offset = 0    # means "patched"
+            faildescr._x86_class_switch = switch
+            return
+        if classbox is None:
+            switch.adr_default = adr_new_target
+        else:
+            switch.classes.append(classbox.getint())
+            switch.targets.append(adr_new_target)
+        self._write_class_switch(switch)
+
+    def _write_class_switch(self, switch):
+        mc = codebuf.MachineCodeBlockWrapper()
+        objloc = RegLoc(switch.reg, False)
+        for i in range(len(switch.classes)):
+            self._cmp_guard_class(mc, [objloc, imm(switch.classes[i])])
+            # Patched below
+            mc.J_il8(rx86.Conditions['NE'], 0)
+            jne_location = mc.get_relative_pos()
+            mc.JMP(imm(switch.targets[i]))
+            offset = mc.get_relative_pos() - jne_location
+            assert 0 < offset <= 127
+            mc.overwrite(jne_location-1, chr(offset))
+        mc.JMP(imm(switch.adr_default))
+        assert mc.get_relative_pos() <= switch.size
+        mc.copy_to_raw_memory(switch.adr_code)
+
     def fixup_target_tokens(self, rawstart):
         for targettoken in self.target_tokens_currently_compiling:
             targettoken._ll_loop_code += rawstart
@@ -841,7 +941,13 @@ class Assembler386(BaseAssembler):
     # ------------------------------------------------------------
 
     def mov(self, from_loc, to_loc):
-        if (isinstance(from_loc, RegLoc) and from_loc.is_xmm) or (isinstance(to_loc, RegLoc) and to_loc.is_xmm):
+        if (isinstance(from_loc, FrameLoc) and from_loc.type == VECTOR or
+                isinstance(to_loc, FrameLoc) and to_loc.type == VECTOR):
+            self.mc.MOVUPD(to_loc, from_loc)
+        elif (isinstance(from_loc, RegLoc) and from_loc.is_xmm and
+                isinstance(to_loc, RegLoc)):
+            self.mc.MOVAPD(to_loc, from_loc)   # copies vectors too
+        elif (isinstance(from_loc, RegLoc) and from_loc.is_xmm) or (isinstance(to_loc, RegLoc) and to_loc.is_xmm):
             self.mc.MOVSD(to_loc, from_loc)
         else:
             assert to_loc is not ebp
@@ -1092,6 +1198,13 @@ class Assembler386(BaseAssembler):
     genop_float_sub = _binaryop('SUBSD')
     genop_float_mul = _binaryop('MULSD')
     genop_float_truediv = _binaryop('DIVSD')
+    genop_vec_float_add = _binaryop('ADDPD')
+    genop_vec_float_sub = _binaryop('SUBPD')
+    genop_vec_float_mul = _binaryop('MULPD')
+    genop_vec_float_truediv = _binaryop('DIVPD')
+
+    def genop_vec_float_splat(self, op, arglocs, resloc):
+        self.mc.UNPCKLPD(resloc, resloc)
 
     genop_int_lt = _cmpop("L", "G")
     genop_int_le = _cmpop("LE", "GE")
@@ -1438,6 +1551,20 @@ class Assembler386(BaseAssembler):
         src_addr = addr_add(base_loc, ofs_loc, ofs.value, 0)
         self.load_from_mem(resloc, src_addr, size_loc, sign_loc)
 
+    def genop_vec_getarrayitem_raw(self, op, arglocs, resloc):
+        base_loc, ofs_loc, size_loc, ofs, sign_loc = arglocs
+        assert isinstance(ofs, ImmedLoc)
+        assert isinstance(size_loc, ImmedLoc)
+        scale = get_scale(size_loc.value)
+        src_addr = addr_add(base_loc, ofs_loc, ofs.value, scale)
+        self.mc.MOVUPD(resloc, src_addr)
+
+    def genop_vec_raw_load(self, op, arglocs, resloc):
+        base_loc, ofs_loc, size_loc, ofs, sign_loc = arglocs
+        assert isinstance(ofs, ImmedLoc)
+        src_addr = addr_add(base_loc, ofs_loc, ofs.value, 0)
+        self.mc.MOVUPD(resloc, src_addr)
+
     def _imul_const_scaled(self, mc, targetreg, sourcereg, itemsize):
         """Produce one operation to do roughly
                targetreg = sourcereg * itemsize
@@ -1531,6 +1658,20 @@ class Assembler386(BaseAssembler):
         dest_addr = AddressLoc(base_loc, ofs_loc, 0, baseofs.value)
         self.save_into_mem(dest_addr, value_loc, size_loc)
 
+    def genop_discard_vec_setarrayitem_raw(self, op, arglocs):
+        base_loc, ofs_loc, value_loc, size_loc, baseofs = arglocs
+        assert isinstance(baseofs, ImmedLoc)
+        assert isinstance(size_loc, ImmedLoc)
+        scale = get_scale(size_loc.value)
+        dest_addr = AddressLoc(base_loc, ofs_loc, scale, baseofs.value)
+        self.mc.MOVUPD(dest_addr, value_loc)
+
+    def genop_discard_vec_raw_store(self, op, arglocs):
+        base_loc, ofs_loc, value_loc, size_loc, baseofs = arglocs
+        assert isinstance(baseofs, ImmedLoc)
+        dest_addr = AddressLoc(base_loc, ofs_loc, 0, baseofs.value)
+        self.mc.MOVUPD(dest_addr, value_loc)
+
     def genop_discard_strsetitem(self, op, arglocs):
         base_loc, ofs_loc, val_loc = arglocs
         basesize, itemsize, ofs_length = symbolic.get_array_token(rstr.STR,
@@ -1691,10 +1832,10 @@ class Assembler386(BaseAssembler):
             self.mc.CMP(locs[0], locs[1])
         self.implement_guard(guard_token, 'NE')
 
-    def _cmp_guard_class(self, locs):
+    def _cmp_guard_class(self, mc, locs):
         offset = self.cpu.vtable_offset
         if offset is not None:
-            self.mc.CMP(mem(locs[0], offset), locs[1])
+            mc.CMP(mem(locs[0], offset), locs[1])
         else:
             # XXX hard-coded assumption: to go from an object to its class
             # we use the following algorithm:
@@ -1720,12 +1861,16 @@ class Assembler386(BaseAssembler):
             expected_typeid = classptr - sizeof_ti - type_info_group
             if IS_X86_32:
                 expected_typeid >>= 2
-                self.mc.CMP16(mem(locs[0], 0), ImmedLoc(expected_typeid))
+                mc.CMP16(mem(locs[0], 0), ImmedLoc(expected_typeid))
             elif IS_X86_64:
-                self.mc.CMP32_mi((locs[0].value, 0), expected_typeid)
+                mc.CMP32_mi((locs[0].value, 0), expected_typeid)
 
     def genop_guard_guard_class(self, ign_1, guard_op, guard_token, locs, ign_2):
-        self._cmp_guard_class(locs)
+        self._cmp_guard_class(self.mc, locs)
+        if self.cpu.guard_class_switch_cases > 0:
+            # the object is still in this register if the guard fails,
+            # for patch_class_switch()
+            guard_token.faildescr._x86_class_reg = locs[0].value
         self.implement_guard(guard_token, 'NE')
 
     def genop_guard_guard_nonnull_class(self, ign_1, guard_op,
@@ -1734,7 +1879,7 @@ class Assembler386(BaseAssembler):
         # Patched below
         self.mc.J_il8(rx86.Conditions['B'], 0)
         jb_location = self.mc.get_relative_pos()
-        self._cmp_guard_class(locs)
+        self._cmp_guard_class(self.mc, locs)
         # patch the JB above
         offset = self.mc.get_relative_pos() - jb_location
         assert 0 < offset <= 127
@@ -1770,6 +1915,62 @@ class Assembler386(BaseAssembler):
         self.mc.JMP(imm(target))
         return startpos
 
+    def write_compact_failure_recoveries(self):
+        # The guards of this loop or bridge get one entry each in a table
+        # in the data blocks: the descr, the gcmap, and the address where
+        # to go next.  That address is the compact_failure_recovery_code
+        # for this kind of guard, or a bridge that is too far away for
+        # patch_jump_for_descr() to patch the guard itself.  The recovery
+        # stub of a guard only pushes the index of its entry and jumps,
+        # which is 4 to 10 bytes instead of around 37 on x86-64.
+        tokens = self.pending_guard_tokens
+        if not tokens:
+            return
+        entry_size = 3 * WORD
+        rawtable = self.datablockwrapper.malloc_aligned(
+            entry_size * len(tokens), WORD)
+        table = rffi.cast(rffi.SIGNEDP, rawtable)
+        for i in range(len(tokens)):
+            tok = tokens[i]
+            fail_descr, target = self.store_info_on_descr(0, tok)
+            kind = self.failure_recovery_code.index(target)
+            table[3 * i] = fail_descr
+            table[3 * i + 1] = rffi.cast(lltype.Signed, tok.gcmap)
+            table[3 * i + 2] = self.compact_failure_recovery_code[kind]
+            tok.faildescr._x86_recovery_entry = rawtable + entry_size * i
+        #
+        mc = self.mc
+        if IS_X86_64:
+            # the stubs push the index of their entry in the table, and
+            # jump to this code, which loads the address of the entry in
+            # r11 and jumps to the target of the entry
+            r11 = X86_64_SCRATCH_REG.value
+            trampoline = mc.get_relative_pos()
+            mc.PUSH_r(eax.value)
+            mc.MOV_rs(r11, WORD)
+            mc.LEA_ra(r11, (r11, r11, 1, 0))                 # r11 *= 3
+            mc.MOV_ri(eax.value, rawtable)
+            mc.LEA_ra(r11, (eax.value, r11, get_scale(WORD), 0))
+            mc.POP_r(eax.value)
+            mc.LEA_rs(esp.value, WORD)
+            mc.JMP_m((r11, 2 * WORD))
+            for i in range(len(tokens)):
+                tokens[i].pos_recovery_stub = mc.get_relative_pos()
+                mc.PUSH_i(i)
+                offset = trampoline - (mc.get_relative_pos() + 2)
+                if rx86.single_byte(offset):
+                    mc.JMP_l8(offset)
+                else:
+                    mc.JMP_l(trampoline - (mc.get_relative_pos() + 5))
+        else:
+            # everything fits in 32 bits: the stubs push the address of
+            # their entry, and the bridges are always attached by
+            # patching the guards
+            for i in range(len(tokens)):
+                tokens[i].pos_recovery_stub = mc.get_relative_pos()
+                mc.PUSH(imm(rawtable + entry_size * i))
+                mc.JMP(imm(table[3 * i + 2]))
+
     def push_gcmap(self, mc, gcmap, push=False, mov=False, store=False):
         if push:
             mc.PUSH(imm(rffi.cast(lltype.Signed, gcmap)))
@@ -1791,6 +1992,7 @@ class Assembler386(BaseAssembler):
 
     def setup_failure_recovery(self):
         self.failure_recovery_code = [0, 0, 0, 0]
+        self.compact_failure_recovery_code = [0, 0, 0, 0]
 
     def _push_all_regs_to_frame(self, mc, ignored_regs, withfloats,
                                 callee_only=False):
@@ -1837,9 +2039,17 @@ class Assembler386(BaseAssembler):
                 mc.MOVSD_xb(i, (ofs + i * coeff) * WORD + base_ofs)
 
     def _build_failure_recovery(self, exc, withfloats=False):
+        self._build_failure_recovery_code(exc, withfloats, compact=False)
+        self._build_failure_recovery_code(exc, withfloats, compact=True)
+
+    def _build_failure_recovery_code(self, exc, withfloats, compact):
         mc = codebuf.MachineCodeBlockWrapper()
         self.mc = mc
 
+        if compact and IS_X86_64:
+            # the address of the entry is in r11, see the trampoline in
+            # write_compact_failure_recoveries()
+            mc.PUSH_r(X86_64_SCRATCH_REG.value)
         self._push_all_regs_to_frame(mc, [], withfloats)
 
         if exc:
@@ -1857,14 +2067,26 @@ class Assembler386(BaseAssembler):
         # in generate_quick_failure().
         ofs = self.cpu.get_ofs_of_frame_field('jf_descr')
         ofs2 = self.cpu.get_ofs_of_frame_field('jf_gcmap')
-        mc.POP_b(ofs2)
-        mc.POP_b(ofs)
+        if compact:
+            # we have instead the address of the entry of the guard in
+            # the table of write_compact_failure_recoveries()
+            mc.POP_r(ecx.value)
+            mc.MOV_rm(eax.value, (ecx.value, 0))
+            mc.MOV_br(ofs, eax.value)
+            mc.MOV_rm(eax.value, (ecx.value, WORD))
+            mc.MOV_br(ofs2, eax.value)
+        else:
+            mc.POP_b(ofs2)
+            mc.POP_b(ofs)
 
         # now we return from the complete frame, which starts from
         # _call_header_with_stack_check().  The _call_footer below does it.
         self._call_footer()
         rawstart = mc.materialize(self.cpu.asmmemmgr, [])
-        self.failure_recovery_code[exc + 2 * withfloats] = rawstart
+        if compact:
+            self.compact_failure_recovery_code[exc + 2 * withfloats] = rawstart
+        else:
+            self.failure_recovery_code[exc + 2 * withfloats] = rawstart
         self.mc = None
 
     def genop_finish(self, op, arglocs, result_loc):
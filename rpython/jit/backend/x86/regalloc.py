@@ -22,7 +22,7 @@ from rpython.jit.backend.x86.regloc import (FrameLoc, RegLoc, ConstFloatLoc,
 from rpython.jit.codewriter import longlong
 from rpython.jit.codewriter.effectinfo import EffectInfo
 from rpython.jit.metainterp.history import (Box, Const, ConstInt, ConstPtr,
-    ConstFloat, BoxInt, BoxFloat, INT, REF, FLOAT, TargetToken)
+    ConstFloat, BoxInt, BoxFloat, INT, REF, FLOAT, VECTOR, TargetToken)
 from rpython.jit.metainterp.resoperation import rop, ResOperation
 from rpython.rlib import rgc
 from rpython.rlib.objectmodel import we_are_translated
@@ -61,7 +61,7 @@ class X86_64_RegisterManager(X86RegisterManager):
 
 class X86XMMRegisterManager(RegisterManager):
 
-    box_types = [FLOAT]
+    box_types = [FLOAT, VECTOR]
     all_regs = [xmm0, xmm1, xmm2, xmm3, xmm4, xmm5, xmm6, xmm7]
     # we never need lower byte I hope
     save_around_call_regs = all_regs
@@ -100,6 +100,9 @@ class X86FrameManager(FrameManager):
     def frame_size(box_type):
         if IS_X86_32 and box_type == FLOAT:
             return 2
+        elif box_type == VECTOR:
+            assert IS_X86_64
+            return 2
         else:
             return 1
 
@@ -177,7 +180,7 @@ class RegAlloc(BaseRegalloc):
         return self.fm.get_frame_depth()
 
     def possibly_free_var(self, var):
-        if var.type == FLOAT:
+        if var.type == FLOAT or var.type == VECTOR:
             self.xrm.possibly_free_var(var)
         else:
             self.rm.possibly_free_var(var)
@@ -197,7 +200,7 @@ class RegAlloc(BaseRegalloc):
 
     def make_sure_var_in_reg(self, var, forbidden_vars=[],
                              selected_reg=None, need_lower_byte=False):
-        if var.type == FLOAT:
+        if var.type == FLOAT or var.type == VECTOR:
             if isinstance(var, ConstFloat):
                 return FloatImmedLoc(var.getfloatstorage())
             return self.xrm.make_sure_var_in_reg(var, forbidden_vars,
@@ -208,7 +211,7 @@ class RegAlloc(BaseRegalloc):
 
     def force_allocate_reg(self, var, forbidden_vars=[], selected_reg=None,
                            need_lower_byte=False):
-        if var.type == FLOAT:
+        if var.type == FLOAT or var.type == VECTOR:
             return self.xrm.force_allocate_reg(var, forbidden_vars,
                                                selected_reg, need_lower_byte)
         else:
@@ -216,7 +219,7 @@ class RegAlloc(BaseRegalloc):
                                               selected_reg, need_lower_byte)
 
     def force_spill_var(self, var):
-        if var.type == FLOAT:
+        if var.type == FLOAT or var.type == VECTOR:
             return self.xrm.force_spill_var(var)
         else:
             return self.rm.force_spill_var(var)
@@ -358,7 +361,7 @@ class RegAlloc(BaseRegalloc):
     def loc(self, v):
         if v is None: # xxx kludgy
             return None
-        if v.type == FLOAT:
+        if v.type == FLOAT or v.type == VECTOR:
             return self.xrm.loc(v)
         return self.rm.loc(v)
 
@@ -581,6 +584,23 @@ class RegAlloc(BaseRegalloc):
     consider_float_mul = _consider_float_op      # xxx could be _symm
     consider_float_truediv = _consider_float_op
 
+    def _consider_vec_float_op(self, op):
+        # unlike the scalar operations, these need a memory operand to be
+        # 16-bytes aligned, which is not the case of our frame locations
+        args = op.getarglist()
+        loc1 = self.xrm.make_sure_var_in_reg(op.getarg(1), args)
+        loc0 = self.xrm.force_result_in_reg(op.result, op.getarg(0), args)
+        self.perform(op, [loc0, loc1], loc0)
+
+    consider_vec_float_add = _consider_vec_float_op
+    consider_vec_float_sub = _consider_vec_float_op
+    consider_vec_float_mul = _consider_vec_float_op
+    consider_vec_float_truediv = _consider_vec_float_op
+
+    def consider_vec_float_splat(self, op):
+        loc0 = self.xrm.force_result_in_reg(op.result, op.getarg(0))
+        self.perform(op, [loc0], loc0)
+
     def _consider_float_cmp(self, op, guard_op):
         vx = op.getarg(0)
         vy = op.getarg(1)
@@ -1041,6 +1061,8 @@ class RegAlloc(BaseRegalloc):
 
     consider_setarrayitem_raw = consider_setarrayitem_gc
     consider_raw_store = consider_setarrayitem_gc
+    consider_vec_setarrayitem_raw = consider_setarrayitem_gc
+    consider_vec_raw_store = consider_setarrayitem_gc
 
     def consider_getfield_gc(self, op):
         ofs, size, sign = unpack_fielddescr(op.getdescr())
@@ -1080,6 +1102,8 @@ class RegAlloc(BaseRegalloc):
     consider_getarrayitem_gc_pure = consider_getarrayitem_gc
     consider_getarrayitem_raw_pure = consider_getarrayitem_gc
     consider_raw_load = consider_getarrayitem_gc
+    consider_vec_getarrayitem_raw = consider_getarrayitem_gc
+    consider_vec_raw_load = consider_getarrayitem_gc
 
     def consider_getinteriorfield_gc(self, op):
         t = unpack_interiorfielddescr(op.getdescr())
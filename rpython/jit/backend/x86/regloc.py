@@ -642,11 +642,16 @@ class LocationCodeBuilder(object):
 
     MOVSD = _binaryop('MOVSD')
     MOVAPD = _binaryop('MOVAPD')
+    MOVUPD = _binaryop('MOVUPD')
     ADDSD = _binaryop('ADDSD')
     ADDPD = _binaryop('ADDPD')
     SUBSD = _binaryop('SUBSD')
+    SUBPD = _binaryop('SUBPD')
     MULSD = _binaryop('MULSD')
+    MULPD = _binaryop('MULPD')
     DIVSD = _binaryop('DIVSD')
+    DIVPD = _binaryop('DIVPD')
+    UNPCKLPD = _binaryop('UNPCKLPD')
     UCOMISD = _binaryop('UCOMISD')
     CVTSI2SD = _binaryop('CVTSI2SD')
     CVTTSD2SI = _binaryop('CVTTSD2SI')
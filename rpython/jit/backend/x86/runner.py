@@ -19,6 +19,7 @@ class AbstractX86CPU(AbstractLLCPU):
     debug = True
     supports_floats = True
     supports_singlefloats = True
+    guard_class_switch_cases = 4
 
     dont_keepalive_stuff = False # for tests
     with_threads = False
@@ -103,6 +104,15 @@ class AbstractX86CPU(AbstractLLCPU):
         return self.assembler.assemble_bridge(faildescr, inputargs, operations,
                                               original_loop_token, log, logger)
 
+    def compile_bridge_for_class(self, faildescr, classbox, inputargs,
+                                 operations, original_loop_token, log=True,
+                                 logger=None):
+        clt = original_loop_token.compiled_loop_token
+        clt.compiling_a_bridge()
+        return self.assembler.assemble_bridge(faildescr, inputargs, operations,
+                                              original_loop_token, log, logger,
+                                              classbox=classbox)
+
     def clear_latest_values(self, count):
         setitem = self.assembler.fail_boxes_ptr.setitem
         null = lltype.nullptr(llmemory.GCREF.TO)
@@ -162,5 +172,6 @@ class CPU_X86_64(AbstractX86CPU):
     CALLEE_SAVE_REGISTERS = [regloc.ebx, regloc.r12, regloc.r13, regloc.r14, regloc.r15]
 
     IS_64_BIT = True
+    vector_extension = True
 
 CPU = CPU386
@@ -446,6 +446,41 @@ class TestX86(LLtypeBackendTest):
                 ops_offset[operations[2]] <=
                 ops_offset[None])
 
+    def test_compact_failure_recovery(self):
+        # a loop full of guards, compiled with one complete recovery stub
+        # per guard and with the compact stubs; compares the sizes
+        def compile(compact):
+            self.cpu.assembler.compact_failure_recovery = compact
+            i0 = BoxInt()
+            operations = []
+            for i in range(50):
+                i1 = BoxInt()
+                operations.append(ResOperation(rop.INT_NE,
+                                               [i0, ConstInt(i)], i1))
+                op = ResOperation(rop.GUARD_TRUE, [i1], None,
+                                  descr=BasicFailDescr(i))
+                op.setfailargs([i0])
+                operations.append(op)
+            operations.append(ResOperation(rop.FINISH, [i0], None,
+                                           descr=BasicFinalDescr(99)))
+            looptoken = JitCellToken()
+            info = self.cpu.compile_loop([i0], operations, looptoken)
+            stubs = (looptoken._x86_rawstart + looptoken._x86_fullsize -
+                     info.asmaddr - info.asmlen)
+            return looptoken, stubs
+        try:
+            old_token, old_stubs = compile(False)
+            new_token, new_stubs = compile(True)
+        finally:
+            del self.cpu.assembler.compact_failure_recovery
+        assert new_stubs * 2 < old_stubs
+        for looptoken in [old_token, new_token]:
+            for n, expected in [(0, 0), (26, 26), (49, 49), (99, 99)]:
+                deadframe = self.cpu.execute_token(looptoken, n)
+                fail = self.cpu.get_latest_descr(deadframe)
+                assert fail.identifier == expected
+                assert self.cpu.get_int_value(deadframe, 0) == n
+
     def test_calling_convention(self, monkeypatch):
         if WORD != 4:
             py.test.skip("32-bit only test")
@@ -0,0 +1,9 @@
+
+from rpython.jit.backend.x86.test.test_basic import Jit386Mixin
+from rpython.jit.metainterp.test.test_vectorize import VectorizeTests
+
+
+class TestVectorize(Jit386Mixin, VectorizeTests):
+    # for the individual tests see
+    # ====> ../../../metainterp/test/test_vectorize.py
+    pass
@@ -7,13 +7,14 @@ from rpython.jit.codewriter import support
 from rpython.jit.codewriter.jitcode import JitCode
 from rpython.jit.codewriter.effectinfo import (VirtualizableAnalyzer,
     QuasiImmutAnalyzer, RandomEffectsAnalyzer, effectinfo_from_writeanalyze,
-    EffectInfo, CallInfoCollection)
+    EffectInfo, CallInfoCollection, NOCAPTURE_MAX_ARGS)
 from rpython.rtyper.lltypesystem import lltype, llmemory
 from rpython.rtyper.typesystem import getfunctionptr
 from rpython.rlib import rposix
 from rpython.translator.backendopt.canraise import RaiseAnalyzer
 from rpython.translator.backendopt.writeanalyze import ReadWriteAnalyzer
 from rpython.translator.backendopt.graphanalyze import DependencyTracker
+from rpython.translator.backendopt.escape import CaptureAnalyzer
 
 
 class CallControl(object):
@@ -35,6 +36,7 @@ class CallControl(object):
             self.virtualizable_analyzer = VirtualizableAnalyzer(translator)
             self.quasiimmut_analyzer = QuasiImmutAnalyzer(translator)
             self.randomeffects_analyzer = RandomEffectsAnalyzer(translator)
+            self.capture_analyzer = CaptureAnalyzer(translator)
             self.seen = DependencyTracker(self.readwrite_analyzer)
         else:
             self.seen = None
@@ -284,10 +286,15 @@ class CallControl(object):
                 " but this contradicts other sources (e.g. it can have random"
                 " effects): EF=%s" % (op, extraeffect))
         #
+        nocapture_args = 0
+        if (extraeffect == EffectInfo.EF_CANNOT_RAISE or
+                extraeffect == EffectInfo.EF_CAN_RAISE):
+            nocapture_args = self._get_nocapture_args(op)
+        #
         effectinfo = effectinfo_from_writeanalyze(
             self.readwrite_analyzer.analyze(op, self.seen), self.cpu,
             extraeffect, oopspecindex, can_invalidate, call_release_gil_target,
-            extradescr,
+            extradescr, nocapture_args,
         )
         #
         assert effectinfo is not None
@@ -300,6 +307,26 @@ class CallControl(object):
         return self.cpu.calldescrof(FUNC, tuple(NON_VOID_ARGS), RESULT,
                                     effectinfo)
 
+    def _get_nocapture_args(self, op):
+        # bit 'i' is set if the callee does not capture the i-th argument
+        # of the CALL operation; like there, the function itself is
+        # argument 0 and the Void arguments are skipped
+        if op.opname != 'direct_call' and op.opname != 'indirect_call':
+            return 0
+        try:
+            flags = self.capture_analyzer.analyze_call(op)
+        except lltype.DelayedPointer:
+            return 0
+        result = 0
+        index = 1
+        for i in range(len(flags)):
+            if op.args[i + 1].concretetype is lltype.Void:
+                continue
+            if flags[i] and index < NOCAPTURE_MAX_ARGS:
+                result |= 1 << index
+            index += 1
+        return result
+
     def _canraise(self, op):
         if op.opname == 'pseudo_call_cannot_raise':
             return False
@@ -1,3 +1,5 @@
+import time
+
 from rpython.jit.codewriter import support, heaptracker
 from rpython.jit.codewriter.regalloc import perform_register_allocation
 from rpython.jit.codewriter.flatten import flatten_graph, KINDS
@@ -10,6 +12,10 @@ from rpython.jit.codewriter.policy import log
 from rpython.flowspace.model import copygraph
 from rpython.tool.udir import udir
 
+# the steps of transform_graph_to_jitcode(), in order, as reported by
+# make_jitcodes()
+STEPS = ['jtransform', 'regalloc', 'flatten', 'liveness', 'assemble', 'dump']
+
 
 class CodeWriter(object):
     callcontrol = None    # for tests
@@ -20,6 +26,12 @@ class CodeWriter(object):
         self.assembler = Assembler()
         self.callcontrol = CallControl(cpu, jitdrivers_sd)
         self._seen_files = set()
+        self.timings = dict.fromkeys(STEPS, 0.0)
+
+    def _step_done(self, step, start):
+        now = time.time()
+        self.timings[step] += now - start
+        return now
 
     def transform_func_to_jitcode(self, func, values):
         """For testing."""
@@ -34,35 +46,42 @@ class CodeWriter(object):
         in a different format.
         """
         portal_jd = self.callcontrol.jitdriver_sd_from_portal_graph(graph)
+        start = time.time()
         graph = copygraph(graph, shallowvars=True)
         #
         # step 1: mangle the graph so that it contains the final instructions
         # that we want in the JitCode, but still as a control flow graph
         transform_graph(graph, self.cpu, self.callcontrol, portal_jd)
+        start = self._step_done('jtransform', start)
         #
         # step 2: perform register allocation on it
         regallocs = {}
         for kind in KINDS:
             regallocs[kind] = perform_register_allocation(graph, kind)
+        start = self._step_done('regalloc', start)
         #
         # step 3: flatten the graph to produce human-readable "assembler",
         # which means mostly producing a linear list of operations and
         # inserting jumps or conditional jumps.  This is a list of tuples
         # of the shape ("opname", arg1, ..., argN) or (Label(...),).
         ssarepr = flatten_graph(graph, regallocs)
+        start = self._step_done('flatten', start)
         #
         # step 3b: compute the liveness around certain operations
         compute_liveness(ssarepr)
+        start = self._step_done('liveness', start)
         #
         # step 4: "assemble" it into a JitCode, which contains a sequence
         # of bytes and lists of constants.  It's during this step that
         # constants are cast to their normalized type (Signed, GCREF or
         # Float).
         self.assembler.assemble(ssarepr, jitcode)
+        start = self._step_done('assemble', start)
         #
         # print the resulting assembler
         if self.debug:
             self.print_ssa_repr(ssarepr, portal_jd, verbose)
+            self._step_done('dump', start)
 
     def make_jitcodes(self, verbose=False):
         log.info("making JitCodes...")
@@ -76,6 +95,16 @@ class CodeWriter(object):
         self.assembler.finished(self.callcontrol.callinfocollection)
         heaptracker.finish_registering(self.cpu)
         log.info("there are %d JitCode instances." % count)
+        self.log_timings()
+
+    def log_timings(self):
+        total = sum(self.timings.values())
+        if total <= 0.0:
+            return
+        log.info("time spent making JitCodes: %.1fs" % (total,))
+        for step in STEPS:
+            t = self.timings[step]
+            log.info("    %-12s %7.1fs  %5.1f%%" % (step, t, 100.0 * t / total))
 
     def setup_vrefinfo(self, vrefinfo):
         # must be called at most once
@@ -91,9 +120,10 @@ class CodeWriter(object):
         return self.callcontrol.find_all_graphs(policy)
 
     def print_ssa_repr(self, ssarepr, portal_jitdriver, verbose):
+        text = format_assembler(ssarepr)
         if verbose:
             print '%s:' % (ssarepr.name,)
-            print format_assembler(ssarepr)
+            print text
         else:
             log.dot()
         dir = udir.ensure("jitcodes", dir=1)
@@ -111,4 +141,4 @@ class CodeWriter(object):
             i += 1
             extra = '.%d' % i
         self._seen_files.add(name+extra)
-        dir.join(name+extra).write(format_assembler(ssarepr))
+        dir.join(name+extra).write(text)
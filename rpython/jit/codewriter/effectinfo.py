@@ -108,7 +108,10 @@ class EffectInfo(object):
                 oopspecindex=OS_NONE,
                 can_invalidate=False,
                 call_release_gil_target=_NO_CALL_RELEASE_GIL_TARGET,
-                extradescrs=None):
+                extradescrs=None,
+                nocapture_args=0):
+        if extraeffect >= EffectInfo.EF_FORCES_VIRTUAL_OR_VIRTUALIZABLE:
+            nocapture_args = 0
         key = (frozenset_or_none(readonly_descrs_fields),
                frozenset_or_none(readonly_descrs_arrays),
                frozenset_or_none(readonly_descrs_interiorfields),
@@ -117,7 +120,8 @@ class EffectInfo(object):
                frozenset_or_none(write_descrs_interiorfields),
                extraeffect,
                oopspecindex,
-               can_invalidate)
+               can_invalidate,
+               nocapture_args)
         tgt_func, tgt_saveerr = call_release_gil_target
         if tgt_func:
             key += (object(),)    # don't care about caching in this case
@@ -152,6 +156,7 @@ class EffectInfo(object):
         result.oopspecindex = oopspecindex
         result.extradescrs = extradescrs
         result.call_release_gil_target = call_release_gil_target
+        result.nocapture_args = nocapture_args
         if result.check_can_raise():
             assert oopspecindex in cls._OS_CANRAISE
         cls._cache[key] = result
@@ -173,6 +178,15 @@ class EffectInfo(object):
     def has_random_effects(self):
         return self.extraeffect >= self.EF_RANDOM_EFFECTS
 
+    def check_nocapture_arg(self, index):
+        """Check if the callee neither captures nor modifies the argument
+        'index' of the CALL operation, or anything reachable from it (see
+        CaptureAnalyzer in backendopt/escape.py).  Argument 0 is the
+        function itself.
+        """
+        return index < NOCAPTURE_MAX_ARGS and (
+            self.nocapture_args & (1 << index)) != 0
+
     def is_call_release_gil(self):
         tgt_func, tgt_saveerr = self.call_release_gil_target
         return bool(tgt_func)
@@ -184,6 +198,10 @@ class EffectInfo(object):
         return '<EffectInfo 0x%x: EF=%r%s>' % (id(self), self.extraeffect, more)
 
 
+# only the first arguments of a call are described by 'nocapture_args'
+NOCAPTURE_MAX_ARGS = 32
+
+
 def frozenset_or_none(x):
     if x is None:
         return None
@@ -200,7 +218,8 @@ def effectinfo_from_writeanalyze(effects, cpu,
                                  can_invalidate=False,
                                  call_release_gil_target=
                                      EffectInfo._NO_CALL_RELEASE_GIL_TARGET,
-                                 extradescr=None):
+                                 extradescr=None,
+                                 nocapture_args=0):
     from rpython.translator.backendopt.writeanalyze import top_set
     if effects is top_set or extraeffect == EffectInfo.EF_RANDOM_EFFECTS:
         readonly_descrs_fields = None
@@ -285,7 +304,8 @@ def effectinfo_from_writeanalyze(effects, cpu,
                       oopspecindex,
                       can_invalidate,
                       call_release_gil_target,
-                      extradescr)
+                      extradescr,
+                      nocapture_args)
 
 def consider_struct(TYPE, fieldname):
     if fieldType(TYPE, fieldname) is lltype.Void:
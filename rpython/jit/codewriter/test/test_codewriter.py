@@ -232,3 +232,19 @@ def test_raw_malloc_and_access():
     assert 'setarrayitem_raw_i' in s
     assert 'getarrayitem_raw_i' in s
     assert 'residual_call_ir_v $<* fn _ll_1_raw_free__arrayPtr>' in s
+
+def test_timings():
+    from rpython.jit.codewriter.codewriter import STEPS
+    def ggg(x):
+        return x * 2
+    def fff(a, b):
+        return ggg(b) - ggg(a)
+    rtyper = support.annotate(fff, [35, 42])
+    jitdriver_sd = FakeJitDriverSD(rtyper.annotator.translator.graphs[0])
+    cw = CodeWriter(FakeCPU(rtyper), [jitdriver_sd])
+    cw.find_all_graphs(FakePolicy())
+    cw.make_jitcodes(verbose=False)
+    assert sorted(cw.timings) == sorted(STEPS)
+    for step in STEPS:
+        assert cw.timings[step] >= 0.0
+    assert sum(cw.timings.values()) > 0.0
@@ -1,9 +1,9 @@
 import weakref
 from rpython.rtyper.lltypesystem import lltype, llmemory
 from rpython.rtyper.annlowlevel import cast_instance_to_gcref
-from rpython.rlib.objectmodel import we_are_translated
+from rpython.rlib.objectmodel import we_are_translated, compute_unique_id
 from rpython.rlib.debug import debug_start, debug_stop, debug_print
-from rpython.rlib.rarithmetic import r_uint, intmask
+from rpython.rlib.rarithmetic import r_uint, intmask, LONG_BIT
 from rpython.rlib import rstack
 from rpython.rlib.jit import JitDebugInfo, Counters, dont_look_inside
 from rpython.conftest import option
@@ -12,7 +12,7 @@ from rpython.tool.sourcetools import func_with_new_name
 from rpython.jit.metainterp.resoperation import ResOperation, rop, get_deep_immutable_oplist
 from rpython.jit.metainterp.history import (TreeLoop, Box, JitCellToken,
     TargetToken, AbstractFailDescr, BoxInt, BoxPtr, BoxFloat, ConstInt)
-from rpython.jit.metainterp import history, jitexc
+from rpython.jit.metainterp import history, jitexc, jitprof
 from rpython.jit.metainterp.optimize import InvalidLoop
 from rpython.jit.metainterp.inliner import Inliner
 from rpython.jit.metainterp.resume import NUMBERING, PENDINGFIELDSP, ResumeDataDirectReader
@@ -42,9 +42,13 @@ def show_procedures(metainterp_sd, procedure=None, error=None):
                                  metainterp_sd=metainterp_sd)
 
 def create_empty_loop(metainterp, name_prefix=''):
-    name = metainterp.staticdata.stats.name_for_new_loop()
+    return _create_empty_loop(metainterp.staticdata,
+                              metainterp.call_pure_results, name_prefix)
+
+def _create_empty_loop(metainterp_sd, call_pure_results, name_prefix=''):
+    name = metainterp_sd.stats.name_for_new_loop()
     loop = TreeLoop(name_prefix + name)
-    loop.call_pure_results = metainterp.call_pure_results
+    loop.call_pure_results = call_pure_results
     return loop
 
 
@@ -110,12 +114,57 @@ def compile_loop(metainterp, greenkey, start,
     """Try to compile a new procedure by closing the current history back
     to the first operation.
     """
+    return _compile_loop(metainterp.staticdata, metainterp.jitdriver_sd,
+                         greenkey, metainterp.history.operations, start,
+                         inputargs, jumpargs, metainterp.call_pure_results,
+                         try_disabling_unroll)
+
+def compile_pending_loop(metainterp_sd, pending):
+    """Compile a loop that was put in the CompileQueue at the end of
+    tracing, instead of being compiled immediately (see compilequeue.py).
+    Returns True if it worked.
+    """
+    jitdriver_sd = pending.jitdriver_sd
+    warmstate = jitdriver_sd.warmstate
+    greenkey = pending.greenkey
+    warmstate.clear_compile_pending(greenkey)
+    cell = warmstate.JitCell.get_jit_cell_at_key(greenkey)
+    if cell is not None:
+        token = cell.get_procedure_token()
+        if token is not None and token.target_tokens is not None:
+            return False     # we got a loop from somewhere else meanwhile
+    from rpython.jit.metainterp.pyjitpl import SwitchToBlackhole
+    target_token = None
+    for try_disabling_unroll in [False, True]:
+        # like MetaInterp.compile_loop_or_abort(), but we can't go on
+        # tracing: if it fails, try at once without unrolling
+        try:
+            target_token = _compile_loop(metainterp_sd, jitdriver_sd,
+                                         greenkey, pending.operations, 0,
+                                         pending.inputargs, pending.jumpargs,
+                                         pending.call_pure_results,
+                                         try_disabling_unroll)
+        except SwitchToBlackhole, stb:
+            # the optimizer gave up (e.g. too many failargs), which would
+            # abort the tracing; there is no tracing to abort here
+            debug_print("compile_pending_loop: giving up, reason",
+                        stb.reason)
+            return False
+        if target_token is not None:
+            break
+    else:
+        return False
+    assert isinstance(target_token, TargetToken)
+    jitcell_token = target_token.targeting_jitcell_token
+    warmstate.attach_procedure_to_interp(greenkey, jitcell_token)
+    metainterp_sd.stats.add_jitcell_token(jitcell_token)
+    return True
+
+def _compile_loop(metainterp_sd, jitdriver_sd, greenkey, h_ops, start,
+                  inputargs, jumpargs, call_pure_results,
+                  try_disabling_unroll=False):
     from rpython.jit.metainterp.optimizeopt import optimize_trace
 
-    metainterp_sd = metainterp.staticdata
-    jitdriver_sd = metainterp.jitdriver_sd
-    history = metainterp.history
-
     enable_opts = jitdriver_sd.warmstate.enable_opts
     if try_disabling_unroll:
         if 'unroll' not in enable_opts:
@@ -124,9 +173,8 @@ def compile_loop(metainterp, greenkey, start,
         del enable_opts['unroll']
 
     jitcell_token = make_jitcell_token(jitdriver_sd)
-    part = create_empty_loop(metainterp)
+    part = _create_empty_loop(metainterp_sd, call_pure_results)
     part.inputargs = inputargs[:]
-    h_ops = history.operations
     label = ResOperation(rop.LABEL, inputargs, None,
                          descr=TargetToken(jitcell_token))
     end_label = ResOperation(rop.LABEL, jumpargs, None, descr=jitcell_token)
@@ -141,7 +189,7 @@ def compile_loop(metainterp, greenkey, start,
     assert isinstance(target_token, TargetToken)
     all_target_tokens = [target_token]
 
-    loop = create_empty_loop(metainterp)
+    loop = _create_empty_loop(metainterp_sd, call_pure_results)
     loop.inputargs = part.inputargs
     loop.operations = part.operations
     loop.quasi_immutable_deps = {}
@@ -165,6 +213,10 @@ def compile_loop(metainterp, greenkey, start,
                            start_state=start_state, export_state=False)
         except InvalidLoop:
             return None
+        if jitdriver_sd.warmstate.vec and metainterp_sd.cpu.vector_extension:
+            from rpython.jit.metainterp.optimizeopt.vectorize import (
+                optimize_vector)
+            optimize_vector(metainterp_sd, jitdriver_sd, part)
 
         loop.operations = loop.operations[:-1] + part.operations
         if part.quasi_immutable_deps:
@@ -217,6 +269,13 @@ def compile_retrace(metainterp, greenkey, start,
         optimize_trace(metainterp_sd, jitdriver_sd, part,
                        jitdriver_sd.warmstate.enable_opts,
                        start_state=start_state, export_state=False)
+        # count the retraces that closed a loop specialized for the new
+        # virtual state, not the ones that jumped to the preamble or to
+        # another target token; see UnrollOptimizer.may_raise_retrace_limit()
+        jumpop = part.operations[-1]
+        if (jumpop.getopnum() == rop.JUMP and
+                jumpop.getdescr() is label.getdescr()):
+            loop_jitcell_token.retrace_successes += 1
     except InvalidLoop:
         # Fall back on jumping to preamble
         target_token = label.getdescr()
@@ -312,13 +371,42 @@ def do_compile_loop(metainterp_sd, inputargs, operations, looptoken,
                                           logger=metainterp_sd.logger_ops)
 
 def do_compile_bridge(metainterp_sd, faildescr, inputargs, operations,
-                      original_loop_token, log=True):
+                      original_loop_token, log=True, classbox=None):
     metainterp_sd.logger_ops.log_bridge(inputargs, operations, "compiling")
     assert isinstance(faildescr, AbstractFailDescr)
+    if classbox is not None:
+        return metainterp_sd.cpu.compile_bridge_for_class(faildescr,
+                    classbox, inputargs, operations, original_loop_token,
+                    log=log, logger=metainterp_sd.logger_ops)
     return metainterp_sd.cpu.compile_bridge(faildescr, inputargs, operations,
                                             original_loop_token, log=log,
                                             logger=metainterp_sd.logger_ops)
 
+# rough sizes in bytes, used by estimate_memory_size()
+WORD = LONG_BIT // 8
+GUARD_DESCR_SIZE = 12 * WORD    # the descr itself and its GC header
+NUMBERING_HEADER_SIZE = 3 * WORD
+
+def estimate_memory_size(operations, asminfo):
+    """Estimate how many bytes the loop or bridge made of 'operations'
+    costs, for the memory budget of the memmgr: the machine code, plus
+    the descrs and resume data of the guards.
+    """
+    size = 0
+    if asminfo is not None:
+        size += asminfo.asmlen
+    for op in operations:
+        descr = op.getdescr()
+        if isinstance(descr, ResumeGuardDescr):
+            size += GUARD_DESCR_SIZE + descr.rd_count * WORD
+            # the 'prev' part of the numbering is usually shared with
+            # other guards, only count the part specific to this guard
+            if descr.rd_numb:
+                size += NUMBERING_HEADER_SIZE + len(descr.rd_numb.code)
+            if descr.rd_virtuals is not None:
+                size += len(descr.rd_virtuals) * 4 * WORD
+    return size
+
 def send_loop_to_backend(greenkey, jitdriver_sd, metainterp_sd, loop, type):
     vinfo = jitdriver_sd.virtualizable_info
     if vinfo is not None:
@@ -370,10 +458,15 @@ def send_loop_to_backend(greenkey, jitdriver_sd, metainterp_sd, loop, type):
                                       name=loopname)
     #
     if metainterp_sd.warmrunnerdesc is not None:    # for tests
-        metainterp_sd.warmrunnerdesc.memory_manager.keep_loop_alive(original_jitcell_token)
+        memmgr = metainterp_sd.warmrunnerdesc.memory_manager
+        memmgr.keep_loop_alive(original_jitcell_token)
+        memmgr.record_size(original_jitcell_token,
+                           estimate_memory_size(operations, asminfo))
+        record_locations(metainterp_sd.warmrunnerdesc.loop_stats, 'e', n,
+                         operations, loopname)
 
 def send_bridge_to_backend(jitdriver_sd, metainterp_sd, faildescr, inputargs,
-                           operations, original_loop_token):
+                           operations, original_loop_token, classbox=None):
     if not we_are_translated():
         show_procedures(metainterp_sd)
         seen = dict.fromkeys(inputargs)
@@ -393,7 +486,8 @@ def send_bridge_to_backend(jitdriver_sd, metainterp_sd, faildescr, inputargs,
     try:
         asminfo = do_compile_bridge(metainterp_sd, faildescr, inputargs,
                                     operations,
-                                    original_loop_token)
+                                    original_loop_token,
+                                    classbox=classbox)
     finally:
         debug_stop("jit-backend")
     metainterp_sd.profiler.end_backend()
@@ -414,6 +508,25 @@ def send_bridge_to_backend(jitdriver_sd, metainterp_sd, faildescr, inputargs,
     #if metainterp_sd.warmrunnerdesc is not None:    # for tests
     #    metainterp_sd.warmrunnerdesc.memory_manager.keep_loop_alive(
     #        original_loop_token)
+    if metainterp_sd.warmrunnerdesc is not None:    # for tests
+        metainterp_sd.warmrunnerdesc.memory_manager.record_size(
+            original_loop_token, estimate_memory_size(operations, asminfo))
+        loop_stats = metainterp_sd.warmrunnerdesc.loop_stats
+        record_locations(loop_stats, 'b', compute_unique_id(faildescr),
+                         operations,
+                         loop_stats.get_location('e', original_loop_token.number))
+
+def record_locations(loop_stats, tp, number, operations, location):
+    """Record in 'loop_stats' that the loop or bridge 'number' and its
+    labels come from 'location', if pypyjit.enable_debug() was called.
+    """
+    if not loop_stats.enabled:
+        return
+    loop_stats.record_location(tp, number, location)
+    for op in operations:
+        if op.getopnum() == rop.LABEL:
+            loop_stats.record_location('l', compute_unique_id(op.getdescr()),
+                                       location)
 
 # ____________________________________________________________
 
@@ -489,14 +602,16 @@ class ResumeDescr(AbstractFailDescr):
 
 class ResumeGuardDescr(ResumeDescr):
     _attrs_ = ('rd_numb', 'rd_count', 'rd_consts', 'rd_virtuals',
-               'rd_frame_info_list', 'rd_pendingfields', 'status')
-    
+               'rd_frame_info_list', 'rd_pendingfields', 'rd_knowledge',
+               'status')
+
     rd_numb = lltype.nullptr(NUMBERING)
     rd_count = 0
     rd_consts = None
     rd_virtuals = None
     rd_frame_info_list = None
     rd_pendingfields = lltype.nullptr(PENDINGFIELDSP.TO)
+    rd_knowledge = None    # a bridgeopt.GuardKnowledge, or None
 
     status = r_uint(0)
 
@@ -508,6 +623,7 @@ class ResumeGuardDescr(ResumeDescr):
         self.rd_pendingfields = other.rd_pendingfields
         self.rd_virtuals = other.rd_virtuals
         self.rd_numb = other.rd_numb
+        self.rd_knowledge = other.rd_knowledge
         # we don't copy status
 
     ST_BUSY_FLAG    = 0x01     # if set, busy tracing from the guard
@@ -531,7 +647,9 @@ class ResumeGuardDescr(ResumeDescr):
             self.status = hash & self.ST_SHIFT_MASK
 
     def handle_fail(self, deadframe, metainterp_sd, jitdriver_sd):
+        busy = self.status & self.ST_BUSY_FLAG
         if self.must_compile(deadframe, metainterp_sd, jitdriver_sd):
+            self.record_failure(metainterp_sd, jitprof.GUARD_TRACING)
             self.start_compiling()
             try:
                 self._trace_and_compile_from_bridge(deadframe, metainterp_sd,
@@ -540,9 +658,26 @@ class ResumeGuardDescr(ResumeDescr):
                 self.done_compiling()
         else:
             from rpython.jit.metainterp.blackhole import resume_in_blackhole
+            if busy:
+                self.record_failure(metainterp_sd, jitprof.GUARD_BUSY)
+            else:
+                self.record_failure(metainterp_sd, jitprof.GUARD_COUNTING)
             resume_in_blackhole(metainterp_sd, jitdriver_sd, self, deadframe)
         assert 0, "unreachable"
 
+    def record_failure(self, metainterp_sd, reason):
+        if metainterp_sd.warmrunnerdesc is None:    # for tests
+            return
+        loop_stats = metainterp_sd.warmrunnerdesc.loop_stats
+        if loop_stats.enabled:
+            loop_number = -1
+            if self.rd_loop_token is not None:
+                looptoken = self.rd_loop_token.loop_token_wref()
+                if looptoken is not None:
+                    loop_number = looptoken.number
+            loop_stats.guard_failed(compute_unique_id(self), loop_number,
+                                    reason)
+
     def _trace_and_compile_from_bridge(self, deadframe, metainterp_sd,
                                        jitdriver_sd):
         # 'jitdriver_sd' corresponds to the outermost one, i.e. the one
@@ -626,7 +761,12 @@ class ResumeGuardDescr(ResumeDescr):
         propagate_original_jitcell_token(new_loop)
         send_bridge_to_backend(metainterp.jitdriver_sd, metainterp.staticdata,
                                self, inputargs, new_loop.operations,
-                               new_loop.original_jitcell_token)
+                               new_loop.original_jitcell_token,
+                               classbox=self.take_case_classbox())
+
+    def take_case_classbox(self):
+        # overridden in ResumeGuardClassDescr
+        return None
 
     def make_a_counter_per_value(self, guard_value_op):
         assert guard_value_op.getopnum() == rop.GUARD_VALUE
@@ -654,6 +794,63 @@ class ResumeGuardIsnullDescr(ResumeGuardDescr):
 
 class ResumeGuardClassDescr(ResumeGuardDescr):
     guard_opnum = rop.GUARD_CLASS
+    _attrs_ = ('class_index', 'num_class_cases', 'case_classbox')
+
+    # If the backend supports it (cpu.guard_class_switch_cases), a
+    # GUARD_CLASS that fails gets one bridge per class of the object
+    # instead of a single one, and dispatches on the class to the right
+    # bridge.  Without it, a polymorphic site ends up as a chain of
+    # bridges, each one failing its own GUARD_CLASS to reach the next
+    # one.  We count the failures separately for each class, like
+    # GUARD_VALUE does for each value.  Once the guard dispatches to
+    # 'guard_class_switch_cases' bridges, the next bridge is attached in
+    # the usual way and gets all the other classes.  The bridges still
+    # start with their own GUARD_CLASS, so the dispatching is only a
+    # shortcut, not something that the bridges rely on.
+    class_index = -1       # index of the object in the failargs, or -1
+    num_class_cases = 0
+    case_classbox = None   # the class of the bridge being traced, if any
+
+    def make_a_counter_per_class(self, guard_class_op, cpu):
+        assert guard_class_op.getopnum() == rop.GUARD_CLASS
+        if cpu.guard_class_switch_cases == 0:
+            return
+        box = guard_class_op.getarg(0)
+        try:
+            self.class_index = guard_class_op.getfailargs().index(box)
+        except ValueError:
+            pass     # the object is not in the failargs, probably rare
+
+    def must_compile(self, deadframe, metainterp_sd, jitdriver_sd):
+        self.case_classbox = None
+        cpu = metainterp_sd.cpu
+        if (self.class_index < 0 or self.status & self.ST_BUSY_FLAG or
+                self.num_class_cases >= cpu.guard_class_switch_cases):
+            return ResumeGuardDescr.must_compile(self, deadframe,
+                                                 metainterp_sd, jitdriver_sd)
+        from rpython.rlib.objectmodel import current_object_addr_as_int
+        ref = cpu.get_ref_value(deadframe, self.class_index)
+        classbox = cpu.ts.cls_of_box(BoxPtr(ref))
+        intval = classbox.getint()
+        if not we_are_translated():
+            if isinstance(intval, llmemory.AddressAsInt):
+                intval = llmemory.cast_adr_to_int(
+                    llmemory.cast_int_to_adr(intval), "forced")
+        hash = r_uint(current_object_addr_as_int(self) * 777767777 +
+                      intval * 1442968193)
+        jitcounter = metainterp_sd.warmrunnerdesc.jitcounter
+        increment = jitdriver_sd.warmstate.increment_trace_eagerness
+        if not jitcounter.tick(hash, increment):
+            return False
+        self.case_classbox = classbox
+        return True
+
+    def take_case_classbox(self):
+        classbox = self.case_classbox
+        if classbox is not None:
+            self.case_classbox = None
+            self.num_class_cases += 1
+        return classbox
 
 class ResumeGuardTrueDescr(ResumeGuardDescr):
     guard_opnum = rop.GUARD_TRUE
@@ -717,6 +914,7 @@ class ResumeGuardForcedDescr(ResumeGuardDescr):
         # the virtualrefs and virtualizable have been forced by
         # handle_async_forcing() just a moment ago.
         from rpython.jit.metainterp.blackhole import resume_in_blackhole
+        self.record_failure(metainterp_sd, jitprof.GUARD_FORCED)
         hidden_all_virtuals = metainterp_sd.cpu.get_savedata_ref(deadframe)
         obj = AllVirtuals.show(metainterp_sd.cpu, hidden_all_virtuals)
         all_virtuals = obj.cache
@@ -834,6 +1032,10 @@ def compile_trace(metainterp, resumekey):
     new_trace.inputargs = metainterp.history.inputargs[:]
 
     new_trace.operations = metainterp.history.operations[:]
+    if isinstance(resumekey, ResumeGuardDescr):
+        # let the optimizer start from what it knew at the guard
+        new_trace.bridge_knowledge = resumekey.rd_knowledge
+        new_trace.bridge_liveboxes = metainterp.resumed_liveboxes
     metainterp_sd = metainterp.staticdata
     jitdriver_sd = metainterp.jitdriver_sd
     state = jitdriver_sd.warmstate
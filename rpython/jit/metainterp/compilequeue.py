@@ -0,0 +1,97 @@
+from rpython.rlib.debug import debug_start, debug_print, debug_stop
+
+#
+# Logic to delay the optimization and assembly of the loops.
+#
+# Normally, as soon as the metainterp closes a loop, the thread that was
+# tracing optimizes the trace and assembles it, which can take several
+# milliseconds for a big loop.  If the 'compile_queue' parameter is
+# positive, the trace is instead stored in the CompileQueue, and the
+# metainterp goes back to interpreting (like after a normal compilation,
+# see MetaInterp.raise_continue_running_normally()).  The loop is only
+# optimized and assembled when compile_pending() is called, typically by
+# pypyjit.compile_pending() when the program is idle.  Once it is done,
+# attach_procedure_to_interp() installs it, redirecting the
+# CALL_ASSEMBLERs that pointed to a temporary token.
+#
+# The traces stay valid while they wait: everything the trace depends on
+# is checked by its guards, and the quasi-immutable fields are checked by
+# the optimizer, which only runs in compile_pending().  While a loop is
+# pending, its JitCell has the JC_COMPILE_PENDING flag, so that we don't
+# trace it a second time.
+#
+# Note that compile_pending() runs in the thread that calls it: the
+# optimizer and the backends allocate GC objects and share a lot of
+# state with the running program, so they can only run while holding
+# the GIL, like the rest of the interpreter.
+#
+# If the queue is full, or for bridges and retraces, the trace is
+# compiled immediately as usual.
+#
+
+class PendingLoop(object):
+    """ A trace that was recorded, and that waits in the CompileQueue to
+    be optimized and assembled by compile.compile_pending_loop().
+    """
+    def __init__(self, jitdriver_sd, greenkey, operations, inputargs,
+                 jumpargs, call_pure_results):
+        self.jitdriver_sd = jitdriver_sd
+        self.greenkey = greenkey
+        self.operations = operations
+        self.inputargs = inputargs
+        self.jumpargs = jumpargs
+        self.call_pure_results = call_pure_results
+
+
+class CompileQueue(object):
+
+    def __init__(self):
+        self.max_length = 0       # 0: compile the loops immediately
+        self.pending = []
+        # counters, for pypyjit.get_stats_snapshot()
+        self.num_deferred = 0
+        self.num_compiled = 0
+        self.num_failed = 0
+
+    def set_max_length(self, max_length):
+        if max_length <= 0:
+            self.max_length = 0
+        else:
+            self.max_length = max_length
+
+    def can_defer(self):
+        return len(self.pending) < self.max_length
+
+    def defer_loop(self, pending):
+        self.pending.append(pending)
+        self.num_deferred += 1
+
+    def compile_pending(self, metainterp_sd):
+        """Optimize and assemble all the pending loops.  Returns the
+        number of loops that were compiled.
+        """
+        from rpython.jit.metainterp.compile import compile_pending_loop
+        if not self.pending:
+            return 0
+        pending = self.pending
+        self.pending = []
+        debug_start("jit-compile-queue")
+        debug_print("compiling", len(pending), "pending loops")
+        compiled = 0
+        for i in range(len(pending)):
+            if compile_pending_loop(metainterp_sd, pending[i]):
+                compiled += 1
+            else:
+                self.num_failed += 1
+            pending[i] = None      # free the trace early
+        self.num_compiled += compiled
+        debug_print("done,", compiled, "compiled")
+        debug_stop("jit-compile-queue")
+        return compiled
+
+    def forget_pending(self):
+        """Drop all the pending loops, for tests."""
+        for pending in self.pending:
+            pending.jitdriver_sd.warmstate.clear_compile_pending(
+                pending.greenkey)
+        self.pending = []
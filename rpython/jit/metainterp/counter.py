@@ -59,7 +59,8 @@ class JitCounter:
     'reset(hash)', 'change_current_fraction(hash, new_time_value)'
     change the time value associated with a hash.  The former resets
     it to zero, and the latter changes it to the given value (which
-    should be a value close to 1.0).
+    should be a value close to 1.0).  'get_current_fraction(hash)'
+    returns the time value, or 0.0 if the hash is not in the table.
 
     'set_decay(decay)', 'decay_all_counters()' is used to globally
     reduce all the stored time values.  They all get multiplied by
@@ -78,6 +79,9 @@ class JitCounter:
     'cleanup_chain(hash)' resets the timetable's 'hash' entry and
     cleans up the celltable at 'hash'.  It removes those JitCells
     for which 'cell.should_remove_jitcell()' returns True.
+
+    'get_all_cells()' returns a list of all the JitCells of the
+    celltable, e.g. to dump a profile of the hot greenkeys.
     """
     DEFAULT_SIZE = 2048
 
@@ -229,6 +233,14 @@ class JitCounter:
         p_entry.subhashes[0] = rffi.cast(rffi.USHORT, subhash)
         p_entry.times[0]     = r_singlefloat(new_fraction)
 
+    def get_current_fraction(self, hash):
+        p_entry = self.timetable[self._get_index(hash)]
+        subhash = self._get_subhash(hash)
+        for i in range(5):
+            if p_entry.subhashes[i] == subhash:
+                return float(p_entry.times[i])
+        return 0.0
+
     def reset(self, hash):
         p_entry = self.timetable[self._get_index(hash)]
         subhash = self._get_subhash(hash)
@@ -239,6 +251,15 @@ class JitCounter:
     def lookup_chain(self, hash):
         return self.celltable[self._get_index(hash)]
 
+    def get_all_cells(self):
+        result = []
+        for index in range(self.size):
+            cell = self.celltable[index]
+            while cell is not None:
+                result.append(cell)
+                cell = cell.next
+        return result
+
     def cleanup_chain(self, hash):
         self.reset(hash)
         self.install_new_cell(hash, None)
@@ -323,6 +344,16 @@ class DeterministicJitCounter(JitCounter):
         "NOT_RPYTHON"
         pass
 
+    def get_all_cells(self):
+        "NOT_RPYTHON"
+        result = []
+        for index in sorted(self.celltable):
+            cell = self.celltable[index]
+            while cell is not None:
+                result.append(cell)
+                cell = cell.next
+        return result
+
     def _clear_all(self):
         self.timetable.clear()
         self.celltable.clear()
@@ -338,6 +338,15 @@ def _make_execute_list():
                          rop.CALL_MALLOC_NURSERY_VARSIZE,
                          rop.CALL_MALLOC_NURSERY_VARSIZE_FRAME,
                          rop.LABEL,
+                         rop.VEC_FLOAT_ADD,
+                         rop.VEC_FLOAT_SUB,
+                         rop.VEC_FLOAT_MUL,
+                         rop.VEC_FLOAT_TRUEDIV,
+                         rop.VEC_FLOAT_SPLAT,
+                         rop.VEC_RAW_LOAD,
+                         rop.VEC_GETARRAYITEM_RAW,
+                         rop.VEC_RAW_STORE,
+                         rop.VEC_SETARRAYITEM_RAW,
                          ):      # list of opcodes never executed by pyjitpl
                 continue
             raise AssertionError("missing %r" % (key,))
@@ -140,6 +140,13 @@ class HeapCache(object):
             # its argument
             # XXX really?
             pass
+        elif (opnum == rop.CALL and
+              descr.get_extra_info().nocapture_args != 0):
+            # the callee neither keeps nor modifies some of the arguments
+            effectinfo = descr.get_extra_info()
+            for i in range(len(argboxes)):
+                if not effectinfo.check_nocapture_arg(i):
+                    self._escape_box(argboxes[i])
         # GETFIELD_GC, MARK_OPAQUE_PTR, PTR_EQ, and PTR_NE don't escape their
         # arguments
         elif (opnum != rop.GETFIELD_GC and
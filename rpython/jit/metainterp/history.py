@@ -19,6 +19,7 @@ FLOAT = 'f'
 STRUCT = 's'
 HOLE  = '_'
 VOID  = 'v'
+VECTOR = 'V'
 
 FAILARGS_LIMIT = 1000
 
@@ -153,7 +154,12 @@ class AbstractFailDescr(AbstractDescr):
 
     _attrs_ = ('adr_jump_offset', 'rd_locs', 'rd_loop_token',
                '_asmjs_block', '_asmjs_faillocs', '_asmjs_failkinds',
-               '_asmjs_failvars', '_asmjs_hasexc', '_asmjs_gcmap')
+               '_asmjs_failvars', '_asmjs_hasexc', '_asmjs_gcmap',
+               '_x86_class_reg', '_x86_class_switch',
+               '_x86_recovery_entry')
+    _x86_class_reg = -1          # for compile_bridge_for_class() in x86
+    _x86_class_switch = None
+    _x86_recovery_entry = 0      # for the compact recovery stubs of x86
 
     def handle_fail(self, deadframe, metainterp_sd, jitdriver_sd):
         raise NotImplementedError
@@ -384,6 +390,8 @@ class Box(AbstractValue):
                     t = 'i'
                 elif self.type == FLOAT:
                     t = 'f'
+                elif self.type == VECTOR:
+                    t = 'v'
                 else:
                     t = 'p'
             except AttributeError:
@@ -469,6 +477,36 @@ class BoxFloat(Box):
     def repr_rpython(self):
         return repr_rpython(self, 'bf')
 
+class BoxVector(Box):
+    """A box for a vector of floats, as produced by the vectorizer.
+
+    Vectors only live within a single iteration of a loop: they are never
+    passed as failargs or jump arguments, so they carry no value here.
+    """
+    type = VECTOR
+    _attrs_ = ('count',)
+
+    def __init__(self, count=2):
+        self.count = count
+
+    def forget_value(self):
+        pass
+
+    def clonebox(self):
+        return BoxVector(self.count)
+
+    def constbox(self):
+        assert False, "vectors cannot be constants"
+
+    def nonnull(self):
+        return True
+
+    def _getrepr_(self):
+        return 'vector%d' % (self.count,)
+
+    def repr_rpython(self):
+        return repr_rpython(self, 'bv')
+
 class BoxPtr(Box):
     type = REF
     _attrs_ = ('value',)
@@ -566,12 +604,15 @@ class JitCellToken(AbstractDescr):
     target_tokens = None
     failed_states = None
     retraced_count = 0
+    retrace_successes = 0   # number of retraces that closed a new loop
+    retrace_limit_raised = 0
     terminating = False # see TerminatingLoopToken in compile.py
     invalidated = False
     outermost_jitdriver_sd = None
     # and more data specified by the backend when the loop is compiled
     number = -1
     generation = r_int64(0)
+    memory_size = 0     # estimated, see compile.estimate_memory_size()
     # one purpose of LoopToken is to keep alive the CompiledLoopToken
     # returned by the backend.  When the LoopToken goes away, the
     # CompiledLoopToken has its __del__ called, which frees the assembler
@@ -626,6 +667,8 @@ class TreeLoop(object):
     inputargs = None
     operations = None
     call_pure_results = None
+    bridge_knowledge = None   # see optimizeopt/bridgeopt.py
+    bridge_liveboxes = None
     logops = None
     quasi_immutable_deps = None
 
@@ -0,0 +1,76 @@
+#
+# Profiles of the hot greenkeys, to warm up a new process faster.
+#
+# A fresh process has to count 'threshold' iterations of every loop before
+# tracing it, even if the previous process running the same program found
+# out long ago that the loop is hot.  For programs that are restarted
+# often, this warm-up is a large part of the total run time.
+#
+# dump_profile() returns a text with one line per greenkey that has a
+# JitCell: the name of the jitdriver, the fraction of the threshold
+# reached (in 1/1000, or 1000 if the loop was compiled), and the location
+# of the greenkey as given by get_printable_location().  The greenkeys
+# without a JitCell are not in the profile: the JitCounter only knows
+# their hashes, which are different in the next process anyway.
+#
+# load_profile() reads such a text in the new process.  The greenkeys
+# are identified by their location only: the first time we see a
+# greenkey with the same location, its counter starts at the fraction
+# from the profile instead of at 0.0 (see seed_from_hotness_profile() in
+# warmstate.py).  The fraction is capped at SEED_MAX, so that a loop that
+# was compiled in the previous process is traced after two iterations.
+# The jitdrivers without get_printable_location() are not profiled.
+#
+# Looking up the seeds builds a location string, so it is only done for
+# the first SEED_LOOKUPS greenkeys that are not in the JitCounter yet.
+# After that, the seeds that were not used are dropped: the profile is
+# most likely stale.
+#
+
+SEED_MAX = 0.999
+SEED_LOOKUPS = 10000
+
+
+def dump_profile(warmrunnerdesc):
+    """Return the text of the profile of the hot greenkeys of all the
+    jitdrivers.
+    """
+    lines = []
+    for jd in warmrunnerdesc.jitdrivers_sd:
+        state = jd.warmstate
+        entries = []
+        state.collect_hotness_profile(entries)
+        for location, fraction in entries:
+            if '\n' in location:
+                continue
+            permille = int(fraction * 1000.0)
+            if permille <= 0:
+                continue
+            lines.append('%s %d %s\n' % (state.jitdriver_name, permille,
+                                        location))
+    return ''.join(lines)
+
+
+def load_profile(warmrunnerdesc, data):
+    """Load a profile returned by dump_profile() in a previous process.
+    Invalid lines are ignored.  Returns the number of greenkeys loaded.
+    """
+    count = 0
+    for line in data.split('\n'):
+        parts = line.split(' ', 2)
+        if len(parts) != 3:
+            continue
+        try:
+            permille = int(parts[1])
+        except ValueError:
+            continue
+        if permille <= 0:
+            continue
+        fraction = min(permille / 1000.0, SEED_MAX)
+        for jd in warmrunnerdesc.jitdrivers_sd:
+            state = jd.warmstate
+            if state.jitdriver_name == parts[0]:
+                state.add_hotness_seed(parts[2], fraction)
+                count += 1
+                break
+    return count
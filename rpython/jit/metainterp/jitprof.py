@@ -175,5 +175,80 @@ class Profiler(BaseProfiler):
         debug_print(final)
 
 
+# what happened when a guard failed, see LoopStats.guard_reasons
+GUARD_COUNTING = 'c'   # went back to the interpreter, counting towards
+                       # trace_eagerness
+GUARD_BUSY     = 'b'   # went back to the interpreter, because we are
+                       # already tracing a bridge from this guard
+GUARD_FORCED   = 'f'   # a GUARD_NOT_FORCED, never gets a bridge
+GUARD_TRACING  = 't'   # started tracing a bridge
+
+
+class LoopStats(object):
+    """ Per-loop information for pypyjit.get_stats_snapshot(), only
+    recorded after set_enabled(True): the location (the repr of the
+    greenkey) of the loops and bridges, the number of times each guard
+    failed and why, and the number of times each loop hit retrace_limit.
+    The numbers are the same as the ones of the entry counters that the
+    backends put in the generated code in debug mode, see
+    cpu.get_all_loop_runs(): 'e' for the entry of a loop, 'l' for its
+    labels, 'b' for a bridge and 'g' for a guard.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.locations = {}          # {(type, number): location}
+        self.guard_failures = {}     # {guard number: count}
+        self.guard_reasons = {}      # {(guard number, GUARD_xxx): count}
+        self.retrace_limit_hits = {} # {loop number: count}
+
+    def set_enabled(self, flag):
+        self.enabled = flag
+
+    def record_location(self, tp, number, location):
+        if self.enabled:
+            self.locations[(tp, number)] = location
+
+    def get_location(self, tp, number):
+        return self.locations.get((tp, number), '')
+
+    def guard_failed(self, number, loop_number, reason):
+        if self.enabled:
+            try:
+                self.guard_failures[number] += 1
+            except KeyError:
+                self.guard_failures[number] = 1
+                self.locations[('g', number)] = self.get_location('e',
+                                                                  loop_number)
+            key = (number, reason)
+            self.guard_reasons[key] = self.guard_reasons.get(key, 0) + 1
+
+    def retrace_limit_reached(self, loop_number):
+        if self.enabled:
+            self.retrace_limit_hits[loop_number] = (
+                self.retrace_limit_hits.get(loop_number, 0) + 1)
+
+    def get_top_guards(self, limit):
+        """Return the numbers of the 'limit' guards that failed the most
+        often, the most failing first."""
+        top = []     # [(count, number)], the highest count first
+        for number, count in self.guard_failures.iteritems():
+            i = len(top)
+            while i > 0 and top[i - 1][0] < count:
+                i -= 1
+            if i < limit:
+                assert i >= 0
+                top.insert(i, (count, number))
+                if len(top) > limit:
+                    top.pop()
+        return [number for count, number in top]
+
+    def clear(self):
+        self.locations.clear()
+        self.guard_failures.clear()
+        self.guard_reasons.clear()
+        self.retrace_limit_hits.clear()
+
+
 class BrokenProfilerData(JitException):
     pass
@@ -2,6 +2,7 @@ import math
 from rpython.rlib.rarithmetic import r_int64
 from rpython.rlib.debug import debug_start, debug_print, debug_stop
 from rpython.rlib.objectmodel import we_are_translated
+from rpython.rlib.listsort import make_timsort_class
 
 #
 # Logic to decide which loops are old and not used any more.
@@ -19,6 +20,16 @@ from rpython.rlib.objectmodel import we_are_translated
 # 'generation' field is much smaller than the current generation, and
 # removed from the set.
 #
+# Independently, the MemoryManager can be given a budget in bytes for
+# the machine code and resume data of the loops (see record_size()).
+# When the total size of the loops in 'alive_loops' goes above it, the
+# loops that have not been entered for the longest time are removed
+# from the set until the total is back to 3/4 of the budget.  The
+# sizes are estimates, and a loop removed from the set is only really
+# freed a bit later by the GC; but it is enough to keep a long-running
+# process that goes through many different code paths from growing
+# without bound.
+#
 
 class MemoryManager(object):
 
@@ -38,6 +49,12 @@ class MemoryManager(object):
         self.current_generation = r_int64(1)
         self.next_check = r_int64(-1)
         self.alive_loops = {}
+        # the memory budget, in bytes, or 0 for no budget
+        self.max_size = 0
+        self.total_size = 0
+        # counters, for pypyjit.get_stats_snapshot()
+        self.num_limit_hits = 0
+        self.num_evicted_loops = 0
 
     def set_max_age(self, max_age, check_frequency=0):
         if max_age <= 0:
@@ -49,6 +66,13 @@ class MemoryManager(object):
             self.check_frequency = check_frequency
             self.next_check = self.current_generation + 1
 
+    def set_max_size(self, max_size):
+        if max_size <= 0:
+            self.max_size = 0
+        else:
+            self.max_size = max_size
+            self._check_size()
+
     def next_generation(self):
         self.current_generation += 1
         if self.current_generation == self.next_check:
@@ -58,8 +82,26 @@ class MemoryManager(object):
     def keep_loop_alive(self, looptoken):
         if looptoken.generation != self.current_generation:
             looptoken.generation = self.current_generation
+            if looptoken not in self.alive_loops:
+                self.total_size += looptoken.memory_size
             self.alive_loops[looptoken] = None
 
+    def record_size(self, looptoken, size):
+        """Record that 'size' more bytes were allocated for 'looptoken',
+        i.e. for the loop itself or for one of its bridges."""
+        looptoken.memory_size += size
+        if looptoken in self.alive_loops:
+            self.total_size += size
+            self._check_size()
+
+    def _check_size(self):
+        if self.max_size > 0 and self.total_size > self.max_size:
+            self._evict_loops_now()
+
+    def _forget_loop(self, looptoken):
+        del self.alive_loops[looptoken]
+        self.total_size -= looptoken.memory_size
+
     def _kill_old_loops_now(self):
         debug_start("jit-mem-collect")
         oldtotal = len(self.alive_loops)
@@ -70,14 +112,49 @@ class MemoryManager(object):
         for looptoken in self.alive_loops.keys():
             if (0 <= looptoken.generation < max_generation or
                 looptoken.invalidated):
-                del self.alive_loops[looptoken]
+                self._forget_loop(looptoken)
+        looptoken = None
         newtotal = len(self.alive_loops)
         debug_print("Loop tokens freed: ", oldtotal - newtotal)
         debug_print("Loop tokens left:  ", newtotal)
         #print self.alive_loops.keys()
-        if not we_are_translated() and oldtotal != newtotal:
-            looptoken = None
+        self._collect_if_needed(oldtotal != newtotal)
+        debug_stop("jit-mem-collect")
+
+    def _evict_loops_now(self):
+        debug_start("jit-mem-evict")
+        self.num_limit_hits += 1
+        oldtotal = len(self.alive_loops)
+        debug_print("Current generation:", self.current_generation)
+        debug_print("Loop memory before:", self.total_size)
+        # free the least recently entered loops first, but never the ones
+        # used in the current generation: they may be just being compiled
+        target = self.max_size - self.max_size // 4
+        looptokens = self.alive_loops.keys()
+        GenerationSort(looptokens).sort()
+        for looptoken in looptokens:
+            if self.total_size <= target:
+                break
+            if looptoken.generation >= self.current_generation:
+                break
+            self._forget_loop(looptoken)
+        looptokens = None
+        looptoken = None
+        newtotal = len(self.alive_loops)
+        self.num_evicted_loops += oldtotal - newtotal
+        debug_print("Loop tokens evicted:", oldtotal - newtotal)
+        debug_print("Loop memory after: ", self.total_size)
+        self._collect_if_needed(oldtotal != newtotal)
+        debug_stop("jit-mem-evict")
+
+    def _collect_if_needed(self, freed_some):
+        if not we_are_translated() and freed_some:
             from rpython.rlib import rgc
             # a single one is not enough for all tests :-(
             rgc.collect(); rgc.collect(); rgc.collect()
-        debug_stop("jit-mem-collect")
+
+
+def _older_generation(looptoken1, looptoken2):
+    return looptoken1.generation < looptoken2.generation
+
+GenerationSort = make_timsort_class(lt=_older_generation)
@@ -0,0 +1,128 @@
+""" Code to carry what the optimizer knows at a guard over to the bridge
+that is later compiled from that guard.
+
+When the optimizer emits a guard, it usually knows the class of some of the
+boxes that are stored in the guard's resume data, or bounds on some of the
+integers.  Without this, a bridge starts from scratch and has to guard again
+on all these facts, often redoing the work of the preamble of the loop it
+jumps back to.  The facts are valid at the guard, so they are valid at the
+start of the bridge as well.
+"""
+
+from rpython.jit.metainterp.history import Const, INT, REF
+from rpython.jit.metainterp.optimizeopt.intutils import IntUnbounded,\
+     IntLowerBound, IntUpperBound, MININT, MAXINT
+
+# flags stored in the low bits of the entries of GuardKnowledge.ref_info
+# and GuardKnowledge.int_info, the failarg index is stored above them
+FLAG_KNOWNCLASS = 0x1
+FLAG_HAS_LOWER = 0x1
+FLAG_HAS_UPPER = 0x2
+INFO_SHIFT = 2
+
+
+class GuardKnowledge(object):
+    """ What the optimizer knew about the failargs of a guard, indexed by
+    the position of the box in the failargs:
+
+    ref_info: one entry per nonnull ref, index << INFO_SHIFT | flags; if
+              FLAG_KNOWNCLASS is set, the class is the next item of 'classes'
+    int_info: three entries per bounded int: index << INFO_SHIFT | flags,
+              the lower bound and the upper bound
+    """
+    _attrs_ = ('ref_info', 'classes', 'int_info')
+
+    def __init__(self, ref_info, classes, int_info):
+        self.ref_info = ref_info
+        self.classes = classes
+        self.int_info = int_info
+
+
+def serialize_optimizer_knowledge(optimizer, descr, failargs):
+    """ Store on 'descr' what 'optimizer' knows about 'failargs'. """
+    ref_info = []
+    classes = []
+    int_info = []
+    for i in range(len(failargs)):
+        box = failargs[i]
+        if box is None or isinstance(box, Const):
+            continue
+        value = optimizer.values.get(box, None)
+        if value is None or value.is_virtual() or value.is_constant():
+            continue
+        if box.type == REF:
+            if not value.is_nonnull():
+                continue
+            cls = value.get_known_class()
+            if cls is not None:
+                ref_info.append((i << INFO_SHIFT) | FLAG_KNOWNCLASS)
+                classes.append(cls)
+            else:
+                ref_info.append(i << INFO_SHIFT)
+        elif box.type == INT:
+            bound = value.getintbound()
+            if bound is None:
+                continue
+            flags = 0
+            if bound.has_lower and bound.lower > MININT:
+                flags |= FLAG_HAS_LOWER
+            if bound.has_upper and bound.upper < MAXINT:
+                flags |= FLAG_HAS_UPPER
+            if flags == 0:
+                continue
+            int_info.append((i << INFO_SHIFT) | flags)
+            int_info.append(bound.lower)
+            int_info.append(bound.upper)
+    if ref_info or int_info:
+        descr.rd_knowledge = GuardKnowledge(ref_info, classes, int_info)
+    else:
+        descr.rd_knowledge = None
+
+
+def deserialize_optimizer_knowledge(optimizer, knowledge, liveboxes):
+    """ Teach 'optimizer' the facts of 'knowledge'.  'liveboxes' are the
+    boxes that the failargs of the guard became in the bridge, with None
+    for the holes, as returned by resume.rebuild_from_resumedata().
+    """
+    ref_info = knowledge.ref_info
+    classes = knowledge.classes
+    j = 0
+    for info in ref_info:
+        box = _get_livebox(liveboxes, info >> INFO_SHIFT, REF)
+        cls = None
+        if info & FLAG_KNOWNCLASS:
+            cls = classes[j]
+            j += 1
+        if box is None:
+            continue
+        value = optimizer.getvalue(box)
+        if value.is_constant() or value.get_known_class() is not None:
+            continue
+        if cls is not None:
+            value.make_constant_class(None, cls)
+        elif not value.is_nonnull():
+            value.make_nonnull(None)
+    int_info = knowledge.int_info
+    for k in range(0, len(int_info), 3):
+        info = int_info[k]
+        box = _get_livebox(liveboxes, info >> INFO_SHIFT, INT)
+        if box is None:
+            continue
+        value = optimizer.getvalue(box)
+        if value.is_constant():
+            continue
+        bound = IntUnbounded()
+        if info & FLAG_HAS_LOWER:
+            bound.make_ge(IntLowerBound(int_info[k + 1]))
+        if info & FLAG_HAS_UPPER:
+            bound.make_le(IntUpperBound(int_info[k + 2]))
+        value.getintbound().intersect(bound)
+
+
+def _get_livebox(liveboxes, index, tp):
+    if index >= len(liveboxes):
+        return None
+    box = liveboxes[index]
+    if box is None or isinstance(box, Const) or box.type != tp:
+        return None
+    return box
@@ -6,6 +6,8 @@ from rpython.jit.metainterp.optimizeopt.intutils import IntBound, IntUnbounded,\
                                                      IntLowerBound, MININT,\
                                                      MAXINT
 from rpython.jit.metainterp.optimizeopt.util import make_dispatcher_method
+from rpython.jit.metainterp.optimizeopt.bridgeopt import \
+     serialize_optimizer_knowledge, deserialize_optimizer_knowledge
 from rpython.jit.metainterp.resoperation import rop, ResOperation,\
      AbstractResOp, GuardResOp
 from rpython.jit.metainterp.typesystem import llhelper
@@ -554,6 +556,9 @@ class Optimizer(Optimization):
 
         self.set_optimizations(optimizations)
         self.setup()
+        if loop is not None and loop.bridge_knowledge is not None:
+            deserialize_optimizer_knowledge(self, loop.bridge_knowledge,
+                                            loop.bridge_liveboxes)
 
     def set_optimizations(self, optimizations):
         if optimizations:
@@ -726,6 +731,7 @@ class Optimizer(Optimization):
         self.loop.quasi_immutable_deps = self.quasi_immutable_deps
         # accumulate counters
         self.resumedata_memo.update_counters(self.metainterp_sd.profiler)
+        self.resumedata_memo.log_sizes()
 
     def send_extra_operation(self, op):
         self.first_optimization.propagate_forward(op)
@@ -819,6 +825,7 @@ class Optimizer(Optimization):
         except resume.TagOverflow:
             raise compile.giveup()
         descr.store_final_boxes(op, newboxes, self.metainterp_sd)
+        serialize_optimizer_knowledge(self, descr, newboxes)
         #
         if op.getopnum() == rop.GUARD_VALUE:
             if self.getvalue(op.getarg(0)) in self.bool_boxes:
@@ -839,6 +846,9 @@ class Optimizer(Optimization):
             else:
                 # a real GUARD_VALUE.  Make it use one counter per value.
                 descr.make_a_counter_per_value(op)
+        elif op.getopnum() == rop.GUARD_CLASS:
+            if isinstance(descr, compile.ResumeGuardClassDescr):
+                descr.make_a_counter_per_class(op, self.cpu)
         return op
 
     def make_args_key(self, op):
@@ -0,0 +1,95 @@
+from rpython.jit.metainterp.history import BoxInt, BoxPtr, BoxFloat, ConstInt
+from rpython.jit.metainterp.optimizeopt.optimizer import PtrOptValue,\
+     IntOptValue, OptValue, LEVEL_NONNULL
+from rpython.jit.metainterp.optimizeopt.intutils import IntBound,\
+     IntLowerBound, MININT, MAXINT
+from rpython.jit.metainterp.optimizeopt.bridgeopt import\
+     serialize_optimizer_knowledge, deserialize_optimizer_knowledge
+
+
+class FakeOptimizer(object):
+    def __init__(self):
+        self.values = {}
+
+    def getvalue(self, box):
+        try:
+            return self.values[box]
+        except KeyError:
+            if isinstance(box, BoxPtr):
+                value = PtrOptValue(box)
+            elif isinstance(box, BoxInt):
+                value = IntOptValue(box)
+            else:
+                value = OptValue(box)
+            self.values[box] = value
+            return value
+
+
+class FakeDescr(object):
+    rd_knowledge = None
+
+
+def roundtrip(optimizer, failargs, liveboxes):
+    descr = FakeDescr()
+    serialize_optimizer_knowledge(optimizer, descr, failargs)
+    newopt = FakeOptimizer()
+    if descr.rd_knowledge is not None:
+        deserialize_optimizer_knowledge(newopt, descr.rd_knowledge,
+                                        liveboxes)
+    return descr, newopt
+
+
+def test_nothing_known():
+    opt = FakeOptimizer()
+    failargs = [BoxPtr(), BoxInt(), BoxFloat(), None]
+    for box in failargs[:3]:
+        opt.getvalue(box)
+    descr, _ = roundtrip(opt, failargs, failargs)
+    assert descr.rd_knowledge is None
+
+def test_classes_and_nonnull():
+    opt = FakeOptimizer()
+    p0, p1, p2 = BoxPtr(), BoxPtr(), BoxPtr()
+    cls = ConstInt(12345)
+    opt.getvalue(p0).make_constant_class(None, cls)
+    opt.getvalue(p1).make_nonnull(None)
+    opt.getvalue(p2)
+    failargs = [p2, BoxInt(), p0, p1]
+    newboxes = [BoxPtr(), BoxInt(), BoxPtr(), BoxPtr()]
+    _, newopt = roundtrip(opt, failargs, newboxes)
+    assert newopt.getvalue(newboxes[2]).get_known_class() is cls
+    assert newopt.getvalue(newboxes[3]).getlevel() == LEVEL_NONNULL
+    assert newopt.getvalue(newboxes[3]).get_known_class() is None
+    assert not newopt.getvalue(newboxes[0]).is_nonnull()
+
+def test_int_bounds():
+    opt = FakeOptimizer()
+    i0, i1, i2, i3 = BoxInt(), BoxInt(), BoxInt(), BoxInt()
+    opt.getvalue(i0).getintbound().intersect(IntBound(-5, 10))
+    opt.getvalue(i1).getintbound().intersect(IntLowerBound(0))
+    opt.getvalue(i2)
+    opt.getvalue(i3).getintbound().intersect(IntBound(MININT, 7))
+    failargs = [i0, i1, i2, i3]
+    newboxes = [BoxInt(), BoxInt(), BoxInt(), BoxInt()]
+    _, newopt = roundtrip(opt, failargs, newboxes)
+    b = newopt.getvalue(newboxes[0]).getintbound()
+    assert (b.lower, b.upper) == (-5, 10)
+    b = newopt.getvalue(newboxes[1]).getintbound()
+    assert (b.lower, b.upper) == (0, MAXINT)
+    b = newopt.getvalue(newboxes[2]).getintbound()
+    assert (b.lower, b.upper) == (MININT, MAXINT)
+    b = newopt.getvalue(newboxes[3]).getintbound()
+    assert (b.lower, b.upper) == (MININT, 7)
+
+def test_holes_and_mismatches():
+    opt = FakeOptimizer()
+    p0, i1, i2 = BoxPtr(), BoxInt(), BoxInt()
+    opt.getvalue(p0).make_nonnull(None)
+    opt.getvalue(i1).getintbound().intersect(IntBound(0, 1))
+    opt.getvalue(i2).getintbound().intersect(IntBound(2, 3))
+    # the box of i1 is a hole in the bridge, and the bridge gets a
+    # constant for i2: nothing must be applied to them
+    newboxes = [BoxPtr(), None, ConstInt(3)]
+    _, newopt = roundtrip(opt, [p0, i1, i2], newboxes)
+    assert newopt.getvalue(newboxes[0]).is_nonnull()
+    assert newopt.values.keys() == [newboxes[0]]
@@ -17,7 +17,7 @@ from rpython.jit.codewriter.heaptracker import register_known_gctype, adr2int
 from rpython.jit.tool.oparser import OpParser, pure_parse
 from rpython.jit.metainterp.quasiimmut import QuasiImmutDescr
 from rpython.jit.metainterp import compile, resume, history
-from rpython.jit.metainterp.jitprof import EmptyProfiler
+from rpython.jit.metainterp.jitprof import EmptyProfiler, LoopStats
 from rpython.jit.metainterp.counter import DeterministicJitCounter
 from rpython.config.translationoption import get_combined_translation_config
 from rpython.jit.metainterp.resoperation import rop, opname, ResOperation
@@ -332,7 +332,9 @@ class FakeMetaInterpStaticData(object):
         class memory_manager:
             retrace_limit = 5
             max_retrace_guards = 15
+            max_retrace_limit = 0
         jitcounter = DeterministicJitCounter()
+        loop_stats = LoopStats()
 
     def get_name_from_address(self, addr):
         # hack
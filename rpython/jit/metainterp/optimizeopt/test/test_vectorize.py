@@ -0,0 +1,287 @@
+from rpython.jit.metainterp.optimizeopt.test.test_util import (LLtypeMixin,
+    FakeMetaInterpStaticData)
+from rpython.jit.metainterp.optimizeopt.util import equaloplists
+from rpython.jit.metainterp.optimizeopt.vectorize import optimize_vector
+from rpython.jit.metainterp.history import (TargetToken, JitCellToken,
+                                            BoxVector)
+from rpython.jit.metainterp.resoperation import rop
+from rpython.jit.metainterp import compile
+from rpython.jit.tool.oparser import parse
+
+
+def invent_fail_descr(model, opnum, fail_args):
+    return compile.invent_fail_descr_for_op(opnum, None)
+
+
+class TestVectorize(LLtypeMixin):
+
+    def setup_method(self, meth):
+        self.namespace = self.namespace.copy()
+        self.namespace['targettoken'] = TargetToken(JitCellToken())
+
+    def parse(self, source):
+        return parse(source, self.cpu, self.namespace,
+                     boxkinds={'v': BoxVector},
+                     invent_fail_descr=invent_fail_descr)
+
+    def vectorize(self, source):
+        loop = self.parse(source)
+        metainterp_sd = FakeMetaInterpStaticData(self.cpu)
+        metainterp_sd.warmrunnerdesc = None
+        self.vectorized = optimize_vector(metainterp_sd, None, loop)
+        return loop
+
+    def optimize_loop(self, source, expected):
+        loop = self.vectorize(source)
+        assert self.vectorized
+        expected = self.parse(expected)
+        remap = {}
+        for box1, box2 in zip(loop.inputargs, expected.inputargs):
+            remap[box2] = box1
+        assert equaloplists(loop.operations, expected.operations,
+                            True, remap)
+        return loop
+
+    def not_vectorized(self, source):
+        loop = self.vectorize(source)
+        assert not self.vectorized
+
+    def test_add_arrays(self):
+        source = """
+        [i0, i1, i2, i3, i4]
+        label(i0, i1, i2, i3, i4, descr=targettoken)
+        i5 = int_lt(i0, i4)
+        guard_true(i5) [i0, i1, i2, i3, i4]
+        f0 = getarrayitem_raw(i1, i0, descr=rawarraydescr_float)
+        f1 = getarrayitem_raw(i2, i0, descr=rawarraydescr_float)
+        f2 = float_add(f0, f1)
+        setarrayitem_raw(i3, i0, f2, descr=rawarraydescr_float)
+        i6 = int_add(i0, 1)
+        jump(i6, i1, i2, i3, i4, descr=targettoken)
+        """
+        expected = """
+        [i0, i1, i2, i3, i4]
+        label(i0, i1, i2, i3, i4, descr=targettoken)
+        i5 = int_lt(i0, i4)
+        guard_true(i5) [i0, i1, i2, i3, i4]
+        i6 = int_add(i0, 1)
+        i7 = int_lt(i6, i4)
+        guard_true(i7) [i0, i1, i2, i3, i4]
+        i8 = int_add(i6, 1)
+        i10 = int_mul(i0, 8)
+        i11 = int_add(i3, i10)
+        i12 = int_mul(i0, 8)
+        i13 = int_add(i1, i12)
+        i14 = int_sub(i11, i13)
+        i15 = int_sub(i14, 1)
+        i16 = uint_ge(i15, 15)
+        guard_true(i16) [i0, i1, i2, i3, i4]
+        i20 = int_mul(i0, 8)
+        i21 = int_add(i3, i20)
+        i22 = int_mul(i0, 8)
+        i23 = int_add(i2, i22)
+        i24 = int_sub(i21, i23)
+        i25 = int_sub(i24, 1)
+        i26 = uint_ge(i25, 15)
+        guard_true(i26) [i0, i1, i2, i3, i4]
+        v0 = vec_getarrayitem_raw(i1, i0, descr=rawarraydescr_float)
+        v1 = vec_getarrayitem_raw(i2, i0, descr=rawarraydescr_float)
+        v2 = vec_float_add(v0, v1)
+        vec_setarrayitem_raw(i3, i0, v2, descr=rawarraydescr_float)
+        jump(i8, i1, i2, i3, i4, descr=targettoken)
+        """
+        loop = self.optimize_loop(source, expected)
+        # the other guards resume on the passing path of the first one
+        guards = [op for op in loop.operations if op.is_guard()]
+        assert len(guards) == 4
+        for guard in guards[1:]:
+            descr = guard.getdescr()
+            assert isinstance(descr, compile.ResumeAtPositionDescr)
+            assert guard.getfailargs() == guards[0].getfailargs()
+
+    def test_same_array_no_overlap(self):
+        source = """
+        [i0, i1, i4]
+        label(i0, i1, i4, descr=targettoken)
+        i5 = int_lt(i0, i4)
+        guard_true(i5) [i0, i1, i4]
+        f0 = getarrayitem_raw(i1, i0, descr=rawarraydescr_float)
+        f1 = float_mul(f0, 2.5)
+        setarrayitem_raw(i1, i0, f1, descr=rawarraydescr_float)
+        i6 = int_add(i0, 1)
+        jump(i6, i1, i4, descr=targettoken)
+        """
+        expected = """
+        [i0, i1, i4]
+        label(i0, i1, i4, descr=targettoken)
+        i5 = int_lt(i0, i4)
+        guard_true(i5) [i0, i1, i4]
+        i6 = int_add(i0, 1)
+        i7 = int_lt(i6, i4)
+        guard_true(i7) [i0, i1, i4]
+        i8 = int_add(i6, 1)
+        v0 = vec_getarrayitem_raw(i1, i0, descr=rawarraydescr_float)
+        v1 = vec_float_splat(2.5)
+        v2 = vec_float_mul(v0, v1)
+        vec_setarrayitem_raw(i1, i0, v2, descr=rawarraydescr_float)
+        jump(i8, i1, i4, descr=targettoken)
+        """
+        self.optimize_loop(source, expected)
+
+    def test_raw_load_store(self):
+        source = """
+        [i0, i1, i2, i4, f9]
+        label(i0, i1, i2, i4, f9, descr=targettoken)
+        i5 = int_lt(i0, i4)
+        guard_true(i5) [i0, i1, i2, i4, f9]
+        f0 = raw_load(i1, i0, descr=rawarraydescr_float)
+        f1 = float_sub(f0, f9)
+        raw_store(i1, i0, f1, descr=rawarraydescr_float)
+        i6 = int_add(i0, 8)
+        jump(i6, i1, i2, i4, f9, descr=targettoken)
+        """
+        expected = """
+        [i0, i1, i2, i4, f9]
+        label(i0, i1, i2, i4, f9, descr=targettoken)
+        i5 = int_lt(i0, i4)
+        guard_true(i5) [i0, i1, i2, i4, f9]
+        i6 = int_add(i0, 8)
+        i7 = int_lt(i6, i4)
+        guard_true(i7) [i0, i1, i2, i4, f9]
+        i8 = int_add(i6, 8)
+        v0 = vec_raw_load(i1, i0, descr=rawarraydescr_float)
+        v1 = vec_float_splat(f9)
+        v2 = vec_float_sub(v0, v1)
+        vec_raw_store(i1, i0, v2, descr=rawarraydescr_float)
+        jump(i8, i1, i2, i4, f9, descr=targettoken)
+        """
+        self.optimize_loop(source, expected)
+
+    def test_guard_after_store(self):
+        source = """
+        [i0, i1, i4]
+        label(i0, i1, i4, descr=targettoken)
+        f0 = getarrayitem_raw(i1, i0, descr=rawarraydescr_float)
+        f1 = float_mul(f0, 2.5)
+        setarrayitem_raw(i1, i0, f1, descr=rawarraydescr_float)
+        i6 = int_add(i0, 1)
+        i5 = int_lt(i6, i4)
+        guard_true(i5) [i4, i6, i1]
+        jump(i6, i1, i4, descr=targettoken)
+        """
+        expected = """
+        [i0, i1, i4]
+        label(i0, i1, i4, descr=targettoken)
+        i6 = int_add(i0, 1)
+        i5 = int_lt(i6, i4)
+        guard_true(i5) [i4, i0, i1]
+        i7 = int_add(i6, 1)
+        i8 = int_lt(i7, i4)
+        guard_true(i8) [i4, i0, i1]
+        v0 = vec_getarrayitem_raw(i1, i0, descr=rawarraydescr_float)
+        v1 = vec_float_splat(2.5)
+        v2 = vec_float_mul(v0, v1)
+        vec_setarrayitem_raw(i1, i0, v2, descr=rawarraydescr_float)
+        jump(i7, i1, i4, descr=targettoken)
+        """
+        loop = self.optimize_loop(source, expected)
+        # both guards resume at the end of the previous iteration
+        for op in loop.operations:
+            if op.is_guard():
+                descr = op.getdescr()
+                assert isinstance(descr, compile.ResumeAtPositionDescr)
+
+    def test_guard_after_store_not_passed_on(self):
+        # i7 isn't known at the end of the previous iteration
+        self.not_vectorized("""
+        [i0, i1, i4]
+        label(i0, i1, i4, descr=targettoken)
+        f0 = getarrayitem_raw(i1, i0, descr=rawarraydescr_float)
+        f1 = float_mul(f0, 2.5)
+        setarrayitem_raw(i1, i0, f1, descr=rawarraydescr_float)
+        i6 = int_add(i0, 1)
+        i7 = int_sub(i4, i6)
+        i5 = int_gt(i7, 0)
+        guard_true(i5) [i7, i6, i1]
+        jump(i6, i1, i4, descr=targettoken)
+        """)
+
+    def test_only_guard_false(self):
+        self.not_vectorized("""
+        [i0, i1, i4]
+        label(i0, i1, i4, descr=targettoken)
+        i5 = int_ge(i0, i4)
+        guard_false(i5) [i0, i1, i4]
+        f0 = getarrayitem_raw(i1, i0, descr=rawarraydescr_float)
+        f1 = float_mul(f0, 2.5)
+        setarrayitem_raw(i1, i0, f1, descr=rawarraydescr_float)
+        i6 = int_add(i0, 1)
+        jump(i6, i1, i4, descr=targettoken)
+        """)
+
+    def test_overlapping_accesses(self):
+        # a[i + 1] = a[i] * 2.5 depends on the previous iteration
+        self.not_vectorized("""
+        [i0, i1, i4]
+        label(i0, i1, i4, descr=targettoken)
+        i5 = int_lt(i0, i4)
+        guard_true(i5) [i0, i1, i4]
+        f0 = getarrayitem_raw(i1, i0, descr=rawarraydescr_float)
+        f1 = float_mul(f0, 2.5)
+        i7 = int_add(i0, 1)
+        setarrayitem_raw(i1, i7, f1, descr=rawarraydescr_float)
+        i6 = int_add(i0, 1)
+        jump(i6, i1, i4, descr=targettoken)
+        """)
+
+    def test_not_consecutive(self):
+        self.not_vectorized("""
+        [i0, i1, i4]
+        label(i0, i1, i4, descr=targettoken)
+        i5 = int_lt(i0, i4)
+        guard_true(i5) [i0, i1, i4]
+        f0 = getarrayitem_raw(i1, i0, descr=rawarraydescr_float)
+        f1 = float_mul(f0, 2.5)
+        setarrayitem_raw(i1, i0, f1, descr=rawarraydescr_float)
+        i6 = int_add(i0, 2)
+        jump(i6, i1, i4, descr=targettoken)
+        """)
+
+    def test_float_escapes(self):
+        self.not_vectorized("""
+        [i0, i1, i4, f9]
+        label(i0, i1, i4, f9, descr=targettoken)
+        i5 = int_lt(i0, i4)
+        guard_true(i5) [i0, i1, i4, f9]
+        f0 = getarrayitem_raw(i1, i0, descr=rawarraydescr_float)
+        f1 = float_add(f0, f9)
+        setarrayitem_raw(i1, i0, f1, descr=rawarraydescr_float)
+        i6 = int_add(i0, 1)
+        jump(i6, i1, i4, f1, descr=targettoken)
+        """)
+
+    def test_integer_arrays(self):
+        self.not_vectorized("""
+        [i0, i1, i4]
+        label(i0, i1, i4, descr=targettoken)
+        i5 = int_lt(i0, i4)
+        guard_true(i5) [i0, i1, i4]
+        i2 = getarrayitem_raw(i1, i0, descr=rawarraydescr)
+        i3 = int_add(i2, 1)
+        setarrayitem_raw(i1, i0, i3, descr=rawarraydescr)
+        i6 = int_add(i0, 1)
+        jump(i6, i1, i4, descr=targettoken)
+        """)
+
+    def test_call_in_loop(self):
+        self.not_vectorized("""
+        [i0, i1, i4]
+        label(i0, i1, i4, descr=targettoken)
+        i5 = int_lt(i0, i4)
+        guard_true(i5) [i0, i1, i4]
+        f0 = getarrayitem_raw(i1, i0, descr=rawarraydescr_float)
+        f1 = call(12345, f0, descr=nonwritedescr)
+        setarrayitem_raw(i1, i0, f1, descr=rawarraydescr_float)
+        i6 = int_add(i0, 1)
+        jump(i6, i1, i4, descr=targettoken)
+        """)
@@ -129,12 +129,21 @@ class UnrollOptimizer(Optimization):
                 return
 
             if cell_token.target_tokens:
-                limit = self.optimizer.metainterp_sd.warmrunnerdesc.memory_manager.retrace_limit
+                warmrunnerdesc = self.optimizer.metainterp_sd.warmrunnerdesc
+                limit = (warmrunnerdesc.memory_manager.retrace_limit +
+                         cell_token.retrace_limit_raised)
+                if (cell_token.retraced_count >= limit and
+                        self.may_raise_retrace_limit(cell_token)):
+                    cell_token.retrace_limit_raised += 1
+                    limit += 1
+                    debug_print('Raising the retrace limit to %d' % limit)
                 if cell_token.retraced_count < limit:
                     cell_token.retraced_count += 1
                     debug_print('Retracing (%d/%d)' % (cell_token.retraced_count, limit))
                 else:
                     debug_print("Retrace count reached, jumping to preamble")
+                    warmrunnerdesc.loop_stats.retrace_limit_reached(
+                        cell_token.number)
                     assert cell_token.target_tokens[0].virtual_state is None
                     jumpop = jumpop.clone()
                     jumpop.setdescr(cell_token.target_tokens[0])
@@ -376,6 +385,23 @@ class UnrollOptimizer(Optimization):
 
         self.finalize_short_preamble(start_label)
 
+    def may_raise_retrace_limit(self, cell_token):
+        """Called when 'cell_token' reached retrace_limit.  If at least
+        three quarters of its retraces managed to close a loop specialized
+        for their virtual state (instead of jumping to the preamble), more
+        retraces are likely to pay off too, so we allow one more, up to
+        max_retrace_limit.  A loop whose retraces have too many guards
+        (see max_retrace_guards) gets sys.maxint as retraced_count and is
+        never raised."""
+        memory_manager = self.optimizer.metainterp_sd.warmrunnerdesc.memory_manager
+        retraced = cell_token.retraced_count
+        if retraced == sys.maxint:
+            return False
+        if (memory_manager.retrace_limit + cell_token.retrace_limit_raised >=
+                memory_manager.max_retrace_limit):
+            return False
+        return cell_token.retrace_successes * 4 >= retraced * 3 > 0
+
     def finalize_short_preamble(self, start_label):
         short = self.short
         assert short[-1].getopnum() == rop.JUMP
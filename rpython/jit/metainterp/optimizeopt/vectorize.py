@@ -0,0 +1,562 @@
+"""
+Vectorization of simple loops over raw arrays of floats.
+
+This runs on the peeled loop produced by unrolling, i.e. on a list of
+operations that starts with a LABEL and ends with a JUMP back to it.  If
+the loop body only does float arithmetic on items loaded from and stored
+to raw memory at consecutive positions, then two iterations of the loop
+are combined into one, and the float operations of both iterations are
+packed into vector operations that the backend can emit as SSE2.
+
+The resulting loop is laid out as follows:
+
+    label(...)
+    <the integer operations and guards of the first iteration>
+    <the integer operations and guards of the second iteration>
+    <guards checking that the arrays accessed do not overlap>
+    <the vector operations>
+    jump(...)
+
+A guard failing anywhere before the vector operations leaves the memory
+untouched, so it is enough for it to resume at a point of the first
+iteration where nothing was stored yet, and let the interpreter redo the
+rest.  The guards of the original loop can't do that by themselves, as
+they resume on their failing path; instead the new guards get a
+ResumeAtPositionDescr with a copy of the resume data of one GUARD_TRUE,
+which then resumes on the passing path of that guard.  This guard is
+either one that comes before the first store, or one that comes after the
+last store and whose failargs are all passed on to the jump: in the
+latter case it resumes in the state at the end of the previous iteration.
+"""
+
+from rpython.jit.metainterp.history import (Const, ConstInt, BoxInt,
+                                            BoxVector, INT, FLOAT)
+from rpython.jit.metainterp.resoperation import rop, ResOperation
+from rpython.jit.metainterp import compile
+from rpython.rlib.debug import debug_start, debug_stop, debug_print
+
+
+VECTOR_WIDTH = 2       # number of floats per vector
+FLOAT_SIZE = 8
+MAX_MEMORY_OPS = 16    # the overlap checks are quadratic in this
+MAX_LIVE_VECTORS = 8   # stay well below the number of vector registers
+
+VECTOR_ARITH = {
+    rop.FLOAT_ADD: rop.VEC_FLOAT_ADD,
+    rop.FLOAT_SUB: rop.VEC_FLOAT_SUB,
+    rop.FLOAT_MUL: rop.VEC_FLOAT_MUL,
+    rop.FLOAT_TRUEDIV: rop.VEC_FLOAT_TRUEDIV,
+}
+
+VECTOR_MEMORY = {
+    rop.RAW_LOAD: rop.VEC_RAW_LOAD,
+    rop.GETARRAYITEM_RAW: rop.VEC_GETARRAYITEM_RAW,
+    rop.RAW_STORE: rop.VEC_RAW_STORE,
+    rop.SETARRAYITEM_RAW: rop.VEC_SETARRAYITEM_RAW,
+}
+
+
+OVERLAP_NO = 0
+OVERLAP_YES = 1
+OVERLAP_UNKNOWN = 2
+
+
+class NotVectorizable(Exception):
+    pass
+
+
+def optimize_vector(metainterp_sd, jitdriver_sd, loop):
+    """Try to vectorize 'loop', which must be a peeled loop going from
+    its LABEL to a JUMP back to it.  Returns True if the loop's operations were replaced.
+    """
+    operations = loop.operations
+    # unrolling may leave a few SAME_AS operations in front of the label
+    start = 0
+    while start < len(operations) and \
+            operations[start].getopnum() != rop.LABEL:
+        start += 1
+    if start + 1 >= len(operations):
+        return False
+    label = operations[start]
+    jump = operations[-1]
+    if jump.getopnum() != rop.JUMP or jump.getdescr() is not label.getdescr():
+        return False
+    vectorizer = LoopVectorizer(metainterp_sd, label,
+                                operations[start + 1:-1], jump)
+    try:
+        newoperations = operations[:start] + vectorizer.vectorize()
+    except NotVectorizable:
+        return False
+    debug_start("jit-vectorize")
+    debug_print("vectorized loop with %d operations into %d" % (
+        len(operations), len(newoperations)))
+    debug_stop("jit-vectorize")
+    loop.operations = newoperations
+    return True
+
+
+class LinearForm(object):
+    """An integer known to be 'coeff * var + const', where 'var' is an
+    induction variable of the loop (or None for a constant).
+    """
+    def __init__(self, var, coeff, const):
+        self.var = var
+        self.coeff = coeff
+        self.const = const
+
+    def add(self, other, sign):
+        if self.var is None:
+            var = other.var
+        elif other.var is None or other.var is self.var:
+            var = self.var
+        else:
+            return None
+        coeff = self.coeff + sign * other.coeff
+        if coeff == 0:
+            var = None
+        return LinearForm(var, coeff, self.const + sign * other.const)
+
+    def mul(self, factor):
+        if factor == 0:
+            return LinearForm(None, 0, 0)
+        return LinearForm(self.var, self.coeff * factor, self.const * factor)
+
+
+class MemoryRef(object):
+    """A load or store of the loop, at byte address 'base + scale * index'
+    (plus an offset from the descr that is the same for all of them).
+    """
+    def __init__(self, op, is_store, form, scale):
+        self.op = op
+        self.is_store = is_store
+        self.base = op.getarg(0)
+        self.index = op.getarg(1)
+        self.form = form
+        self.scale = scale
+
+    def is_array_op(self):
+        return self.scale != 1
+
+
+class LoopVectorizer(object):
+
+    def __init__(self, metainterp_sd, label, operations, jump):
+        self.metainterp_sd = metainterp_sd
+        self.label = label
+        self.operations = operations
+        self.jump = jump
+        self.resume_descr = None   # the descr and failargs of the guard
+        self.resume_failargs = None    # that the new guards resume at
+        self.invariants = {}       # label args passed unchanged to the jump
+        self.steps = {}            # induction variable -> step
+        self.forms = {}            # int box -> LinearForm
+        self.scalar_ops = []       # integer operations and guards
+        self.vector_ops = []       # float arithmetic, loads and stores
+        self.float_results = {}    # results of the vector_ops
+        self.memrefs = []
+        self.newoperations = []
+
+    def vectorize(self):
+        self.split_operations()
+        self.find_invariants()
+        self.find_induction_variables()
+        self.check_escapes()
+        self.build_memrefs()
+        self.check_register_pressure()
+        self.find_resume_guard()
+        self.emit_first_iteration()
+        renamed = self.emit_second_iteration()
+        self.emit_overlap_checks()
+        self.emit_vector_operations()
+        jumpargs = [renamed.get(arg, arg) for arg in self.jump.getarglist()]
+        self.newoperations.append(self.jump.copy_and_change(rop.JUMP,
+                                                            args=jumpargs))
+        return self.newoperations
+
+    # ---------- analysis ----------
+
+    def split_operations(self):
+        # the guards before the first store (in 'early_guards') are the only
+        # ones that fail in the same state in the new loop
+        self.early_guards = {}
+        self.late_guards = []      # the guards after the last store
+        seen_store = False
+        num_memory_ops = 0
+        for op in self.operations:
+            opnum = op.getopnum()
+            if opnum in VECTOR_MEMORY:
+                if not op.getdescr().is_array_of_floats():
+                    raise NotVectorizable
+                num_memory_ops += 1
+                if op.result is None:
+                    seen_store = True
+                    self.late_guards = []
+                else:
+                    self.float_results[op.result] = None
+                self.vector_ops.append(op)
+            elif opnum in VECTOR_ARITH:
+                self.float_results[op.result] = None
+                self.vector_ops.append(op)
+            elif op.is_guard():
+                if (opnum != rop.GUARD_TRUE and opnum != rop.GUARD_FALSE and
+                    opnum != rop.GUARD_NO_OVERFLOW and
+                    opnum != rop.GUARD_NOT_INVALIDATED):
+                    raise NotVectorizable
+                if seen_store:
+                    self.late_guards.append(op)
+                else:
+                    self.early_guards[op] = None
+                self.scalar_ops.append(op)
+            elif opnum == rop.DEBUG_MERGE_POINT or opnum == rop.JIT_DEBUG:
+                self.scalar_ops.append(op)
+            elif op.is_always_pure() or op.is_ovf():
+                if op.result is None or op.result.type != INT:
+                    raise NotVectorizable
+                for arg in op.getarglist():
+                    if arg.type != INT:
+                        raise NotVectorizable
+                self.scalar_ops.append(op)
+            else:
+                raise NotVectorizable
+        if not seen_store or num_memory_ops > MAX_MEMORY_OPS:
+            raise NotVectorizable
+
+    def find_invariants(self):
+        labelargs = self.label.getarglist()
+        jumpargs = self.jump.getarglist()
+        if len(labelargs) != len(jumpargs):
+            raise NotVectorizable
+        for i in range(len(labelargs)):
+            if labelargs[i] is jumpargs[i]:
+                self.invariants[labelargs[i]] = None
+
+    def find_induction_variables(self):
+        # Start by assuming that all integer label args are induction
+        # variables, and drop those whose value passed to the jump is not
+        # a constant step away from them, until we reach a fixpoint.
+        labelargs = self.label.getarglist()
+        jumpargs = self.jump.getarglist()
+        candidates = {}
+        for arg in labelargs:
+            if arg.type == INT and arg not in self.invariants:
+                candidates[arg] = None
+        while True:
+            self.compute_forms(candidates)
+            changed = False
+            for i in range(len(labelargs)):
+                var = labelargs[i]
+                if var not in candidates:
+                    continue
+                form = self.get_form(jumpargs[i])
+                if (form is None or form.var is not var or form.coeff != 1
+                        or form.const == 0):
+                    del candidates[var]
+                    changed = True
+                else:
+                    self.steps[var] = form.const
+            if not changed:
+                break
+            self.steps = {}
+        if not self.steps:
+            raise NotVectorizable
+
+    def compute_forms(self, variables):
+        self.forms = {}
+        for var in variables:
+            self.forms[var] = LinearForm(var, 1, 0)
+        for op in self.scalar_ops:
+            opnum = op.getopnum()
+            if opnum == rop.INT_ADD or opnum == rop.INT_ADD_OVF:
+                form = self._combine(op, 1)
+            elif opnum == rop.INT_SUB or opnum == rop.INT_SUB_OVF:
+                form = self._combine(op, -1)
+            elif opnum == rop.INT_MUL or opnum == rop.INT_MUL_OVF:
+                form = self._scale(op.getarg(0), op.getarg(1))
+                if form is None:
+                    form = self._scale(op.getarg(1), op.getarg(0))
+            elif opnum == rop.INT_LSHIFT:
+                form = None
+                factor = op.getarg(1)
+                if isinstance(factor, ConstInt) and 0 <= factor.getint() < 8:
+                    form = self._scale(op.getarg(0),
+                                       ConstInt(1 << factor.getint()))
+            elif opnum == rop.SAME_AS:
+                form = self.get_form(op.getarg(0))
+            else:
+                form = None
+            if form is not None:
+                self.forms[op.result] = form
+
+    def get_form(self, box):
+        if isinstance(box, ConstInt):
+            return LinearForm(None, 0, box.getint())
+        return self.forms.get(box, None)
+
+    def _combine(self, op, sign):
+        form0 = self.get_form(op.getarg(0))
+        form1 = self.get_form(op.getarg(1))
+        if form0 is None or form1 is None:
+            return None
+        return form0.add(form1, sign)
+
+    def _scale(self, box, factor):
+        form = self.get_form(box)
+        if form is None or not isinstance(factor, ConstInt):
+            return None
+        return form.mul(factor.getint())
+
+    def check_escapes(self):
+        # The float values only exist as vectors in the new loop, so they
+        # can't be used by anything that needs the individual values.
+        for arg in self.jump.getarglist():
+            if arg in self.float_results:
+                raise NotVectorizable
+        for op in self.scalar_ops:
+            if op.is_guard():
+                for arg in op.getfailargs():
+                    if arg is not None and arg in self.float_results:
+                        raise NotVectorizable
+        for op in self.vector_ops:
+            for arg in op.getarglist():
+                if arg.type == FLOAT and not self._is_vectorizable_float(arg):
+                    raise NotVectorizable
+
+    def _is_vectorizable_float(self, box):
+        return (isinstance(box, Const) or box in self.invariants or
+                box in self.float_results)
+
+    def build_memrefs(self):
+        for op in self.vector_ops:
+            opnum = op.getopnum()
+            if opnum not in VECTOR_MEMORY:
+                continue
+            base = op.getarg(0)
+            if not isinstance(base, Const) and base not in self.invariants:
+                raise NotVectorizable
+            form = self.get_form(op.getarg(1))
+            if form is None or form.var is None:
+                raise NotVectorizable
+            if opnum == rop.RAW_LOAD or opnum == rop.RAW_STORE:
+                scale = 1
+            else:
+                scale = FLOAT_SIZE
+            # the two iterations must access consecutive items
+            if scale * form.coeff * self.steps[form.var] != FLOAT_SIZE:
+                raise NotVectorizable
+            is_store = op.result is None
+            self.memrefs.append(MemoryRef(op, is_store, form, scale))
+
+    def check_register_pressure(self):
+        # every float in the vector loop is live from its first appearance
+        # to its last use, be it a vector result or a splat
+        start = {}
+        end = {}
+        for i in range(len(self.vector_ops)):
+            op = self.vector_ops[i]
+            for arg in op.getarglist():
+                if arg.type == FLOAT:
+                    if arg not in start:
+                        start[arg] = i
+                    end[arg] = i
+            if op.result is not None:
+                start[op.result] = i
+                end[op.result] = i
+        for i in range(len(self.vector_ops)):
+            live = 0
+            for box in start:
+                if start[box] <= i <= end[box]:
+                    live += 1
+            if live > MAX_LIVE_VECTORS:
+                raise NotVectorizable
+
+    def find_resume_guard(self):
+        for op in self.scalar_ops:
+            if op in self.early_guards and self._resumes_on_passing_path(op):
+                self.resume_descr = op.getdescr()
+                self.resume_failargs = op.getfailargs()[:]
+                return
+        # a guard after the last store, in the state at the end of the
+        # previous iteration, i.e. with the values passed to the jump
+        # replaced by the label args
+        for op in self.late_guards:
+            if not self._resumes_on_passing_path(op):
+                continue
+            descr = op.getdescr()
+            assert isinstance(descr, compile.ResumeGuardDescr)
+            if descr.rd_virtuals or descr.rd_pendingfields:
+                continue
+            failargs = []
+            for arg in op.getfailargs():
+                if arg is not None and not isinstance(arg, Const):
+                    arg = self._value_before_label(arg)
+                    if arg is None:
+                        break
+                failargs.append(arg)
+            else:
+                self.resume_descr = descr
+                self.resume_failargs = failargs
+                return
+        raise NotVectorizable
+
+    def _value_before_label(self, box):
+        labelargs = self.label.getarglist()
+        jumpargs = self.jump.getarglist()
+        result = None
+        for i in range(len(jumpargs)):
+            if jumpargs[i] is box:
+                if result is not None and result is not labelargs[i]:
+                    return None
+                result = labelargs[i]
+        return result
+
+    def _resumes_on_passing_path(self, op):
+        # For these, the resume data describes the state in which the
+        # interpreter goes on as if the guard passed.  That's not the case
+        # for GUARD_FALSE, whose passing path is the jump of a goto_if_not.
+        descr = op.getdescr()
+        return (isinstance(descr, compile.ResumeGuardTrueDescr) or
+                isinstance(descr, compile.ResumeGuardValueDescr))
+
+    # ---------- code generation ----------
+
+    def emit(self, op):
+        self.newoperations.append(op)
+
+    def emit_first_iteration(self):
+        self.newoperations.append(self.label)
+        for op in self.scalar_ops:
+            if op.is_guard() and op not in self.early_guards:
+                self.emit_resuming_guard(op.getopnum(), op.getarglist())
+            else:
+                self.emit(op)
+
+    def emit_second_iteration(self):
+        labelargs = self.label.getarglist()
+        jumpargs = self.jump.getarglist()
+        renamed = {}
+        for i in range(len(labelargs)):
+            renamed[labelargs[i]] = jumpargs[i]
+        for op in self.scalar_ops:
+            opnum = op.getopnum()
+            if (opnum == rop.DEBUG_MERGE_POINT or opnum == rop.JIT_DEBUG or
+                    opnum == rop.GUARD_NOT_INVALIDATED):
+                continue
+            args = [renamed.get(arg, arg) for arg in op.getarglist()]
+            if op.is_guard():
+                self.emit_resuming_guard(opnum, args)
+            else:
+                result = op.result.clonebox()
+                renamed[op.result] = result
+                self.emit(op.copy_and_change(opnum, args=args, result=result))
+        return renamed
+
+    def emit_resuming_guard(self, opnum, args):
+        """Emit a guard that resumes on the passing path of the guard
+        chosen by find_resume_guard(), with nothing stored yet.
+        """
+        olddescr = self.resume_descr
+        assert isinstance(olddescr, compile.ResumeGuardDescr)
+        descr = compile.ResumeAtPositionDescr()
+        descr.copy_all_attributes_from(olddescr)
+        descr.rd_knowledge = None    # the facts held at another position
+        newop = ResOperation(opnum, args, None, descr=descr)
+        descr.store_final_boxes(newop, self.resume_failargs[:],
+                                self.metainterp_sd)
+        self.emit(newop)
+
+    def emit_overlap_checks(self):
+        # In the vector loop, the access of the second iteration at some
+        # position happens before the accesses of the first iteration at
+        # later positions.  That's only fine if they don't overlap.
+        for p in range(len(self.memrefs)):
+            ref_p = self.memrefs[p]
+            for q in range(p):
+                ref_q = self.memrefs[q]
+                if not (ref_p.is_store or ref_q.is_store):
+                    continue
+                overlap = self.check_overlap(ref_p, ref_q)
+                if overlap == OVERLAP_UNKNOWN:
+                    self.emit_overlap_guard(ref_p, ref_q)
+                elif overlap == OVERLAP_YES:
+                    raise NotVectorizable
+
+    def check_overlap(self, ref_p, ref_q):
+        """Check if 'ref_p' in the first iteration overlaps with 'ref_q'
+        in the second iteration.  This is the case if the address of
+        'ref_p' is strictly between 0 and 2 * FLOAT_SIZE bytes above the
+        address of 'ref_q' in the same iteration.
+        """
+        # we only know how to compute the distance between the addresses
+        # if they share a descr, and with it any fixed offset
+        if ref_p.op.getdescr() is not ref_q.op.getdescr():
+            raise NotVectorizable
+        if ref_p.base is not ref_q.base:
+            if not (isinstance(ref_p.base, Const) and
+                    isinstance(ref_q.base, Const) and
+                    ref_p.base.same_constant(ref_q.base)):
+                return OVERLAP_UNKNOWN
+        if (ref_p.form.var is not ref_q.form.var or
+                ref_p.form.coeff != ref_q.form.coeff):
+            return OVERLAP_UNKNOWN
+        distance = ref_p.scale * (ref_p.form.const - ref_q.form.const)
+        if 0 < distance < 2 * FLOAT_SIZE:
+            return OVERLAP_YES
+        return OVERLAP_NO
+
+    def _address_of(self, ref):
+        if ref.is_array_op():
+            offset = BoxInt()
+            self.emit(ResOperation(rop.INT_MUL,
+                                   [ref.index, ConstInt(FLOAT_SIZE)], offset))
+        else:
+            offset = ref.index
+        address = BoxInt()
+        self.emit(ResOperation(rop.INT_ADD, [ref.base, offset], address))
+        return address
+
+    def emit_overlap_guard(self, ref_p, ref_q):
+        # fail unless 0 < addr_p - addr_q < 16 is false, i.e. unless
+        # (addr_p - addr_q - 1) is not unsigned-lower than 15
+        address_p = self._address_of(ref_p)
+        address_q = self._address_of(ref_q)
+        diff = BoxInt()
+        self.emit(ResOperation(rop.INT_SUB, [address_p, address_q], diff))
+        diff1 = BoxInt()
+        self.emit(ResOperation(rop.INT_SUB, [diff, ConstInt(1)], diff1))
+        ok = BoxInt()
+        self.emit(ResOperation(rop.UINT_GE,
+                               [diff1, ConstInt(2 * FLOAT_SIZE - 1)], ok))
+        self.emit_resuming_guard(rop.GUARD_TRUE, [ok])
+
+    def emit_vector_operations(self):
+        vectors = {}
+        for op in self.vector_ops:
+            opnum = op.getopnum()
+            if opnum in VECTOR_ARITH:
+                args = [self.get_vector(vectors, arg)
+                        for arg in op.getarglist()]
+                result = BoxVector(VECTOR_WIDTH)
+                self.emit(ResOperation(VECTOR_ARITH[opnum], args, result))
+                vectors[op.result] = result
+            elif op.result is not None:
+                result = BoxVector(VECTOR_WIDTH)
+                self.emit(ResOperation(VECTOR_MEMORY[opnum],
+                                       [op.getarg(0), op.getarg(1)], result,
+                                       descr=op.getdescr()))
+                vectors[op.result] = result
+            else:
+                value = self.get_vector(vectors, op.getarg(2))
+                self.emit(ResOperation(VECTOR_MEMORY[opnum],
+                                       [op.getarg(0), op.getarg(1), value],
+                                       None, descr=op.getdescr()))
+
+    def get_vector(self, vectors, box):
+        try:
+            return vectors[box]
+        except KeyError:
+            pass
+        # a constant or loop-invariant float
+        result = BoxVector(VECTOR_WIDTH)
+        self.emit(ResOperation(rop.VEC_FLOAT_SPLAT, [box], result))
+        vectors[box] = result
+        return result
@@ -73,13 +73,16 @@ def get_fielddescrlist_cache(cpu):
 get_fielddescrlist_cache._annspecialcase_ = "specialize:memo"
 
 class AbstractVirtualStructValue(AbstractVirtualValue):
-    _attrs_ = ('_fields', 'cpu', '_cached_sorted_fields')
+    _attrs_ = ('_fields', 'cpu', '_cached_sorted_fields', '_lent_box',
+               '_lent_optimizer')
 
     def __init__(self, cpu, keybox, source_op=None):
         AbstractVirtualValue.__init__(self, keybox, source_op)
         self.cpu = cpu
         self._fields = {}
         self._cached_sorted_fields = None
+        self._lent_box = None
+        self._lent_optimizer = None
 
     def getfield(self, ofs, default):
         return self._fields.get(ofs, default)
@@ -150,18 +153,61 @@ class AbstractVirtualStructValue(AbstractVirtualValue):
                         ofs, box, subbox)
             # keep self._fields, because it's all immutable anyway
         else:
-            optforce.emit_operation(op)
-            self.box = box = op.result
-            #
-            iteritems = self._fields.iteritems()
-            if not we_are_translated(): #random order is fine, except for tests
-                iteritems = list(iteritems)
-                iteritems.sort(key=lambda (x, y): x.sort_key())
-            for ofs, value in iteritems:
-                subbox = value.force_box(optforce)
-                op = ResOperation(rop.SETFIELD_GC, [box, subbox], None,
-                                  descr=ofs)
+            if self._has_lent_box(optforce):
+                # reuse the copy that we passed to residual calls; they
+                # did not keep it, so nobody else can see it.  Its fields
+                # are written again below, as they may have changed since
+                box = self._lent_box
+            else:
                 optforce.emit_operation(op)
+                box = op.result
+            self.box = box
+            self._emit_setfields(optforce, box, False, None)
+
+    def _has_lent_box(self, optforce):
+        return (self._lent_box is not None and
+                self._lent_optimizer is optforce.optimizer)
+
+    def lend_box(self, optforce, lent):
+        """Return a box with a copy of this virtual, to pass to a residual
+        call that neither captures nor modifies it, or anything reachable
+        from it (see EffectInfo.check_nocapture_arg()).  Unlike
+        force_box(), this leaves the value virtual; a later force_box()
+        reuses the same copy.  'lent' is a dict of the values already
+        lent for the current call.
+        """
+        if self.box is not None:
+            return self.box
+        if self in lent:
+            return self._lent_box
+        if self._is_immutable_and_filled_with_constants():
+            return self.force_box(optforce)
+        if not self._has_lent_box(optforce):
+            op = self.source_op
+            assert op is not None
+            newop = ResOperation(op.getopnum(), op.getarglist(), BoxPtr(),
+                                 descr=op.getdescr())
+            optforce.emit_operation(newop)
+            self._lent_box = newop.result
+            self._lent_optimizer = optforce.optimizer
+        lent[self] = None
+        self._emit_setfields(optforce, self._lent_box, True, lent)
+        return self._lent_box
+
+    def _emit_setfields(self, optforce, box, lend, lent):
+        iteritems = self._fields.iteritems()
+        if not we_are_translated(): #random order is fine, except for tests
+            iteritems = list(iteritems)
+            iteritems.sort(key=lambda (x, y): x.sort_key())
+        for ofs, value in iteritems:
+            if (lend and value.is_virtual() and
+                    isinstance(value, AbstractVirtualStructValue)):
+                subbox = value.lend_box(optforce, lent)
+            else:
+                subbox = value.force_box(optforce)
+            op = ResOperation(rop.SETFIELD_GC, [box, subbox], None,
+                              descr=ofs)
+            optforce.emit_operation(op)
 
     def _get_field_descr_list(self):
         _cached_sorted_fields = self._cached_sorted_fields
@@ -733,8 +779,28 @@ class OptVirtualize(optimizer.Optimization):
             if value.is_virtual():
                 return
         else:
+            if effectinfo.nocapture_args != 0:
+                op = self._lend_nocapture_args(op, effectinfo)
             self.emit_operation(op)
 
+    def _lend_nocapture_args(self, op, effectinfo):
+        # the virtual structs passed as arguments that the callee does not
+        # capture stay virtual: the call gets a copy of them instead
+        newargs = None
+        lent = {}
+        for i in range(1, op.numargs()):
+            if not effectinfo.check_nocapture_arg(i):
+                continue
+            value = self.getvalue(op.getarg(i))
+            if (value.is_virtual() and
+                    isinstance(value, AbstractVirtualStructValue)):
+                if newargs is None:
+                    newargs = op.getarglist()[:]
+                newargs[i] = value.lend_box(self, lent)
+        if newargs is None:
+            return op
+        return op.copy_and_change(op.getopnum(), args=newargs)
+
     def do_RAW_MALLOC_VARSIZE_CHAR(self, op):
         sizebox = self.get_constant_box(op.getarg(1))
         if sizebox is None:
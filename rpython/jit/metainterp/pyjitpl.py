@@ -1758,6 +1758,7 @@ class MetaInterp(object):
         self.forced_virtualizable = None
         self.partial_trace = None
         self.retracing_from = -1
+        self.resumed_liveboxes = None
         self.call_pure_results = args_dict()
         self.heapcache = HeapCache()
 
@@ -2289,7 +2290,9 @@ class MetaInterp(object):
         # ignore the loop_token passed in.  It means that we go back to
         # interpreted mode, but it should come back very quickly to the
         # JIT, find probably the same 'loop_token', and execute it.
-        if we_are_translated():
+        # A 'loop_token' of None means that the loop was not compiled
+        # (see defer_compile_loop()).
+        if we_are_translated() or loop_token is None:
             num_green_args = self.jitdriver_sd.num_green_args
             gi, gr, gf = self._unpack_boxes(live_arg_boxes, 0, num_green_args)
             ri, rr, rf = self._unpack_boxes(live_arg_boxes, num_green_args,
@@ -2386,6 +2389,10 @@ class MetaInterp(object):
                                                    self.resumekey,
                                                    exported_state)
         else:
+            if not try_disabling_unroll and self.can_defer_compilation():
+                self.defer_compile_loop(greenkey, start,
+                                        original_boxes[num_green_args:],
+                                        live_arg_boxes)
             target_token = compile.compile_loop(self, greenkey, start,
                                                 original_boxes[num_green_args:],
                                                 live_arg_boxes[num_green_args:],
@@ -2401,6 +2408,28 @@ class MetaInterp(object):
             jitcell_token = target_token.targeting_jitcell_token
             self.raise_continue_running_normally(live_arg_boxes, jitcell_token)
 
+    def can_defer_compilation(self):
+        warmrunnerdesc = self.staticdata.warmrunnerdesc
+        if warmrunnerdesc is None:
+            return False
+        return warmrunnerdesc.compile_queue.can_defer()
+
+    def defer_compile_loop(self, greenkey, start, inputargs, live_arg_boxes):
+        """Put the loop in the CompileQueue instead of compiling it now,
+        and go back to interpreting it (see compilequeue.py).
+        """
+        from rpython.jit.metainterp.compilequeue import PendingLoop
+        num_green_args = self.jitdriver_sd.num_green_args
+        pending = PendingLoop(self.jitdriver_sd, greenkey,
+                              self.history.operations[start:],
+                              inputargs,
+                              live_arg_boxes[num_green_args:],
+                              self.call_pure_results)
+        self.staticdata.warmrunnerdesc.compile_queue.defer_loop(pending)
+        self.jitdriver_sd.warmstate.mark_compile_pending(greenkey)
+        self.staticdata.log('loop compilation deferred')
+        self.raise_continue_running_normally(live_arg_boxes, None)
+
     def compile_loop_or_abort(self, original_boxes, live_arg_boxes,
                               start):
         """Called after we aborted more than 'max_unroll_loops' times.
@@ -2523,6 +2552,7 @@ class MetaInterp(object):
             inputargs_and_holes = self.rebuild_state_after_failure(resumedescr,
                                                                    deadframe)
             self.history.inputargs = [box for box in inputargs_and_holes if box]
+            self.resumed_liveboxes = inputargs_and_holes
         finally:
             rstack._stack_criticalcode_stop()
 
@@ -440,6 +440,13 @@ _oplist = [
     'CONVERT_FLOAT_BYTES_TO_LONGLONG/1',
     'CONVERT_LONGLONG_BYTES_TO_FLOAT/1',
     #
+    # vector operations, only produced by optimizeopt/vectorize.py
+    'VEC_FLOAT_ADD/2',
+    'VEC_FLOAT_SUB/2',
+    'VEC_FLOAT_MUL/2',
+    'VEC_FLOAT_TRUEDIV/2',
+    'VEC_FLOAT_SPLAT/1',    # a vector with every element equal to the arg
+    #
     'INT_LT/2b',
     'INT_LE/2b',
     'INT_EQ/2b',
@@ -488,6 +495,8 @@ _oplist = [
     'GETARRAYITEM_RAW/2d',
     'GETINTERIORFIELD_GC/2d',
     'RAW_LOAD/2d',
+    'VEC_RAW_LOAD/2d',          # [addr, offset], loads consecutive items
+    'VEC_GETARRAYITEM_RAW/2d',  # [array, index], loads consecutive items
     'GETFIELD_GC/1d',
     'GETFIELD_RAW/1d',
     '_MALLOC_FIRST',
@@ -511,6 +520,8 @@ _oplist = [
     'SETINTERIORFIELD_GC/3d',
     'SETINTERIORFIELD_RAW/3d',    # right now, only used by tests
     'RAW_STORE/3d',
+    'VEC_RAW_STORE/3d',
+    'VEC_SETARRAYITEM_RAW/3d',
     'SETFIELD_GC/2d',
     'ZERO_PTR_FIELD/2', # only emitted by the rewrite, clears a pointer field
                         # at a given constant offset, no descr
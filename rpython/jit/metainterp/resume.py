@@ -75,19 +75,59 @@ def capture_resumedata(framestack, virtualizable_boxes, virtualref_boxes,
 #
 # The following is equivalent to the RPython-level declaration:
 #
-#     class Numbering: __slots__ = ['prev', 'nums']
+#     class Numbering: __slots__ = ['prev', 'code']
 #
 # except that it is more compact in translated programs, because the
-# array 'nums' is inlined in the single NUMBERING object.  This is
+# array 'code' is inlined in the single NUMBERING object.  This is
 # important because this is often the biggest single consumer of memory
-# in a pypy-c-jit.
+# in a pypy-c-jit.  For the same reason, 'code' does not store the
+# tagged numbers (see tag() below) directly: each of them is encoded
+# as a varint, in one to three bytes, see append_numbering_item().
+# Most tagged numbers are small and fit in a single byte.  The list is
+# only decoded, with unpack_numbering(), when a guard fails.
 #
 NUMBERINGP = lltype.Ptr(lltype.GcForwardReference())
 NUMBERING = lltype.GcStruct('Numbering',
                             ('prev', NUMBERINGP),
-                            ('nums', lltype.Array(rffi.SHORT)))
+                            ('code', lltype.Array(lltype.Char)))
 NUMBERINGP.TO.become(NUMBERING)
 
+def append_numbering_item(code, tagged):
+    # zigzag encoding: the tagged numbers are 16-bit signed integers,
+    # turn them into 16-bit unsigned integers with the sign in the
+    # lowest bit, and write them 7 bits at a time
+    tagged = rarithmetic.widen(tagged)
+    item = ((tagged << 1) ^ (tagged >> 15)) & 0xffff
+    while item >= 0x80:
+        code.append(chr((item & 0x7f) | 0x80))
+        item >>= 7
+    code.append(chr(item))
+
+def create_numbering(code, prev):
+    """Make a NUMBERING from the list of chars 'code'."""
+    numb = lltype.malloc(NUMBERING, len(code))
+    numb.prev = prev
+    for i in range(len(code)):
+        numb.code[i] = code[i]
+    return numb
+
+def unpack_numbering(numb):
+    """Return the list of tagged numbers stored in 'numb'."""
+    result = []
+    item = 0
+    shift = 0
+    for i in range(len(numb.code)):
+        byte = ord(numb.code[i])
+        item |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            tagged = (item >> 1) ^ -(item & 1)
+            result.append(rffi.cast(rffi.SHORT, tagged))
+            item = 0
+            shift = 0
+    return result
+
 PENDINGFIELDSTRUCT = lltype.Struct('PendingField',
                                    ('lldescr', OBJECTPTR),
                                    ('num', rffi.SHORT),
@@ -144,12 +184,20 @@ class ResumeDataLoopMemo(object):
         self.large_ints = {}
         self.refs = self.cpu.ts.new_ref_dict_2()
         self.numberings = {}
+        # NUMBERINGs with the same content and the same 'prev' are shared
+        # between all the guards of the trace: {key: (numb, numb_id)}
+        self.shared_numberings = {}
         self.cached_boxes = {}
         self.cached_virtuals = {}
 
         self.nvirtuals = 0
         self.nvholes = 0
         self.nvreused = 0
+        # statistics about the numberings, see log_sizes()
+        self.nnumberings = 0
+        self.nnumberings_shared = 0
+        self.nnumbering_items = 0
+        self.nnumbering_bytes = 0
 
     def getconst(self, const):
         if const.type == INT:
@@ -187,17 +235,21 @@ class ResumeDataLoopMemo(object):
     # env numbering
 
     def number(self, optimizer, snapshot):
+        numb, _, liveboxes, v = self._number(optimizer, snapshot)
+        return numb, liveboxes.copy(), v
+
+    def _number(self, optimizer, snapshot):
         if snapshot is None:
-            return lltype.nullptr(NUMBERING), {}, 0
+            return lltype.nullptr(NUMBERING), 0, {}, 0
         if snapshot in self.numberings:
-            numb, liveboxes, v = self.numberings[snapshot]
-            return numb, liveboxes.copy(), v
+            return self.numberings[snapshot]
 
-        numb1, liveboxes, v = self.number(optimizer, snapshot.prev)
+        numb1, numb1_id, liveboxes, v = self._number(optimizer, snapshot.prev)
+        liveboxes = liveboxes.copy()
         n = len(liveboxes) - v
         boxes = snapshot.boxes
         length = len(boxes)
-        numb = lltype.malloc(NUMBERING, length)
+        code = []
         for i in range(length):
             box = boxes[i]
             value = optimizer.getvalue(box)
@@ -215,11 +267,30 @@ class ResumeDataLoopMemo(object):
                     tagged = tag(n, TAGBOX)
                     n += 1
                 liveboxes[box] = tagged
-            numb.nums[i] = tagged
+            append_numbering_item(code, tagged)
         #
-        numb.prev = numb1
-        self.numberings[snapshot] = numb, liveboxes, v
-        return numb, liveboxes.copy(), v
+        numb, numb_id = self._get_shared_numbering(code, numb1, numb1_id)
+        self.nnumberings += 1
+        self.nnumbering_items += length
+        result = numb, numb_id, liveboxes, v
+        self.numberings[snapshot] = result
+        return result
+
+    def _get_shared_numbering(self, code, prev, prev_id):
+        # the tagged numbers only depend on the position of the boxes, so
+        # the guards of a trace often end up with the same numbering even
+        # if their snapshots are different
+        key = '%d:%s' % (prev_id, ''.join(code))
+        try:
+            result = self.shared_numberings[key]
+        except KeyError:
+            numb = create_numbering(code, prev)
+            result = numb, len(self.shared_numberings) + 1
+            self.shared_numberings[key] = result
+            self.nnumbering_bytes += len(code)
+        else:
+            self.nnumberings_shared += 1
+        return result
 
     def forget_numberings(self, virtualbox):
         # XXX ideally clear only the affected numberings
@@ -262,6 +333,16 @@ class ResumeDataLoopMemo(object):
         profiler.count(jitprof.Counters.NVHOLES, self.nvholes)
         profiler.count(jitprof.Counters.NVREUSED, self.nvreused)
 
+    def log_sizes(self):
+        # parsed by rpython/jit/tool/resumesize.py
+        debug_start("jit-resume-size")
+        debug_print("numberings:", self.nnumberings,
+                    "shared:", self.nnumberings_shared,
+                    "items:", self.nnumbering_items,
+                    "bytes:", self.nnumbering_bytes,
+                    "consts:", len(self.consts))
+        debug_stop("jit-resume-size")
+
 _frame_info_placeholder = (None, 0, 0)
 
 
@@ -817,6 +898,7 @@ class AbstractResumeDataReader(object):
     def _init(self, cpu, storage):
         self.cpu = cpu
         self.cur_numb = storage.rd_numb
+        self.cur_nums = None
         self.count = storage.rd_count
         self.consts = storage.rd_consts
 
@@ -899,22 +981,24 @@ class AbstractResumeDataReader(object):
     def _prepare_next_section(self, info):
         # Use info.enumerate_vars(), normally dispatching to
         # rpython.jit.codewriter.jitcode.  Some tests give a different 'info'.
+        self.cur_nums = unpack_numbering(self.cur_numb)
         info.enumerate_vars(self._callback_i,
                             self._callback_r,
                             self._callback_f,
                             self.unique_id)    # <-- annotation hack
         self.cur_numb = self.cur_numb.prev
+        self.cur_nums = None
 
     def _callback_i(self, index, register_index):
-        value = self.decode_int(self.cur_numb.nums[index])
+        value = self.decode_int(self.cur_nums[index])
         self.write_an_int(register_index, value)
 
     def _callback_r(self, index, register_index):
-        value = self.decode_ref(self.cur_numb.nums[index])
+        value = self.decode_ref(self.cur_nums[index])
         self.write_a_ref(register_index, value)
 
     def _callback_f(self, index, register_index):
-        value = self.decode_float(self.cur_numb.nums[index])
+        value = self.decode_float(self.cur_nums[index])
         self.write_a_float(register_index, value)
 
 # ---------- when resuming for pyjitpl.py, make boxes ----------
@@ -955,36 +1039,36 @@ class ResumeDataBoxReader(AbstractResumeDataReader):
         self.boxes_f = boxes_f
         self._prepare_next_section(info)
 
-    def consume_virtualizable_boxes(self, vinfo, numb):
+    def consume_virtualizable_boxes(self, vinfo, nums):
         # we have to ignore the initial part of 'nums' (containing vrefs),
         # find the virtualizable from nums[-1], and use it to know how many
         # boxes of which type we have to return.  This does not write
         # anything into the virtualizable.
-        index = len(numb.nums) - 1
-        virtualizablebox = self.decode_ref(numb.nums[index])
+        index = len(nums) - 1
+        virtualizablebox = self.decode_ref(nums[index])
         virtualizable = vinfo.unwrap_virtualizable_box(virtualizablebox)
-        return vinfo.load_list_of_boxes(virtualizable, self, numb)
+        return vinfo.load_list_of_boxes(virtualizable, self, nums)
 
-    def consume_virtualref_boxes(self, numb, end):
+    def consume_virtualref_boxes(self, nums, end):
         # Returns a list of boxes, assumed to be all BoxPtrs.
         # We leave up to the caller to call vrefinfo.continue_tracing().
         assert (end & 1) == 0
-        return [self.decode_ref(numb.nums[i]) for i in range(end)]
+        return [self.decode_ref(nums[i]) for i in range(end)]
 
     def consume_vref_and_vable_boxes(self, vinfo, ginfo):
-        numb = self.cur_numb
-        self.cur_numb = numb.prev
+        nums = unpack_numbering(self.cur_numb)
+        self.cur_numb = self.cur_numb.prev
         if vinfo is not None:
-            virtualizable_boxes = self.consume_virtualizable_boxes(vinfo, numb)
-            end = len(numb.nums) - len(virtualizable_boxes)
+            virtualizable_boxes = self.consume_virtualizable_boxes(vinfo, nums)
+            end = len(nums) - len(virtualizable_boxes)
         elif ginfo is not None:
-            index = len(numb.nums) - 1
-            virtualizable_boxes = [self.decode_ref(numb.nums[index])]
-            end = len(numb.nums) - 1
+            index = len(nums) - 1
+            virtualizable_boxes = [self.decode_ref(nums[index])]
+            end = len(nums) - 1
         else:
             virtualizable_boxes = None
-            end = len(numb.nums)
-        virtualref_boxes = self.consume_virtualref_boxes(numb, end)
+            end = len(nums)
+        virtualref_boxes = self.consume_virtualref_boxes(nums, end)
         return virtualizable_boxes, virtualref_boxes
 
     def allocate_with_vtable(self, known_class):
@@ -1264,7 +1348,7 @@ class ResumeDataDirectReader(AbstractResumeDataReader):
         info = blackholeinterp.get_current_position_info()
         self._prepare_next_section(info)
 
-    def consume_virtualref_info(self, vrefinfo, numb, end):
+    def consume_virtualref_info(self, vrefinfo, nums, end):
         # we have to decode a list of references containing pairs
         # [..., virtual, vref, ...]  stopping at 'end'
         if vrefinfo is None:
@@ -1272,22 +1356,22 @@ class ResumeDataDirectReader(AbstractResumeDataReader):
             return
         assert (end & 1) == 0
         for i in range(0, end, 2):
-            virtual = self.decode_ref(numb.nums[i])
-            vref = self.decode_ref(numb.nums[i + 1])
+            virtual = self.decode_ref(nums[i])
+            vref = self.decode_ref(nums[i + 1])
             # For each pair, we store the virtual inside the vref.
             vrefinfo.continue_tracing(vref, virtual)
 
-    def consume_vable_info(self, vinfo, numb):
+    def consume_vable_info(self, vinfo, nums):
         # we have to ignore the initial part of 'nums' (containing vrefs),
         # find the virtualizable from nums[-1], load all other values
         # from the CPU stack, and copy them into the virtualizable
         if vinfo is None:
-            return len(numb.nums)
-        index = len(numb.nums) - 1
-        virtualizable = self.decode_ref(numb.nums[index])
+            return len(nums)
+        index = len(nums) - 1
+        virtualizable = self.decode_ref(nums[index])
         # just reset the token, we'll force it later
         vinfo.reset_token_gcref(virtualizable)
-        return vinfo.write_from_resume_data_partial(virtualizable, self, numb)
+        return vinfo.write_from_resume_data_partial(virtualizable, self, nums)
 
     def load_value_of_type(self, TYPE, tagged):
         from rpython.jit.metainterp.warmstate import specialize_value
@@ -1304,13 +1388,13 @@ class ResumeDataDirectReader(AbstractResumeDataReader):
     load_value_of_type._annspecialcase_ = 'specialize:arg(1)'
 
     def consume_vref_and_vable(self, vrefinfo, vinfo, ginfo):
-        numb = self.cur_numb
-        self.cur_numb = numb.prev
+        nums = unpack_numbering(self.cur_numb)
+        self.cur_numb = self.cur_numb.prev
         if self.resume_after_guard_not_forced != 2:
-            end_vref = self.consume_vable_info(vinfo, numb)
+            end_vref = self.consume_vable_info(vinfo, nums)
             if ginfo is not None:
                 end_vref -= 1
-            self.consume_virtualref_info(vrefinfo, numb, end_vref)
+            self.consume_virtualref_info(vrefinfo, nums, end_vref)
 
     def allocate_with_vtable(self, known_class):
         from rpython.jit.metainterp.executor import exec_new_with_vtable
@@ -48,6 +48,7 @@ def _get_jitcodes(testself, CPUClass, func, values,
 
         trace_limit = sys.maxint
         enable_opts = ALL_OPTS_DICT
+        vec = 0
 
     if kwds.pop('disable_optimizations', False):
         FakeWarmRunnerState.enable_opts = {}
@@ -1488,7 +1488,7 @@ class BasicTests:
             return x
         res = self.meta_interp(f, [299], listops=True)
         assert res == f(299)
-        self.check_resops(guard_class=0, guard_nonnull=4,
+        self.check_resops(guard_class=0, guard_nonnull=0,
                           guard_nonnull_class=4, guard_isnull=2)
 
 
@@ -1516,7 +1516,7 @@ class BasicTests:
             return x
         res = self.meta_interp(f, [299], listops=True)
         assert res == f(299)
-        self.check_resops(guard_value=4, guard_class=0, guard_nonnull=4,
+        self.check_resops(guard_value=4, guard_class=0, guard_nonnull=0,
                           guard_nonnull_class=0, guard_isnull=2)
 
 
@@ -1544,7 +1544,7 @@ class BasicTests:
             return x
         res = self.meta_interp(f, [299], listops=True)
         assert res == f(299)
-        self.check_resops(guard_value=4, guard_class=0, guard_nonnull=4,
+        self.check_resops(guard_value=4, guard_class=0, guard_nonnull=0,
                           guard_nonnull_class=0, guard_isnull=2)
 
 
@@ -1575,7 +1575,7 @@ class BasicTests:
             return x
         res = self.meta_interp(f, [399], listops=True)
         assert res == f(399)
-        self.check_resops(guard_class=0, guard_nonnull=6, guard_value=6,
+        self.check_resops(guard_class=0, guard_nonnull=0, guard_value=6,
                           guard_nonnull_class=0, guard_isnull=2)
 
 
@@ -2652,7 +2652,7 @@ class BasicTests:
                 i += 1
             return sa
         assert self.meta_interp(f, [20]) == f(20)
-        self.check_resops(int_lt=6, int_le=2, int_ge=4, int_gt=3)
+        self.check_resops(int_lt=6, int_le=2, int_ge=2, int_gt=3)
 
 
     def test_intbounds_not_generalized2(self):
@@ -2695,6 +2695,52 @@ class BasicTests:
         self.check_jitcell_token_count(1)
         self.check_target_token_count(5)
 
+    def test_max_retrace_limit(self):
+        myjitdriver = JitDriver(greens = [], reds = ['n', 'i', 'sa', 'a'])
+
+        def f(n, limit):
+            set_param(myjitdriver, 'retrace_limit', 2)
+            set_param(myjitdriver, 'max_retrace_limit', limit)
+            sa = i = a = 0
+            while i < n:
+                myjitdriver.jit_merge_point(n=n, i=i, sa=sa, a=a)
+                a = i/4
+                a = hint(a, promote=True)
+                sa += a
+                i += 1
+            return sa
+        # every retrace produces a specialized loop, so the limit is
+        # raised for the loop up to max_retrace_limit
+        assert self.meta_interp(f, [20, 3]) == f(20, 3)
+        self.check_jitcell_token_count(1)
+        self.check_target_token_count(5)
+        assert self.meta_interp(f, [20, 2]) == f(20, 2)
+        self.check_jitcell_token_count(1)
+        self.check_target_token_count(4)
+        # the retraces that jumped to the preamble are not successes
+        [token] = get_stats().get_all_jitcell_tokens()
+        assert token.retrace_successes == token.retraced_count == 2
+
+    def test_retrace_successes(self):
+        myjitdriver = JitDriver(greens = [], reds = ['n', 'x'])
+
+        def f(n, x):
+            while n > 0:
+                myjitdriver.can_enter_jit(n=n, x=x)
+                myjitdriver.jit_merge_point(n=n, x=x)
+                if n % 2:
+                    x = 3
+                else:
+                    x = 5
+                n -= 1
+            return x
+        self.meta_interp(f, [40, 0])
+        # the retrace jumps to the loop of the first trace instead of
+        # closing its own loop: it must not count as a success
+        [token] = get_stats().get_all_jitcell_tokens()
+        assert token.retraced_count == 1
+        assert token.retrace_successes == 0
+
     def test_max_retrace_guards(self):
         myjitdriver = JitDriver(greens = [], reds = ['n', 'i', 'sa', 'a'])
 
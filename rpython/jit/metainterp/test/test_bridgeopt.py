@@ -0,0 +1,61 @@
+from rpython.jit.metainterp.test.support import LLJitMixin
+from rpython.rlib.jit import JitDriver
+
+
+class BridgeOptTests(object):
+
+    def test_known_class_in_bridge(self):
+        myjitdriver = JitDriver(greens=[], reds=['i', 'm', 'n', 'res', 'a'])
+        class A(object):
+            def f(self):
+                return 1
+        class B(A):
+            def f(self):
+                return 2
+        def g(a, m, n):
+            i = 0
+            res = 0
+            while i < n:
+                myjitdriver.jit_merge_point(a=a, i=i, m=m, n=n, res=res)
+                res += a.f()
+                if i >= m:
+                    res += a.f() * 3
+                i += 1
+            return res
+        def f(n, m, k):
+            if k:
+                a = B()
+            else:
+                a = A()
+            return g(a, m, n)
+        res = self.meta_interp(f, [40, 20, 1])
+        assert res == f(40, 20, 1)
+        # only the preamble needs to check the class of 'a', the bridge
+        # starting at 'i >= m' knows it
+        self.check_resops(guard_class=1)
+        self.check_trace_count(3)
+
+    def test_bounds_in_bridge(self):
+        myjitdriver = JitDriver(greens=[], reds=['i', 'm', 'n', 'res'])
+        def f(n, m):
+            i = 0
+            res = 0
+            while i < n:
+                myjitdriver.jit_merge_point(i=i, m=m, n=n, res=res)
+                if i > 1000:
+                    return -1
+                res += i
+                if i >= m:
+                    res += 3
+                i += 1
+            return res
+        res = self.meta_interp(f, [40, 20])
+        assert res == f(40, 20)
+        # the bridge knows that 'i <= 1000' held in the loop, so it does
+        # not need to check that 'i + 1 <= 1001' before jumping back to it
+        self.check_resops(int_le=0)
+        self.check_trace_count(3)
+
+
+class TestLLtype(BridgeOptTests, LLJitMixin):
+    pass
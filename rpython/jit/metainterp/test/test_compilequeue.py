@@ -0,0 +1,103 @@
+from rpython.jit.metainterp.test.support import LLJitMixin
+from rpython.rlib.jit import JitDriver, we_are_jitted
+from rpython.rlib import jit_hooks
+
+
+class CompileQueueTests(object):
+
+    def make_loop(self):
+        myjitdriver = JitDriver(greens=['k'], reds=['i', 'res'])
+        def loop(k, n):
+            # returns the number of iterations that ran in machine code
+            i = n
+            res = 0
+            while i > 0:
+                myjitdriver.jit_merge_point(k=k, i=i, res=res)
+                if we_are_jitted():
+                    res += 1
+                i -= k
+            return res
+        return loop
+
+    def test_compile_pending(self):
+        loop = self.make_loop()
+        def main(k):
+            res1 = loop(k, 30)
+            assert jit_hooks.stats_compile_queue_get_pending(None) == 1
+            res2 = loop(k, 30)
+            assert jit_hooks.stats_compile_pending(None) == 1
+            assert jit_hooks.stats_compile_queue_get_pending(None) == 0
+            assert jit_hooks.stats_compile_queue_get_deferred(None) == 1
+            res3 = loop(k, 30)
+            return res1 * 10000 + res2 * 100 + res3
+        res = self.meta_interp(main, [1], compile_queue=5)
+        # only the iteration that was traced counts before compile_pending()
+        assert res // 10000 <= 1
+        assert res // 100 % 100 == 0
+        assert res % 100 > 25
+        self.check_enter_count(1)
+        self.check_trace_count(1)
+
+    def test_queue_full(self):
+        loop = self.make_loop()
+        def main(k):
+            res1 = loop(k, 30)
+            res2 = loop(k + 1, 60)
+            assert jit_hooks.stats_compile_queue_get_pending(None) == 1
+            assert jit_hooks.stats_compile_pending(None) == 1
+            return res1 * 100 + res2
+        res = self.meta_interp(main, [1], compile_queue=1)
+        assert res // 100 <= 1
+        assert res % 100 > 25
+        self.check_trace_count(2)
+
+    def test_giveup_while_pending(self):
+        # the optimizer gives up on this loop, because its guards need
+        # more failargs than allowed, while it is in the queue
+        myjitdriver = JitDriver(greens=[], reds=['i', 'n', 'o'])
+        class A(object):
+            def __init__(self, i0, i1, i2, i3, i4, i5, i6, i7, i8, i9):
+                self.i0 = i0
+                self.i1 = i1
+                self.i2 = i2
+                self.i3 = i3
+                self.i4 = i4
+                self.i5 = i5
+                self.i6 = i6
+                self.i7 = i7
+                self.i8 = i8
+                self.i9 = i9
+        def loop(n):
+            i = 0
+            o = A(0, 1, 2, 3, 4, 5, 6, 7, 8, 9)
+            while i < n:
+                myjitdriver.jit_merge_point(o=o, i=i, n=n)
+                o = A(i, i + 1, i + 2, i + 3, i + 4, i + 5,
+                      i + 6, i + 7, i + 8, i + 9)
+                i += 1
+            return o.i9
+        def main(n):
+            res = loop(n)
+            assert jit_hooks.stats_compile_queue_get_pending(None) == 1
+            assert jit_hooks.stats_compile_pending(None) == 0
+            assert jit_hooks.stats_compile_queue_get_pending(None) == 0
+            assert jit_hooks.stats_compile_queue_get_failed(None) == 1
+            return res + loop(n)
+        res = self.meta_interp(main, [30], compile_queue=5,
+                               failargs_limit=10, listops=True)
+        assert res == 2 * (29 + 9)
+
+    def test_no_queue(self):
+        loop = self.make_loop()
+        def main(k):
+            res = loop(k, 30)
+            assert jit_hooks.stats_compile_queue_get_pending(None) == 0
+            assert jit_hooks.stats_compile_pending(None) == 0
+            return res
+        res = self.meta_interp(main, [1])
+        assert res > 25
+        self.check_trace_count(1)
+
+
+class TestLLtype(CompileQueueTests, LLJitMixin):
+    pass
@@ -128,3 +128,30 @@ def test_change_current_fraction():
     assert r is False
     r = jc.tick(index2hash(jc, 104), incr)
     assert r is True
+
+def test_get_current_fraction():
+    jc = JitCounter()
+    incr = jc.compute_threshold(8)
+    assert jc.get_current_fraction(index2hash(jc, 104)) == 0.0
+    jc.tick(index2hash(jc, 104), incr)
+    jc.tick(index2hash(jc, 104), incr)
+    assert abs(jc.get_current_fraction(index2hash(jc, 104)) - 0.25) < 1E-3
+    assert jc.get_current_fraction(index2hash(jc, 104, subhash=1)) == 0.0
+    jc.change_current_fraction(index2hash(jc, 104, subhash=1), 0.95)
+    assert abs(jc.get_current_fraction(index2hash(jc, 104, subhash=1)) -
+               0.95) < 1E-6
+    jc.reset(index2hash(jc, 104))
+    assert jc.get_current_fraction(index2hash(jc, 104)) == 0.0
+
+def test_get_all_cells():
+    class Alive:
+        next = None
+        def should_remove_jitcell(self):
+            return False
+    jc = JitCounter()
+    assert jc.get_all_cells() == []
+    c1, c2, c3 = Alive(), Alive(), Alive()
+    jc.install_new_cell(index2hash(jc, 104), c1)
+    jc.install_new_cell(index2hash(jc, 104), c2)
+    jc.install_new_cell(index2hash(jc, 7), c3)
+    assert jc.get_all_cells() == [c3, c1, c2]
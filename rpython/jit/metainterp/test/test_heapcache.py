@@ -29,27 +29,33 @@ class FakeEffectinfo(object):
 
     OS_ARRAYCOPY = 0
 
-    def __init__(self, extraeffect, oopspecindex, write_descrs_fields, write_descrs_arrays):
+    def __init__(self, extraeffect, oopspecindex, write_descrs_fields, write_descrs_arrays, nocapture_args=0):
         self.extraeffect = extraeffect
         self.oopspecindex = oopspecindex
         self.write_descrs_fields = write_descrs_fields
         self.write_descrs_arrays = write_descrs_arrays
+        self.nocapture_args = nocapture_args
 
     def has_random_effects(self):
         return self.extraeffect == self.EF_RANDOM_EFFECTS
 
+    def check_nocapture_arg(self, index):
+        return (self.nocapture_args & (1 << index)) != 0
+
 class FakeCallDescr(object):
-    def __init__(self, extraeffect, oopspecindex=None, write_descrs_fields=[], write_descrs_arrays=[]):
+    def __init__(self, extraeffect, oopspecindex=None, write_descrs_fields=[], write_descrs_arrays=[], nocapture_args=0):
         self.extraeffect = extraeffect
         self.oopspecindex = oopspecindex
         self.write_descrs_fields = write_descrs_fields
         self.write_descrs_arrays = write_descrs_arrays
+        self.nocapture_args = nocapture_args
 
     def get_extra_info(self):
         return FakeEffectinfo(
             self.extraeffect, self.oopspecindex,
             write_descrs_fields=self.write_descrs_fields,
             write_descrs_arrays=self.write_descrs_arrays,
+            nocapture_args=self.nocapture_args,
         )
 
 arraycopydescr1 = FakeCallDescr(FakeEffectinfo.EF_CANNOT_RAISE, FakeEffectinfo.OS_ARRAYCOPY, write_descrs_arrays=[descr1])
@@ -541,6 +547,32 @@ class TestHeapCache(object):
         )
         assert h.getfield(box1, descr1) is box2
 
+    def test_call_nocapture_args_stay_unescaped(self):
+        h = HeapCache()
+        h.new(box1)
+        h.new(box2)
+        h.new(box3)
+        h.invalidate_caches(rop.SETFIELD_GC, None, [box1, box3])
+        h.setfield(box1, box3, descr1)
+        # the callee does not capture its first argument, box1 (argument
+        # 0 is the function), and so not box3 either, but it does
+        # capture box2
+        h.invalidate_caches(rop.CALL,
+            FakeCallDescr(FakeEffectinfo.EF_CAN_RAISE, nocapture_args=0x2),
+            [ConstInt(123), box1, box2]
+        )
+        assert h.is_unescaped(box1)
+        assert h.is_unescaped(box3)
+        assert not h.is_unescaped(box2)
+        assert h.getfield(box1, descr1) is box3
+        # with another call, box1 escapes, and box3 with it
+        h.invalidate_caches(rop.CALL,
+            FakeCallDescr(FakeEffectinfo.EF_CAN_RAISE, nocapture_args=0x4),
+            [ConstInt(123), box1, box2]
+        )
+        assert not h.is_unescaped(box1)
+        assert not h.is_unescaped(box3)
+
     def test_call_doesnt_invalidate_unescaped_array_boxes(self):
         h = HeapCache()
         h.new_array(box1, lengthbox1)
@@ -601,6 +633,7 @@ class TestHeapCache(object):
             EF_LOOPINVARIANT = 1
             EF_ELIDABLE_CANNOT_RAISE = 2
             EF_ELIDABLE_CAN_RAISE = 3
+            nocapture_args = 0
         descr.get_extra_info = XTra
         h.invalidate_caches(rop.CALL, descr, [])
         assert h.is_unescaped(box1)
@@ -0,0 +1,74 @@
+from rpython.jit.metainterp.test.support import LLJitMixin
+from rpython.rlib.jit import JitDriver, we_are_jitted, set_param
+from rpython.rlib import jit_hooks
+from rpython.rtyper.annlowlevel import llstr, hlstr
+
+
+class HotProfileTests(object):
+
+    def make_loop(self):
+        myjitdriver = JitDriver(greens=['k'], reds=['i', 'res'],
+                                name='hotloop',
+                                get_printable_location=lambda k: 'k=%d' % k)
+        def loop(k, n):
+            # returns the number of iterations that ran in machine code
+            i = n
+            res = 0
+            while i > 0:
+                myjitdriver.jit_merge_point(k=k, i=i, res=res)
+                if we_are_jitted():
+                    res += 1
+                i -= 1
+            return res
+        return myjitdriver, loop
+
+    def test_dump_profile(self):
+        myjitdriver, loop = self.make_loop()
+        def main(k):
+            set_param(myjitdriver, 'threshold', 10)
+            loop(k, 30)
+            loop(k + 1, 5)
+            profile = hlstr(jit_hooks.stats_dump_hotness_profile(None))
+            assert profile == 'hotloop 1000 k=%d\n' % k
+            return len(profile)
+        self.meta_interp(main, [7])
+
+    def test_load_profile(self):
+        myjitdriver, loop = self.make_loop()
+        profile = ('hotloop 1000 k=7\n'
+                   'hotloop 500 k=8\n'
+                   'otherloop 1000 k=9\n'
+                   'garbage\n'
+                   'hotloop xx k=10\n')
+        def main(k):
+            set_param(myjitdriver, 'threshold', 1000)
+            n = jit_hooks.stats_load_hotness_profile(None, llstr(profile))
+            assert n == 2
+            res1 = loop(k, 30)
+            res2 = loop(k + 2, 30)
+            return res1 * 100 + res2
+        res = self.meta_interp(main, [7])
+        # 'k=7' is traced almost immediately, 'k=9' never
+        assert res // 100 > 25
+        assert res % 100 == 0
+        self.check_trace_count(1)
+
+    def test_seed_lookups_bounded(self, monkeypatch):
+        from rpython.jit.metainterp import hotprofile
+        monkeypatch.setattr(hotprofile, 'SEED_LOOKUPS', 3)
+        myjitdriver, loop = self.make_loop()
+        profile = 'hotloop 1000 k=7\n'
+        def main(k):
+            set_param(myjitdriver, 'threshold', 1000)
+            jit_hooks.stats_load_hotness_profile(None, llstr(profile))
+            for j in range(3):
+                loop(k + 1 + j, 2)
+            # the seed for 'k=7' was dropped after 3 lookups
+            return loop(k, 30)
+        res = self.meta_interp(main, [7])
+        assert res == 0
+        self.check_trace_count(0)
+
+
+class TestLLtype(HotProfileTests, LLJitMixin):
+    pass
@@ -1,5 +1,6 @@
 
-from rpython.rlib.jit import JitDriver, JitHookInterface, Counters
+from rpython.rlib.jit import (JitDriver, JitHookInterface, Counters, set_param,
+                              promote)
 from rpython.rlib import jit_hooks
 from rpython.jit.metainterp.test.support import LLJitMixin
 from rpython.jit.codewriter.policy import JitPolicy
@@ -191,6 +192,87 @@ class JitHookInterfaceTests(object):
             assert jit_hooks.stats_get_times_value(None, Counters.TRACING) == 0
         self.meta_interp(main, [], ProfilerClass=EmptyProfiler)
 
+    def test_get_memmgr_stats(self):
+        driver = JitDriver(greens = [], reds = ['i'])
+        def loop(i):
+            while i > 0:
+                driver.jit_merge_point(i=i)
+                i -= 1
+        def main():
+            loop(30)
+            assert jit_hooks.stats_memmgr_get_total_size(None) > 0
+            assert jit_hooks.stats_memmgr_get_max_size(None) == 2048
+            assert jit_hooks.stats_memmgr_get_limit_hits(None) == 0
+            assert jit_hooks.stats_memmgr_get_evicted_loops(None) == 0
+        self.meta_interp(main, [], loop_memory_limit=2)
+
+    def test_guard_failures_and_locations(self):
+        def get_location(k):
+            return 'loc%d' % k
+        driver = JitDriver(greens = ['k'], reds = ['i', 's'],
+                           get_printable_location=get_location)
+        def loop(k, i):
+            s = 0
+            while i > 0:
+                driver.jit_merge_point(k=k, i=i, s=s)
+                if i % 10 == 0:
+                    s += 1
+                i -= 1
+            return s
+        def main(k):
+            jit_hooks.stats_set_debug(None, True)
+            set_param(driver, 'trace_eagerness', 10000)
+            loop(k, 100)
+            l = jit_hooks.stats_get_guard_failures(None)
+            assert len(l) >= 1
+            total = 0
+            for i in range(len(l)):
+                assert l[i].type == 'g'
+                total += l[i].counter
+                loc = jit_hooks.stats_get_location(None, 'g', l[i].number)
+                assert hlstr(loc) == 'loc1'
+            assert total >= 9
+            assert hlstr(jit_hooks.stats_get_location(None, 'g', -42)) == ''
+            top = jit_hooks.stats_get_top_failing_guards(None, 1)
+            assert len(top) == 1
+            for i in range(len(l)):
+                assert l[i].counter <= top[0].counter
+            reasons = jit_hooks.stats_get_guard_reasons(None)
+            counting = 0
+            for i in range(len(reasons)):
+                assert reasons[i].type in 'cbft'
+                if reasons[i].number == top[0].number:
+                    assert reasons[i].type == 'c'
+                    counting += reasons[i].counter
+            assert counting == top[0].counter
+        self.meta_interp(main, [1])
+
+    def test_retrace_limit_hits(self):
+        def get_location():
+            return 'loc'
+        driver = JitDriver(greens = [], reds = ['n', 'i', 'sa', 'a'],
+                           get_printable_location=get_location)
+        def loop(n):
+            sa = i = a = 0
+            while i < n:
+                driver.jit_merge_point(n=n, i=i, sa=sa, a=a)
+                a = i / 4
+                a = promote(a)
+                sa += a
+                i += 1
+            return sa
+        def main(n):
+            jit_hooks.stats_set_debug(None, True)
+            set_param(driver, 'retrace_limit', 1)
+            loop(n)
+            l = jit_hooks.stats_get_retrace_limit_hits(None)
+            assert len(l) == 1
+            assert l[0].type == 'e'
+            assert l[0].counter >= 1
+            loc = jit_hooks.stats_get_location(None, 'e', l[0].number)
+            assert hlstr(loc) == 'loc'
+        self.meta_interp(main, [40])
+
 
 class LLJitHookInterfaceTests(JitHookInterfaceTests):
     # use this for any backend, instead of the super class
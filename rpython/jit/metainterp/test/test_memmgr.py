@@ -15,12 +15,14 @@ from rpython.jit.metainterp.memmgr import MemoryManager
 from rpython.jit.metainterp.test.support import LLJitMixin
 from rpython.rlib.jit import JitDriver, dont_look_inside
 from rpython.jit.metainterp.warmspot import get_stats
+from rpython.jit.metainterp import pyjitpl
 from rpython.jit.metainterp.warmstate import BaseJitCell
 from rpython.rlib import rgc
 
 class FakeLoopToken:
     generation = 0
     invalidated = False
+    memory_size = 0
 
 
 class _TestMemoryManager:
@@ -78,6 +80,52 @@ class _TestMemoryManager:
             else:
                 assert tokens[i] in memmgr.alive_loops
 
+    def test_max_size(self):
+        memmgr = MemoryManager()
+        memmgr.set_max_size(1000)
+        tokens = [FakeLoopToken() for i in range(10)]
+        for token in tokens:
+            memmgr.keep_loop_alive(token)
+            memmgr.record_size(token, 200)
+            memmgr.next_generation()
+        # going over 1000 evicts the oldest loops, down to 750 bytes
+        assert memmgr.alive_loops == dict.fromkeys(tokens[6:])
+        assert memmgr.total_size == 800
+        assert memmgr.num_limit_hits == 2
+        assert memmgr.num_evicted_loops == 6
+
+    def test_max_size_lru(self):
+        memmgr = MemoryManager()
+        memmgr.set_max_size(1000)
+        tokens = [FakeLoopToken() for i in range(10)]
+        for token in tokens:
+            memmgr.keep_loop_alive(token)
+            memmgr.record_size(token, 200)
+            memmgr.next_generation()
+            # tokens[0] is still entered all the time
+            memmgr.keep_loop_alive(tokens[0])
+        assert tokens[0] in memmgr.alive_loops
+        assert memmgr.total_size <= 1000
+        # a bridge of an old loop counts as well
+        memmgr.record_size(tokens[0], 500)
+        assert tokens[0].memory_size == 700
+        assert memmgr.total_size <= 750
+        assert tokens[0] in memmgr.alive_loops
+
+    def test_max_size_disabled(self):
+        memmgr = MemoryManager()
+        tokens = [FakeLoopToken() for i in range(10)]
+        for token in tokens:
+            memmgr.keep_loop_alive(token)
+            memmgr.record_size(token, 20000)
+            memmgr.next_generation()
+        assert memmgr.alive_loops == dict.fromkeys(tokens)
+        assert memmgr.total_size == 200000
+        # setting a limit evicts loops immediately
+        memmgr.set_max_size(100000)
+        assert len(memmgr.alive_loops) == 3
+        assert memmgr.num_limit_hits == 1
+
 
 class _TestIntegration(LLJitMixin):
     # See comments in TestMemoryManager.  To get temporarily the normal
@@ -224,6 +272,29 @@ class _TestIntegration(LLJitMixin):
         # Loop with number 0, h(), has not been freed
         assert 0 in [t.number for t in tokens if t]
 
+    def test_loop_memory_limit(self):
+        myjitdriver = JitDriver(greens=['m'], reds=['n'])
+        def g(m):
+            n = 10
+            while n > 0:
+                myjitdriver.can_enter_jit(n=n, m=m)
+                myjitdriver.jit_merge_point(n=n, m=m)
+                n = n - 1
+            return 21
+        def f():
+            for i in range(20):
+                g(i)
+            return 42
+
+        res = self.meta_interp(f, [], loop_memory_limit=1)
+        assert res == 42
+        memmgr = pyjitpl._warmrunnerdesc.memory_manager
+        assert memmgr.num_limit_hits > 0
+        assert memmgr.num_evicted_loops > 0
+        assert memmgr.total_size <= 1024
+        tokens = [t() for t in get_stats().jitcell_token_wrefs]
+        assert None in tokens
+
 # ____________________________________________________________
 
 def test_all():
@@ -52,8 +52,9 @@ def dump_storage(storage, liveboxes):
             frameinfo = frameinfo.prev
         numb = storage.rd_numb
         while numb:
-            debug_print('\tnumb', str([untag(numb.nums[i])
-                                       for i in range(len(numb.nums))]),
+            nums = unpack_numbering(numb)
+            debug_print('\tnumb', str([untag(nums[i])
+                                       for i in range(len(nums))]),
                         'at', compute_unique_id(numb))
             numb = numb.prev
         for const in storage.rd_consts:
@@ -256,11 +257,10 @@ def _next_section(reader, *expected):
 
 
 def Numbering(prev, nums):
-    numb = lltype.malloc(NUMBERING, len(nums))
-    numb.prev = prev or lltype.nullptr(NUMBERING)
-    for i in range(len(nums)):
-        numb.nums[i] = nums[i]
-    return numb
+    code = []
+    for tagged in nums:
+        append_numbering_item(code, tagged)
+    return create_numbering(code, prev or lltype.nullptr(NUMBERING))
 
 def test_simple_read():
     #b1, b2, b3 = [BoxInt(), BoxPtr(), BoxInt()]
@@ -529,12 +529,30 @@ def test_Numbering_create():
     l = [rffi.r_short(1), rffi.r_short(2)]
     numb = Numbering(None, l)
     assert not numb.prev
-    assert list(numb.nums) == l
+    assert unpack_numbering(numb) == l
 
     l1 = [rffi.r_short(3)]
     numb1 = Numbering(numb, l1)
     assert numb1.prev == numb
-    assert list(numb1.nums) == l1
+    assert unpack_numbering(numb1) == l1
+
+def test_Numbering_varint():
+    l = [tag(0, TAGCONST), tag(5, TAGBOX), tag(31, TAGINT), tag(32, TAGINT),
+         tag(-1, TAGINT), tag(-2**12, TAGINT), tag(2**13 - 1, TAGVIRTUAL),
+         NULLREF, UNASSIGNED, UNASSIGNEDVIRTUAL,
+         rffi.r_short(-2**15), rffi.r_short(2**15 - 1)]
+    numb = Numbering(None, l)
+    assert unpack_numbering(numb) == l
+    # small numbers take a single byte, the biggest ones three bytes
+    small = [tag(0, TAGCONST), tag(5, TAGBOX), tag(15, TAGINT), NULLREF]
+    assert len(Numbering(None, small).code) == 4
+    assert len(Numbering(None, [tag(16, TAGINT)]).code) == 2
+    assert len(Numbering(None, [rffi.r_short(-2**15)]).code) == 3
+
+def test_Numbering_empty():
+    numb = Numbering(None, [])
+    assert len(numb.code) == 0
+    assert unpack_numbering(numb) == []
 
 def test_capture_resumedata():
     b1, b2, b3 = [BoxInt(), BoxPtr(), BoxInt()]
@@ -900,11 +918,11 @@ def test_ResumeDataLoopMemo_number():
 
     assert liveboxes == {b1: tag(0, TAGBOX), b2: tag(1, TAGBOX),
                          b3: tag(2, TAGBOX)}
-    assert list(numb.nums) == [tag(3, TAGINT), tag(2, TAGBOX), tag(0, TAGBOX),
-                               tag(1, TAGINT)]
-    assert list(numb.prev.nums) == [tag(0, TAGBOX), tag(1, TAGINT),
-                                    tag(1, TAGBOX),
-                                    tag(0, TAGBOX), tag(2, TAGINT)]
+    assert unpack_numbering(numb) == [tag(3, TAGINT), tag(2, TAGBOX), tag(0, TAGBOX),
+                                      tag(1, TAGINT)]
+    assert unpack_numbering(numb.prev) == [tag(0, TAGBOX), tag(1, TAGINT),
+                                           tag(1, TAGBOX),
+                                           tag(0, TAGBOX), tag(2, TAGINT)]
     assert not numb.prev.prev
 
     numb2, liveboxes2, v = memo.number(FakeOptimizer({}), snap2)
@@ -913,8 +931,8 @@ def test_ResumeDataLoopMemo_number():
     assert liveboxes2 == {b1: tag(0, TAGBOX), b2: tag(1, TAGBOX),
                          b3: tag(2, TAGBOX)}
     assert liveboxes2 is not liveboxes
-    assert list(numb2.nums) == [tag(3, TAGINT), tag(2, TAGBOX), tag(0, TAGBOX),
-                                tag(3, TAGINT)]
+    assert unpack_numbering(numb2) == [tag(3, TAGINT), tag(2, TAGBOX), tag(0, TAGBOX),
+                                       tag(3, TAGINT)]
     assert numb2.prev == numb.prev
 
     env3 = [c3, b3, b1, c3]
@@ -937,8 +955,8 @@ def test_ResumeDataLoopMemo_number():
     assert v == 0
     
     assert liveboxes3 == {b1: tag(0, TAGBOX), b2: tag(1, TAGBOX)}
-    assert list(numb3.nums) == [tag(3, TAGINT), tag(4, TAGINT), tag(0, TAGBOX),
-                                tag(3, TAGINT)]
+    assert unpack_numbering(numb3) == [tag(3, TAGINT), tag(4, TAGINT), tag(0, TAGBOX),
+                                       tag(3, TAGINT)]
     assert numb3.prev == numb.prev
 
     # virtual
@@ -951,8 +969,8 @@ def test_ResumeDataLoopMemo_number():
     
     assert liveboxes4 == {b1: tag(0, TAGBOX), b2: tag(1, TAGBOX),
                           b4: tag(0, TAGVIRTUAL)}
-    assert list(numb4.nums) == [tag(3, TAGINT), tag(0, TAGVIRTUAL),
-                                tag(0, TAGBOX), tag(3, TAGINT)]
+    assert unpack_numbering(numb4) == [tag(3, TAGINT), tag(0, TAGVIRTUAL),
+                                       tag(0, TAGBOX), tag(3, TAGINT)]
     assert numb4.prev == numb.prev
 
     env5 = [b1, b4, b5]
@@ -965,10 +983,31 @@ def test_ResumeDataLoopMemo_number():
     
     assert liveboxes5 == {b1: tag(0, TAGBOX), b2: tag(1, TAGBOX),
                           b4: tag(0, TAGVIRTUAL), b5: tag(1, TAGVIRTUAL)}
-    assert list(numb5.nums) == [tag(0, TAGBOX), tag(0, TAGVIRTUAL),
-                                                tag(1, TAGVIRTUAL)]
+    assert unpack_numbering(numb5) == [tag(0, TAGBOX), tag(0, TAGVIRTUAL),
+                                       tag(1, TAGVIRTUAL)]
     assert numb5.prev == numb4
 
+def test_ResumeDataLoopMemo_number_shared():
+    b1, b2, b3, b4 = [BoxInt(), BoxPtr(), BoxInt(), BoxInt()]
+    c1 = ConstInt(1)
+    memo = ResumeDataLoopMemo(FakeMetaInterpStaticData())
+    snap = Snapshot(None, [b1, b2, c1])
+    numb, _, _ = memo.number(FakeOptimizer({}), Snapshot(snap, [b3, c1]))
+    # a different snapshot, but with the same numbering as the first one
+    snap2 = Snapshot(None, [b1, b2, c1])
+    numb2, _, _ = memo.number(FakeOptimizer({}), Snapshot(snap2, [b3, c1]))
+    assert numb2 == numb
+    assert memo.nnumberings == 4
+    assert memo.nnumberings_shared == 2
+    # same content, but 'prev' differs: not shared
+    snap3 = Snapshot(None, [b1, b4])
+    numb3, _, _ = memo.number(FakeOptimizer({}), Snapshot(snap3, [b3, c1]))
+    assert unpack_numbering(numb3) == unpack_numbering(numb)
+    assert numb3 != numb
+    assert memo.nnumberings_shared == 2
+    assert memo.nnumbering_items == 14
+    assert memo.nnumbering_bytes == 9
+
 def test_ResumeDataLoopMemo_number_boxes():
     memo = ResumeDataLoopMemo(FakeMetaInterpStaticData())
     b1, b2 = [BoxInt(), BoxInt()]
@@ -1104,7 +1143,7 @@ class ResumeDataFakeReader(ResumeDataBoxReader):
         class MyInfo:
             @staticmethod
             def enumerate_vars(callback_i, callback_r, callback_f, _):
-                for index, tagged in enumerate(self.cur_numb.nums):
+                for index, tagged in enumerate(unpack_numbering(self.cur_numb)):
                     _, tag = untag(tagged)
                     if tag == TAGVIRTUAL:
                         kind = REF
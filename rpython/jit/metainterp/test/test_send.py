@@ -2,6 +2,8 @@ import py
 from rpython.rlib.jit import JitDriver, promote, elidable, set_param
 from rpython.jit.codewriter.policy import StopAtXPolicy
 from rpython.jit.metainterp.test.support import LLJitMixin
+from rpython.jit.metainterp.resoperation import rop
+from rpython.jit.metainterp.warmspot import get_stats
 
 class SendTests(object):
 
@@ -628,5 +630,78 @@ class SendTests(object):
         res = self.meta_interp(fn, [20], policy=StopAtXPolicy(extern))
         assert res == 21
 
+    def test_guard_class_switch(self):
+        myjitdriver = JitDriver(greens = [], reds = ['n', 'res'])
+        class Base:
+            pass
+        class W1(Base):
+            def foo(self):
+                return 1
+        class W2(Base):
+            def foo(self):
+                return 20
+        class W3(Base):
+            def foo(self):
+                return 300
+        def extern(n):
+            if n % 3 == 0:
+                return W1()
+            elif n % 3 == 1:
+                return W2()
+            else:
+                return W3()
+        def f(n):
+            res = 0
+            while n > 0:
+                myjitdriver.jit_merge_point(n=n, res=res)
+                res += extern(n).foo()
+                n -= 1
+            return res
+        res = self.meta_interp(f, [300], policy=StopAtXPolicy(extern))
+        assert res == f(300)
+        if self.CPUClass.guard_class_switch_cases < 2:
+            py.test.skip("the backend has no guard_class switch")
+        # the two other classes get a bridge each from the guard_class in
+        # the body of the loop, instead of a chain of two bridges
+        [loop] = get_stats().loops
+        guard_ops = [op for op in loop.operations
+                     if op.getopnum() == rop.GUARD_CLASS]
+        assert guard_ops[-1].getdescr().num_class_cases == 2
+        self.check_trace_count_at_most(4)
+
+    def test_guard_class_switch_full(self):
+        myjitdriver = JitDriver(greens = [], reds = ['n', 'res'])
+        class Base:
+            pass
+        classes = []
+        for i in range(7):
+            class W(Base):
+                value = 10 ** i
+                def foo(self):
+                    return self.value
+            classes.append(W)
+        def extern(n):
+            k = n % 7
+            for i in range(7):
+                if i == k:
+                    return classes[i]()
+            raise AssertionError
+        def f(n):
+            res = 0
+            while n > 0:
+                myjitdriver.jit_merge_point(n=n, res=res)
+                res += extern(n).foo()
+                n -= 1
+            return res
+        res = self.meta_interp(f, [700], policy=StopAtXPolicy(extern))
+        assert res == f(700)
+        cases = self.CPUClass.guard_class_switch_cases
+        if cases == 0:
+            py.test.skip("the backend has no guard_class switch")
+        [loop] = get_stats().loops
+        guard_ops = [op for op in loop.operations
+                     if op.getopnum() == rop.GUARD_CLASS]
+        assert guard_ops[-1].getdescr().num_class_cases == cases
+
 class TestLLtype(SendTests, LLJitMixin):
     pass
@@ -0,0 +1,100 @@
+import py
+from rpython.jit.metainterp.test.support import LLJitMixin
+from rpython.rlib.jit import JitDriver
+from rpython.rtyper.lltypesystem import lltype
+
+
+FLOATARRAY = lltype.Array(lltype.Float, hints={'nolength': True})
+
+
+class VectorizeTests(object):
+
+    def test_add_arrays(self):
+        if getattr(self.CPUClass, 'is_llgraph', False):
+            py.test.skip("the guards checking for overlaps do arithmetic "
+                         "on raw addresses, which llgraph can't do")
+        myjitdriver = JitDriver(greens=[], reds='auto')
+        def add(a, b, c, n):
+            i = 0
+            while i < n:
+                myjitdriver.jit_merge_point()
+                c[i] = a[i] + b[i]
+                i += 1
+        def checksum(a, n):
+            res = 0.0
+            i = 0
+            while i < n:
+                res = res * 0.5 + a[i]
+                i += 1
+            return res
+        def f(n):
+            a = lltype.malloc(FLOATARRAY, n + 1, flavor='raw')
+            b = lltype.malloc(FLOATARRAY, n, flavor='raw')
+            c = lltype.malloc(FLOATARRAY, n, flavor='raw')
+            i = 0
+            while i < n:
+                a[i] = i * 1.5
+                b[i] = i * 0.25
+                i += 1
+            add(a, b, c, n)
+            res = checksum(c, n)
+            # now the target overlaps with the next items of the source,
+            # which must be caught by the guards before the vector code
+            add(a, b, lltype.direct_ptradd(a, 1), n)
+            res += checksum(a, n + 1)
+            lltype.free(a, flavor='raw')
+            lltype.free(b, flavor='raw')
+            lltype.free(c, flavor='raw')
+            return res
+        expected = f(31)
+        res = self.meta_interp(f, [31], vec=1)
+        assert res == expected
+        self.check_simple_loop(vec_float_add=1, float_add=0,
+                               vec_getarrayitem_raw=2,
+                               vec_setarrayitem_raw=1)
+
+    def test_scale_in_place(self):
+        myjitdriver = JitDriver(greens=[], reds='auto')
+        def f(n, k):
+            a = lltype.malloc(FLOATARRAY, n, flavor='raw')
+            i = 0
+            while i < n:
+                a[i] = i * 1.5
+                i += 1
+            i = 0
+            x = k * 0.5
+            while i < n:
+                myjitdriver.jit_merge_point()
+                a[i] = a[i] * x - 1.0
+                i += 1
+            res = 0.0
+            i = 0
+            while i < n:
+                res = res * 0.5 + a[i]
+                i += 1
+            lltype.free(a, flavor='raw')
+            return res
+        res = self.meta_interp(f, [30, 3], vec=1)
+        assert res == f(30, 3)
+        self.check_simple_loop(vec_float_mul=1, vec_float_sub=1,
+                               vec_float_splat=2, float_mul=0)
+
+    def test_not_enabled(self):
+        myjitdriver = JitDriver(greens=[], reds='auto')
+        def f(n):
+            a = lltype.malloc(FLOATARRAY, n, flavor='raw')
+            i = 0
+            while i < n:
+                myjitdriver.jit_merge_point()
+                a[i] = i * 1.5
+                i += 1
+            res = a[n - 1]
+            lltype.free(a, flavor='raw')
+            return res
+        res = self.meta_interp(f, [30])
+        assert res == 29 * 1.5
+        self.check_simple_loop(vec_setarrayitem_raw=0)
+
+
+class TestLLtype(VectorizeTests, LLJitMixin):
+    pass
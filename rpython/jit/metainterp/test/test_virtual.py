@@ -802,6 +802,30 @@ class VirtualTests:
         assert res == f(10)
         self.check_resops(new_with_vtable=0, new=0)
 
+    def test_residual_call_does_not_capture(self):
+        @dont_look_inside
+        def external(node):
+            return node.value + 1
+        myjitdriver = JitDriver(greens=[], reds=['n', 'node'])
+        def f(n):
+            node = self._new()
+            node.value = 0
+            node.extra = 0
+            while n > 0:
+                myjitdriver.jit_merge_point(n=n, node=node)
+                next = self._new()
+                next.value = node.value + n
+                next.extra = external(next) + node.extra
+                node = next
+                n -= 1
+            return node.value * node.extra
+        res = self.meta_interp(f, [10])
+        assert res == f(10)
+        # 'next' stays virtual: only the copy passed to external() is
+        # allocated, and its 'extra' field is never written
+        self.check_simple_loop(getfield_gc=0, setfield_gc=1, call=1,
+                               **{self._new_op: 1})
+
     def test_retrace_not_matching_bridge(self):
         @dont_look_inside
         def external(node):
@@ -91,6 +91,7 @@ def test_make_jitdriver_callbacks_1():
     class FakeWarmRunnerDesc:
         cpu = None
         memory_manager = None
+        compile_queue = None
         jitcounter = DeterministicJitCounter()
     class FakeJitDriverSD:
         jitdriver = None
@@ -121,6 +122,7 @@ def test_make_jitdriver_callbacks_3():
         rtyper = None
         cpu = None
         memory_manager = None
+        compile_queue = None
         jitcounter = DeterministicJitCounter()
     class FakeJitDriverSD:
         jitdriver = None
@@ -147,6 +149,7 @@ def test_make_jitdriver_callbacks_4():
         rtyper = None
         cpu = None
         memory_manager = None
+        compile_queue = None
         jitcounter = DeterministicJitCounter()
     class FakeJitDriverSD:
         jitdriver = None
@@ -173,6 +176,7 @@ def test_make_jitdriver_callbacks_5():
         rtyper = None
         cpu = None
         memory_manager = None
+        compile_queue = None
         jitcounter = DeterministicJitCounter()
     class FakeJitDriverSD:
         jitdriver = None
@@ -18,6 +18,7 @@ from rpython.translator.backendopt import removenoops
 from rpython.translator.unsimplify import call_final_function
 
 from rpython.jit.metainterp import history, pyjitpl, gc, memmgr, jitexc
+from rpython.jit.metainterp import compilequeue, jitprof
 from rpython.jit.metainterp.pyjitpl import MetaInterpStaticData
 from rpython.jit.metainterp.jitprof import Profiler, EmptyProfiler
 from rpython.jit.metainterp.jitdriver import JitDriverStaticData
@@ -67,10 +68,12 @@ def ll_meta_interp(function, args, backendopt=False, type_system='lltype',
 
 def jittify_and_run(interp, graph, args, repeat=1, graph_and_interp_only=False,
                     backendopt=False, trace_limit=sys.maxint,
-                    inline=False, loop_longevity=0, retrace_limit=5,
+                    inline=False, loop_longevity=0, loop_memory_limit=0,
+                    compile_queue=0,
+                    retrace_limit=5, max_retrace_limit=0,
                     function_threshold=4,
                     enable_opts=ALL_OPTS_NAMES, max_retrace_guards=15, 
-                    max_unroll_recursion=7, **kwds):
+                    max_unroll_recursion=7, vec=0, **kwds):
     from rpython.config.config import ConfigError
     translator = interp.typer.annotator.translator
     try:
@@ -89,10 +92,14 @@ def jittify_and_run(interp, graph, args, repeat=1, graph_and_interp_only=False,
         jd.warmstate.set_param_trace_limit(trace_limit)
         jd.warmstate.set_param_inlining(inline)
         jd.warmstate.set_param_loop_longevity(loop_longevity)
+        jd.warmstate.set_param_loop_memory_limit(loop_memory_limit)
+        jd.warmstate.set_param_compile_queue(compile_queue)
         jd.warmstate.set_param_retrace_limit(retrace_limit)
+        jd.warmstate.set_param_max_retrace_limit(max_retrace_limit)
         jd.warmstate.set_param_max_retrace_guards(max_retrace_guards)
         jd.warmstate.set_param_enable_opts(enable_opts)
         jd.warmstate.set_param_max_unroll_recursion(max_unroll_recursion)
+        jd.warmstate.set_param_vec(vec)
     warmrunnerdesc.finish()
     if graph_and_interp_only:
         return interp, graph
@@ -171,6 +178,9 @@ def reset_jit():
     """Helper for some tests (see micronumpy/test/test_zjit.py)"""
     reset_stats()
     pyjitpl._warmrunnerdesc.memory_manager.alive_loops.clear()
+    pyjitpl._warmrunnerdesc.memory_manager.total_size = 0
+    pyjitpl._warmrunnerdesc.compile_queue.forget_pending()
+    pyjitpl._warmrunnerdesc.loop_stats.clear()
     pyjitpl._warmrunnerdesc.jitcounter._clear_all()
 
 def get_translator():
@@ -190,6 +200,8 @@ class WarmRunnerDesc(object):
         pyjitpl._warmrunnerdesc = self   # this is a global for debugging only!
         self.set_translator(translator)
         self.memory_manager = memmgr.MemoryManager()
+        self.compile_queue = compilequeue.CompileQueue()
+        self.loop_stats = jitprof.LoopStats()
         self.build_cpu(CPUClass, **kwds)
         self.inline_inlineable_portals()
         self.find_portals()
@@ -2,7 +2,7 @@ import sys
 import weakref
 
 from rpython.jit.codewriter import support, heaptracker, longlong
-from rpython.jit.metainterp import history
+from rpython.jit.metainterp import history, hotprofile
 from rpython.rlib.debug import debug_start, debug_stop, debug_print
 from rpython.rlib.jit import PARAMETERS
 from rpython.rlib.nonconst import NonConstant
@@ -128,6 +128,7 @@ JC_TRACING         = 0x01
 JC_DONT_TRACE_HERE = 0x02
 JC_TEMPORARY       = 0x04
 JC_TRACING_OCCURRED= 0x08
+JC_COMPILE_PENDING = 0x10
 
 class BaseJitCell(object):
     """Subclasses of BaseJitCell are used in tandem with the single
@@ -163,6 +164,9 @@ class BaseJitCell(object):
 
         JC_TRACING_OCCURRED: set if JC_TRACING was set at least once.
 
+        JC_COMPILE_PENDING: we traced the loop from this greenkey, and
+        it waits in the CompileQueue to be compiled (see compilequeue.py).
+
         JC_TEMPORARY: a "temporary" wref_procedure_token.
         It's the procedure_token of a dummy loop that simply calls
         back the interpreter.  Used for a CALL_ASSEMBLER where the
@@ -203,7 +207,7 @@ class BaseJitCell(object):
     def should_remove_jitcell(self):
         if self.get_procedure_token() is not None:
             return False    # don't remove JitCells with a procedure_token
-        if self.flags & JC_TRACING:
+        if self.flags & (JC_TRACING | JC_COMPILE_PENDING):
             return False    # don't remove JitCells that are being traced
         if self.flags & JC_DONT_TRACE_HERE:
             # if we have this flag, and we *had* a procedure_token but
@@ -223,6 +227,9 @@ class WarmEnterState(object):
         self.jitdriver_sd = jitdriver_sd
         if warmrunnerdesc is not None:       # for tests
             self.cpu = warmrunnerdesc.cpu
+        # {location: fraction} loaded by hotprofile.load_profile()
+        self.hotness_seeds = None
+        self.hotness_seed_lookups = 0
         try:
             self.profiler = warmrunnerdesc.metainterp_sd.profiler
         except AttributeError:       # for tests
@@ -276,11 +283,28 @@ class WarmEnterState(object):
             self.warmrunnerdesc.memory_manager is not None):   # all for tests
             self.warmrunnerdesc.memory_manager.set_max_age(value)
 
+    def set_param_loop_memory_limit(self, value):
+        # note: it's a global parameter, not a per-jitdriver one
+        if (self.warmrunnerdesc is not None and
+            self.warmrunnerdesc.memory_manager is not None):   # all for tests
+            self.warmrunnerdesc.memory_manager.set_max_size(value * 1024)
+
+    def set_param_compile_queue(self, value):
+        # note: it's a global parameter, not a per-jitdriver one
+        if (self.warmrunnerdesc is not None and
+            self.warmrunnerdesc.compile_queue is not None):   # all for tests
+            self.warmrunnerdesc.compile_queue.set_max_length(value)
+
     def set_param_retrace_limit(self, value):
         if self.warmrunnerdesc:
             if self.warmrunnerdesc.memory_manager:
                 self.warmrunnerdesc.memory_manager.retrace_limit = value
 
+    def set_param_max_retrace_limit(self, value):
+        if self.warmrunnerdesc:
+            if self.warmrunnerdesc.memory_manager:
+                self.warmrunnerdesc.memory_manager.max_retrace_limit = value
+
     def set_param_max_retrace_guards(self, value):
         if self.warmrunnerdesc:
             if self.warmrunnerdesc.memory_manager:
@@ -296,6 +320,9 @@ class WarmEnterState(object):
             if self.warmrunnerdesc.memory_manager:
                 self.warmrunnerdesc.memory_manager.max_unroll_recursion = value
 
+    def set_param_vec(self, value):
+        self.vec = value
+
     def disable_noninlinable_function(self, greenkey):
         cell = self.JitCell.ensure_jit_cell_at_key(greenkey)
         cell.flags |= JC_DONT_TRACE_HERE
@@ -304,6 +331,25 @@ class WarmEnterState(object):
         debug_print("disabled inlining", loc)
         debug_stop("jit-disableinlining")
 
+    def add_hotness_seed(self, location, fraction):
+        """Record that the greenkey at 'location' was seen with the given
+        counter fraction by a previous process (see hotprofile.py).  The
+        JitCounter is changed the first time we see the greenkey.
+        """
+        if self.hotness_seeds is None:
+            self.hotness_seeds = {}
+        self.hotness_seeds[location] = fraction
+        self.hotness_seed_lookups = hotprofile.SEED_LOOKUPS
+
+    def mark_compile_pending(self, greenkey):
+        cell = self.JitCell.ensure_jit_cell_at_key(greenkey)
+        cell.flags |= JC_COMPILE_PENDING
+
+    def clear_compile_pending(self, greenkey):
+        cell = self.JitCell.get_jit_cell_at_key(greenkey)
+        if cell is not None:
+            cell.flags &= ~JC_COMPILE_PENDING
+
     def attach_procedure_to_interp(self, greenkey, procedure_token):
         cell = self.JitCell.ensure_jit_cell_at_key(greenkey)
         old_token = cell.get_procedure_token()
@@ -347,6 +393,8 @@ class WarmEnterState(object):
         func_execute_token = self.cpu.make_execute_token(*ARGS)
         cpu = self.cpu
         jitcounter = self.warmrunnerdesc.jitcounter
+        warmstate = self
+        seed_from_hotness_profile = self.seed_from_hotness_profile
 
         def execute_assembler(loop_token, *args):
             # Call the backend to run the 'looptoken' with the given
@@ -406,16 +454,19 @@ class WarmEnterState(object):
                 cell = cell.next
             else:
                 # not found. increment the counter
+                if warmstate.hotness_seeds is not None:
+                    seed_from_hotness_profile(hash, *greenargs)
                 if jitcounter.tick(hash, increment_threshold):
                     bound_reached(hash, None, *args)
                 return
 
             # Here, we have found 'cell'.
             #
-            if cell.flags & (JC_TRACING | JC_TEMPORARY):
-                if cell.flags & JC_TRACING:
+            if cell.flags & (JC_TRACING | JC_COMPILE_PENDING | JC_TEMPORARY):
+                if cell.flags & (JC_TRACING | JC_COMPILE_PENDING):
                     # tracing already happening in some outer invocation of
-                    # this function. don't trace a second time.
+                    # this function, or the trace waits to be compiled.
+                    # don't trace a second time.
                     return
                 # attached by compile_tmp_callback().  count normally
                 if jitcounter.tick(hash, increment_threshold):
@@ -501,6 +552,12 @@ class WarmEnterState(object):
                     setattr(self, attrname, greenargs[i])
                     i = i + 1
 
+            def get_greenargs(self):
+                greenargs = ()
+                for attrname, _ in green_args_name_spec:
+                    greenargs += (getattr(self, attrname),)
+                return greenargs
+
             def comparekey(self, *greenargs2):
                 i = 0
                 for attrname, TYPE in green_args_name_spec:
@@ -620,12 +677,13 @@ class WarmEnterState(object):
 
         #
         get_location_ptr = self.jitdriver_sd._get_printable_location_ptr
+        jitdriver = self.jitdriver_sd.jitdriver
+        if jitdriver:
+            drivername = jitdriver.name
+        else:
+            drivername = '<unknown jitdriver>'
+        self.jitdriver_name = drivername
         if get_location_ptr is None:
-            jitdriver = self.jitdriver_sd.jitdriver
-            if self.jitdriver_sd.jitdriver:
-                drivername = jitdriver.name
-            else:
-                drivername = '<unknown jitdriver>'
             missing = '(%s: no get_printable_location)' % drivername
             def get_location_str(greenkey):
                 return missing
@@ -633,15 +691,69 @@ class WarmEnterState(object):
             rtyper = self.warmrunnerdesc.rtyper
             unwrap_greenkey = self.make_unwrap_greenkey()
             #
-            def get_location_str(greenkey):
-                greenargs = unwrap_greenkey(greenkey)
+            def get_location_str_from_args(*greenargs):
                 fn = support.maybe_on_top_of_llinterp(rtyper, get_location_ptr)
                 llres = fn(*greenargs)
                 if not we_are_translated() and isinstance(llres, str):
                     return llres
                 return hlstr(llres)
+            #
+            def get_location_str(greenkey):
+                greenargs = unwrap_greenkey(greenkey)
+                return get_location_str_from_args(*greenargs)
         self.get_location_str = get_location_str
         #
+        # see hotprofile.py
+        jitcounter = warmrunnerdesc.jitcounter
+        if get_location_ptr is None:
+            # without a location, we cannot recognize the greenkeys
+            # in the next process
+            def collect_hotness_profile(entries):
+                pass
+            def seed_from_hotness_profile(hash, *greenargs):
+                self.hotness_seeds = None
+        else:
+            def collect_hotness_profile(entries):
+                for cell in jitcounter.get_all_cells():
+                    if not isinstance(cell, JitCell):
+                        continue
+                    greenargs = cell.get_greenargs()
+                    if (cell.flags & JC_COMPILE_PENDING or
+                            (not (cell.flags & JC_TEMPORARY) and
+                             cell.get_procedure_token() is not None)):
+                        fraction = 1.0
+                    else:
+                        hash = JitCell.get_uhash(*greenargs)
+                        fraction = jitcounter.get_current_fraction(hash)
+                        if fraction <= 0.0:
+                            continue
+                    location = get_location_str_from_args(*greenargs)
+                    entries.append((location, fraction))
+            #
+            def seed_from_hotness_profile(hash, *greenargs):
+                # Only look for greenkeys that are not in the JitCounter
+                # yet: computing the location string every time would be
+                # too slow.  Each seed is used only once.  When all of
+                # them are used, or after SEED_LOOKUPS lookups, the
+                # remaining seeds are dropped and we are back to the
+                # fast path.
+                if jitcounter.get_current_fraction(hash) != 0.0:
+                    return
+                self.hotness_seed_lookups -= 1
+                if self.hotness_seed_lookups < 0:
+                    self.hotness_seeds = None
+                    return
+                seeds = self.hotness_seeds
+                location = get_location_str_from_args(*greenargs)
+                fraction = seeds.get(location, 0.0)
+                if fraction > 0.0:
+                    del seeds[location]
+                    if not seeds:
+                        self.hotness_seeds = None
+                    jitcounter.change_current_fraction(hash, fraction)
+        self.collect_hotness_profile = collect_hotness_profile
+        self.seed_from_hotness_profile = seed_from_hotness_profile
+        #
         confirm_enter_jit_ptr = self.jitdriver_sd._confirm_enter_jit_ptr
         if confirm_enter_jit_ptr is None:
             def confirm_enter_jit(*args):
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""
+Measure the size of the resume data of the traces produced by pypy-c-jit,
+from a log made with PYPYLOG=jit-resume-size:logfile.  Run it on the logs
+of the PyPy benchmark programs to compare the compact encoding of the
+numberings with the previous one, which used two bytes per item and did
+not share numberings between the guards.
+"""
+
+import sys
+import optparse
+import re
+
+from rpython.jit.metainterp.compile import NUMBERING_HEADER_SIZE
+
+def parse_resume_sizes(log):
+    r = re.compile(r'numberings: (\d+) shared: (\d+) items: (\d+) '
+                   r'bytes: (\d+) consts: (\d+)')
+    for line in log:
+        match = r.match(line)
+        if match:
+            yield tuple([int(x) for x in match.groups()])
+
+def compute_sizes(log):
+    traces = 0
+    old_size = 0
+    new_size = 0
+    for numberings, shared, items, nbytes, consts in parse_resume_sizes(log):
+        traces += 1
+        old_size += numberings * NUMBERING_HEADER_SIZE + items * 2
+        new_size += (numberings - shared) * NUMBERING_HEADER_SIZE + nbytes
+    return traces, old_size, new_size
+
+def main(logfile, options):
+    traces, old_size, new_size = compute_sizes(open(logfile))
+    if traces == 0:
+        print 'no jit-resume-size section found in %s' % (logfile,)
+        return
+    print 'traces:             %d' % traces
+    print 'old bytes:          %d (%.1f per trace)' % (
+        old_size, float(old_size) / traces)
+    print 'new bytes:          %d (%.1f per trace)' % (
+        new_size, float(new_size) / traces)
+    if old_size:
+        print 'ratio:              %.2f' % (float(new_size) / old_size)
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(usage="%prog logfile [options]")
+    options, args = parser.parse_args()
+    if len(args) != 1:
+        parser.print_help()
+        sys.exit(2)
+    main(args[0], options)
@@ -0,0 +1,25 @@
+from cStringIO import StringIO
+from rpython.jit.tool.resumesize import parse_resume_sizes, compute_sizes,\
+     NUMBERING_HEADER_SIZE
+
+LOG = """
+[1200] {stuff
+...
+[1201] stuff}
+[120a] {jit-resume-size
+numberings: 10 shared: 4 items: 50 bytes: 30 consts: 2
+[120b] jit-resume-size}
+[1300] {jit-resume-size
+numberings: 3 shared: 0 items: 6 bytes: 8 consts: 0
+[1301] jit-resume-size}
+"""
+
+def test_parse_resume_sizes():
+    sizes = list(parse_resume_sizes(StringIO(LOG)))
+    assert sizes == [(10, 4, 50, 30, 2), (3, 0, 6, 8, 0)]
+
+def test_compute_sizes():
+    traces, old_size, new_size = compute_sizes(StringIO(LOG))
+    assert traces == 2
+    assert old_size == 13 * NUMBERING_HEADER_SIZE + 56 * 2
+    assert new_size == 9 * NUMBERING_HEADER_SIZE + 38
@@ -181,6 +181,11 @@ class GCBase(object):
     def set_max_heap_size(self, size):
         raise NotImplementedError
 
+    def get_stats(self, stats_no):
+        """Return the value of one of the rgc.STAT_* statistics,
+        or -1 if this GC does not support it."""
+        return -1
+
     def trace(self, obj, callback, arg):
         """Enumerate the locations inside the given obj that can contain
         GC pointers.  For each such location, callback(pointer, arg) is
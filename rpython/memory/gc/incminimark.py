@@ -9,6 +9,15 @@ Environment variables can be used to fine-tune the following parameters:
  PYPY_GC_NURSERY_DEBUG   If set to non-zero, will fill nursery with garbage,
                          to help debugging.
 
+ PYPY_GC_NURSERY_TARGET  If set, the nursery is resized at runtime to make
+                         the fraction of its content that survives minor
+                         collections close to this value.  Try values like
+                         '0.05'.  Not set by default: the nursery keeps
+                         the size given by PYPY_GC_NURSERY.
+
+ PYPY_GC_NURSERY_MIN     The bounds of the nursery size when it is resized.
+ PYPY_GC_NURSERY_MAX     Default to 1/4th and 4 times PYPY_GC_NURSERY.
+
  PYPY_GC_INCREMENT_STEP  The size of memory marked during the marking step.
                          Default is size of nursery * 2. If you mark it too high
                          your GC is not incremental at all. The minimum is set
@@ -43,6 +52,13 @@ Environment variables can be used to fine-tune the following parameters:
                          the GC in very small programs.  Defaults to 8
                          times the nursery.
 
+ PYPY_GC_RELEASE         After each major collection, give back to the OS
+                         the memory of at most this amount of free pages,
+                         with madvise(); entirely free arenas are always
+                         given back.  Defaults to '4MB'.  '0' or 'off'
+                         disables it: the process then keeps the memory
+                         of its peak usage.
+
  PYPY_GC_DEBUG           Enable extra checks around collections that are
                          too slow for normal use.  Values are 0 (off),
                          1 (on major collections) or 2 (also on minor
@@ -55,7 +71,7 @@ Environment variables can be used to fine-tune the following parameters:
 
 # XXX try merging old_objects_pointing_to_pinned into
 # XXX old_objects_pointing_to_young (IRC 2014-10-22, fijal and gregor_w)
-import sys
+import sys, os
 from rpython.rtyper.lltypesystem import lltype, llmemory, llarena, llgroup
 from rpython.rtyper.lltypesystem.lloperation import llop
 from rpython.rtyper.lltypesystem.llmemory import raw_malloc_usage
@@ -66,7 +82,10 @@ from rpython.rlib.rarithmetic import ovfcheck, LONG_BIT, intmask, r_uint
 from rpython.rlib.rarithmetic import LONG_BIT_SHIFT
 from rpython.rlib.debug import ll_assert, debug_print, debug_start, debug_stop
 from rpython.rlib.objectmodel import specialize
+from rpython.rlib.rtimer import read_timestamp
+from rpython.rlib import rgc
 from rpython.memory.gc.minimarkpage import out_of_memory
+from rpython.memory.gc.pausestats import PauseStats
 
 #
 # Handles the objects in 2 generations:
@@ -177,6 +196,10 @@ FORWARDSTUB = lltype.GcStruct('forwarding_stub',
 FORWARDSTUBPTR = lltype.Ptr(FORWARDSTUB)
 NURSARRAY = lltype.Array(llmemory.Address)
 
+# When resizing the nursery (see PYPY_GC_NURSERY_TARGET), the number of
+# minor collections over which the survival rate is measured
+NURSERY_RESIZE_WINDOW = 8
+
 # ____________________________________________________________
 
 class IncrementalMiniMarkGC(MovingGCBase):
@@ -260,6 +283,11 @@ class IncrementalMiniMarkGC(MovingGCBase):
         # minimal allocated size of the nursery is 2x the following
         # number (by default, at least 132KB on 32-bit and 264KB on 64-bit).
         "large_object": (16384+512)*WORD,
+
+        # The maximum number of bytes of free pages whose memory is given
+        # back to the OS after each major collection.  0 means that the
+        # memory is never given back.
+        "release_limit": 4*1024*1024,
         }
 
     def __init__(self, config,
@@ -273,6 +301,10 @@ class IncrementalMiniMarkGC(MovingGCBase):
                  growth_rate_max=2.5,   # for tests
                  card_page_indices=0,
                  large_object=8*WORD,
+                 release_limit=0,
+                 nursery_survival_target=0.0,
+                 nursery_min_size=0,
+                 nursery_max_size=0,
                  ArenaCollectionClass=None,
                  **kwds):
         MovingGCBase.__init__(self, config, **kwds)
@@ -289,6 +321,26 @@ class IncrementalMiniMarkGC(MovingGCBase):
         self.max_heap_size_already_raised = False
         self.max_delta = float(r_uint(-1))
         self.max_number_of_pinned_objects = 0      # computed later
+        self.release_limit = release_limit
+        #
+        # Resizing the nursery: the target survival rate (or 0.0 to keep
+        # its size), the bounds, and what was measured over the last
+        # minor collections.
+        self.nursery_survival_target = nursery_survival_target
+        self.nursery_min_size = nursery_min_size
+        self.nursery_max_size = nursery_max_size
+        self.nursery_resize_count = 0
+        self.nursery_resize_allocated = 0
+        self.nursery_resize_surviving = 0
+        self.nursery_resize_ticks = 0.0
+        #
+        # Statistics about the pauses: the minor collections and the
+        # steps of the major collections, and the bytes they promoted
+        # out of the nursery or freed.
+        self.minor_pauses = PauseStats()
+        self.major_pauses = PauseStats()
+        self.total_promoted_size = 0
+        self.total_freed_size = 0
         #
         self.card_page_indices = card_page_indices
         if self.card_page_indices > 0:
@@ -453,6 +505,20 @@ class IncrementalMiniMarkGC(MovingGCBase):
             else:
                 self.gc_increment_step = newsize * 4
             #
+            release_limit = env.read_from_env('PYPY_GC_RELEASE')
+            if release_limit > 0 or os.environ.get('PYPY_GC_RELEASE'):
+                self.release_limit = release_limit
+            #
+            survival_target = env.read_float_from_env('PYPY_GC_NURSERY_TARGET')
+            if survival_target > 0.0:
+                self.nursery_survival_target = survival_target
+            nursery_min_size = env.read_from_env('PYPY_GC_NURSERY_MIN')
+            if nursery_min_size > 0:
+                self.nursery_min_size = nursery_min_size
+            nursery_max_size = env.read_from_env('PYPY_GC_NURSERY_MAX')
+            if nursery_max_size > 0:
+                self.nursery_max_size = nursery_max_size
+            #
             nursery_debug = env.read_uint_from_env('PYPY_GC_NURSERY_DEBUG')
             if nursery_debug > 0:
                 self.gc_nursery_debug = True
@@ -466,6 +532,18 @@ class IncrementalMiniMarkGC(MovingGCBase):
         # Estimate this number conservatively
         bigobj = self.nonlarge_max + 1
         self.max_number_of_pinned_objects = self.nursery_size / (bigobj * 2)
+        #
+        self.ac.release_memory = self.release_limit > 0
+        #
+        if self.nursery_survival_target > 0.0:
+            if self.nursery_min_size <= 0:
+                self.nursery_min_size = self.nursery_size // 4
+            self.nursery_min_size = max(self.nursery_min_size,
+                                        2 * bigobj) & ~(WORD-1)
+            if self.nursery_max_size <= 0:
+                self.nursery_max_size = self.nursery_size * 4
+            self.nursery_max_size = max(self.nursery_max_size,
+                                        self.nursery_min_size) & ~(WORD-1)
 
     def _nursery_memory_size(self):
         extra = self.nonlarge_max + 1
@@ -503,6 +581,61 @@ class IncrementalMiniMarkGC(MovingGCBase):
         debug_stop("gc-set-nursery-size")
 
 
+    def resize_nursery(self, newsize):
+        """Replace the nursery, which must be empty, with one of the given
+        size.  The JIT reads 'nursery_free' and 'nursery_top' from the GC
+        every time, so it does not need to know."""
+        debug_start("gc-set-nursery-size")
+        debug_print("nursery size:", newsize)
+        llarena.arena_free(self.nursery)
+        self.nursery_size = newsize
+        self.nursery = self._alloc_nursery()
+        self.nursery_free = self.nursery
+        self.nursery_top = self.nursery + self.nursery_size
+        bigobj = self.nonlarge_max + 1
+        self.max_number_of_pinned_objects = self.nursery_size / (bigobj * 2)
+        debug_stop("gc-set-nursery-size")
+
+    def _record_minor_collection(self, allocated, duration):
+        # Called at the end of each minor collection if the nursery
+        # is resized at runtime.
+        self.nursery_resize_count += 1
+        self.nursery_resize_allocated += allocated
+        self.nursery_resize_surviving += self.nursery_surviving_size
+        self.nursery_resize_ticks += float(duration)
+        if (self.nursery_resize_count >= NURSERY_RESIZE_WINDOW and
+                self.pinned_objects_in_nursery == 0):
+            self._adapt_nursery_size()
+
+    def _adapt_nursery_size(self):
+        # If more than the target fraction of the nursery survives, the
+        # objects don't have the time to die: make the nursery bigger.
+        # If much less survives, a smaller nursery uses the cache better.
+        # Pinned objects and the debugging options that play with the
+        # nursery prevent resizing it.
+        allocated = self.nursery_resize_allocated
+        newsize = self.nursery_size
+        if allocated > 0:
+            survival = float(self.nursery_resize_surviving) / allocated
+            if survival > self.nursery_survival_target:
+                newsize = min(newsize * 2, self.nursery_max_size)
+            elif survival < self.nursery_survival_target * 0.5:
+                newsize = max((newsize // 2) & ~(WORD-1),
+                              self.nursery_min_size)
+            debug_start("gc-nursery-resize")
+            debug_print("survival rate:", survival,
+                        "average pause (ticks):",
+                        self.nursery_resize_ticks / self.nursery_resize_count,
+                        "nursery size:", self.nursery_size, "->", newsize)
+            debug_stop("gc-nursery-resize")
+        self.nursery_resize_count = 0
+        self.nursery_resize_allocated = 0
+        self.nursery_resize_surviving = 0
+        self.nursery_resize_ticks = 0.0
+        if (newsize != self.nursery_size and self.debug_tiny_nursery < 0
+                and not self.debug_rotating_nurseries):
+            self.resize_nursery(newsize)
+
     def set_major_threshold_from(self, threshold, reserving_size=0):
         # Set the next_major_collection_threshold.
         threshold_max = (self.next_major_collection_initial *
@@ -1100,6 +1233,52 @@ class IncrementalMiniMarkGC(MovingGCBase):
         return (self.next_major_collection_threshold -
                 float(self.get_total_memory_used()))
 
+    def release_free_pages(self):
+        max_pages = self.release_limit // self.ac.page_size
+        released = self.ac.release_free_pages(max_pages)
+        debug_start("gc-release")
+        debug_print("released pages:", released,
+                    "now released:", self.ac.num_released_pages,
+                    "freed arenas so far:", self.ac.num_freed_arenas)
+        debug_stop("gc-release")
+
+    def get_stats(self, stats_no):
+        if stats_no == rgc.STAT_RELEASED_MEMORY:
+            return self.ac.num_released_pages * self.ac.released_page_size
+        elif stats_no == rgc.STAT_TOTAL_RELEASED_MEMORY:
+            return self.ac.total_released_pages * self.ac.released_page_size
+        elif stats_no == rgc.STAT_FREED_ARENAS:
+            return self.ac.num_freed_arenas
+        elif stats_no == rgc.STAT_MINOR_COLLECTIONS:
+            return self.minor_pauses.count
+        elif stats_no == rgc.STAT_MINOR_PAUSE_TOTAL:
+            return self.minor_pauses.total
+        elif stats_no == rgc.STAT_MINOR_PAUSE_MIN:
+            return self.minor_pauses.min
+        elif stats_no == rgc.STAT_MINOR_PAUSE_MAX:
+            return self.minor_pauses.max
+        elif stats_no == rgc.STAT_MINOR_PAUSE_P99:
+            return self.minor_pauses.percentile(99)
+        elif stats_no == rgc.STAT_TOTAL_PROMOTED:
+            return self.total_promoted_size
+        elif stats_no == rgc.STAT_MAJOR_STEPS:
+            return self.major_pauses.count
+        elif stats_no == rgc.STAT_MAJOR_PAUSE_TOTAL:
+            return self.major_pauses.total
+        elif stats_no == rgc.STAT_MAJOR_PAUSE_MIN:
+            return self.major_pauses.min
+        elif stats_no == rgc.STAT_MAJOR_PAUSE_MAX:
+            return self.major_pauses.max
+        elif stats_no == rgc.STAT_MAJOR_PAUSE_P99:
+            return self.major_pauses.percentile(99)
+        elif stats_no == rgc.STAT_TOTAL_FREED:
+            return self.total_freed_size
+        elif stats_no == rgc.STAT_GC_STATE:
+            return self.gc_state
+        elif stats_no == rgc.STAT_PINNED_OBJECTS:
+            return self.pinned_objects_in_nursery
+        return -1
+
     def card_marking_words_for_length(self, length):
         # --- Unoptimized version:
         #num_bits = ((length-1) >> self.card_page_shift) + 1
@@ -1514,6 +1693,14 @@ class IncrementalMiniMarkGC(MovingGCBase):
         #
         debug_start("gc-minor")
         #
+        start_time = read_timestamp()
+        allocated = 0
+        if self.nursery_survival_target > 0.0:
+            free = self.nursery_free
+            if not free:    # called from collect_and_reserve()
+                free = self.nursery_top
+            allocated = llarena.getfakearenaaddress(free) - self.nursery
+        #
         # All nursery barriers are invalid from this point on.  They
         # are evaluated anew as part of the minor collection.
         self.nursery_barriers.delete()
@@ -1671,10 +1858,18 @@ class IncrementalMiniMarkGC(MovingGCBase):
         self.old_objects_pointing_to_pinned.foreach(
                 self._reset_flag_old_objects_pointing_to_pinned, None)
         #
+        duration = intmask(read_timestamp() - start_time)
+        self.minor_pauses.record(duration)
+        self.total_promoted_size += self.nursery_surviving_size
+        if self.nursery_survival_target > 0.0:
+            self._record_minor_collection(allocated, duration)
+        #
         debug_print("minor collect, total memory used:",
                     self.get_total_memory_used())
         debug_print("number of pinned objects:",
                     self.pinned_objects_in_nursery)
+        debug_print("promoted:", self.nursery_surviving_size,
+                    "duration (ticks):", duration)
         if self.DEBUG >= 2:
             self.debug_check_consistency()     # expensive!
         #
@@ -2047,6 +2242,8 @@ class IncrementalMiniMarkGC(MovingGCBase):
     def major_collection_step(self, reserving_size=0):
         debug_start("gc-collect-step")
         debug_print("starting gc state: ", GC_STATES[self.gc_state])
+        start_time = read_timestamp()
+        memory_used_before = self.get_total_memory_used()
         # Debugging checks
         if self.pinned_objects_in_nursery == 0:
             ll_assert(self.nursery_free == self.nursery,
@@ -2157,6 +2354,10 @@ class IncrementalMiniMarkGC(MovingGCBase):
             if done:
                 self.num_major_collects += 1
                 #
+                # Give back to the OS the memory of some free pages.
+                if self.release_limit > 0:
+                    self.release_free_pages()
+                #
                 # We also need to reset the GCFLAG_VISITED on prebuilt GC objects.
                 self.prebuilt_root_objects.foreach(self._reset_gcflag_visited, None)
                 #
@@ -2206,6 +2407,14 @@ class IncrementalMiniMarkGC(MovingGCBase):
         else:
             pass #XXX which exception to raise here. Should be unreachable.
 
+        duration = intmask(read_timestamp() - start_time)
+        self.major_pauses.record(duration)
+        freed = 0
+        memory_used_after = self.get_total_memory_used()
+        if memory_used_after < memory_used_before:
+            freed = intmask(memory_used_before - memory_used_after)
+            self.total_freed_size += freed
+        debug_print("freed:", freed, "duration (ticks):", duration)
         debug_print("stopping, now in gc state: ", GC_STATES[self.gc_state])
         debug_stop("gc-collect-step")
 
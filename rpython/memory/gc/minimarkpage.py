@@ -16,6 +16,10 @@ assert 1 << WORD_POWER_2 == WORD
 # The actual allocation occurs in whole arenas, which are then subdivided
 # into pages.  For each arena we allocate one of the following structures:
 
+RELEASED_PAGES = lltype.Array(llmemory.Address, hints={'nolength': True})
+RELEASED_PAGES_PTR = lltype.Ptr(RELEASED_PAGES)
+RELEASED_PAGES_NULL = lltype.nullptr(RELEASED_PAGES)
+
 ARENA_PTR = lltype.Ptr(lltype.ForwardReference())
 ARENA = lltype.Struct('ArenaReference',
     # -- The address of the arena, as returned by malloc()
@@ -24,7 +28,14 @@ ARENA = lltype.Struct('ArenaReference',
     ('nfreepages', lltype.Signed),
     ('totalpages', lltype.Signed),
     # -- A chained list of free pages in the arena.  Ends with NULL.
+    #    The released pages below are not in this list.
     ('freepages', llmemory.Address),
+    # -- The number of free pages whose memory was given back to the OS,
+    #    and their addresses, in an array of 'totalpages' items that is
+    #    only allocated the first time pages of the arena are released.
+    #    They are included in 'nfreepages'.
+    ('nreleasedpages', lltype.Signed),
+    ('releasedpages', RELEASED_PAGES_PTR),
     # -- A linked list of arenas.  See below.
     ('nextarena', ARENA_PTR),
     )
@@ -40,6 +51,12 @@ ARENA_NULL = lltype.nullptr(ARENA)
 # arenas that have 'nfreepages == i'.  We allocate pages out of the
 # arena in 'current_arena'; when it is exhausted we pick another arena
 # with the smallest value for nfreepages (but > 0).
+#
+# Optionally, release_free_pages() gives back to the OS the memory of
+# some of the free pages of the arenas that are not entirely free, with
+# madvise().  It starts with the arenas with the most free pages, which
+# are the last ones we will allocate pages from.  The whole page is
+# released: it is moved from 'freepages' to the 'releasedpages' array.
 
 # ____________________________________________________________
 #
@@ -140,6 +157,19 @@ class ArenaCollection(object):
         # the total memory used, counting every block in use, without
         # the additional bookkeeping stuff.
         self.total_memory_used = r_uint(0)
+        #
+        # if True, the memory of the free pages and arenas is given back
+        # to the OS; see release_free_pages().  Statistics about it:
+        # the number of free pages currently given back, the total number
+        # of pages given back so far, and the number of arenas freed.
+        # 'released_page_size' is how many bytes of a page are actually
+        # given back: all pages are aligned in the same way, so it is
+        # either the whole page or nothing if the OS pages are bigger.
+        self.release_memory = False
+        self.num_released_pages = 0
+        self.total_released_pages = 0
+        self.num_freed_arenas = 0
+        self.released_page_size = 0
 
 
     def _new_page_ptr_list(self, length):
@@ -198,34 +228,41 @@ class ArenaCollection(object):
         if self.current_arena == ARENA_NULL:
             self.allocate_new_arena()
         #
-        # The result is simply 'current_arena.freepages'.
+        # The result is 'current_arena.freepages', or a released page
+        # when there is no other free page left.
         arena = self.current_arena
-        result = arena.freepages
-        if arena.nfreepages > 0:
+        if arena.nfreepages > arena.nreleasedpages:
             #
             # The 'result' was part of the chained list; read the next.
+            result = arena.freepages
             arena.nfreepages -= 1
-            freepages = result.address[0]
+            arena.freepages = result.address[0]
             llarena.arena_reset(result,
                                 llmemory.sizeof(llmemory.Address),
                                 0)
             #
+        elif arena.nreleasedpages > 0:
+            # The 'result' is a released page: the OS gives it back to
+            # us, full of zeroes, when we write to it.
+            arena.nreleasedpages -= 1
+            arena.nfreepages -= 1
+            result = arena.releasedpages[arena.nreleasedpages]
+            self.num_released_pages -= 1
+            #
         else:
             # The 'result' is part of the uninitialized pages.
             ll_assert(self.num_uninitialized_pages > 0,
                       "fully allocated arena found in self.current_arena")
+            result = arena.freepages
             self.num_uninitialized_pages -= 1
             if self.num_uninitialized_pages > 0:
-                freepages = result + self.page_size
+                arena.freepages = result + self.page_size
             else:
-                freepages = NULL
+                arena.freepages = NULL
         #
-        arena.freepages = freepages
-        if freepages == NULL:
+        if arena.nfreepages == 0 and arena.freepages == NULL:
             # This was the last page, so put the arena away into
             # arenas_lists[0].
-            ll_assert(arena.nfreepages == 0, 
-                      "freepages == NULL but nfreepages > 0")
             arena.nextarena = self.arenas_lists[0]
             self.arenas_lists[0] = arena
             self.current_arena = ARENA_NULL
@@ -309,6 +346,8 @@ class ArenaCollection(object):
         arena.nfreepages = 0        # they are all uninitialized pages
         arena.totalpages = npages
         arena.freepages = firstpage
+        arena.nreleasedpages = 0
+        arena.releasedpages = RELEASED_PAGES_NULL
         self.num_uninitialized_pages = npages
         self.current_arena = arena
         #
@@ -395,7 +434,16 @@ class ArenaCollection(object):
                 if arena.nfreepages == arena.totalpages:
                     #
                     # The whole arena is empty.  Free it.
+                    self.num_released_pages -= arena.nreleasedpages
+                    self.num_freed_arenas += 1
+                    if self.release_memory:
+                        # free() may keep the memory for itself; make sure
+                        # that it is given back to the OS anyway
+                        llarena.arena_release(arena.base, self.arena_size)
                     llarena.arena_free(arena.base)
+                    if arena.releasedpages:
+                        lltype.free(arena.releasedpages, flavor='raw',
+                                    track_allocation=False)
                     lltype.free(arena, flavor='raw', track_allocation=False)
                     #
                 else:
@@ -412,6 +460,47 @@ class ArenaCollection(object):
         self.min_empty_nfreepages = 1
 
 
+    def release_free_pages(self, max_pages):
+        """Give back to the OS the memory of at most 'max_pages' free pages
+        that was not given back yet.  Returns the number of pages.
+        Called after mass_free(), when 'arenas_lists' is up-to-date.
+        """
+        released = 0
+        i = self.max_pages_per_arena - 1
+        while i > 0 and released < max_pages:
+            arena = self.arenas_lists[i]
+            while arena != ARENA_NULL and released < max_pages:
+                released += self._release_pages_in_arena(arena,
+                                                         max_pages - released)
+                arena = arena.nextarena
+            i -= 1
+        self.num_released_pages += released
+        self.total_released_pages += released
+        return released
+
+    def _release_pages_in_arena(self, arena, max_pages):
+        # Move pages from the 'freepages' list to the 'releasedpages'
+        # array, which is outside the pages, and release them entirely.
+        count = arena.nfreepages - arena.nreleasedpages
+        if count > max_pages:
+            count = max_pages
+        if count > 0 and not arena.releasedpages:
+            arena.releasedpages = lltype.malloc(RELEASED_PAGES,
+                                                arena.totalpages,
+                                                flavor='raw',
+                                                track_allocation=False)
+        n = count
+        while n > 0:
+            pageaddr = arena.freepages
+            arena.freepages = pageaddr.address[0]
+            self.released_page_size = llarena.arena_release(pageaddr,
+                                                            self.page_size)
+            arena.releasedpages[arena.nreleasedpages] = pageaddr
+            arena.nreleasedpages += 1
+            n -= 1
+        return count
+
+
     def mass_free_in_pages(self, size_class, ok_to_free_func, max_pages):
         nblocks = self.nblocks_for_size[size_class]
         block_size = size_class * WORD
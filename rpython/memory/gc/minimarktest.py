@@ -20,6 +20,11 @@ class SimpleArenaCollection(object):
         self.small_request_threshold = small_request_threshold
         self.all_objects = []
         self.total_memory_used = 0
+        self.release_memory = False
+        self.num_released_pages = 0
+        self.total_released_pages = 0
+        self.num_freed_arenas = 0
+        self.released_page_size = 0
 
     def malloc(self, size):
         nsize = raw_malloc_usage(size)
@@ -56,3 +61,6 @@ class SimpleArenaCollection(object):
         self.mass_free_prepare()
         res = self.mass_free_incremental(ok_to_free_func, sys.maxint)
         assert res
+
+    def release_free_pages(self, max_pages):
+        return 0    # there are no free pages
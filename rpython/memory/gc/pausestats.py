@@ -0,0 +1,66 @@
+"""Statistics about the duration of the GC pauses.
+
+The durations are measured with read_timestamp(), so they are in
+'ticks', whose meaning depends on the platform (on x86, the cycles
+counted by the RDTSC instruction).  Apart from the count, the total,
+the min and the max, a histogram with one bucket per power of two is
+kept, from which the percentiles are computed.  They are thus
+approximations: the result is the upper bound of the bucket where the
+percentile falls, but never more than the max.
+"""
+
+from rpython.rtyper.lltypesystem import lltype, rffi
+from rpython.rlib.rarithmetic import LONG_BIT, intmask
+
+NUM_BUCKETS = LONG_BIT
+
+
+def bucket_index(duration):
+    """Index of the bucket for the given duration: 0 for 0 and 1, then
+    i for the durations between 2**i and 2**(i+1)-1."""
+    i = 0
+    while duration > 1:
+        duration >>= 1
+        i += 1
+    return i
+
+
+class PauseStats(object):
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+        self.buckets = lltype.malloc(rffi.CArray(lltype.Signed),
+                                     NUM_BUCKETS, flavor='raw', zero=True,
+                                     immortal=True)
+
+    def record(self, duration):
+        if duration < 0:    # e.g. the timestamp counters of two CPUs
+            duration = 0    # are not synchronized
+        if self.count == 0 or duration < self.min:
+            self.min = duration
+        if duration > self.max:
+            self.max = duration
+        self.count += 1
+        self.total = intmask(self.total + duration)
+        i = bucket_index(duration)
+        self.buckets[i] += 1
+
+    def percentile(self, percent):
+        """Approximate duration below which 'percent'% of the pauses
+        are, or 0 if there was no pause so far."""
+        if self.count == 0:
+            return 0
+        # number of pauses that may be above the result
+        above = int(self.count * (100 - percent) / 100.0)
+        i = NUM_BUCKETS - 1
+        while i > 0:
+            above -= self.buckets[i]
+            if above < 0:
+                break
+            i -= 1
+        if i >= LONG_BIT - 2:
+            return self.max
+        return min((2 << i) - 1, self.max)
@@ -13,6 +13,7 @@ from rpython.rlib.rarithmetic import LONG_BIT, is_valid_int
 from rpython.memory.gc import minimark, incminimark
 from rpython.memory.gctypelayout import zero_gc_pointers_inside, zero_gc_pointers
 from rpython.rlib.debug import debug_print
+from rpython.rlib import rgc
 import pdb
 WORD = LONG_BIT // 8
 
@@ -725,6 +726,100 @@ class TestIncrementalMiniMarkGCFull(DirectGCTest):
             assert arr_of_ptr_struct[i].prev == lltype.nullptr(S)
             assert arr_of_ptr_struct[i].next == lltype.nullptr(S)
 
+    def test_nursery_grows_when_objects_survive(self):
+        size = self.gc.nursery_size
+        for i in range(200):
+            p = self.malloc(S)
+            p.x = i
+            self.stackroots.append(p)
+        assert self.gc.nursery_size == self.gc.nursery_max_size > size
+        assert self.gc.is_in_nursery(llmemory.cast_ptr_to_adr(
+            self.stackroots[-1]))
+        for i in range(200):
+            assert self.stackroots[i].x == i
+    test_nursery_grows_when_objects_survive.GC_PARAMS = {
+        'nursery_survival_target': 0.1}
+
+    def test_nursery_shrinks_when_objects_die(self):
+        size = self.gc.nursery_size
+        for i in range(200):
+            p = self.malloc(S)
+            p.x = i
+        assert self.gc.nursery_size == self.gc.nursery_min_size < size
+        assert self.gc.nursery_min_size >= 2 * (self.gc.nonlarge_max + 1)
+        p = self.malloc(S)
+        assert self.gc.is_in_nursery(llmemory.cast_ptr_to_adr(p))
+    test_nursery_shrinks_when_objects_die.GC_PARAMS = {
+        'nursery_size': 64*WORD,
+        'nursery_survival_target': 0.1}
+
+    def test_release_free_pages(self):
+        for i in range(300):
+            self.stackroots.append(self.malloc(S))
+        self.gc.collect()
+        assert self.gc.get_stats(rgc.STAT_RELEASED_MEMORY) == 0
+        # keep one object out of 10: some arenas are then entirely free,
+        # and the others contain free pages
+        self.stackroots[:] = self.stackroots[::10]
+        self.gc.collect()
+        released = self.gc.get_stats(rgc.STAT_RELEASED_MEMORY)
+        assert released > 0
+        assert released <= 1024 * WORD
+        # whole pages are released
+        assert self.gc.ac.released_page_size == self.gc.ac.page_size
+        assert released % self.gc.ac.page_size == 0
+        assert self.gc.get_stats(rgc.STAT_TOTAL_RELEASED_MEMORY) == released
+        assert self.gc.get_stats(rgc.STAT_FREED_ARENAS) > 0
+        #
+        # the released pages can be used again
+        for i in range(300):
+            self.stackroots.append(self.malloc(S))
+        self.gc.collect()
+        assert self.gc.get_stats(rgc.STAT_RELEASED_MEMORY) < released
+        for i in range(len(self.stackroots)):
+            assert self.stackroots[i]
+    test_release_free_pages.GC_PARAMS = {'release_limit': 1024 * WORD}
+
+    def test_no_release_free_pages(self):
+        for i in range(300):
+            self.stackroots.append(self.malloc(S))
+        self.gc.collect()
+        self.stackroots[:] = self.stackroots[::10]
+        self.gc.collect()
+        assert self.gc.get_stats(rgc.STAT_TOTAL_RELEASED_MEMORY) == 0
+        assert self.gc.get_stats(rgc.STAT_FREED_ARENAS) > 0
+
+    def test_pause_stats(self):
+        from rpython.memory.gc.incminimark import STATE_SCANNING
+        assert self.gc.get_stats(rgc.STAT_MINOR_COLLECTIONS) == 0
+        self.stackroots.append(self.malloc(S))
+        self.gc.minor_collection()
+        assert self.gc.get_stats(rgc.STAT_MINOR_COLLECTIONS) == 1
+        assert self.gc.get_stats(rgc.STAT_TOTAL_PROMOTED) > 0
+        minor_min = self.gc.get_stats(rgc.STAT_MINOR_PAUSE_MIN)
+        minor_max = self.gc.get_stats(rgc.STAT_MINOR_PAUSE_MAX)
+        assert 0 <= minor_min == minor_max
+        assert self.gc.get_stats(rgc.STAT_MINOR_PAUSE_P99) == minor_max
+        assert self.gc.get_stats(rgc.STAT_MAJOR_STEPS) == 0
+        #
+        for i in range(300):
+            self.stackroots.append(self.malloc(S))
+        minor_collections = self.gc.get_stats(rgc.STAT_MINOR_COLLECTIONS)
+        assert minor_collections > 1
+        del self.stackroots[:]
+        self.gc.collect()
+        steps = self.gc.get_stats(rgc.STAT_MAJOR_STEPS)
+        assert steps >= 4      # one for each state
+        assert (self.gc.get_stats(rgc.STAT_MINOR_COLLECTIONS) >
+                minor_collections)
+        assert self.gc.get_stats(rgc.STAT_TOTAL_FREED) > 0
+        assert (self.gc.get_stats(rgc.STAT_MAJOR_PAUSE_MIN) <=
+                self.gc.get_stats(rgc.STAT_MAJOR_PAUSE_P99) <=
+                self.gc.get_stats(rgc.STAT_MAJOR_PAUSE_MAX) <=
+                self.gc.get_stats(rgc.STAT_MAJOR_PAUSE_TOTAL))
+        assert self.gc.get_stats(rgc.STAT_GC_STATE) == STATE_SCANNING
+        assert self.gc.get_stats(rgc.STAT_PINNED_OBJECTS) == 0
+
     #fail for now
     def xxx_test_malloc_array_of_ptr_arr(self):
         ARR_OF_PTR_ARR = lltype.GcArray(lltype.Ptr(lltype.GcArray(lltype.Ptr(S))))
@@ -1,7 +1,7 @@
 import py
 from rpython.memory.gc.minimarkpage import ArenaCollection
 from rpython.memory.gc.minimarkpage import PAGE_HEADER, PAGE_PTR
-from rpython.memory.gc.minimarkpage import PAGE_NULL, WORD
+from rpython.memory.gc.minimarkpage import PAGE_NULL, WORD, ARENA_NULL
 from rpython.memory.gc.minimarkpage import _dummy_size
 from rpython.rtyper.lltypesystem import lltype, llmemory, llarena
 from rpython.rtyper.lltypesystem.llmemory import cast_ptr_to_adr
@@ -400,13 +400,106 @@ def test_mass_free_half_page_becomes_more_free():
     assert freepages(ac) == NULL
     assert ac.full_page_for_size[2] == PAGE_NULL
 
+def test_release_free_pages():
+    pagesize = hdrsize + 16
+    ac = arena_collection_for_test(pagesize, "#..#..")
+    # move the arena from 'current_arena' to 'arenas_lists'
+    arena = ac.current_arena
+    ac.current_arena = ARENA_NULL
+    arena.nextarena = ARENA_NULL
+    ac.arenas_lists[4] = arena
+    assert freepages_list(arena) == [pagenum(ac, i) for i in [1, 2, 4, 5]]
+    #
+    assert ac.release_free_pages(3) == 3
+    assert arena.nreleasedpages == 3
+    assert ac.num_released_pages == ac.total_released_pages == 3
+    assert ac.released_page_size == pagesize
+    assert released_list(arena) == [pagenum(ac, i) for i in [1, 2, 4]]
+    assert freepages_list(arena) == [pagenum(ac, 5)]
+    assert ac.release_free_pages(3) == 1
+    assert arena.nreleasedpages == 4
+    assert ac.num_released_pages == ac.total_released_pages == 4
+    assert ac.release_free_pages(3) == 0
+    assert released_list(arena) == [pagenum(ac, i) for i in [1, 2, 4, 5]]
+    assert freepages_list(arena) == []
+    assert arena.freepages == NULL
+    # the whole pages were released, including their first word
+    for i in [1, 2, 4, 5]:
+        offset = pagenum(ac, i).offset
+        assert arena.base.arena.usagemap[offset:offset+pagesize].tostring() \
+            == '#' * pagesize
+    #
+    # reusing the released pages
+    ac.arenas_lists[4] = ARENA_NULL
+    ac.current_arena = arena
+    page = ac.allocate_new_page(1); checkpage(ac, page, 5)
+    assert arena.nfreepages == arena.nreleasedpages == 3
+    assert ac.num_released_pages == 3
+    assert ac.total_released_pages == 4
+
+def test_release_free_pages_reuses_released_last():
+    pagesize = hdrsize + 16
+    ac = arena_collection_for_test(pagesize, "#..#..")
+    arena = ac.current_arena
+    ac.current_arena = ARENA_NULL
+    arena.nextarena = ARENA_NULL
+    ac.arenas_lists[4] = arena
+    assert ac.release_free_pages(2) == 2
+    #
+    ac.arenas_lists[4] = ARENA_NULL
+    ac.current_arena = arena
+    page = ac.allocate_new_page(1); checkpage(ac, page, 4)
+    page = ac.allocate_new_page(2); checkpage(ac, page, 5)
+    assert arena.nfreepages == arena.nreleasedpages == 2
+    page = ac.allocate_new_page(3); checkpage(ac, page, 2)
+    assert arena.nfreepages == arena.nreleasedpages == 1
+    assert ac.num_released_pages == 1
+    page = ac.allocate_new_page(4); checkpage(ac, page, 1)
+    assert arena.nfreepages == arena.nreleasedpages == 0
+    assert ac.current_arena == ARENA_NULL
+    assert ac.arenas_lists[0] == arena
+
+def test_release_free_pages_before_uninitialized_pages():
+    pagesize = hdrsize + 16
+    ac = arena_collection_for_test(pagesize, "#.#.  ")
+    arena = ac.current_arena
+    ac.current_arena = ARENA_NULL
+    arena.nextarena = ARENA_NULL
+    ac.arenas_lists[2] = arena
+    assert freepages_list(arena) == [pagenum(ac, 1), pagenum(ac, 3)]
+    assert ac.release_free_pages(1) == 1
+    assert released_list(arena) == [pagenum(ac, 1)]
+    assert freepages_list(arena) == [pagenum(ac, 3)]
+    # the last free page still links to the uninitialized pages
+    assert arena.freepages.address[0] == pagenum(ac, 4)
+    #
+    ac.arenas_lists[2] = ARENA_NULL
+    ac.current_arena = arena
+    page = ac.allocate_new_page(1); checkpage(ac, page, 3)
+    page = ac.allocate_new_page(2); checkpage(ac, page, 1)
+    page = ac.allocate_new_page(3); checkpage(ac, page, 4)
+    page = ac.allocate_new_page(4); checkpage(ac, page, 5)
+    assert ac.current_arena == ARENA_NULL
+
+def freepages_list(arena):
+    result = []
+    pageaddr = arena.freepages
+    for i in range(arena.nfreepages - arena.nreleasedpages):
+        result.append(pageaddr)
+        pageaddr = pageaddr.address[0]
+    return result
+
+def released_list(arena):
+    return [arena.releasedpages[i] for i in range(arena.nreleasedpages)]
+
 # ____________________________________________________________
 
-def test_random(incremental=False):
+def test_random(incremental=False, release=False):
     import random
     pagesize = hdrsize + 24*WORD
     num_pages = 3
     ac = arena_collection_for_test(pagesize, " " * num_pages)
+    ac.release_memory = release
     live_objects = {}
     #
     # Run the test until three arenas are freed.  This is a quick test
@@ -472,8 +565,19 @@ def test_random(incremental=False):
             assert not (set(live_objects) & set(live_objects_extra))
             live_objects.update(live_objects_extra)
             #
+            if release:
+                ac.release_free_pages(random.randrange(0, 4))
+                total = 0
+                for a in ac._all_arenas():
+                    assert 0 <= a.nreleasedpages <= a.nfreepages
+                    total += a.nreleasedpages
+                assert total == ac.num_released_pages
+            #
     except DoneTesting:
         pass
 
 def test_random_incremental():
     test_random(incremental=True)
+
+def test_random_release():
+    test_random(release=True)
@@ -0,0 +1,38 @@
+from rpython.memory.gc.pausestats import PauseStats, bucket_index
+
+
+def test_bucket_index():
+    assert bucket_index(0) == 0
+    assert bucket_index(1) == 0
+    assert bucket_index(2) == 1
+    assert bucket_index(3) == 1
+    assert bucket_index(4) == 2
+    assert bucket_index(1023) == 9
+    assert bucket_index(1024) == 10
+
+def test_empty():
+    stats = PauseStats()
+    assert stats.count == 0
+    assert stats.percentile(99) == 0
+
+def test_record():
+    stats = PauseStats()
+    for duration in [50, 10, 30, -5]:
+        stats.record(duration)
+    assert stats.count == 4
+    assert stats.total == 90
+    assert stats.min == 0
+    assert stats.max == 50
+    assert stats.percentile(99) == 50
+    assert stats.percentile(50) == 15
+
+def test_percentile():
+    stats = PauseStats()
+    for i in range(990):
+        stats.record(10)
+    for i in range(10):
+        stats.record(100000)
+    assert stats.percentile(99) == 15
+    assert stats.percentile(100) == 100000
+    stats.record(100000)
+    assert stats.percentile(99) == 100000
@@ -468,6 +468,10 @@ class BaseFrameworkGCTransformer(GCTransformer):
                                             annmodel.SomeInteger(nonneg=True)],
                                            annmodel.s_None)
 
+        self.get_stats_ptr = getfn(GCClass.get_stats.im_func,
+                                   [s_gc, annmodel.SomeInteger()],
+                                   annmodel.SomeInteger())
+
         if GCClass.can_usually_pin_objects:
             self.pin_ptr = getfn(GCClass.pin,
                                  [s_gc, SomeAddress()],
@@ -1067,6 +1071,12 @@ class BaseFrameworkGCTransformer(GCTransformer):
                                   self.c_const_gc,
                                   v_size])
 
+    def gct_gc_get_stats(self, hop):
+        [v_stats_no] = hop.spaceop.args
+        hop.genop("direct_call", [self.get_stats_ptr, self.c_const_gc,
+                                  v_stats_no],
+                  resultvar=hop.spaceop.result)
+
     def gct_gc_pin(self, hop):
         if not hasattr(self, 'pin_ptr'):
             c_false = rmodel.inputconst(lltype.Bool, False)
@@ -78,6 +78,9 @@ class GCManagedHeap(object):
         if hasattr(self.gc, 'raw_malloc_memory_pressure'):
             self.gc.raw_malloc_memory_pressure(size)
 
+    def get_stats(self, stats_no):
+        return self.gc.get_stats(stats_no)
+
     def shrink_array(self, p, smallersize):
         if hasattr(self.gc, 'shrink_array'):
             addr = llmemory.cast_ptr_to_adr(p)
@@ -39,6 +39,13 @@ class TestIncrementalMiniMarkGC(test_minimark_gc.TestMiniMarkGC):
         res = self.interpret(f, [])
         assert res == True
 
+    def test_get_stats(self):
+        def f():
+            return (rgc.get_stats(rgc.STAT_FREED_ARENAS) >= 0 and
+                    rgc.get_stats(-1) == -1)
+        res = self.interpret(f, [])
+        assert res == True
+
     def test_pin_weakref_not_implemented(self):
         import weakref
         class A:
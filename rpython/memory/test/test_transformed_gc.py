@@ -1297,6 +1297,22 @@ class TestIncrementalMiniMarkGC(TestMiniMarkGC):
         res = run([])
         assert res
 
+    def define_get_stats(cls):
+        S = lltype.GcStruct('S', ('x', lltype.Signed))
+        def f():
+            lst = [lltype.malloc(S) for i in range(200)]
+            llop.gc__collect(lltype.Void)
+            del lst[:]
+            llop.gc__collect(lltype.Void)
+            return (rgc.get_stats(rgc.STAT_FREED_ARENAS) * 10 +
+                    rgc.get_stats(rgc.STAT_TOTAL_RELEASED_MEMORY))
+        return f
+
+    def test_get_stats(self):
+        run = self.runner("get_stats")
+        res = run([])
+        assert res > 0 and res % 10 == 0
+
 # ________________________________________________________________
 # tagged pointers
 
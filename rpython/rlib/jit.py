@@ -470,12 +470,19 @@ PARAMETER_DOCS = {
     'trace_limit': 'number of recorded operations before we abort tracing with ABORT_TOO_LONG',
     'inlining': 'inline python functions or not (1/0)',
     'loop_longevity': 'a parameter controlling how long loops will be kept before being freed, an estimate',
+    'loop_memory_limit': 'memory, in KB, that the machine code and resume data of the loops can use before the least recently entered ones are freed (0 = no limit)',
+    'compile_queue': 'number of traced loops that can wait for pypyjit.compile_pending() to be optimized and assembled, instead of being compiled at once (0 = none)',
     'retrace_limit': 'how many times we can try retracing before giving up',
+    'max_retrace_limit': 'how far retrace_limit can be raised for a loop '
+                         'whose retraces keep producing specialized loops '
+                         '(never raised if not above retrace_limit)',
     'max_retrace_guards': 'number of extra guards a retrace can cause',
     'max_unroll_loops': 'number of extra unrollings a loop can cause',
     'enable_opts': 'INTERNAL USE ONLY (MAY NOT WORK OR LEAD TO CRASHES): '
                    'optimizations to enable, or all = %s' % ENABLE_ALL_OPTS,
-    'max_unroll_recursion': 'how many levels deep to unroll a recursive function'
+    'max_unroll_recursion': 'how many levels deep to unroll a recursive function',
+    'vec': 'turn on the vectorization optimization of loops over raw arrays '
+           'of floats (1/0)',
     }
 
 PARAMETERS = {'threshold': 1039, # just above 1024, prime
@@ -485,11 +492,15 @@ PARAMETERS = {'threshold': 1039, # just above 1024, prime
               'trace_limit': 6000,
               'inlining': 1,
               'loop_longevity': 1000,
+              'loop_memory_limit': 0,
+              'compile_queue': 0,
               'retrace_limit': 5,
+              'max_retrace_limit': 5,    # same as retrace_limit: off
               'max_retrace_guards': 15,
               'max_unroll_loops': 0,
               'enable_opts': 'all',
               'max_unroll_recursion': 7,
+              'vec': 0,
               }
 unroll_parameters = unrolling_iterable(PARAMETERS.items())
 
@@ -2,7 +2,7 @@ from rpython.annotator import model as annmodel
 from rpython.rtyper.llannotation import SomePtr, lltype_to_annotation
 from rpython.rlib.objectmodel import specialize
 from rpython.rtyper.annlowlevel import (cast_instance_to_base_ptr,
-    cast_base_ptr_to_instance, llstr)
+    cast_base_ptr_to_instance, llstr, hlstr)
 from rpython.rtyper.extregistry import ExtRegistryEntry
 from rpython.rtyper.lltypesystem import llmemory, lltype
 from rpython.rtyper import rclass
@@ -122,6 +122,7 @@ def box_isint(llbox):
 
 @register_helper(annmodel.SomeBool())
 def stats_set_debug(warmrunnerdesc, flag):
+    warmrunnerdesc.loop_stats.set_enabled(flag)
     return warmrunnerdesc.metainterp_sd.cpu.set_debug(flag)
 
 @register_helper(annmodel.SomeInteger())
@@ -132,6 +133,49 @@ def stats_get_counter_value(warmrunnerdesc, no):
 def stats_get_times_value(warmrunnerdesc, no):
     return warmrunnerdesc.metainterp_sd.profiler.get_times(no)
 
+@register_helper(annmodel.SomeInteger())
+def stats_memmgr_get_total_size(warmrunnerdesc):
+    return warmrunnerdesc.memory_manager.total_size
+
+@register_helper(annmodel.SomeInteger())
+def stats_memmgr_get_max_size(warmrunnerdesc):
+    return warmrunnerdesc.memory_manager.max_size
+
+@register_helper(annmodel.SomeInteger())
+def stats_memmgr_get_limit_hits(warmrunnerdesc):
+    return warmrunnerdesc.memory_manager.num_limit_hits
+
+@register_helper(annmodel.SomeInteger())
+def stats_memmgr_get_evicted_loops(warmrunnerdesc):
+    return warmrunnerdesc.memory_manager.num_evicted_loops
+
+@register_helper(annmodel.SomeInteger())
+def stats_compile_queue_get_pending(warmrunnerdesc):
+    return len(warmrunnerdesc.compile_queue.pending)
+
+@register_helper(annmodel.SomeInteger())
+def stats_compile_queue_get_deferred(warmrunnerdesc):
+    return warmrunnerdesc.compile_queue.num_deferred
+
+@register_helper(annmodel.SomeInteger())
+def stats_compile_queue_get_failed(warmrunnerdesc):
+    return warmrunnerdesc.compile_queue.num_failed
+
+@register_helper(annmodel.SomeInteger())
+def stats_compile_pending(warmrunnerdesc):
+    return warmrunnerdesc.compile_queue.compile_pending(
+        warmrunnerdesc.metainterp_sd)
+
+@register_helper(annmodel.SomeString(can_be_None=True))
+def stats_dump_hotness_profile(warmrunnerdesc):
+    from rpython.jit.metainterp import hotprofile
+    return llstr(hotprofile.dump_profile(warmrunnerdesc))
+
+@register_helper(annmodel.SomeInteger())
+def stats_load_hotness_profile(warmrunnerdesc, ll_data):
+    from rpython.jit.metainterp import hotprofile
+    return hotprofile.load_profile(warmrunnerdesc, hlstr(ll_data))
+
 LOOP_RUN_CONTAINER = lltype.GcArray(lltype.Struct('elem',
                                                   ('type', lltype.Char),
                                                   ('number', lltype.Signed),
@@ -140,3 +184,56 @@ LOOP_RUN_CONTAINER = lltype.GcArray(lltype.Struct('elem',
 @register_helper(lltype.Ptr(LOOP_RUN_CONTAINER))
 def stats_get_loop_run_times(warmrunnerdesc):
     return warmrunnerdesc.metainterp_sd.cpu.get_all_loop_runs()
+
+@register_helper(lltype.Ptr(LOOP_RUN_CONTAINER))
+def stats_get_guard_failures(warmrunnerdesc):
+    guard_failures = warmrunnerdesc.loop_stats.guard_failures
+    l = lltype.malloc(LOOP_RUN_CONTAINER, len(guard_failures))
+    i = 0
+    for number, counter in guard_failures.iteritems():
+        l[i].type = 'g'
+        l[i].number = number
+        l[i].counter = counter
+        i += 1
+    return l
+
+@register_helper(lltype.Ptr(LOOP_RUN_CONTAINER))
+def stats_get_top_failing_guards(warmrunnerdesc, limit):
+    loop_stats = warmrunnerdesc.loop_stats
+    numbers = loop_stats.get_top_guards(limit)
+    l = lltype.malloc(LOOP_RUN_CONTAINER, len(numbers))
+    for i in range(len(numbers)):
+        l[i].type = 'g'
+        l[i].number = numbers[i]
+        l[i].counter = loop_stats.guard_failures[numbers[i]]
+    return l
+
+@register_helper(lltype.Ptr(LOOP_RUN_CONTAINER))
+def stats_get_guard_reasons(warmrunnerdesc):
+    # 'type' is one of the GUARD_xxx reasons of jitprof.py
+    guard_reasons = warmrunnerdesc.loop_stats.guard_reasons
+    l = lltype.malloc(LOOP_RUN_CONTAINER, len(guard_reasons))
+    i = 0
+    for key, counter in guard_reasons.iteritems():
+        number, reason = key
+        l[i].type = reason
+        l[i].number = number
+        l[i].counter = counter
+        i += 1
+    return l
+
+@register_helper(lltype.Ptr(LOOP_RUN_CONTAINER))
+def stats_get_retrace_limit_hits(warmrunnerdesc):
+    retrace_limit_hits = warmrunnerdesc.loop_stats.retrace_limit_hits
+    l = lltype.malloc(LOOP_RUN_CONTAINER, len(retrace_limit_hits))
+    i = 0
+    for number, counter in retrace_limit_hits.iteritems():
+        l[i].type = 'e'
+        l[i].number = number
+        l[i].counter = counter
+        i += 1
+    return l
+
+@register_helper(annmodel.SomeString(can_be_None=True))
+def stats_get_location(warmrunnerdesc, tp, number):
+    return llstr(warmrunnerdesc.loop_stats.get_location(tp, number))
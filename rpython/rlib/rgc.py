@@ -412,6 +412,49 @@ class AddMemoryPressureEntry(ExtRegistryEntry):
         return hop.genop('gc_add_memory_pressure', [v_size],
                          resulttype=lltype.Void)
 
+# Statistics returned by get_stats()
+STAT_RELEASED_MEMORY = 0        # free memory currently given back to the OS
+STAT_TOTAL_RELEASED_MEMORY = 1  # free memory given back to the OS so far
+STAT_FREED_ARENAS = 2           # number of entirely free arenas freed so far
+STAT_MINOR_COLLECTIONS = 3      # number of minor collections so far
+STAT_MINOR_PAUSE_TOTAL = 4      # their total duration, in read_timestamp ticks
+STAT_MINOR_PAUSE_MIN = 5        # the shortest one
+STAT_MINOR_PAUSE_MAX = 6        # the longest one
+STAT_MINOR_PAUSE_P99 = 7        # 99% of them are shorter than this
+STAT_TOTAL_PROMOTED = 8         # bytes moved out of the nursery so far
+STAT_MAJOR_STEPS = 9            # number of steps of major collections so far
+STAT_MAJOR_PAUSE_TOTAL = 10     # same as above for the major steps
+STAT_MAJOR_PAUSE_MIN = 11
+STAT_MAJOR_PAUSE_MAX = 12
+STAT_MAJOR_PAUSE_P99 = 13
+STAT_TOTAL_FREED = 14           # bytes freed by the major steps so far
+STAT_GC_STATE = 15              # the current phase of the major collection
+STAT_PINNED_OBJECTS = 16        # number of pinned objects in the nursery
+STAT_NAMES = ['released_memory', 'total_released_memory', 'freed_arenas',
+              'minor_collections', 'minor_pause_total', 'minor_pause_min',
+              'minor_pause_max', 'minor_pause_p99', 'total_promoted',
+              'major_steps', 'major_pause_total', 'major_pause_min',
+              'major_pause_max', 'major_pause_p99', 'total_freed',
+              'gc_state', 'pinned_objects']
+
+def get_stats(stats_no):
+    """Return the value of one of the STAT_* statistics of the GC,
+    or -1 if it is not available."""
+    return -1
+
+class GetStatsEntry(ExtRegistryEntry):
+    _about_ = get_stats
+
+    def compute_result_annotation(self, s_stats_no):
+        from rpython.annotator import model as annmodel
+        return annmodel.SomeInteger()
+
+    def specialize_call(self, hop):
+        [v_stats_no] = hop.inputargs(lltype.Signed)
+        hop.exception_cannot_occur()
+        return hop.genop('gc_get_stats', [v_stats_no],
+                         resulttype=lltype.Signed)
+
 
 def get_rpy_memory_usage(gcref):
     "NOT_RPYTHON"
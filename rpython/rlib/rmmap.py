@@ -70,6 +70,8 @@ if _POSIX:
     CConfig.MREMAP_MAYMOVE = (
         rffi_platform.DefinedConstantInteger("MREMAP_MAYMOVE"))
     CConfig.has_mremap = rffi_platform.Has('mremap(NULL, 0, 0, 0)')
+    CConfig.MADV_DONTNEED = (
+        rffi_platform.DefinedConstantInteger("MADV_DONTNEED"))
     # a dirty hack, this is probably a macro
 
 elif _MS_WINDOWS:
@@ -98,6 +100,8 @@ if _POSIX:
         constants["MAP_ANONYMOUS"] = constants["MAP_ANON"]
     assert constants["MAP_ANONYMOUS"] is not None
     constants["MAP_ANON"] = constants["MAP_ANONYMOUS"]
+    # only used by the GC, not exported by the mmap module
+    MADV_DONTNEED = constants.pop("MADV_DONTNEED")
 
 locals().update(constants)
 
@@ -709,6 +713,21 @@ if _POSIX:
         res = c_mmap_safe(addr, map_size, prot, flags, -1, 0)
         return res == addr
 
+    if MADV_DONTNEED is not None:
+        _, c_madvise_safe = external('madvise', [PTR, size_t, rffi.INT],
+                                     rffi.INT)
+
+        def release_memory_chunk_aligned(addr, map_size):
+            """Give the pages back to the OS.  Their content is lost: they
+            read as zeroes the next time they are used."""
+            addr = rffi.cast(PTR, addr)
+            res = c_madvise_safe(addr, map_size,
+                                 rffi.cast(rffi.INT, MADV_DONTNEED))
+            return rffi.cast(lltype.Signed, res) == 0
+    else:
+        def release_memory_chunk_aligned(addr, map_size):
+            return False
+
     # XXX is this really necessary?
     class Hint:
         pos = -0x4fff0000   # for reproducible results
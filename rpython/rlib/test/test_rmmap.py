@@ -492,6 +492,18 @@ def test_alloc_free():
         assert data[i] == chr(i & 0xff)
     free(data, map_size)
 
+def test_release_memory_chunk_aligned():
+    if os.name != 'posix':
+        py.test.skip("posix only")
+    map_size = 65536
+    data = alloc(map_size)
+    for i in range(0, map_size, 171):
+        data[i] = chr((i & 0xff) | 1)
+    assert mmap.release_memory_chunk_aligned(data, map_size)
+    for i in range(0, map_size, 171):
+        assert data[i] == '\x00'
+    free(data, map_size)
+
 def test_compile_alloc_free():
     from rpython.translator.c.test.test_genc import compile
 
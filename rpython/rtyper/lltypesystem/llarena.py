@@ -385,6 +385,16 @@ def arena_protect(arena_addr, size, inaccessible):
     assert size == arena_addr.arena.nbytes
     arena_addr.arena.set_protect(inaccessible)
 
+def arena_release(arena_addr, size):
+    """Give the memory of a range of the arena back to the OS, as far as
+    possible: only the whole OS pages inside the range are released.
+    There must not be any object in the range, and its content is
+    undefined afterwards.  Returns the number of bytes released.
+    """
+    arena_addr = getfakearenaaddress(arena_addr)
+    arena_addr.arena.reset(False, arena_addr.offset, size)
+    return size
+
 # ____________________________________________________________
 #
 # Translation support: the functions above turn into the code below.
@@ -412,14 +422,17 @@ if os.name == 'posix':
             self.pagesize = 0
     posixpagesize = PosixPageSize()
 
-    def clear_large_memory_chunk(baseaddr, size):
-        from rpython.rlib import rmmap
-
+    def get_posix_pagesize():
         pagesize = posixpagesize.pagesize
         if pagesize == 0:
             pagesize = rffi.cast(lltype.Signed, legacy_getpagesize())
             posixpagesize.pagesize = pagesize
+        return pagesize
 
+    def clear_large_memory_chunk(baseaddr, size):
+        from rpython.rlib import rmmap
+
+        pagesize = get_posix_pagesize()
         if size > 2 * pagesize:
             lowbits = rffi.cast(lltype.Signed, baseaddr) & (pagesize - 1)
             if lowbits:     # clear the initial misaligned part, if any
@@ -435,6 +448,19 @@ if os.name == 'posix':
         if size > 0:    # clear the final misaligned part, if any
             llmemory.raw_memclear(baseaddr, size)
 
+    def release_memory_chunk(baseaddr, size):
+        from rpython.rlib import rmmap
+
+        pagesize = get_posix_pagesize()
+        start = rffi.cast(lltype.Signed, baseaddr)
+        end = (start + size) & -pagesize
+        start = (start + pagesize - 1) & -pagesize
+        if end > start:
+            if rmmap.release_memory_chunk_aligned(
+                    rffi.cast(llmemory.Address, start), end - start):
+                return end - start
+        return 0
+
 else:
     # XXX any better implementation on Windows?
     # Should use VirtualAlloc() to reserve the range of pages,
@@ -443,6 +469,9 @@ else:
     # them immediately.
     clear_large_memory_chunk = llmemory.raw_memclear
 
+    def release_memory_chunk(baseaddr, size):
+        return 0
+
 if os.name == "posix" or 'emsfans_nt':
     from rpython.translator.tool.cbuild import ExternalCompilationInfo
     _eci = ExternalCompilationInfo(includes=['sys/mman.h'])
@@ -563,6 +592,11 @@ register_external(arena_protect, [llmemory.Address, lltype.Signed,
                   'll_arena.arena_protect', llimpl=llimpl_arena_protect,
                   llfakeimpl=arena_protect, sandboxsafe=True)
 
+register_external(arena_release, [llmemory.Address, lltype.Signed],
+                  lltype.Signed, 'll_arena.arena_release',
+                  llimpl=release_memory_chunk,
+                  llfakeimpl=arena_release, sandboxsafe=True)
+
 def llimpl_getfakearenaaddress(addr):
     return addr
 register_external(getfakearenaaddress, [llmemory.Address], llmemory.Address,
@@ -500,6 +500,7 @@ LL_OPERATIONS = {
     'gc_typeids_list'     : LLOp(),
     'gc_gcflag_extra'     : LLOp(),
     'gc_add_memory_pressure': LLOp(),
+    'gc_get_stats'        : LLOp(),
 
     # ------- JIT & GC interaction, only for some GCs ----------
 
@@ -3,7 +3,8 @@ import py
 from rpython.rtyper.lltypesystem import lltype, llmemory
 from rpython.rtyper.lltypesystem.llarena import (arena_malloc, arena_reset,
     arena_reserve, arena_free, round_up_for_allocation, ArenaError,
-    arena_new_view, arena_shrink_obj, arena_protect, has_protect)
+    arena_new_view, arena_shrink_obj, arena_protect, has_protect,
+    arena_release)
 from rpython.rtyper.lltypesystem.llmemory import cast_adr_to_ptr
 from rpython.translator.c.test import test_genc, test_standalone
 
@@ -299,6 +300,19 @@ def test_arena_protect():
     p.x = 125
     assert p.x == 125
 
+def test_arena_release():
+    S = lltype.Struct('S', ('x', lltype.Signed))
+    ssize = llmemory.raw_malloc_usage(llmemory.sizeof(S))
+    a = arena_malloc(100, False)
+    arena_reserve(a, llmemory.sizeof(S))
+    p = llmemory.cast_adr_to_ptr(a, lltype.Ptr(S))
+    p.x = 123
+    arena_reserve(a + ssize, llmemory.sizeof(S))
+    assert arena_release(a + ssize, 100 - ssize) == 100 - ssize
+    assert p.x == 123
+    arena_reserve(a + ssize, llmemory.sizeof(S))    # free again
+    py.test.raises(ArenaError, arena_reserve, a, llmemory.sizeof(S))
+
 
 class TestStandalone(test_standalone.StandaloneTests):
     def test_compiled_arena_protect(self):
@@ -8,6 +8,7 @@ class CreationPoint(object):
     def __init__(self, creation_method, TYPE, op=None):
         self.escapes = False
         self.returns = False
+        self.modified = False
         self.creation_method = creation_method
         if creation_method == "constant":
             self.escapes = True
@@ -47,6 +48,14 @@ class VarState(object):
                 crep.returns = True
         return changed
 
+    def setmodified(self):
+        changed = []
+        for crep in self.creation_points:
+            if not crep.modified:
+                changed.append(crep)
+                crep.modified = True
+        return changed
+
     def does_escape(self):
         for crep in self.creation_points:
             if crep.escapes:
@@ -59,6 +68,12 @@ class VarState(object):
                 return True
         return False
 
+    def does_modify(self):
+        for crep in self.creation_points:
+            if crep.modified:
+                return True
+        return False
+
     def __repr__(self):
         return "<VarState %s>" % (self.creation_points, )
 
@@ -184,6 +199,10 @@ class AbstractDataFlowInterpreter(object):
         changed = arg.setreturns()
         self.handle_changed(changed)
 
+    def modifies(self, arg):
+        changed = arg.setmodified()
+        self.handle_changed(changed)
+
     def handle_changed(self, changed):
         for crep in changed:
             if crep not in self.dependencies:
@@ -204,6 +223,8 @@ class AbstractDataFlowInterpreter(object):
             self.escapes(state1)
         if state2.does_return():
             self.returns(state1)
+        if state2.does_modify():
+            self.modifies(state1)
         # register a dependency of the current block on state2:
         # that means that if state2 changes the current block will be reflown
         # triggering this function again and thus updating state1
@@ -230,6 +251,8 @@ class AbstractDataFlowInterpreter(object):
         return state
 
     def op_setfield(self, op, objstate, fieldname, valuestate):
+        if objstate is not None:
+            self.modifies(objstate)
         if valuestate is not None:
             # be pessimistic for now:
             # everything that gets stored into a structure escapes
@@ -237,6 +260,8 @@ class AbstractDataFlowInterpreter(object):
         return None
 
     def op_setarrayitem(self, op, objstate, indexstate, valuestate):
+        if objstate is not None:
+            self.modifies(objstate)
         if valuestate is not None:
             # everything that gets stored into a structure escapes
             self.escapes(valuestate)
@@ -354,3 +379,116 @@ def malloc_like_graphs(adi):
     seen = {}
     return [graph for graph in adi.seen_graphs()
         if is_malloc_like(adi, graph, seen)]
+
+
+class CaptureAnalyzer(AbstractDataFlowInterpreter):
+    """Find the arguments of a call that the callee does not capture: it
+    does not store them in the heap, return them or raise them, and it
+    does not modify them either.  This is a deep property: the same holds
+    for all the objects that the callee reads out of these arguments.
+    The JIT uses it to keep virtual objects virtual across residual
+    calls (see EffectInfo.nocapture_args).
+
+    At most 'max_graphs' graphs are analyzed; calls to the other graphs
+    are assumed to capture all their arguments.
+    """
+    max_graphs = 3000
+
+    def analyze_call(self, op):
+        """Return a list of booleans, one per argument of the
+        'direct_call' or 'indirect_call' operation 'op' (without the
+        function itself): True if the argument is a GC pointer that is
+        not captured by the callee.
+        """
+        if op.opname == 'direct_call':
+            args = op.args[1:]
+            graph = get_graph(op.args[0], self.translation_context)
+            if graph is None:
+                graphs = None
+            else:
+                graphs = [graph]
+        else:
+            assert op.opname == 'indirect_call'
+            args = op.args[1:-1]
+            graphs = op.args[-1].value
+        if not graphs or not self._can_analyze_graphs(graphs):
+            return [False] * len(args)
+        for graph in graphs:
+            if len(graph.getargs()) != len(args):
+                # e.g. a helper called with a different signature
+                return [False] * len(args)
+        for graph in graphs:
+            self.schedule_function(graph)
+        self.complete()
+        result = [isgcpointer(v) for v in args]
+        for graph in graphs:
+            _, argstates = self.schedule_function(graph)
+            for i in range(len(args)):
+                state = argstates[i]
+                if (state is None or state.does_escape() or
+                        state.does_return() or state.does_modify()):
+                    result[i] = False
+        return result
+
+    def _can_analyze_graphs(self, graphs):
+        for graph in graphs:
+            if (graph not in self.functionargs and
+                    len(self.functionargs) >= self.max_graphs):
+                return False
+        return True
+
+    def _escape_all(self, op, args):
+        for arg in args:
+            if arg is not None:
+                self.escapes(arg)
+        if isonheap(op.result):
+            return VarState(self.get_creationpoint(op.result, op.opname, op))
+
+    def op_direct_call(self, op, function, *args):
+        graph = get_graph(op.args[0], self.translation_context)
+        if graph is not None and not self._can_analyze_graphs([graph]):
+            return self._escape_all(op, args)
+        return AbstractDataFlowInterpreter.op_direct_call(self, op, function,
+                                                          *args)
+
+    def op_indirect_call(self, op, function, *args):
+        graphs = op.args[-1].value
+        if graphs is not None and not self._can_analyze_graphs(graphs):
+            return self._escape_all(op, args[:-1])
+        return AbstractDataFlowInterpreter.op_indirect_call(self, op,
+                                                            function, *args)
+
+    # what is read out of an object is considered to be part of it
+
+    def op_getfield(self, op, objstate, fieldname):
+        if isonheap(op.result):
+            return objstate
+
+    def op_getarrayitem(self, op, objstate, indexstate):
+        if isonheap(op.result):
+            return objstate
+
+    def op_getinteriorfield(self, op, objstate, *args):
+        if isonheap(op.result):
+            return objstate
+
+    def op_getsubstruct(self, op, objstate, fieldname):
+        return objstate
+
+    def op_getarraysubstruct(self, op, objstate, indexstate):
+        return objstate
+
+    def op_getinteriorarraysize(self, op, objstate, *args):
+        return None
+
+    def op_setinteriorfield(self, op, objstate, *args):
+        valuestate = args[-1]
+        if objstate is not None:
+            self.modifies(objstate)
+        if valuestate is not None:
+            self.escapes(valuestate)
+        return None
+
+def isgcpointer(var_or_const):
+    T = var_or_const.concretetype
+    return isinstance(T, lltype.Ptr) and T.TO._gckind == 'gc'
@@ -2,6 +2,8 @@ from rpython.translator.interactive import Translation
 from rpython.translator.translator import graphof
 from rpython.translator.backendopt.escape import AbstractDataFlowInterpreter
 from rpython.translator.backendopt.escape import malloc_like_graphs
+from rpython.translator.backendopt.escape import CaptureAnalyzer
+from rpython.translator.simplify import get_graph
 from rpython.rlib.objectmodel import instantiate
 from rpython.conftest import option
 
@@ -368,3 +370,117 @@ def test_find_malloc_like_graphs():
     graphs = malloc_like_graphs(adi)
     assert set([g.name for g in graphs]) == set(["f", "h"])
 
+
+
+def analyze_call_to(function, types, callee):
+    t = Translation(function, types)
+    t.rtype()
+    graph = graphof(t.context, function)
+    calleegraph = graphof(t.context, callee)
+    ca = CaptureAnalyzer(t.context)
+    for block in graph.iterblocks():
+        for op in block.operations:
+            if (op.opname == 'direct_call' and
+                    get_graph(op.args[0], t.context) is calleegraph):
+                return ca.analyze_call(op)
+    assert 0, "call not found"
+
+def test_nocapture_read_only():
+    class A(object):
+        pass
+    def g(a, n, b):
+        return a.x + n + b.x
+    def f(n):
+        a = A()
+        a.x = n
+        return g(a, n, a)
+    assert analyze_call_to(f, [int], g) == [True, False, True]
+
+def test_nocapture_stored_returned_modified():
+    class A(object):
+        pass
+    class Glob(object):
+        pass
+    glob = Glob()
+    def store(a, b):
+        glob.a = a
+        return b.x
+    def ret(a, b):
+        return a
+    def modify(a, b):
+        a.x = 42
+        return b.x
+    def f(n):
+        a = A()
+        a.x = n
+        return store(a, a) + ret(a, a).x + modify(a, a)
+    assert analyze_call_to(f, [int], store) == [False, True]
+    assert analyze_call_to(f, [int], ret) == [False, True]
+    assert analyze_call_to(f, [int], modify) == [False, True]
+
+def test_nocapture_deep():
+    class A(object):
+        pass
+    class B(object):
+        pass
+    class Glob(object):
+        pass
+    glob = Glob()
+    def read(a):
+        return a.b.x
+    def store_inner(a):
+        glob.b = a.b
+    def modify_inner(a):
+        a.b.x += 1
+    def f(n):
+        a = A()
+        a.b = B()
+        a.b.x = n
+        store_inner(a)
+        modify_inner(a)
+        return read(a)
+    assert analyze_call_to(f, [int], read) == [True]
+    assert analyze_call_to(f, [int], store_inner) == [False]
+    assert analyze_call_to(f, [int], modify_inner) == [False]
+
+def test_nocapture_through_calls():
+    class A(object):
+        pass
+    class Glob(object):
+        pass
+    glob = Glob()
+    def h1(a):
+        return a.x
+    def h2(a):
+        glob.a = a
+    def g1(a):
+        return h1(a) + 1
+    def g2(a):
+        h2(a)
+    def f(n):
+        a = A()
+        a.x = n
+        g2(a)
+        return g1(a)
+    assert analyze_call_to(f, [int], g1) == [True]
+    assert analyze_call_to(f, [int], g2) == [False]
+
+def test_nocapture_max_graphs():
+    class A(object):
+        pass
+    def h(a):
+        return a.x
+    def g(a):
+        return h(a)
+    def f(n):
+        a = A()
+        a.x = n
+        return g(a)
+    t = Translation(f, [int])
+    t.rtype()
+    graph = graphof(t.context, f)
+    ca = CaptureAnalyzer(t.context)
+    ca.max_graphs = 1
+    op = [op for op in graph.iterblocks().next().operations
+          if op.opname == 'direct_call'][-1]
+    assert ca.analyze_call(op) == [False]
@@ -1,9 +1,14 @@
-
 int jitExists(int);
 int jitReserve(void);
 int jitCompile(char*);
 int jitRecompile(int, char*);
+void jitSchedule(int, char*);
+int jitFlush(int);
+int jitProcessPending(int);
 void jitCopy(int, int);
 int jitInvoke(int, int, int, int);
 void jitFree(int);
-
+void jitPrecompile(char*, int);
+char* jitCacheRead(char*);
+void jitCacheWrite(char*, char*);
+void jitCacheDelete(char*);